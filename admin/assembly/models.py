@@ -3,7 +3,11 @@ from datetime import datetime
 
 class ProductAssembly(db.Model):
     __tablename__ = 'product_assembly'
-    __table_args__ = {'schema': 'ouvirtiba'}
+    # get_sale_price: última montagem do produto na loja
+    __table_args__ = (
+        db.Index('ix_product_assembly_store_parent_date', 'store_id', 'parent_product_id', 'assembly_date'),
+        {'schema': 'ouvirtiba'}
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     store_id = db.Column(db.Integer, db.ForeignKey('ouvirtiba.store.id'), nullable=False)
@@ -0,0 +1,118 @@
+# admin/blog_post/conteudo.py
+"""
+HTML publicado dos posts do blog.
+
+O conteúdo colado do Word traz blocos VML, classes Mso* e estilos mso-*. Antes
+a limpeza (sete re.sub com DOTALL sobre o texto inteiro) rodava a cada
+visualização de /blog/<slug>; agora gerar_html_publicado() roda uma vez ao
+salvar o post e o resultado fica em BlogPost.content_html.
+
+Na mesma passada as <img> do conteúdo recebem loading="lazy",
+decoding="async" e width/height reais (lidos do arquivo em static/), para o
+navegador reservar o espaço da imagem sem deslocar o texto (CLS).
+
+Posts antigos: python backfill_blog_html.py
+"""
+
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+STATIC_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'static'))
+
+# Mesmas regras da antiga _limpar_html_word de app.py, compiladas uma vez
+_REGRAS_WORD = [
+    # 1. Remove blocos VML <!--[if gte vml 1]>...</[endif]--> (shapetype/shape do Word)
+    (re.compile(r'<!--\s*\[if gte vml\b.*?\[endif\]-->', re.DOTALL), ''),
+    # 2. <!--[if !vml]-->IMAGEM REAL<!--[endif]--> — remove só os comentários, preserva img
+    (re.compile(r'<!--\s*\[if !vml\]-->'), ''),
+    (re.compile(r'<!--\s*\[endif\]-->'), ''),
+    # 3. Remove atributos lang="EN-US" etc.
+    (re.compile(r'\s+lang="[^"]*"'), ''),
+    # 4. Remove classes MSO: class="MsoNormal" etc.
+    (re.compile(r'\s+class="Mso[^"]*"'), ''),
+    # 5. Remove propriedades mso-* dentro de style=""
+    (re.compile(r'mso-[^;:"\'><\s]+[^;"]*;?\s*'), ''),
+    # 6. Remove style="" vazios que sobraram
+    (re.compile(r'\s+style="\s*"'), ''),
+    # 7. Remove <span> vazias que sobraram
+    (re.compile(r'<span>\s*</span>'), ''),
+]
+
+_IMG = re.compile(r'<img\b[^>]*>', re.IGNORECASE)
+_SRC = re.compile(r'\bsrc\s*=\s*["\']([^"\']+)["\']', re.IGNORECASE)
+
+
+def limpar_html_word(html):
+    """Remove tags VML/MSO geradas pelo Word, preservando imagens e HTML limpo."""
+    if not html:
+        return ''
+    for regra, troca in _REGRAS_WORD:
+        html = regra.sub(troca, html)
+    return html.strip()
+
+
+def _tem_atributo(tag, nome):
+    return re.search(r'\s' + nome + r'\s*=', tag, re.IGNORECASE) is not None
+
+
+def _inteiro(tag, nome):
+    """Valor numérico do atributo (width="640" ou width=640) ou None (ausente, "100%"...)."""
+    m = re.search(r'\s' + nome + r'\s*=\s*["\']?\s*(\d+)\s*(?:px)?\s*["\'\s/>]', tag, re.IGNORECASE)
+    return int(m.group(1)) if m else None
+
+
+def _dimensoes(src, static_folder):
+    """(largura, altura) de uma imagem local em /static/ ou None."""
+    if not src.startswith('/static/'):
+        return None
+    caminho = os.path.normpath(os.path.join(static_folder, src[len('/static/'):].split('?')[0]))
+    if not caminho.startswith(static_folder + os.sep) or not os.path.isfile(caminho):
+        return None
+    try:
+        from PIL import Image  # ⚡ só carregado ao salvar post
+        with Image.open(caminho) as img:
+            return img.size
+    except Exception as e:
+        logger.warning(f"⚠️ Não foi possível ler dimensões de {src}: {e}")
+        return None
+
+
+def otimizar_imagens(html, static_folder=STATIC_FOLDER):
+    """
+    Acrescenta loading/decoding e width/height às <img> que não os têm. Se a
+    tag já tem só um deles (numérico), o outro segue a proporção do arquivo.
+    """
+    def _ajustar(m):
+        tag = m.group(0)
+        extras = []
+        if not _tem_atributo(tag, 'loading'):
+            extras.append('loading="lazy"')
+        if not _tem_atributo(tag, 'decoding'):
+            extras.append('decoding="async"')
+        tem_largura, tem_altura = _tem_atributo(tag, 'width'), _tem_atributo(tag, 'height')
+        if not (tem_largura and tem_altura):
+            src = _SRC.search(tag)
+            tamanho = _dimensoes(src.group(1), static_folder) if src else None
+            if tamanho and not (tem_largura or tem_altura):
+                extras.append(f'width="{tamanho[0]}" height="{tamanho[1]}"')
+            elif tamanho and all(tamanho):
+                # Só um dos dois no conteúdo: o outro na mesma proporção do arquivo
+                largura, altura = _inteiro(tag, 'width'), _inteiro(tag, 'height')
+                if tem_largura and largura:
+                    extras.append(f'height="{round(largura * tamanho[1] / tamanho[0])}"')
+                elif tem_altura and altura:
+                    extras.append(f'width="{round(altura * tamanho[0] / tamanho[1])}"')
+        if not extras:
+            return tag
+        fim = '/>' if tag.endswith('/>') else '>'
+        return f"{tag[:-len(fim)].rstrip()} {' '.join(extras)}{fim}"
+
+    return _IMG.sub(_ajustar, html)
+
+
+def gerar_html_publicado(content, static_folder=STATIC_FOLDER):
+    """HTML final do post: limpeza do Word + otimização das imagens."""
+    return otimizar_imagens(limpar_html_word(content), static_folder)
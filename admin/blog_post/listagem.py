@@ -0,0 +1,94 @@
+# admin/blog_post/listagem.py
+"""
+Listagem pública do blog (/blog e /blog/pagina.json).
+
+A listagem só mostra título, resumo, imagem, autor e data, mas BlogPost.query
+trazia também content e content_html (HTML colado do Word, com imagens
+inline), e sem LIMIT. Aqui a consulta carrega só as colunas do card
+(load_only — content/content_html ficam de fora do SELECT) e pagina por
+keyset em (created_at, id), no índice ix_blog_post_active_created.
+
+O total de posts ativos (exibido no topo e devolvido no JSON) fica em cache
+por worker; as rotas de CRUD do blog chamam invalidar_contagem().
+
+- pagina_blog(cursor)     → KeysetPage com os posts da página
+- cursor_valido(cursor)   → True se o cursor decodifica (só esses vão para o page_cache)
+- contar_posts_ativos()   → total de posts ativos (cache com TTL)
+- post_para_dict(post)    → campos do card para o JSON do scroll infinito
+"""
+
+import threading
+import time
+
+from flask import url_for
+from sqlalchemy import func
+from sqlalchemy.orm import load_only
+
+from admin.pagination import decode_cursor, keyset_paginate
+from .models import BlogPost, db
+
+BLOG_POR_PAGINA = 9
+
+# Cada worker tem sua contagem; alterações feitas em outro processo aparecem
+# em no máximo CONTAGEM_TTL segundos.
+CONTAGEM_TTL = 600  # segundos
+
+COLUNAS_CARD = (BlogPost.id, BlogPost.title, BlogPost.summary, BlogPost.image,
+                BlogPost.author, BlogPost.created_at, BlogPost.slug)
+
+_contagem = {'valor': None, 'expira': 0.0}
+_lock = threading.Lock()
+
+
+def consulta_listagem():
+    """Posts ativos só com as colunas do card (sem content/content_html)."""
+    return (BlogPost.query
+            .options(load_only(*COLUNAS_CARD, raiseload=True))
+            .filter(BlogPost.active.is_(True)))
+
+
+def pagina_blog(cursor=None, per_page=BLOG_POR_PAGINA):
+    """Uma página da listagem, mais recentes primeiro."""
+    return keyset_paginate(consulta_listagem(), [BlogPost.created_at, BlogPost.id],
+                           cursor=cursor or '', direcao='next', per_page=per_page)
+
+
+def cursor_valido(cursor):
+    """
+    ?cursor= da listagem (created_at, id). Um valor qualquer abre a primeira
+    página, mas não pode virar mais uma entrada no cache de páginas.
+    """
+    return decode_cursor(cursor, 2) is not None
+
+
+def contar_posts_ativos():
+    agora = time.monotonic()
+    with _lock:
+        if _contagem['valor'] is not None and _contagem['expira'] > agora:
+            return _contagem['valor']
+
+    total = (db.session.query(func.count(BlogPost.id))
+             .filter(BlogPost.active.is_(True))
+             .scalar())
+    with _lock:
+        _contagem['valor'] = total
+        _contagem['expira'] = agora + CONTAGEM_TTL
+    return total
+
+
+def invalidar_contagem():
+    """Descarta o total em cache (chamado após criar/alterar/excluir posts)."""
+    with _lock:
+        _contagem['valor'] = None
+
+
+def post_para_dict(post):
+    return {
+        'id': post.id,
+        'title': post.title,
+        'summary': post.summary,
+        'author': post.author,
+        'created_at': post.created_at.strftime('%d/%m/%Y') if post.created_at else '',
+        'image': url_for('static', filename=post.image) if post.image else None,
+        'url': url_for('blog_post', slug=post.slug),
+    }
@@ -21,12 +21,30 @@ class BlogPost(Base):
     title = db.Column(db.String(255), nullable=False)
     summary = db.Column(db.String(355), nullable=False)
     content = db.Column(db.Text, nullable=False)
+    # HTML já limpo (Word/VML) e com <img loading="lazy" width height>,
+    # gerado ao salvar por conteudo.gerar_html_publicado()
+    content_html = db.Column(db.Text, nullable=True)
     author = db.Column(db.String(45), nullable=False)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
     updated_at = db.Column(db.DateTime, nullable=True)
     image = db.Column(db.String(150), nullable=True)
     active = db.Column(db.Boolean, default=True, nullable=False)
     slug = db.Column(db.String(255), unique=True, nullable=True)
+
+    # /blog: posts ativos, mais recentes primeiro
+    __table_args__ = (
+        db.Index('ix_blog_post_active_created', 'active', 'created_at'),
+        {'schema': 'ouvirtiba'}
+    )
     
     def __repr__(self):
-        return f'<BlogPost {self.title}>'
\ No newline at end of file
+        return f'<BlogPost {self.title}>'
+
+# ==============================================================================
+# ✅ Script de migração — execute UMA vez no banco para adicionar o novo campo
+# ==============================================================================
+# ALTER TABLE ouvirtiba.blog_post
+#   ADD COLUMN IF NOT EXISTS content_html TEXT;
+#
+# Depois preencha os posts existentes: python backfill_blog_html.py
+# ==============================================================================
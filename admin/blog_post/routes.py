@@ -9,6 +9,10 @@ import logging
 
 from .models import BlogPost, db
 from .forms import FormBlogPost
+from .conteudo import gerar_html_publicado
+from .listagem import invalidar_contagem
+from admin.pagination import keyset_paginate, ler_filtros, aplicar_filtros
+from extension import page_cache
 
 # 🔥 CONFIGURAÇÃO DE CAMINHO ABSOLUTO
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -152,8 +156,11 @@ def exibir_erros_formulario(form):
 @blog_bp.route('/admin/blog/list')
 def blog_list():
     """Lista todos os posts do blog."""
-    posts = BlogPost.query.order_by(BlogPost.created_at.desc()).all()
-    return render_template('admin/blog_post/blog_list.html', posts=posts)
+    filtros = ler_filtros()
+    query = aplicar_filtros(BlogPost.query, filtros, data=BlogPost.created_at)
+    pagina = keyset_paginate(query, [BlogPost.created_at, BlogPost.id])
+    return render_template('admin/blog_post/blog_list.html', posts=pagina.items,
+                           pagina=pagina, filtros=filtros)
 
 
 @blog_bp.route('/admin/blog/create', methods=['GET', 'POST'])
@@ -175,11 +182,14 @@ def blog_create():
                 if image_foi_enviada(form.image):
                     image_path = save_image(form.image.data)
 
+                conteudo = corrigir_caminhos_imagens(form.content.data)
+
                 new_post = BlogPost(
                     store_id=session.get('store_id'),
                     title=form.title.data,
                     summary=form.summary.data,
-                    content=corrigir_caminhos_imagens(form.content.data),
+                    content=conteudo,
+                    content_html=gerar_html_publicado(conteudo),
                     author=form.author.data,
                     image=image_path,
                     slug=slug,
@@ -189,6 +199,8 @@ def blog_create():
 
                 db.session.add(new_post)
                 db.session.commit()
+                page_cache.clear()  # 📄 /blog e páginas públicas
+                invalidar_contagem()  # 🔢 total de posts do /blog
 
                 flash(f'Post "{new_post.title}" criado com sucesso!', 'success')
                 return redirect(url_for('blog_bp.blog_list'))
@@ -238,6 +250,7 @@ def blog_update(id):
                 post.title = form.title.data
                 post.summary = form.summary.data
                 post.content = conteudo_novo
+                post.content_html = gerar_html_publicado(conteudo_novo)
                 post.author = form.author.data
                 post.active = form.active.data
 
@@ -251,6 +264,8 @@ def blog_update(id):
                 post.updated_at = datetime.now()
 
                 db.session.commit()
+                page_cache.clear()  # 📄 /blog e páginas públicas
+                invalidar_contagem()  # 🔢 total de posts do /blog
                 flash(f'Post "{post.title}" atualizado com sucesso!', 'success')
                 return redirect(url_for('blog_bp.blog_list'))
 
@@ -329,6 +344,8 @@ def blog_delete(post_id):
         # 3️⃣ EXCLUIR DO BANCO
         db.session.delete(post)
         db.session.commit()
+        page_cache.clear()  # 📄 /blog e páginas públicas
+        invalidar_contagem()  # 🔢 total de posts do /blog
         
         logging.info(f"Post '{post_title}' (ID: {post_id}) excluído com sucesso")
         flash(f'Post "{post_title}" excluído com sucesso!', 'success')
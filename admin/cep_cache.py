@@ -0,0 +1,205 @@
+# admin/cep_cache.py
+"""
+Consulta de CEP com cache em dois níveis (cadastro de clientes e lojas).
+
+Antes busca_cep e validate_zipcode chamavam requests.get no ViaCEP sem
+timeout, sem reaproveitar conexão e sem cache: os mesmos CEPs (clientes do
+mesmo bairro) eram consultados de novo a cada cadastro, e um ViaCEP lento
+prendia o worker indefinidamente.
+
+Ordem da consulta em buscar_cep(cep):
+    1. LRU em memória do worker (CEP_LRU_MAX entradas)
+    2. tabela ouvirtiba.cep_cache (CepCache), válida por CEP_TTL_DIAS
+       (CEP inexistente: CEP_TTL_NEGATIVO_DIAS)
+    3. ViaCEP por uma requests.Session com pool de conexões, pela dependência
+       'viacep' de chamadas_externas.py: timeout de conexão/leitura, limite
+       de chamadas simultâneas e disjuntor (depois de 3 falhas seguidas o
+       ViaCEP não é chamado por 60 s; EXTERNO_VIACEP_*).
+Se o ViaCEP falhar e existir uma linha vencida na tabela, ela é usada.
+
+- buscar_cep(cep)     → dict (address, neighborhood, city, region, complement)
+                        ou None se o CEP não existe; CepIndisponivel se não
+                        houver cache e o ViaCEP estiver fora
+- gravar_ceps(linhas) → upsert em lote (usado por preload_cep.py)
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from chamadas_externas import dependencia, DependenciaIndisponivel
+from extension import db
+from .models import CepCache
+
+logger = logging.getLogger(__name__)
+
+VIACEP_URL = 'https://viacep.com.br/ws/{cep}/json/'
+
+CEP_LRU_MAX = 2048
+CEP_TTL_DIAS = 90
+CEP_TTL_NEGATIVO_DIAS = 1
+
+CAMPOS = ('address', 'neighborhood', 'city', 'region', 'complement')
+
+
+class CepIndisponivel(Exception):
+    """ViaCEP fora do ar (ou disjuntor aberto) e CEP sem cache."""
+
+
+viacep = dependencia('viacep')   # timeout, compartimento e disjuntor
+
+
+# ==============================================================================
+# CACHE EM MEMÓRIA (LRU) E SESSÃO HTTP
+# ==============================================================================
+
+_lru = OrderedDict()      # {cep: (expira_em, dados ou None)}
+_lock = threading.Lock()
+_sessao = None
+
+
+def _lru_get(cep):
+    with _lock:
+        entrada = _lru.get(cep)
+        if entrada is None:
+            return False, None
+        if entrada[0] <= datetime.now():
+            del _lru[cep]
+            return False, None
+        _lru.move_to_end(cep)
+        return True, entrada[1]
+
+
+def _lru_set(cep, expira_em, dados):
+    with _lock:
+        _lru[cep] = (expira_em, dados)
+        _lru.move_to_end(cep)
+        while len(_lru) > CEP_LRU_MAX:
+            _lru.popitem(last=False)
+
+
+def limpar_lru():
+    with _lock:
+        _lru.clear()
+
+
+def _session():
+    """requests.Session reaproveitada (keep-alive com o ViaCEP)."""
+    global _sessao
+    if _sessao is None:
+        import requests  # ⚡ carregado só na primeira consulta externa
+        from requests.adapters import HTTPAdapter
+        sessao = requests.Session()
+        sessao.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0))
+        sessao.headers['User-Agent'] = 'ouvirtiba/1.0'
+        _sessao = sessao
+    return _sessao
+
+
+# ==============================================================================
+# CONSULTA
+# ==============================================================================
+
+def _validade(found):
+    return timedelta(days=CEP_TTL_DIAS if found else CEP_TTL_NEGATIVO_DIAS)
+
+
+def _dados_da_linha(linha):
+    return {c: getattr(linha, c) for c in CAMPOS} if linha.found else None
+
+
+def _consultar_viacep(cep):
+    """dict com o endereço, None se o CEP não existe; levanta CepIndisponivel."""
+    inicio = time.perf_counter()
+    try:
+        resposta = viacep.chamar(_session().get, VIACEP_URL.format(cep=cep), timeout=viacep.timeout)
+    except DependenciaIndisponivel as e:
+        raise CepIndisponivel(f'ViaCEP {e}') from e
+    except Exception as e:
+        raise CepIndisponivel(f'Erro de conexão com a API ViaCEP: {e}') from e
+
+    if resposta.status_code == 400:   # CEP com formato inválido para o ViaCEP
+        return None
+    try:
+        resposta.raise_for_status()
+        dados = resposta.json()
+    except Exception as e:
+        raise CepIndisponivel(f'Resposta inválida da API ViaCEP: {e}') from e
+
+    logger.info("🌐 ViaCEP %s em %.0f ms", cep, (time.perf_counter() - inicio) * 1000)
+    if dados.get('erro'):
+        return None
+    return {
+        'address': dados.get('logradouro'),
+        'neighborhood': dados.get('bairro'),
+        'city': dados.get('localidade'),
+        'region': dados.get('uf'),  # UF é a região (estado)
+        'complement': dados.get('complemento'),
+    }
+
+
+def buscar_cep(cep):
+    cep = ''.join(filter(str.isdigit, cep or ''))
+    if len(cep) != 8:
+        return None
+
+    # 1. Memória
+    achou, dados = _lru_get(cep)
+    if achou:
+        return dados
+
+    # 2. Banco (conexão própria: não interfere na sessão da requisição)
+    tabela = CepCache.__table__
+    linha = None
+    try:
+        with db.engine.connect() as conn:
+            linha = conn.execute(select(tabela).where(tabela.c.cep == cep)).first()
+    except Exception as e:
+        logger.warning("⚠️ Cache de CEP indisponível no banco: %s", e)
+
+    if linha is not None:
+        expira_em = linha.fetched_at + _validade(linha.found)
+        if expira_em > datetime.now():
+            _lru_set(cep, expira_em, _dados_da_linha(linha))
+            return _dados_da_linha(linha)
+
+    # 3. ViaCEP
+    try:
+        dados = _consultar_viacep(cep)
+    except CepIndisponivel:
+        if linha is not None:
+            logger.info("♻️ ViaCEP fora; usando cache vencido do CEP %s", cep)
+            return _dados_da_linha(linha)
+        raise
+
+    agora = datetime.now()
+    _lru_set(cep, agora + _validade(dados is not None), dados)
+    gravar_ceps([dict(dados or {}, cep=cep, found=dados is not None, fetched_at=agora)])
+    return dados
+
+
+def gravar_ceps(linhas):
+    """Grava/atualiza CEPs na tabela (delete + insert numa transação)."""
+    if not linhas:
+        return 0
+    tabela = CepCache.__table__
+    registros = []
+    for linha in linhas:
+        registro = {c: (linha.get(c) or None) for c in CAMPOS}
+        registro['cep'] = linha['cep']
+        registro['found'] = linha.get('found', True)
+        registro['fetched_at'] = linha.get('fetched_at') or datetime.now()
+        registros.append(registro)
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(tabela.delete().where(tabela.c.cep.in_([r['cep'] for r in registros])))
+            conn.execute(tabela.insert(), registros)
+    except Exception as e:
+        logger.warning("⚠️ Não foi possível gravar o cache de CEP: %s", e)
+        return 0
+    return len(registros)
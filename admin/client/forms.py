@@ -6,7 +6,6 @@ from wtforms.validators import DataRequired, Length, Email, ValidationError
 
 # Importações para validação de documentos e CEP (mantendo a lógica do seu código)
 from validate_docbr import CPF, CNPJ
-import requests # Necessário para a função validacep
 import re # ✅ Importar re para validação de telefone
 
 cpf = CPF()
@@ -61,18 +60,17 @@ def validate_zipcode(form, field):
     
     if len(cep_data) != 8:
         raise validators.ValidationError('CEP deve conter 8 dígitos.')
-    
+
+    from admin.cep_cache import buscar_cep, CepIndisponivel  # cache de CEP (memória/banco)
+
     try:
-        # Consulta ViaCEP (Melhor mover isso para uma utilidade no servidor)
-        response = requests.get(f'https://viacep.com.br/ws/{cep_data}/json/')
-        address_data = response.json()
-        
-        if 'erro' in address_data:
-            raise validators.ValidationError('CEP inválido ou não encontrado!')
-            
-    except requests.exceptions.RequestException:
+        address_data = buscar_cep(cep_data)
+    except CepIndisponivel:
         # Erro de conexão, mantendo a validação básica
-        pass
+        return
+
+    if address_data is None:
+        raise validators.ValidationError('CEP inválido ou não encontrado!')
     
 
 def validate_contact(form, field):
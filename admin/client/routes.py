@@ -1,5 +1,6 @@
 from flask import Blueprint, session, render_template, redirect, url_for, flash, request 
 from .models import Client, db 
+from admin.pagination import keyset_paginate, ler_filtros, aplicar_filtros
 from datetime import datetime # ✅ Certifique-se desta importação
 
 # Importações dos seus formulários
@@ -9,9 +10,12 @@ client_bp = Blueprint('client_bp', __name__, template_folder='templates')
 
 @client_bp.route('/admin/client/list')
 def client_list():
-    clients = Client.query.all()
+    filtros = ler_filtros()
+    query = aplicar_filtros(Client.query, filtros, data=Client.created_date)
+    pagina = keyset_paginate(query, [Client.created_date, Client.id])
+    clients = pagina.items
     # Se houver um link para o cadastro nesta template, ele DEVE apontar para 'client_bp.client_register_start'
-    return render_template('admin/client/client_list.html', clients=clients)
+    return render_template('admin/client/client_list.html', clients=clients, pagina=pagina, filtros=filtros)
 
 # =========================================================
 # FLUXO DE CADASTRO DE CLIENTE MULTI-STEP
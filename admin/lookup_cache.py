@@ -0,0 +1,145 @@
+# admin/lookup_cache.py
+"""
+Cache versionado em memória das tabelas de referência do cadastro de produtos
+(Brand, Category, Color, Size e Packaging).
+
+Essas tabelas mudam poucas vezes por mês, mas produto_editar/produto_inserir
+faziam cinco .all() a cada GET e a cada POST com erro. Aqui cada modelo tem um
+número de versão; qualquer insert/update/delete incrementa a versão (pelas
+rotas de CRUD e pelos eventos do SQLAlchemy) e a próxima leitura recarrega a
+lista do banco.
+
+Os itens guardados são cópias simples (LookupItem) e não instâncias ORM, para
+não ficarem presos a uma sessão já encerrada.
+
+- get_lookup(Model)          → lista de itens (id, name, ...)
+- get_lookup_item(Model, id) → item ou None
+- get_nomes(Model)           → {id: name}, para listas e PDFs
+- invalidar_lookup(Model)    → força recarga (None = todos os modelos)
+"""
+
+import threading
+import time
+from types import SimpleNamespace
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from extension import db
+from .models import Brand, Category, Color, Size, Packaging
+
+LOOKUP_MODELS = (Brand, Category, Color, Size, Packaging)
+
+# Cada worker do gunicorn tem seu próprio cache: o TTL garante que alterações
+# feitas em outro processo apareçam aqui em no máximo LOOKUP_CACHE_TTL segundos.
+LOOKUP_CACHE_TTL = 600  # segundos
+
+_versoes = {m.__name__: 0 for m in LOOKUP_MODELS}
+_cache = {}              # {nome_modelo: (versao, expira_em, itens, por_id)}
+_lock = threading.Lock()
+
+
+class LookupItem(SimpleNamespace):
+    """Cópia somente-leitura de uma linha da tabela de referência."""
+
+
+def _snapshot(obj):
+    dados = {c.key: getattr(obj, c.key) for c in obj.__mapper__.column_attrs}
+    if isinstance(obj, Packaging):
+        dados['dimension'] = obj.dimension
+    return LookupItem(**dados)
+
+
+def _carregar(model):
+    nome = model.__name__
+    with _lock:
+        versao = _versoes[nome]
+
+    linhas = db.session.query(model).order_by(model.id).all()
+    itens = [_snapshot(o) for o in linhas]
+    por_id = {i.id: i for i in itens}
+
+    with _lock:
+        # Só grava se ninguém invalidou o modelo durante a consulta
+        if _versoes[nome] == versao:
+            _cache[nome] = (versao, time.monotonic() + LOOKUP_CACHE_TTL, itens, por_id)
+    return itens, por_id
+
+
+def _obter(model):
+    nome = model.__name__
+    with _lock:
+        entrada = _cache.get(nome)
+        versao = _versoes[nome]
+    if entrada and entrada[0] == versao and entrada[1] > time.monotonic():
+        return entrada[2], entrada[3]
+    return _carregar(model)
+
+
+def get_lookup(model, store_id=None):
+    """Lista os registros do modelo (opcionalmente só os da loja informada)."""
+    itens, _ = _obter(model)
+    if store_id is not None:
+        return [i for i in itens if i.store_id == store_id]
+    return list(itens)
+
+
+def get_lookup_item(model, item_id):
+    """Busca um registro pelo id sem ir ao banco (quando já estiver em cache)."""
+    if item_id is None:
+        return None
+    _, por_id = _obter(model)
+    return por_id.get(int(item_id))
+
+
+def get_nomes(model):
+    """Mapa {id: name} do modelo (Packaging usa a descrição das dimensões)."""
+    itens, _ = _obter(model)
+    if model is Packaging:
+        return {i.id: i.dimension for i in itens}
+    return {i.id: i.name for i in itens}
+
+
+def get_versao(model):
+    with _lock:
+        return _versoes[model.__name__]
+
+
+def invalidar_lookup(model=None):
+    """Incrementa a versão do modelo (ou de todos) e descarta o cache."""
+    modelos = LOOKUP_MODELS if model is None else (model,)
+    with _lock:
+        for m in modelos:
+            _versoes[m.__name__] += 1
+            _cache.pop(m.__name__, None)
+
+
+# ==============================================================================
+# ✅ INVALIDAÇÃO AUTOMÁTICA VIA EVENTOS DO SQLALCHEMY
+# ==============================================================================
+# Os eventos de mapper marcam o modelo alterado na sessão; a versão só é
+# incrementada depois do COMMIT (um rollback não invalida nada). Isso cobre
+# alterações feitas fora das rotas de CRUD (scripts, shell, outros blueprints).
+
+def _marcar_alterado(mapper, connection, target):
+    sess = Session.object_session(target)
+    if sess is not None:
+        sess.info.setdefault('lookup_alterados', set()).add(type(target))
+
+
+for _model in LOOKUP_MODELS:
+    event.listen(_model, 'after_insert', _marcar_alterado)
+    event.listen(_model, 'after_update', _marcar_alterado)
+    event.listen(_model, 'after_delete', _marcar_alterado)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_apos_commit(session):
+    alterados = session.info.pop('lookup_alterados', None)
+    for model in alterados or ():
+        invalidar_lookup(model)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _descartar_apos_rollback(session, previous_transaction):
+    session.info.pop('lookup_alterados', None)
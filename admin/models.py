@@ -121,6 +121,125 @@ class Product(Base):
     embalagem = db.relationship('Packaging', backref=db.backref('embalagens', lazy=True))
     loja = db.relationship('Store', backref=db.backref('lojas.produto', lazy=True))
 
+    # Listagem do admin: store_id + type_id (igualdade) e stock > 0 (faixa)
+    __table_args__ = (
+        db.Index('ix_product_store_type_stock', 'store_id', 'type_id', 'stock'),
+        {'schema': 'ouvirtiba'}
+    )
+
+# ==============================================================================
+# ✅ CAIXA DE SAÍDA DE E-MAILS (email_outbox.py)
+# ==============================================================================
+# Cada linha é um e-mail a enviar pelo Resend. status:
+#   pendente → aguardando envio (next_attempt_at = quando tentar)
+#   enviando → reservado por um worker até next_attempt_at (lease)
+#   enviado  → aceito pelo Resend (provider_id)
+#   morto    → esgotou EMAIL_MAX_TENTATIVAS (dead letter, ver last_error)
+
+class OutboxMessage(Base):
+    __tablename__ = 'email_outbox'
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(10), nullable=False, default='pendente')
+    payload = db.Column(db.Text, nullable=False)  # JSON dos parâmetros do Resend
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    last_error = db.Column(db.Text, nullable=True)
+    provider_id = db.Column(db.String(100), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    # Reserva: status IN (pendente, enviando) AND next_attempt_at <= agora
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next', 'status', 'next_attempt_at'),
+        {'schema': 'ouvirtiba'}
+    )
+
+# ==============================================================================
+# ✅ Script de migração — execute UMA vez no banco para criar a caixa de saída
+# ==============================================================================
+# CREATE TABLE IF NOT EXISTS ouvirtiba.email_outbox (
+#   id              SERIAL PRIMARY KEY,
+#   status          VARCHAR(10)  NOT NULL DEFAULT 'pendente',
+#   payload         TEXT         NOT NULL,
+#   attempts        INTEGER      NOT NULL DEFAULT 0,
+#   next_attempt_at TIMESTAMP    NOT NULL DEFAULT now(),
+#   last_error      TEXT,
+#   provider_id     VARCHAR(100),
+#   created_at      TIMESTAMP    NOT NULL DEFAULT now(),
+#   sent_at         TIMESTAMP
+# );
+# Índice ix_email_outbox_status_next: python migrar_indices.py
+# ==============================================================================
+
+# ==============================================================================
+# ✅ CACHE DE CEP (admin/cep_cache.py)
+# ==============================================================================
+# Endereços já consultados no ViaCEP. found=False guarda CEP inexistente
+# (cache negativo, validade menor). fetched_at define a validade (TTL).
+
+class CepCache(Base):
+    __tablename__ = 'cep_cache'
+    cep = db.Column(db.String(8), primary_key=True)
+    found = db.Column(db.Boolean, nullable=False, default=True)
+    address = db.Column(db.String(150), nullable=True)
+    neighborhood = db.Column(db.String(100), nullable=True)
+    city = db.Column(db.String(100), nullable=True)
+    region = db.Column(db.String(2), nullable=True)
+    complement = db.Column(db.String(150), nullable=True)
+    fetched_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+# ==============================================================================
+# ✅ Script de migração — execute UMA vez no banco para criar o cache de CEP
+# ==============================================================================
+# CREATE TABLE IF NOT EXISTS ouvirtiba.cep_cache (
+#   cep          VARCHAR(8)   PRIMARY KEY,
+#   found        BOOLEAN      NOT NULL DEFAULT TRUE,
+#   address      VARCHAR(150),
+#   neighborhood VARCHAR(100),
+#   city         VARCHAR(100),
+#   region       VARCHAR(2),
+#   complement   VARCHAR(150),
+#   fetched_at   TIMESTAMP    NOT NULL DEFAULT now()
+# );
+# Carga inicial opcional (CEPs da região): python preload_cep.py ceps.csv
+# ==============================================================================
+
+# ==============================================================================
+# ✅ NUMERAÇÃO DE PEDIDOS, ORÇAMENTOS E RECIBOS (admin/numeracao_documentos.py)
+# ==============================================================================
+# Um contador por tipo de documento (PEDIDO, ORCAMENTO, RECIBO) + loja + dia
+# (period = 'AAAAMMDD'). O número do documento é AAAAMMDD + loja + contador.
+
+class DocumentSequence(Base):
+    __tablename__ = 'document_sequence'
+    id = db.Column(db.Integer, primary_key=True)
+    doc_type = db.Column(db.String(10), nullable=False)
+    store_id = db.Column(db.Integer, nullable=False)
+    period = db.Column(db.String(8), nullable=False)
+    last_number = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+    __table_args__ = (
+        db.UniqueConstraint('doc_type', 'store_id', 'period', name='uq_document_sequence'),
+        {'schema': 'ouvirtiba'}
+    )
+
+# ==============================================================================
+# ✅ Script de migração — execute UMA vez no banco para criar a numeração
+# ==============================================================================
+# CREATE TABLE IF NOT EXISTS ouvirtiba.document_sequence (
+#   id          SERIAL PRIMARY KEY,
+#   doc_type    VARCHAR(10) NOT NULL,
+#   store_id    INTEGER     NOT NULL,
+#   period      VARCHAR(8)  NOT NULL,
+#   last_number INTEGER     NOT NULL DEFAULT 0,
+#   updated_at  TIMESTAMP   NOT NULL DEFAULT now(),
+#   CONSTRAINT uq_document_sequence UNIQUE (doc_type, store_id, period)
+# );
+# Documentos antigos (AAAAMMDDHHMMSS, 14 dígitos) não colidem com os novos
+# (16 dígitos).
+# ==============================================================================
+
 # ==============================================================================
 # ✅ LÓGICA DE NORMALIZAÇÃO GLOBAL (UPPERCASE / LOWERCASE)
 # ==============================================================================
@@ -1,5 +1,4 @@
-import warnings
-from cryptography.hazmat.primitives.serialization import pkcs12
+from admin.nfe.certificado import obter_certificado
 
 def carregar_certificado(caminho_certificado: str, senha: str):
     """
@@ -7,24 +6,9 @@ def carregar_certificado(caminho_certificado: str, senha: str):
       - private_key: objeto da chave privada
       - certificate: certificado principal
       - chain: lista de certificados intermediários (ou vazia)
-    """
-
-    with open(caminho_certificado, "rb") as f:
-        pfx_data = f.read()
-
-    # Ignora warning BER/DER
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore", category=UserWarning)
-        private_key, certificate, chain = pkcs12.load_key_and_certificates(
-            pfx_data, senha.encode("utf-8")
-        )
-
-    if not private_key or not certificate:
-        raise ValueError("❌ Certificado inválido ou senha incorreta.")
 
-    chain = list(chain) if chain else []
-
-    print(f"✅ Certificado carregado: {certificate.subject}")
-    print(f"🔗 Intermediários detectados: {len(chain)}")
-
-    return private_key, certificate, chain
+    O .pfx só é decifrado na primeira chamada (ou quando o arquivo muda);
+    ver admin/nfe/certificado.py.
+    """
+    cert = obter_certificado(caminho_certificado, senha)
+    return cert.private_key, cert.certificate, cert.chain
@@ -0,0 +1,186 @@
+# admin/nfe/certificado.py
+"""
+Certificado A1 (.pfx) em memória para assinatura e transmissão da NFC-e.
+
+Antes cada assinatura (assinar_xml_nfce) relia o .pfx e rodava
+pkcs12.load_key_and_certificates, e cada transmissão decifrava o .pfx de novo
+e regravava os PEMs em disco. Agora o .pfx é decifrado uma vez por processo:
+a chave privada, o certificado, a cadeia e o certificado em base64 (para o
+<X509Certificate>) ficam em memória, e os PEMs para o mTLS do requests são
+gravados uma única vez por carga.
+
+O arquivo é recarregado quando o mtime/tamanho muda (troca do certificado
+vencido sem reiniciar o servidor).
+
+- obter_certificado(pfx_path, senha) → CertificadoA1 (carregado uma vez)
+- CertificadoA1.arquivos_pem()        → (cert_pem_path, key_pem_path) para requests
+- relatorio()                         → validade e cargas dos certificados em cache
+"""
+
+import atexit
+import base64
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import warnings
+from datetime import datetime, timezone
+
+from cryptography.hazmat.primitives.serialization import (
+    Encoding, PrivateFormat, NoEncryption, pkcs12
+)
+
+logger = logging.getLogger(__name__)
+
+# Avisa no log quando faltar menos que isso para vencer
+DIAS_AVISO_VENCIMENTO = 30
+
+
+class CertificadoA1:
+    """Chave, certificado e cadeia já decifrados de um .pfx."""
+
+    def __init__(self, caminho, private_key, certificate, chain, assinatura_arquivo):
+        self.caminho = caminho
+        self.private_key = private_key
+        self.certificate = certificate
+        self.chain = list(chain or [])
+        self.assinatura_arquivo = assinatura_arquivo  # (mtime_ns, tamanho)
+        self.carregado_em = time.time()
+        # Conteúdo de <X509Certificate> (DER em base64), calculado uma vez
+        self.cert_der_b64 = base64.b64encode(certificate.public_bytes(Encoding.DER)).decode('ascii')
+        self._pasta_pem = None
+        self._lock = threading.Lock()
+
+    @property
+    def validade(self):
+        return self.certificate.not_valid_after_utc
+
+    @property
+    def dias_restantes(self):
+        return (self.validade - datetime.now(timezone.utc)).days
+
+    @property
+    def vencido(self):
+        return self.validade <= datetime.now(timezone.utc)
+
+    def arquivos_pem(self):
+        """
+        Caminhos (cert+cadeia, chave) em PEM para requests (cert=...).
+        Gravados uma vez por carga numa pasta temporária só do usuário.
+        """
+        with self._lock:
+            if self._pasta_pem is None or not os.path.isdir(self._pasta_pem):
+                pasta = tempfile.mkdtemp(prefix='ouvirtiba_cert_')
+                cert_pem = self.certificate.public_bytes(Encoding.PEM)
+                for ca in self.chain:
+                    cert_pem += ca.public_bytes(Encoding.PEM)
+                key_pem = self.private_key.private_bytes(
+                    Encoding.PEM, PrivateFormat.TraditionalOpenSSL, NoEncryption()
+                )
+                for nome, conteudo in (('cert.pem', cert_pem), ('key.pem', key_pem)):
+                    fd = os.open(os.path.join(pasta, nome), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+                    with os.fdopen(fd, 'wb') as f:
+                        f.write(conteudo)
+                self._pasta_pem = pasta
+            return (os.path.join(self._pasta_pem, 'cert.pem'),
+                    os.path.join(self._pasta_pem, 'key.pem'))
+
+    def descartar(self):
+        """Remove os PEMs gravados (chamado quando o .pfx é recarregado)."""
+        with self._lock:
+            if self._pasta_pem:
+                shutil.rmtree(self._pasta_pem, ignore_errors=True)
+                self._pasta_pem = None
+
+
+class GerenciadorCertificado:
+    """Cache por processo dos .pfx já decifrados (chave: caminho + senha)."""
+
+    def __init__(self):
+        self._cache = {}
+        self._lock = threading.Lock()
+        self.cargas = 0
+
+    def obter(self, pfx_path, senha):
+        caminho = os.path.abspath(pfx_path)
+        try:
+            st = os.stat(caminho)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"❌ Certificado não encontrado em: {pfx_path}")
+        assinatura = (st.st_mtime_ns, st.st_size)
+        chave = (caminho, senha)
+
+        atual = self._cache.get(chave)
+        if atual is not None and atual.assinatura_arquivo == assinatura:
+            return atual
+
+        with self._lock:
+            atual = self._cache.get(chave)
+            if atual is not None and atual.assinatura_arquivo == assinatura:
+                return atual
+            novo = self._carregar(caminho, senha, assinatura)
+            self._cache[chave] = novo
+        if atual is not None:
+            logger.info("🔄 Certificado %s alterado em disco — recarregado", os.path.basename(caminho))
+            atual.descartar()
+        return novo
+
+    def _carregar(self, caminho, senha, assinatura):
+        inicio = time.perf_counter()
+        with open(caminho, 'rb') as f:
+            pfx_data = f.read()
+        # Ignora warning BER/DER
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=UserWarning)
+            private_key, certificate, chain = pkcs12.load_key_and_certificates(
+                pfx_data, senha.encode('utf-8') if isinstance(senha, str) else senha
+            )
+        if not private_key or not certificate:
+            raise ValueError("❌ Certificado inválido ou senha incorreta.")
+
+        cert = CertificadoA1(caminho, private_key, certificate, chain, assinatura)
+        self.cargas += 1
+        logger.info("🔐 Certificado carregado em %.0f ms: %s (válido até %s, %d intermediário(s))",
+                    (time.perf_counter() - inicio) * 1000, certificate.subject.rfc4514_string(),
+                    cert.validade.strftime('%d/%m/%Y'), len(cert.chain))
+        if cert.vencido:
+            logger.error("❌ Certificado A1 VENCIDO em %s", cert.validade.strftime('%d/%m/%Y'))
+        elif cert.dias_restantes <= DIAS_AVISO_VENCIMENTO:
+            logger.warning("⚠️ Certificado A1 vence em %d dia(s)", cert.dias_restantes)
+        return cert
+
+    def limpar(self):
+        with self._lock:
+            for cert in self._cache.values():
+                cert.descartar()
+            self._cache.clear()
+
+    def relatorio(self):
+        with self._lock:
+            certificados = list(self._cache.values())
+        return {
+            'cargas': self.cargas,
+            'certificados': [{
+                'arquivo': os.path.basename(c.caminho),
+                'titular': c.certificate.subject.rfc4514_string(),
+                'validade': c.validade.isoformat(),
+                'dias_restantes': c.dias_restantes,
+                'vencido': c.vencido,
+            } for c in certificados],
+        }
+
+
+certificados = GerenciadorCertificado()
+# Remove os PEMs temporários ao encerrar o worker
+atexit.register(certificados.limpar)
+
+
+def obter_certificado(pfx_path, senha):
+    """CertificadoA1 do .pfx (decifrado só na primeira vez ou se o arquivo mudar)."""
+    return certificados.obter(pfx_path, senha)
+
+
+def relatorio():
+    return certificados.relatorio()
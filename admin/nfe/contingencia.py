@@ -0,0 +1,179 @@
+# admin/nfe/contingencia.py
+"""
+Contingência off-line da NFC-e (tpEmis=9).
+
+Antes a emissão dependia da SEFAZ na hora da venda: com o SVRS lento ou fora
+do ar a venda parava ou o worker ficava preso no timeout de transmitir_nfce.
+Com a contingência ativa (linha de NfeContingencia sem fim):
+
+    1. gerar_xml_nfce (EmissaoNFCe, nfce_emissao.py) emite e assina a nota
+       com tpEmis=9, dhCont e xJust; a chave de acesso leva o 9 na posição
+       do tpEmis (DV recalculado)
+    2. o QR Code vai no formato off-line (dia, vNF e DigestValue da
+       assinatura) e o DANFE é impresso na hora, com o aviso de contingência
+    3. a nota fica com status 'Contingencia' — a fila durável que o
+       contingencia_fila.py transmite em lotes quando a consulta de status do
+       serviço (cStat 107) mostra a SEFAZ em operação de novo
+
+A contingência é aberta à mão em /admin/nfe/contingencia (com justificativa)
+ou automaticamente depois de uma falha de comunicação na transmissão ou de
+consultas de status seguidas sem cStat 107 (sefaz_status.py); a automática é
+encerrada pela sonda ou pela própria fila quando a SEFAZ volta.
+"""
+
+import logging
+import re
+from datetime import datetime
+
+from config import NFeConfig as CFG
+from extension import db
+from admin.nfe.models import NfeContingencia
+
+logger = logging.getLogger(__name__)
+
+STATUS_CONTINGENCIA = 'Contingencia'   # emitida off-line, aguardando transmissão
+CSTAT_EM_OPERACAO = '107'
+
+JUSTIFICATIVA_AUTOMATICA = "FALHA DE COMUNICACAO COM A SEFAZ (SVRS) NA TRANSMISSAO DA NFC-E"
+JUSTIFICATIVA_STATUS = "SEFAZ (SVRS) FORA DE OPERACAO NA CONSULTA DE STATUS DO SERVICO"
+POSICAO_TP_EMIS = 34   # cUF(2) AAMM(4) CNPJ(14) mod(2) serie(3) nNF(9) → tpEmis
+
+_DS = '{http://www.w3.org/2000/09/xmldsig#}'
+_NS = f'{{{CFG.NAMESPACE}}}'
+
+
+# ==============================================================================
+# ESTADO DA CONTINGÊNCIA
+# ==============================================================================
+
+def contingencia_ativa():
+    """Período de contingência aberto (NfeContingencia) ou None."""
+    return (NfeContingencia.query
+            .filter(NfeContingencia.fim.is_(None))
+            .order_by(NfeContingencia.inicio.desc())
+            .first())
+
+
+def entrar_contingencia(justificativa, automatica=False):
+    """Abre a contingência (ou devolve a que já está aberta) e faz commit."""
+    justificativa = ' '.join((justificativa or '').split())
+    if not 15 <= len(justificativa) <= 256:
+        raise ValueError("A justificativa da contingência deve ter de 15 a 256 caracteres")
+    ativa = contingencia_ativa()
+    if ativa:
+        return ativa
+    periodo = NfeContingencia(inicio=datetime.now().replace(microsecond=0),
+                              justificativa=justificativa, automatica=automatica)
+    db.session.add(periodo)
+    db.session.commit()
+    logger.warning("🚧 Contingência off-line ativada (%s): %s",
+                   'automática' if automatica else 'manual', justificativa)
+    return periodo
+
+
+def sair_contingencia(somente_automatica=False):
+    """Encerra o período aberto. Retorna quantos períodos fechou (com commit)."""
+    query = NfeContingencia.query.filter(NfeContingencia.fim.is_(None))
+    if somente_automatica:
+        query = query.filter(NfeContingencia.automatica.is_(True))
+    fechados = query.update({'fim': datetime.now()}, synchronize_session=False)
+    db.session.commit()
+    if fechados:
+        logger.info("✅ Contingência off-line encerrada")
+    return fechados
+
+
+# ==============================================================================
+# CHAVE DE ACESSO E XML
+# ==============================================================================
+
+def digito_verificador(chave_sem_dv):
+    """DV (módulo 11) dos 43 primeiros dígitos da chave de acesso."""
+    pesos = [2, 3, 4, 5, 6, 7, 8, 9]
+    soma = sum(int(n) * pesos[i % 8] for i, n in enumerate(reversed(chave_sem_dv)))
+    dv = 11 - (soma % 11)
+    return '0' if dv >= 10 else str(dv)
+
+
+def chave_com_tp_emis(chave, tp_emis):
+    """A mesma chave com outro tpEmis (posição 35) e o DV recalculado."""
+    if not chave or len(chave) != 44:
+        raise ValueError(f"Chave de acesso inválida: {chave}")
+    sem_dv = chave[:POSICAO_TP_EMIS] + str(tp_emis) + chave[POSICAO_TP_EMIS + 1:43]
+    return sem_dv + digito_verificador(sem_dv)
+
+
+def preencher_ide(ide, periodo):
+    """<dhCont> e <xJust> no fim de <ide> (depois de <verProc>)."""
+    from lxml import etree
+
+    etree.SubElement(ide, f"{_NS}dhCont").text = periodo.inicio.strftime('%Y-%m-%dT%H:%M:%S-03:00')
+    etree.SubElement(ide, f"{_NS}xJust").text = periodo.justificativa
+
+
+def aplicar_qrcode_offline(xml_assinado, invoice, valor_nf, ambiente=None):
+    """
+    Troca o QR Code do XML assinado pelo formato off-line, que leva o
+    DigestValue da assinatura. <infNFeSupl> fica fora de <infNFe>, então a
+    assinatura continua válida. Retorna (xml em bytes, url do QR Code).
+    """
+    from lxml import etree
+    from admin.nfe.services.qr_code import gerar_qrcode_url_offline
+
+    parser = etree.XMLParser(remove_blank_text=False, strip_cdata=False)
+    raiz = etree.fromstring(xml_assinado, parser)
+    digest = raiz.findtext(f'.//{_DS}DigestValue')
+    url = gerar_qrcode_url_offline(
+        chave_acesso=invoice.access_key,
+        ambiente=int(ambiente or CFG.TP_AMB),
+        id_token=CFG.CSC_ID,
+        csc_token=CFG.CSC_TOKEN,
+        dh_emissao=invoice.issue_date,
+        valor_nf=valor_nf,
+        digest_value=(digest or '').strip(),
+    )
+    qr = raiz.find(f'.//{_NS}qrCode')
+    if qr is None:
+        raise ValueError("XML sem <infNFeSupl>/<qrCode>")
+    qr.text = etree.CDATA(url)
+    return etree.tostring(raiz, xml_declaration=True, encoding='utf-8'), url
+
+
+_RE_QRCODE = re.compile(r'<qrCode>(?:<!\[CDATA\[)?(.*?)(?:\]\]>)?</qrCode>', re.S)
+
+
+def qrcode_do_xml(caminho):
+    """URL do QR Code gravada no XML da nota (para o DANFE da contingência)."""
+    try:
+        with open(caminho, 'r', encoding='utf-8') as f:
+            achou = _RE_QRCODE.search(f.read())
+    except OSError:
+        return None
+    return achou.group(1).strip() if achou else None
+
+
+# ==============================================================================
+# STATUS DO SERVIÇO
+# ==============================================================================
+
+def sefaz_em_operacao(ambiente=None):
+    """
+    Consulta NfeStatusServico4. Retorna (em_operacao, cStat, xMotivo);
+    falha de rede ou disjuntor aberto = (False, None, mensagem).
+    Compartimento 'svrs' lotado = (None, None, mensagem): a chamada foi
+    recusada aqui, sem ir à SEFAZ — não é resultado da SEFAZ.
+    """
+    from chamadas_externas import DependenciaIndisponivel
+    from admin.nfe.sefaz_client import cliente_sefaz
+    from admin.nfe.nfce_lote import _retorno
+
+    try:
+        resposta = cliente_sefaz(ambiente).status_servico(CFG.CUF)
+        _, cstat, xmotivo = _retorno(resposta.text, 'retConsStatServ')
+    except DependenciaIndisponivel as e:
+        if e.motivo == 'lotado':
+            return None, None, str(e)
+        return False, None, str(e)
+    except Exception as e:
+        return False, None, str(e)
+    return cstat == CSTAT_EM_OPERACAO, cstat, xmotivo
@@ -14,7 +14,9 @@ class Invoice(Base):
 
     id = db.Column(db.Integer, primary_key=True)
     number = db.Column(db.Integer, nullable=False, unique=True)
-    issue_date = db.Column(db.DateTime, default=datetime.utcnow)
+    # NOT NULL: nfe_list pagina por (issue_date, id) e a comparação do keyset
+    # com NULL é sempre falsa — nota sem data sumiria das páginas seguintes
+    issue_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     store_id = db.Column(db.Integer, nullable=False)
     client_id = db.Column(db.Integer, db.ForeignKey('ouvirtiba.client.id'), nullable=False)
     order_id = db.Column(db.Integer, db.ForeignKey('ouvirtiba.customer_request.id'), nullable=True)
@@ -29,12 +31,33 @@ class Invoice(Base):
     xml_path = db.Column(db.String(255)) 
     nprot = db.Column(db.Text)
     discount = db.Column(db.Float)
+    # Contingência offline (admin/nfe/contingencia.py): tp_emis '9' = emitida
+    # sem a SEFAZ; contingency_at = momento da emissão off-line (conta o prazo
+    # legal de transmissão); retry_at = próxima tentativa pela fila
+    # (contingencia_fila.py)
+    tp_emis = db.Column(db.String(1), nullable=False, default='1')
+    contingency_at = db.Column(db.DateTime, nullable=True)
+    retry_at = db.Column(db.DateTime, nullable=True)
+    # Transmissão em lote (admin/nfe/nfce_lote.py): lote_id = NfeLote em que a
+    # nota foi enviada (status 'Enviando' até o retorno); cstat/xmotivo = último
+    # retorno da SEFAZ para a nota (protNFe, consulta por chave ou rejeição do lote)
+    lote_id = db.Column(db.Integer, nullable=True)
+    cstat = db.Column(db.String(3), nullable=True)
+    xmotivo = db.Column(db.Text, nullable=True)
 
     client = db.relationship('Client', backref='invoices')
     order = db.relationship('Customer_request', backref='invoices')
 
+    # Paginação por keyset de nfe_list; fila de contingência (status + retry_at)
+    __table_args__ = (
+        db.Index('ix_invoice_issue_date_id', 'issue_date', 'id'),
+        db.Index('ix_invoice_status_retry', 'status', 'retry_at'),
+        {'schema': 'ouvirtiba'}
+    )
+
     def __repr__(self):
-        return f"<Invoice #{self.number} - {self.client.name}>"
+        # Usa só colunas locais: acessar self.client dispararia um lazy load
+        return f"<Invoice #{self.number} - client_id={self.client_id}>"
 
 # -----------------------------
 # Table: InvoiceItem (itens da nota)
@@ -58,9 +81,14 @@ class InvoiceItem(Base):
 
     invoice = db.relationship('Invoice', backref='items')
     product = db.relationship('Product', backref='invoice_items')
+
+    __table_args__ = (
+        db.Index('ix_invoice_item_invoice', 'invoice_id'),
+        {'schema': 'ouvirtiba'}
+    )
     
     def __repr__(self):
-        return f"<InvoiceItem {self.product.name} x {self.quantity}>"
+        return f"<InvoiceItem product_id={self.product_id} x {self.quantity}>"
     
 # ================================================================
 # MODELO PARA CONTROLE DE SEQUÊNCIA DE NOTAS FISCAIS
@@ -88,3 +116,164 @@ class InvoiceSequence(Base):
     
     def __repr__(self):
         return f'<InvoiceSequence store_id={self.store_id} series={self.series} last_number={self.last_number}>'
+
+
+# ================================================================
+# NÚMEROS PULADOS (LACUNAS) PARA INUTILIZAÇÃO
+# ================================================================
+# Número reservado em InvoiceSequence que não virou nota (erro depois da
+# reserva, sobra do bloco de um worker). Precisa ser inutilizado na SEFAZ;
+# voided_at é preenchido depois da inutilização. Ver admin/nfe/numeracao.py.
+
+class InvoiceNumberGap(Base):
+    __tablename__ = 'invoice_number_gap'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    store_id = db.Column(db.Integer, nullable=False)
+    series = db.Column(db.Integer, nullable=False, default=1)
+    number = db.Column(db.Integer, nullable=False)
+    reason = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    voided_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('store_id', 'series', 'number', name='uq_invoice_number_gap'),
+        {'schema': 'ouvirtiba'}
+    )
+
+    def __repr__(self):
+        return f'<InvoiceNumberGap store_id={self.store_id} series={self.series} number={self.number}>'
+
+# ================================================================
+# ✅ Script de migração — execute UMA vez no banco para criar as lacunas
+# ================================================================
+# CREATE TABLE IF NOT EXISTS ouvirtiba.invoice_number_gap (
+#   id          SERIAL        PRIMARY KEY,
+#   store_id    INTEGER       NOT NULL,
+#   series      INTEGER       NOT NULL DEFAULT 1,
+#   number      INTEGER       NOT NULL,
+#   reason      VARCHAR(255),
+#   created_at  TIMESTAMP     NOT NULL DEFAULT now(),
+#   voided_at   TIMESTAMP,
+#   CONSTRAINT uq_invoice_number_gap UNIQUE (store_id, series, number)
+# );
+# ================================================================
+
+
+# ================================================================
+# LOTES DE NF-e ENVIADOS À SEFAZ (admin/nfe/nfce_lote.py)
+# ================================================================
+# O id é o <idLote> do enviNFe: sequencial e rastreável (antes era aleatório).
+# status: enviado → recebido (cStat 103, nrec) → processado (cStat 104)
+#         ou rejeitado/erro; adiado = serviço paralisado (108/109/656), notas
+#         de volta à fila com retry_at; expirado = recibo sem retorno (recibo_poller.py)
+
+class NfeLote(Base):
+    __tablename__ = 'nfe_lote'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    ambiente = db.Column(db.Integer, nullable=False, default=2)
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+    status = db.Column(db.String(12), nullable=False, default='enviado')
+    nrec = db.Column(db.String(15), nullable=True)
+    cstat = db.Column(db.String(3), nullable=True)
+    xmotivo = db.Column(db.Text, nullable=True)
+    # Consulta do recibo em segundo plano (recibo_poller.py)
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    proxima_consulta = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.now, onupdate=datetime.now)
+
+    # Fila do recibo_poller: status = 'recebido' AND proxima_consulta <= agora.
+    # nrec único: dois workers não registram o mesmo recibo avulso.
+    __table_args__ = (
+        db.Index('ix_nfe_lote_status_proxima', 'status', 'proxima_consulta'),
+        db.Index('ix_nfe_lote_nrec', 'nrec', unique=True),
+        {'schema': 'ouvirtiba'}
+    )
+
+    def __repr__(self):
+        return f'<NfeLote {self.id} {self.status} nrec={self.nrec}>'
+
+# ================================================================
+# ✅ Script de migração — execute UMA vez no banco para criar os lotes
+# ================================================================
+# CREATE TABLE IF NOT EXISTS ouvirtiba.nfe_lote (
+#   id          SERIAL       PRIMARY KEY,
+#   ambiente    INTEGER      NOT NULL DEFAULT 2,
+#   quantidade  INTEGER      NOT NULL DEFAULT 0,
+#   status      VARCHAR(12)  NOT NULL DEFAULT 'enviado',
+#   nrec        VARCHAR(15),
+#   cstat       VARCHAR(3),
+#   xmotivo     TEXT,
+#   created_at  TIMESTAMP    NOT NULL DEFAULT now(),
+#   updated_at  TIMESTAMP    NOT NULL DEFAULT now()
+# );
+# ================================================================
+
+# ================================================================
+# ✅ Script de migração — execute UMA vez no banco para adicionar os novos campos
+# ================================================================
+# ALTER TABLE ouvirtiba.nfe_lote ADD COLUMN IF NOT EXISTS tentativas INTEGER NOT NULL DEFAULT 0;
+# ALTER TABLE ouvirtiba.nfe_lote ADD COLUMN IF NOT EXISTS proxima_consulta TIMESTAMP;
+# Índices ix_nfe_lote_status_proxima e ix_nfe_lote_nrec: python migrar_indices.py
+# ================================================================
+
+# ================================================================
+# ✅ Script de migração — execute UMA vez no banco: issue_date NOT NULL
+# ================================================================
+# Backfill das notas antigas sem data (usa a data do pedido, se houver):
+# UPDATE ouvirtiba.invoice i SET issue_date = COALESCE(
+#        (SELECT r.created_at FROM ouvirtiba.customer_request r WHERE r.id = i.order_id), now())
+#  WHERE i.issue_date IS NULL;
+# ALTER TABLE ouvirtiba.invoice ALTER COLUMN issue_date SET NOT NULL;
+# ================================================================
+
+# ================================================================
+# ✅ Script de migração — execute UMA vez no banco para a contingência
+# ================================================================
+# ALTER TABLE ouvirtiba.invoice ADD COLUMN IF NOT EXISTS tp_emis VARCHAR(1) NOT NULL DEFAULT '1';
+# ALTER TABLE ouvirtiba.invoice ADD COLUMN IF NOT EXISTS contingency_at TIMESTAMP;
+# ALTER TABLE ouvirtiba.invoice ADD COLUMN IF NOT EXISTS retry_at TIMESTAMP;
+# Índice ix_invoice_status_retry: python migrar_indices.py
+# ================================================================
+
+# ================================================================
+# ✅ Script de migração — execute UMA vez no banco para o envio em lote
+# ================================================================
+# ALTER TABLE ouvirtiba.invoice ADD COLUMN IF NOT EXISTS lote_id INTEGER;
+# ALTER TABLE ouvirtiba.invoice ADD COLUMN IF NOT EXISTS cstat VARCHAR(3);
+# ALTER TABLE ouvirtiba.invoice ADD COLUMN IF NOT EXISTS xmotivo TEXT;
+# ================================================================
+
+
+# ================================================================
+# PERÍODOS DE CONTINGÊNCIA OFFLINE (admin/nfe/contingencia.py)
+# ================================================================
+# Linha com fim nulo = contingência ativa: as NFC-e saem com tpEmis=9,
+# dhCont = inicio e xJust = justificativa. automatica = aberta pelo sistema
+# depois de uma falha de comunicação (fecha sozinha quando a SEFAZ volta).
+
+class NfeContingencia(Base):
+    __tablename__ = 'nfe_contingencia'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    inicio = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    justificativa = db.Column(db.String(256), nullable=False)
+    automatica = db.Column(db.Boolean, nullable=False, default=False)
+    fim = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<NfeContingencia {self.id} desde {self.inicio} fim={self.fim}>'
+
+# ================================================================
+# ✅ Script de migração — execute UMA vez no banco para criar os períodos
+# ================================================================
+# CREATE TABLE IF NOT EXISTS ouvirtiba.nfe_contingencia (
+#   id            SERIAL       PRIMARY KEY,
+#   inicio        TIMESTAMP    NOT NULL DEFAULT now(),
+#   justificativa VARCHAR(256) NOT NULL,
+#   automatica    BOOLEAN      NOT NULL DEFAULT FALSE,
+#   fim           TIMESTAMP
+# );
+# ================================================================
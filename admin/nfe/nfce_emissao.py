@@ -0,0 +1,372 @@
+# admin/nfe/nfce_emissao.py
+"""
+Emissão da NFC-e em uma passada: monta → assina → QR Code → serializa.
+
+Antes gerar_xml_nfce montava a árvore lxml, serializava, gravava o XML sem
+assinatura em disco e passava os bytes para assinar_xml_nfce, que fazia o
+parse de novo; na contingência aplicar_qrcode_offline fazia mais um parse
+para trocar o QR Code, e a validação no schema, outro. O re-assinar lia e
+reinterpretava o arquivo de novo só para tirar a assinatura. O QR Code era
+calculado em dois módulos diferentes (nfce_qrcode.py e services/qr_code.py),
+cada um com um hash diferente.
+
+Agora EmissaoNFCe faz tudo na mesma árvore em memória:
+
+    1. montar()         <infNFe> completo (ide, emit, dest, det, total, ...)
+    2. assinar(cert)    C14N + DigestValue de <infNFe> e <Signature> (XML-DSig)
+    3. anexar_qrcode()  <infNFeSupl> antes da <Signature>, com o QR Code do
+                        tpEmis da nota — o off-line leva o DigestValue real
+    4. serializar()     bytes do XML, gerados uma única vez
+
+Sem pretty_print: o que é assinado é exatamente o que vai para a SEFAZ
+(limpar_xml_assinado, usado no lote e na transmissão avulsa, não altera
+nada dentro de <infNFe>).
+
+- EmissaoNFCe(invoice, emitente, cliente, contingencia).emitir(cert) → bytes
+- EmissaoNFCe.sem_assinatura()                    → bytes (sem certificado)
+- reassinar_xml(xml, cert, invoice)              → EmissaoNFCe de um XML já gerado
+- EmissaoNFCe.tempos                              → ms de cada etapa
+
+Benchmark por documento: python bench_nfce.py
+"""
+
+import time
+from decimal import Decimal
+
+from config import NFeConfig as CFG
+
+NS = CFG.NAMESPACE
+_DS = '{http://www.w3.org/2000/09/xmldsig#}'
+
+
+def _tag(nome):
+    return f"{{{NS}}}{nome}"
+
+
+def _sub(pai, nome, texto=None, **atributos):
+    """SubElement já no namespace da NF-e (a árvore é validada e assinada sem re-parse)."""
+    from lxml import etree
+    elemento = etree.SubElement(pai, _tag(nome), **atributos)
+    if texto is not None:
+        elemento.text = texto
+    return elemento
+
+
+def _digitos(valor):
+    return ''.join(filter(str.isdigit, str(valor or '')))
+
+
+def _grupo_pis_cofins(pai, tributo, cst):
+    """
+    Grupo do PIS/COFINS conforme o CST (leiaute NF-e 4.00):
+    01/02 → <tributo>Aliq, 03 → <tributo>Qtde, 04 a 09 → <tributo>NT e os
+    demais (49, 50..99) → <tributo>Outr, com base e valor zerados.
+    """
+    if cst in ("04", "05", "06", "07", "08", "09"):
+        grupo = _sub(pai, f"{tributo}NT")
+        _sub(grupo, "CST", cst)
+        return grupo
+    if cst == "03":
+        grupo = _sub(pai, f"{tributo}Qtde")
+        _sub(grupo, "CST", cst)
+        _sub(grupo, "qBCProd", "0.0000")
+        _sub(grupo, "vAliqProd", "0.0000")
+    else:
+        grupo = _sub(pai, f"{tributo}Aliq" if cst in ("01", "02") else f"{tributo}Outr")
+        _sub(grupo, "CST", cst)
+        _sub(grupo, "vBC", "0.00")
+        _sub(grupo, f"p{tributo}", "0.0000")
+    _sub(grupo, f"v{tributo}", "0.00")
+    return grupo
+
+
+# ==============================================================================
+# EMISSÃO
+# ==============================================================================
+
+class EmissaoNFCe:
+    """
+    Uma NFC-e (modelo 65) da montagem ao XML final. `emitente` é o dict de
+    loja_atual(), `cliente` o Client da nota (ou None) e `contingencia` o
+    período de NfeContingencia aberto (tpEmis=9, dhCont e xJust) ou None.
+    """
+
+    def __init__(self, invoice, emitente, cliente=None, contingencia=None, ambiente=None,
+                 csc_id=None, csc_token=None):
+        self.invoice = invoice
+        self.emitente = emitente
+        self.cliente = cliente
+        self.contingencia = contingencia
+        self.ambiente = int(ambiente or CFG.TP_AMB)
+        self.csc_id = csc_id or CFG.CSC_ID
+        self.csc_token = csc_token or CFG.CSC_TOKEN
+        self.tp_emis = CFG.TP_EMIS_CONTINGENCIA if contingencia else CFG.TP_EMIS
+        self.nfe = None
+        self.valor_nf = None
+        self.digest_value = None
+        self.qrcode_url = None
+        self.tempos = {}
+        self._xml = None
+
+    def _medir(self, etapa, inicio):
+        self.tempos[etapa] = round((time.perf_counter() - inicio) * 1000, 3)
+
+    # ── 1. Montagem ──────────────────────────────────────────────────────────
+
+    def montar(self):
+        """Monta <NFe><infNFe/></NFe> em memória; devolve a raiz."""
+        from lxml import etree
+
+        inicio = time.perf_counter()
+        invoice, emitente = self.invoice, self.emitente
+        chave = invoice.access_key
+
+        nfe = etree.Element(_tag("NFe"), nsmap={None: NS})
+        infNFe = _sub(nfe, "infNFe", Id=f"NFe{chave}", versao="4.00")
+
+        # TAG IDE
+        ide = _sub(infNFe, "ide")
+        _sub(ide, "cUF", chave[:2])
+        _sub(ide, "cNF", chave[35:43])
+        _sub(ide, "natOp", CFG.NATOP)
+        _sub(ide, "mod", CFG.MOD)
+        _sub(ide, "serie", str(invoice.series))
+        _sub(ide, "nNF", str(invoice.number))
+        dh_emi = invoice.issue_date.strftime('%Y-%m-%dT%H:%M:%S-03:00')
+        _sub(ide, "dhEmi", dh_emi)
+        _sub(ide, "dhSaiEnt", dh_emi)
+        _sub(ide, "tpNF", CFG.TP_NF)
+        _sub(ide, "idDest", CFG.ID_DEST)
+        _sub(ide, "cMunFG", CFG.IBGE_CITY_CODE)
+        _sub(ide, "tpImp", CFG.TP_IMP)
+        _sub(ide, "tpEmis", self.tp_emis)
+        _sub(ide, "cDV", chave[-1])
+        _sub(ide, "tpAmb", CFG.TP_AMB)
+        _sub(ide, "finNFe", CFG.FIN_NFE)
+        _sub(ide, "indFinal", CFG.IND_FINAL)
+        _sub(ide, "indPres", CFG.IND_PRES)
+        _sub(ide, "procEmi", CFG.PROC_EMI)
+        _sub(ide, "verProc", CFG.VER_PROC)
+        if self.contingencia:
+            from admin.nfe.contingencia import preencher_ide
+            preencher_ide(ide, self.contingencia)
+
+        # TAG EMIT
+        emit = _sub(infNFe, "emit")
+        _sub(emit, "CNPJ", _digitos(emitente["Code"]))
+        _sub(emit, "xNome", emitente["Name"])
+        _sub(emit, "xFant", CFG.XFANT)
+        enderEmit = _sub(emit, "enderEmit")
+        _sub(enderEmit, "xLgr", emitente["Address"])
+        _sub(enderEmit, "nro", str(emitente["Number"]))
+        _sub(enderEmit, "xBairro", emitente["Neighborhood"])
+        _sub(enderEmit, "cMun", CFG.IBGE_CITY_CODE)
+        _sub(enderEmit, "xMun", emitente["City"])
+        _sub(enderEmit, "UF", emitente["Region"])
+        _sub(enderEmit, "CEP", _digitos(emitente["Cep origem"]))
+        _sub(enderEmit, "cPais", "1058")
+        _sub(enderEmit, "xPais", "BRASIL")
+        if emitente.get("Phone"):
+            _sub(enderEmit, "fone", _digitos(emitente["Phone"]))
+        _sub(emit, "IE", _digitos(emitente["State_Registration"]))
+        _sub(emit, "CRT", str(CFG.CRT))
+
+        # TAG DEST
+        cliente = self.cliente
+        if cliente:
+            dest = _sub(infNFe, "dest")
+            doc_limpo = _digitos(cliente.code)
+            if len(doc_limpo) == 11:
+                _sub(dest, "CPF", doc_limpo)
+            elif len(doc_limpo) == 14:
+                _sub(dest, "CNPJ", doc_limpo)
+
+            if not doc_limpo:
+                _sub(dest, "indIEDest", "9")
+            else:
+                _sub(dest, "xNome", cliente.name.upper())
+                enderDest = _sub(dest, "enderDest")
+                _sub(enderDest, "xLgr", cliente.address.upper())
+                _sub(enderDest, "nro", str(cliente.number))
+                _sub(enderDest, "xBairro", cliente.neighborhood.upper())
+                _sub(enderDest, "cMun", CFG.IBGE_CITY_CODE_CLI)
+                _sub(enderDest, "xMun", cliente.city.upper())
+                _sub(enderDest, "UF", cliente.region.upper())
+                _sub(enderDest, "CEP", _digitos(cliente.zipcode))
+                _sub(enderDest, "cPais", CFG.CPAIS)
+                _sub(enderDest, "xPais", CFG.XPAIS)
+                _sub(dest, "indIEDest", CFG.IND_IE_DEST)
+
+        # TAG DET (ITENS)
+        total_produtos = Decimal("0.00")
+        total_desconto = Decimal("0.00")
+        for index, item in enumerate(invoice.items, start=1):
+            det = _sub(infNFe, "det", nItem=str(index))
+            prod = _sub(det, "prod")
+            _sub(prod, "cProd", str(item.product_id))
+            _sub(prod, "cEAN", CFG.CEAN)
+            desc_produto = item.product.name.upper()
+            if item.serialnumber:
+                desc_produto += f" S/N: {item.serialnumber}"
+            _sub(prod, "xProd", desc_produto)
+            _sub(prod, "NCM", item.ncm or "90214000")
+            _sub(prod, "CFOP", item.cfop or "5102")
+            _sub(prod, "uCom", CFG.UCOM)
+            _sub(prod, "qCom", f"{item.quantity:.4f}")
+            _sub(prod, "vUnCom", f"{item.unit_price:.10f}")
+            _sub(prod, "vProd", f"{item.total_price:.2f}")
+            _sub(prod, "cEANTrib", "SEM GTIN")
+            _sub(prod, "uTrib", "UN")
+            _sub(prod, "qTrib", f"{item.quantity:.4f}")
+            _sub(prod, "vUnTrib", f"{item.unit_price:.10f}")
+            if item.discount and item.discount > 0:
+                _sub(prod, "vDesc", f"{item.discount:.2f}")
+                total_desconto += Decimal(str(item.discount))
+            _sub(prod, "indTot", CFG.IND_TOT)
+            total_produtos += Decimal(str(item.total_price))
+
+            imposto = _sub(det, "imposto")
+            v_trib = Decimal(str(item.total_price)) * Decimal(CFG.TX_TRIB)
+            _sub(imposto, "vTotTrib", f"{v_trib:.2f}")
+            csosn = item.csosn or "102"
+            icmssn = _sub(_sub(imposto, "ICMS"), f"ICMSSN{csosn}")
+            _sub(icmssn, "orig", "0")
+            _sub(icmssn, "CSOSN", csosn)
+            _grupo_pis_cofins(_sub(imposto, "PIS"), "PIS", CFG.PIS_CST)
+            _grupo_pis_cofins(_sub(imposto, "COFINS"), "COFINS", CFG.COFINS_CST)
+
+        # TAG TOTAL
+        self.valor_nf = total_produtos - total_desconto
+        icmsTot = _sub(_sub(infNFe, "total"), "ICMSTot")
+        for campo in ("vBC", "vICMS", "vICMSDeson", "vFCP", "vBCST", "vST", "vFCPST", "vFCPSTRet"):
+            _sub(icmsTot, campo, "0.00")
+        _sub(icmsTot, "vProd", f"{total_produtos:.2f}")
+        _sub(icmsTot, "vFrete", "0.00")
+        _sub(icmsTot, "vSeg", "0.00")
+        _sub(icmsTot, "vDesc", f"{total_desconto:.2f}")
+        for campo in ("vII", "vIPI", "vIPIDevol", "vPIS", "vCOFINS", "vOutro"):
+            _sub(icmsTot, campo, "0.00")
+        _sub(icmsTot, "vNF", f"{self.valor_nf:.2f}")
+
+        # TAG TRANSP
+        _sub(_sub(infNFe, "transp"), "modFrete", CFG.MOD_FRETE)
+
+        # TAG PAG
+        detPag = _sub(_sub(infNFe, "pag"), "detPag")
+        _sub(detPag, "indPag", CFG.IND_PAG)
+        _sub(detPag, "tPag", CFG.T_PAG)
+        _sub(detPag, "vPag", f"{self.valor_nf:.2f}")
+
+        # TAG INFADIC
+        _sub(_sub(infNFe, "infAdic"), "infCpl", f"{CFG.INF_ADIC_TXT_1}{CFG.INF_ADIC_TXT_2}")
+
+        self.nfe, self._xml = nfe, None
+        self._medir('montar', inicio)
+        return nfe
+
+    # ── 2. Assinatura ────────────────────────────────────────────────────────
+
+    def assinar(self, certificado):
+        """Assina <infNFe> na própria árvore (certificado de obter_certificado)."""
+        from admin.nfe.nfce_sign import assinar_elemento
+
+        if self.nfe is None:
+            self.montar()
+        inicio = time.perf_counter()
+        self.digest_value = assinar_elemento(self.nfe, certificado)
+        self._xml = None
+        self._medir('assinar', inicio)
+        return self.digest_value
+
+    # ── 3. QR Code ───────────────────────────────────────────────────────────
+
+    def anexar_qrcode(self):
+        """<infNFeSupl> (qrCode + urlChave) antes da <Signature>, se houver."""
+        from lxml import etree
+        from admin.nfe.services.qr_code import gerar_qrcode_nfce, url_consulta
+
+        if self.nfe is None:
+            self.montar()
+        inicio = time.perf_counter()
+        for antigo in self.nfe.findall(_tag("infNFeSupl")):
+            self.nfe.remove(antigo)
+
+        self.qrcode_url = gerar_qrcode_nfce(
+            chave_acesso=self.invoice.access_key,
+            ambiente=self.ambiente,
+            id_token=self.csc_id,
+            csc_token=self.csc_token,
+            tp_emis=self.tp_emis,
+            dh_emissao=self.invoice.issue_date,
+            valor_nf=self.valor_nf,
+            digest_value=self.digest_value,
+        )
+        infNFeSupl = etree.Element(_tag("infNFeSupl"))
+        _sub(infNFeSupl, "qrCode").text = etree.CDATA(self.qrcode_url)
+        _sub(infNFeSupl, "urlChave", url_consulta(self.ambiente))
+
+        # Ordem do leiaute: <infNFe>, <infNFeSupl>, <Signature>
+        self.nfe.insert(self.nfe.index(self.nfe.find(_tag("infNFe"))) + 1, infNFeSupl)
+        self._xml = None
+        self._medir('qrcode', inicio)
+        return self.qrcode_url
+
+    # ── 4. Serialização ──────────────────────────────────────────────────────
+
+    def serializar(self):
+        """Bytes do XML (gerados uma vez; etapas seguintes invalidam o cache)."""
+        from lxml import etree
+
+        if self._xml is None:
+            inicio = time.perf_counter()
+            self._xml = etree.tostring(self.nfe, xml_declaration=True, encoding='utf-8')
+            self._medir('serializar', inicio)
+        return self._xml
+
+    # ── Atalhos ──────────────────────────────────────────────────────────────
+
+    def emitir(self, certificado):
+        """montar → assinar → QR Code → serializar; devolve o XML assinado."""
+        self.montar()
+        self.assinar(certificado)
+        self.anexar_qrcode()
+        return self.serializar()
+
+    def sem_assinatura(self):
+        """XML sem <Signature> (certificado ausente); QR Code on-line."""
+        self.montar()
+        if self.tp_emis != CFG.TP_EMIS_CONTINGENCIA:
+            self.anexar_qrcode()
+        return self.serializar()
+
+    def validar(self):
+        """Erros do schema NF-e 4.00 na própria árvore (admin/nfe/validacao_xsd.py)."""
+        from admin.nfe.validacao_xsd import validar_xml
+        inicio = time.perf_counter()
+        erros = validar_xml(self.nfe, assinado=self.digest_value is not None)
+        self._medir('validar', inicio)
+        return erros
+
+
+def reassinar_xml(xml, certificado, invoice, ambiente=None):
+    """
+    Re-assina um XML já gerado (um parse, uma serialização): troca a
+    <Signature> e refaz o <infNFeSupl> — o QR Code off-line muda com o
+    DigestValue novo. Devolve a EmissaoNFCe com o XML em serializar().
+    """
+    from lxml import etree
+
+    if isinstance(xml, str):
+        xml = xml.encode('utf-8')
+    parser = etree.XMLParser(remove_blank_text=True, strip_cdata=False)
+    raiz = etree.fromstring(xml.removeprefix(b'\xef\xbb\xbf').lstrip(), parser)
+
+    emissao = EmissaoNFCe(invoice, emitente=None, ambiente=ambiente)
+    emissao.nfe = raiz
+    emissao.tp_emis = raiz.findtext(f'{_tag("infNFe")}/{_tag("ide")}/{_tag("tpEmis")}') or CFG.TP_EMIS
+    v_nf = raiz.findtext(f'.//{_tag("ICMSTot")}/{_tag("vNF")}')
+    emissao.valor_nf = Decimal(v_nf) if v_nf else None
+    emissao.assinar(certificado)
+    emissao.anexar_qrcode()
+    emissao.serializar()
+    return emissao
@@ -0,0 +1,515 @@
+# admin/nfe/nfce_lote.py
+"""
+Transmissão de NFC-e em lote (enviNFe com até LOTE_MAX documentos).
+
+No fechamento do caixa as notas eram transmitidas uma a uma por
+/transmit_nfe/<id>: um enviNFe síncrono com um único documento e idLote
+aleatório por nota. Aqui as notas assinadas pendentes (status XML_Assinado)
+são agrupadas em lotes assíncronos (indSinc=0) de até 50 documentos, cada
+lote vai numa única chamada SOAP e o idLote é o id sequencial de NfeLote.
+
+Fluxo:
+    1. transmitir_lotes()  → reserva as notas (SELECT ... FOR UPDATE SKIP
+                             LOCKED) e, antes do POST, grava o lote e passa as
+                             notas para 'Enviando' com o lote_id (commit)
+       retEnviNFe cStat 103: lote recebido, nrec gravado no lote e nas notas
+                             (status Transmitida)
+    2. consultar_lote()    → retConsReciNFe cStat 104: cada <protNFe> é ligado
+                             à nota pela chave de acesso (chNFe) e atualiza
+                             Invoice.status / nprot (Aprovada, Denegada ou
+                             Rejeitada); nota Aprovada nunca é rebaixada
+       Normalmente quem consulta é o recibo_poller.py, em segundo plano, a
+       partir de proxima_consulta (tMed informado pela SEFAZ).
+
+Envio sem resposta (timeout de leitura, rede): a SEFAZ pode ter recebido o
+lote, então as notas não voltam às cegas para a fila. resolver_em_voo()
+consulta cada chave (NfeConsultaProtocolo4): autorizada/denegada grava o
+protocolo, 217 (não consta) devolve a nota à fila, sem resposta tenta de novo
+mais tarde. Duplicidade (204/539) no protocolo também é resolvida pela
+consulta da chave — a original, se a SEFAZ informar outra no xMotivo.
+
+Rejeição do lote inteiro (sem protNFe): 108/109/656 são passageiras e a nota
+volta à fila com espera (retry_at); 215/225 (schema) vêm de um documento, e o
+lote é dividido ao meio até isolar a nota com problema; as demais gravam
+cstat/xmotivo na nota e a tiram da fila (status Lote_Rejeitado) até que seja
+corrigida e re-assinada.
+"""
+
+import logging
+import os
+import re
+from datetime import datetime, timedelta
+
+from flask import current_app, has_app_context
+from lxml import etree
+from sqlalchemy import or_, update
+from sqlalchemy.orm import load_only
+
+from extension import db
+from admin.nfe.contingencia import STATUS_CONTINGENCIA
+from admin.nfe.models import Invoice, NfeLote
+from admin.nfe.nfce_transmit import limpar_xml_assinado
+from admin.nfe.sefaz_client import cliente_sefaz, NS_NFE
+
+logger = logging.getLogger(__name__)
+
+LOTE_MAX = 50            # limite da SEFAZ por enviNFe
+NS = f"{{{NS_NFE}}}"
+
+STATUS_PENDENTE = 'XML_Assinado'
+STATUS_ENVIANDO = 'Enviando'              # no lote em envio ou sem resposta da SEFAZ
+STATUS_DENEGADA = 'Denegada'
+STATUS_LOTE_REJEITADO = 'Lote_Rejeitado'  # lote recusado sem protNFe: corrigir e re-assinar
+STATUS_FINAL = {'Aprovada', STATUS_DENEGADA}
+
+# cStat do protocolo de cada nota que significam uso autorizado
+CSTAT_AUTORIZADO = {'100', '150'}   # 150 = autorizado fora de prazo
+
+# Uso denegado: o número foi consumido, a nota não pode ser reenviada
+CSTAT_DENEGADO = {'110', '301', '302'}
+
+# Duplicidade: a SEFAZ já tem a nota (204) ou o número com outra chave (539)
+CSTAT_DUPLICIDADE = {'204', '539'}
+
+# Consulta por chave: NF-e não consta na base da SEFAZ (pode ser reenviada)
+CSTAT_NAO_CONSTA = '217'
+
+# Rejeição do lote que passa sozinha: serviço paralisado (108/109) ou consumo
+# indevido (656); espera em segundos até a nova tentativa
+ESPERA_LOTE_S = {'108': 120, '109': 600, '656': 3600}
+
+# Rejeição do lote causada por um documento (schema): divide o lote
+CSTAT_LOTE_POR_DOCUMENTO = {'215', '225'}
+
+# Lote 'enviado' há mais que isto com notas 'Enviando' = worker morreu no POST
+ENVIO_LEASE_S = 300
+
+# Espera antes de consultar de novo a chave de uma nota sem resposta
+ESPERA_CONSULTA_S = 60
+
+# cStat da consulta do recibo que pedem nova consulta mais tarde
+# (105 = lote em processamento, 656 = consumo indevido: SEFAZ bloqueia por 1 h)
+CSTAT_REPETIR_CONSULTA = {'105', '656'}
+
+# Espera mínima antes da 1ª consulta do recibo (a SEFAZ informa tMed no retorno)
+ESPERA_MIN_CONSULTA_S = 3
+
+_RE_CHAVE = re.compile(r'Id="NFe(\d{44})"')
+
+
+def status_transmitida(ambiente):
+    return "Transmitida" if ambiente == 2 else "Transmitida-Prod"
+
+
+def status_pendente(tp_emis):
+    """Status da nota na fila: contingência (tpEmis=9) ou assinada pendente."""
+    return STATUS_CONTINGENCIA if tp_emis == '9' else STATUS_PENDENTE
+
+
+# ==============================================================================
+# MONTAGEM E LEITURA DO XML
+# ==============================================================================
+
+def montar_envi_nfe(id_lote, documentos):
+    """enviNFe assíncrono com os <NFe> assinados (já sem declaração/espaços)."""
+    if not 0 < len(documentos) <= LOTE_MAX:
+        raise ValueError(f"Lote deve ter de 1 a {LOTE_MAX} notas (recebeu {len(documentos)})")
+    return (f'<enviNFe xmlns="{NS_NFE}" versao="4.00">'
+            f'<idLote>{id_lote}</idLote><indSinc>0</indSinc>'
+            + ''.join(documentos) + '</enviNFe>')
+
+
+def chave_do_xml(xml):
+    """Chave de acesso (44 dígitos) do atributo Id de <infNFe>."""
+    achou = _RE_CHAVE.search(xml)
+    return achou.group(1) if achou else None
+
+
+def _retorno(texto, tag):
+    """(elemento de retorno, cStat, xMotivo) dentro do envelope SOAP."""
+    raiz = etree.fromstring(texto.encode('utf-8') if isinstance(texto, str) else texto)
+    ret = raiz if etree.QName(raiz).localname == tag else raiz.find(f'.//{NS}{tag}')
+    if ret is None:
+        raise ValueError(f"Resposta da SEFAZ sem <{tag}>")
+    return ret, ret.findtext(f'{NS}cStat'), ret.findtext(f'{NS}xMotivo')
+
+
+def espera_inicial(ret):
+    """Segundos até a 1ª consulta do recibo: tMed do retEnviNFe (mínimo ESPERA_MIN_CONSULTA_S)."""
+    try:
+        return max(int(ret.findtext(f'.//{NS}tMed') or 0), ESPERA_MIN_CONSULTA_S)
+    except ValueError:
+        return ESPERA_MIN_CONSULTA_S
+
+
+def ler_situacao(texto, chave):
+    """Dict (chave, cstat, xmotivo, nprot) do retConsSitNFe de uma chave."""
+    ret, cstat, xmotivo = _retorno(texto, 'retConsSitNFe')
+    inf = ret.find(f'.//{NS}infProt')
+    if inf is None:
+        return {'chave': chave, 'cstat': cstat, 'xmotivo': xmotivo, 'nprot': None}
+    return {
+        'chave': inf.findtext(f'{NS}chNFe') or chave,
+        'cstat': inf.findtext(f'{NS}cStat'),
+        'xmotivo': inf.findtext(f'{NS}xMotivo'),
+        'nprot': inf.findtext(f'{NS}nProt'),
+    }
+
+
+def ler_protocolos(ret):
+    """Lista de dicts (chave, cstat, xmotivo, nprot) dos <protNFe> do retorno."""
+    protocolos = []
+    for inf in ret.iter(f'{NS}infProt'):
+        protocolos.append({
+            'chave': inf.findtext(f'{NS}chNFe'),
+            'cstat': inf.findtext(f'{NS}cStat'),
+            'xmotivo': inf.findtext(f'{NS}xMotivo'),
+            'nprot': inf.findtext(f'{NS}nProt'),
+        })
+    return protocolos
+
+
+# ==============================================================================
+# ATUALIZAÇÃO DAS NOTAS
+# ==============================================================================
+
+def _resultado(p):
+    """Campos da nota para o protocolo `p` (autorizado, denegado ou rejeitado)."""
+    if p['cstat'] in CSTAT_AUTORIZADO:
+        status = 'Aprovada'
+    elif p['cstat'] in CSTAT_DENEGADO:
+        status = STATUS_DENEGADA
+    else:
+        status = 'Rejeitada'
+    return {'status': status, 'nprot': p['nprot'] if status != 'Rejeitada' else None,
+            'cstat': p['cstat'], 'xmotivo': (p['xmotivo'] or '')[:500]}
+
+
+def aplicar_protocolos(protocolos, cliente=None, ambiente=None):
+    """
+    Grava o resultado de cada nota (um UPDATE em lote pelas chaves).
+    Nota Aprovada/Denegada não muda mais; duplicidade (204/539) é resolvida
+    pela consulta da chave. Retorna (autorizadas, rejeitadas). Não faz commit.
+    """
+    chaves = [p['chave'] for p in protocolos if p['chave']]
+    if not chaves:
+        return 0, 0
+    atuais = {chave: (invoice_id, status) for chave, invoice_id, status in db.session.execute(
+        db.select(Invoice.access_key, Invoice.id, Invoice.status).where(Invoice.access_key.in_(chaves))
+    ).all()}
+
+    linhas, duplicadas, autorizadas, rejeitadas = [], [], 0, 0
+    for p in protocolos:
+        invoice_id, status = atuais.get(p['chave'], (None, None))
+        if invoice_id is None:
+            logger.warning("⚠️ Protocolo de chave desconhecida: %s", p['chave'])
+            continue
+        if status in STATUS_FINAL:
+            if p['cstat'] not in CSTAT_AUTORIZADO | CSTAT_DENEGADO:
+                logger.warning("⚠️ NFC-e %s já %s: protocolo %s - %s ignorado",
+                               p['chave'], status, p['cstat'], p['xmotivo'])
+            continue
+        if p['cstat'] in CSTAT_DUPLICIDADE:
+            duplicadas.append((invoice_id, p))
+            continue
+        linhas.append({'id': invoice_id, **_resultado(p)})
+        if p['cstat'] in CSTAT_AUTORIZADO:
+            autorizadas += 1
+        else:
+            rejeitadas += 1
+            logger.warning("⚠️ NFC-e %s %s: %s - %s", p['chave'],
+                           'denegada' if p['cstat'] in CSTAT_DENEGADO else 'rejeitada',
+                           p['cstat'], p['xmotivo'])
+    if linhas:
+        db.session.execute(update(Invoice), linhas)
+
+    if duplicadas:
+        cliente = cliente or cliente_sefaz(ambiente)
+        for invoice_id, p in duplicadas:
+            if _resolver_duplicidade(cliente, invoice_id, p) == 'Aprovada':
+                autorizadas += 1
+    return autorizadas, rejeitadas
+
+
+def _resolver_duplicidade(cliente, invoice_id, p):
+    """
+    Duplicidade no protocolo: a nota (ou o mesmo número com outra chave, no
+    539) já está na SEFAZ. Consulta a chave e grava a situação real; sem
+    resposta, a nota fica 'Enviando' para resolver_em_voo(). Retorna o status.
+    """
+    outra = re.search(r'\d{44}', p['xmotivo'] or '')
+    chave = outra.group(0) if outra else p['chave']
+    try:
+        situacao = ler_situacao(cliente.consultar_protocolo(chave).text, chave)
+    except Exception as e:
+        logger.warning("⚠️ Duplicidade da NFC-e %s sem consulta da chave %s: %s", p['chave'], chave, e)
+        situacao = None
+
+    if situacao and situacao['cstat'] in CSTAT_AUTORIZADO | CSTAT_DENEGADO:
+        novo = {'id': invoice_id, 'access_key': situacao['chave'], **_resultado(situacao)}
+        if situacao['chave'] != p['chave']:
+            logger.warning("⚠️ NFC-e %s: o número já está autorizado na chave %s",
+                           p['chave'], situacao['chave'])
+    else:
+        novo = {'id': invoice_id, 'status': STATUS_ENVIANDO, 'cstat': p['cstat'],
+                'xmotivo': (p['xmotivo'] or '')[:500],
+                'retry_at': datetime.now() + timedelta(seconds=ESPERA_CONSULTA_S)}
+    db.session.execute(update(Invoice), [novo])
+    return novo['status']
+
+
+def resolver_em_voo(cliente, lote_id=None, limite=LOTE_MAX):
+    """
+    Notas 'Enviando' cujo envio ficou sem resposta (lote 'erro', worker que
+    morreu no POST ou duplicidade sem consulta): consulta cada chave em vez de
+    reenviar às cegas. Retorna quantas notas resolveu. Faz commit.
+    """
+    agora = datetime.now()
+    query = (Invoice.query
+             .options(load_only(Invoice.id, Invoice.number, Invoice.access_key,
+                                Invoice.status, Invoice.tp_emis, raiseload=True))
+             .filter(Invoice.status == STATUS_ENVIANDO, Invoice.access_key.isnot(None)))
+    if lote_id is not None:
+        query = query.filter(Invoice.lote_id == lote_id)
+    else:
+        em_envio = db.select(NfeLote.id).where(
+            NfeLote.status == 'enviado',
+            NfeLote.created_at > agora - timedelta(seconds=ENVIO_LEASE_S))
+        query = query.filter(or_(Invoice.retry_at.is_(None), Invoice.retry_at <= agora),
+                             or_(Invoice.lote_id.is_(None), Invoice.lote_id.notin_(em_envio)))
+    notas = query.order_by(Invoice.number).limit(limite).all()
+
+    linhas, resolvidas = [], 0
+    for i, nota in enumerate(notas):
+        try:
+            situacao = ler_situacao(cliente.consultar_protocolo(nota.access_key).text, nota.access_key)
+        except Exception as e:
+            # SEFAZ ainda sem resposta: nenhuma nota é reenviada, tenta mais tarde
+            logger.warning("⚠️ Consulta da NFC-e %s sem resposta: %s", nota.number, e)
+            depois = agora + timedelta(seconds=ESPERA_CONSULTA_S)
+            linhas.extend({'id': n.id, 'retry_at': depois} for n in notas[i:])
+            break
+        if situacao['cstat'] in CSTAT_AUTORIZADO | CSTAT_DENEGADO:
+            linhas.append({'id': nota.id, 'access_key': situacao['chave'], 'retry_at': None,
+                           **_resultado(situacao)})
+        elif situacao['cstat'] == CSTAT_NAO_CONSTA:
+            # A SEFAZ não recebeu: volta para a fila e pode ser reenviada
+            linhas.append({'id': nota.id, 'status': status_pendente(nota.tp_emis), 'retry_at': None,
+                           'cstat': situacao['cstat'], 'xmotivo': situacao['xmotivo']})
+        else:
+            logger.warning("⚠️ Consulta da NFC-e %s: %s - %s", nota.number,
+                           situacao['cstat'], situacao['xmotivo'])
+            linhas.append({'id': nota.id, 'cstat': situacao['cstat'], 'xmotivo': situacao['xmotivo'],
+                           'retry_at': agora + timedelta(seconds=ESPERA_CONSULTA_S)})
+            continue
+        resolvidas += 1
+        logger.info("🔎 NFC-e %s consultada pela chave: %s - %s", nota.number,
+                    situacao['cstat'], situacao['xmotivo'])
+    if linhas:
+        db.session.execute(update(Invoice), linhas)
+    db.session.commit()
+    return resolvidas
+
+
+def consultar_chave(cliente, invoice):
+    """
+    Situação da chave da nota na SEFAZ antes de reemiti-la com outro tpEmis.
+    Autorizada ou denegada: grava o protocolo na nota (sem commit). Retorna
+    ler_situacao(); falha de rede propaga a exceção.
+    """
+    situacao = ler_situacao(cliente.consultar_protocolo(invoice.access_key).text, invoice.access_key)
+    if situacao['cstat'] in CSTAT_AUTORIZADO | CSTAT_DENEGADO:
+        for campo, valor in _resultado(situacao).items():
+            setattr(invoice, campo, valor)
+        invoice.retry_at = None
+    logger.info("🔎 NFC-e %s consultada pela chave: %s - %s", invoice.number,
+                situacao['cstat'], situacao['xmotivo'])
+    return situacao
+
+
+# ==============================================================================
+# ENVIO E CONSULTA
+# ==============================================================================
+
+def notas_pendentes(limite=None, excluir=(), reservar=False):
+    """
+    Notas assinadas ainda não transmitidas (e fora da espera de retry_at), em
+    ordem de número. reservar=True trava as linhas (FOR UPDATE SKIP LOCKED)
+    até o commit de enviar_lote, que as passa para 'Enviando'.
+    """
+    query = (Invoice.query
+             .options(load_only(Invoice.id, Invoice.number, Invoice.xml_path,
+                                Invoice.access_key, Invoice.status, Invoice.tp_emis,
+                                raiseload=True))
+             .filter(Invoice.status == STATUS_PENDENTE, Invoice.xml_path.isnot(None),
+                     or_(Invoice.retry_at.is_(None), Invoice.retry_at <= datetime.now()))
+             .order_by(Invoice.number))
+    if excluir:
+        query = query.filter(Invoice.id.notin_(list(excluir)))
+    if limite:
+        query = query.limit(limite)
+    if reservar:
+        query = query.with_for_update(skip_locked=True)
+    return query.all()
+
+
+def _ler_documentos(notas, base_dir):
+    """[(nota, chave, xml limpo)] das notas cujo XML assinado existe em disco."""
+    documentos = []
+    for nota in notas:
+        caminho = os.path.join(base_dir, nota.xml_path)
+        try:
+            with open(caminho, 'r', encoding='utf-8') as f:
+                xml = limpar_xml_assinado(f.read())
+        except OSError as e:
+            logger.warning("⚠️ NFC-e %s sem XML assinado em disco: %s", nota.number, e)
+            continue
+        chave = chave_do_xml(xml)
+        if chave is None:
+            logger.warning("⚠️ NFC-e %s: XML sem chave de acesso (infNFe/@Id)", nota.number)
+            continue
+        documentos.append((nota, chave, xml))
+    return documentos
+
+
+def enviar_lote(cliente, documentos):
+    """
+    Envia um lote já lido (até LOTE_MAX documentos) e grava o resultado.
+    Retorna o NfeLote.
+    """
+    lote = NfeLote(ambiente=cliente.ambiente, quantidade=len(documentos), status='enviado')
+    db.session.add(lote)
+    db.session.flush()
+    fila = {nota.id: status_pendente(nota.tp_emis) for nota, _, _ in documentos}
+    # idLote e notas 'Enviando' gravados antes do POST (e libera o FOR UPDATE):
+    # outro worker não reenvia, e um envio sem resposta é resolvido pela chave
+    db.session.execute(update(Invoice), [
+        {'id': nota.id, 'status': STATUS_ENVIANDO, 'lote_id': lote.id, 'access_key': chave,
+         'retry_at': None}
+        for nota, chave, _ in documentos
+    ])
+    db.session.commit()
+
+    ids = list(fila)
+    try:
+        resposta = cliente.autorizacao(montar_envi_nfe(lote.id, [xml for _, _, xml in documentos]))
+        ret, cstat, xmotivo = _retorno(resposta.text, 'retEnviNFe')
+    except Exception as e:
+        db.session.rollback()
+        lote.status, lote.xmotivo = 'erro', str(e)[:500]
+        db.session.commit()
+        logger.error("❌ Lote %s sem resposta: %s — consultando as chaves", lote.id, e)
+        resolver_em_voo(cliente, lote_id=lote.id)
+        return lote
+
+    lote.cstat, lote.xmotivo = cstat, xmotivo
+    if cstat == '103':
+        lote.status = 'recebido'
+        lote.nrec = ret.findtext(f'.//{NS}nRec')
+        lote.proxima_consulta = datetime.now() + timedelta(seconds=espera_inicial(ret))
+        db.session.execute(update(Invoice), [
+            {'id': nota.id, 'nrec': lote.nrec, 'status': status_transmitida(cliente.ambiente)}
+            for nota, _, _ in documentos
+        ])
+    elif cstat == '104':
+        # Processado na hora: os protocolos já vêm no retorno
+        lote.status = 'processado'
+        aplicar_protocolos(ler_protocolos(ret), cliente=cliente)
+    elif cstat in ESPERA_LOTE_S:
+        # Serviço paralisado: as notas voltam para a fila com espera
+        lote.status = 'adiado'
+        depois = datetime.now() + timedelta(seconds=ESPERA_LOTE_S[cstat])
+        db.session.execute(update(Invoice), [
+            {'id': invoice_id, 'status': status, 'retry_at': depois, 'cstat': cstat, 'xmotivo': xmotivo}
+            for invoice_id, status in fila.items()
+        ])
+        logger.warning("⏸️ Lote %s adiado (%d notas): %s - %s", lote.id, len(ids), cstat, xmotivo)
+    else:
+        lote.status = 'rejeitado'
+        if cstat in CSTAT_LOTE_POR_DOCUMENTO and len(documentos) > 1:
+            # As notas continuam 'Enviando': enviar_documentos() divide o lote
+            logger.warning("⚠️ Lote %s rejeitado (%d notas): %s - %s — dividindo",
+                           lote.id, len(ids), cstat, xmotivo)
+        else:
+            db.session.execute(update(Invoice), [
+                {'id': invoice_id, 'status': STATUS_LOTE_REJEITADO, 'cstat': cstat, 'xmotivo': xmotivo}
+                for invoice_id in ids
+            ])
+            logger.warning("⚠️ Lote %s rejeitado (%d notas): %s - %s", lote.id, len(ids), cstat, xmotivo)
+    db.session.commit()
+    logger.info("📦 Lote %s: %d nota(s), cStat %s", lote.id, len(ids), cstat)
+    return lote
+
+
+def enviar_documentos(cliente, documentos):
+    """
+    enviar_lote() e, se a SEFAZ recusar o lote por causa de um documento
+    (215/225), reenvia cada metade até isolar a nota. Retorna os NfeLote.
+    """
+    lote = enviar_lote(cliente, documentos)
+    if lote.status == 'rejeitado' and lote.cstat in CSTAT_LOTE_POR_DOCUMENTO and len(documentos) > 1:
+        meio = len(documentos) // 2
+        return ([lote] + enviar_documentos(cliente, documentos[:meio])
+                + enviar_documentos(cliente, documentos[meio:]))
+    return [lote]
+
+
+def transmitir_lotes(ambiente=None, pfx_path=None, senha=None, base_dir='.', tamanho=LOTE_MAX):
+    """
+    Transmite todas as notas pendentes em lotes de até `tamanho` notas.
+    Retorna a lista de NfeLote enviados (N notas → ceil(N/tamanho) chamadas).
+    Levanta SefazIndisponivel (sefaz_status.py) se a sonda viu a SEFAZ fora.
+    """
+    tamanho = max(1, min(tamanho, LOTE_MAX))
+    # SEFAZ fora pela última consulta de status: falha na hora, sem timeout
+    if has_app_context() and 'sefaz_status' in current_app.extensions:
+        current_app.extensions['sefaz_status'].exigir_disponivel()
+    cliente = cliente_sefaz(ambiente, pfx_path, senha)
+    # Envios anteriores sem resposta: consulta pela chave antes de qualquer reenvio
+    resolver_em_voo(cliente)
+
+    lotes, vistas = [], set()
+    while True:
+        # Um lote por vez: reserva, grava 'Enviando' e só então envia
+        notas = notas_pendentes(tamanho, excluir=vistas, reservar=True)
+        if not notas:
+            break
+        vistas.update(nota.id for nota in notas)
+        documentos = _ler_documentos(notas, base_dir)
+        if not documentos:
+            db.session.commit()   # libera as linhas travadas
+            continue
+        lotes.extend(enviar_documentos(cliente, documentos))
+    db.session.commit()
+    return lotes
+
+
+def aplicar_retorno_recibo(lote, texto):
+    """
+    Lê o retConsReciNFe do lote e grava o resultado (sem commit).
+    Retorna (cStat, autorizadas, rejeitadas); cStat 105 = ainda em processamento.
+    """
+    ret, cstat, xmotivo = _retorno(texto, 'retConsReciNFe')
+    resultado = (0, 0)
+    lote.cstat, lote.xmotivo = cstat, xmotivo
+    if cstat == '104':
+        lote.status = 'processado'
+        resultado = aplicar_protocolos(ler_protocolos(ret), ambiente=lote.ambiente)
+    elif cstat not in CSTAT_REPETIR_CONSULTA:
+        lote.status = 'rejeitado'
+    lote.updated_at = datetime.now()
+    return (cstat,) + resultado
+
+
+def consultar_lote(lote, pfx_path=None, senha=None):
+    """
+    Consulta o recibo do lote e aplica os protocolos das notas.
+    Retorna (autorizadas, rejeitadas); (0, 0) se ainda em processamento (105).
+    """
+    if not lote.nrec:
+        return 0, 0
+    cliente = cliente_sefaz(lote.ambiente, pfx_path, senha)
+    resposta = cliente.consultar_recibo(lote.nrec)
+    _, autorizadas, rejeitadas = aplicar_retorno_recibo(lote, resposta.text)
+    db.session.commit()
+    return autorizadas, rejeitadas
@@ -5,17 +5,103 @@ Padrão XML-DSig conforme especificação da SEFAZ
 """
 
 from lxml import etree
-from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import padding
-from cryptography.hazmat.backends import default_backend
-from cryptography import x509
 import base64
 import hashlib
 
+from admin.nfe.certificado import obter_certificado
+
+
+NS_NFE = "http://www.portalfiscal.inf.br/nfe"
+DS_NAMESPACE = "http://www.w3.org/2000/09/xmldsig#"
+
+
+def assinar_elemento(nfe, cert):
+    """
+    Assina a tag <infNFe> de uma <NFe> já em memória (árvore lxml), sem
+    serializar nem refazer o parse. A <Signature> entra como último filho de
+    <NFe> (ordem do leiaute: infNFe, infNFeSupl, Signature).
+
+    Args:
+        nfe (lxml.etree._Element): raiz <NFe>
+        cert: certificado de obter_certificado (chave privada + X509 em base64)
+
+    Returns:
+        str: DigestValue (base64) — usado no QR Code da contingência
+    """
+    ds = f"{{{DS_NAMESPACE}}}"
+
+    # ============================================================
+    # 1. LOCALIZA A TAG <infNFe> PARA ASSINAR
+    # ============================================================
+    infNFe = nfe.find(f'.//{{{NS_NFE}}}infNFe')
+    if infNFe is None:
+        raise Exception("❌ Tag <infNFe> não encontrada no XML")
+
+    # Pega o ID da tag infNFe (ex: NFe42260156154376000105650010000000012412469927)
+    uri_reference = infNFe.get('Id')
+    if not uri_reference:
+        raise Exception("❌ Atributo 'Id' não encontrado na tag <infNFe>")
+
+    # Remove qualquer assinatura existente (se houver)
+    for existing_sig in nfe.findall(f'.//{ds}Signature'):
+        existing_sig.getparent().remove(existing_sig)
+
+    # ============================================================
+    # 2. CANONICALIZA <infNFe> (C14N) E CALCULA O DIGEST (SHA-1)
+    # ============================================================
+    try:
+        canonicalized_xml = etree.tostring(infNFe, method='c14n', exclusive=False, with_comments=False)
+        digest_value = base64.b64encode(hashlib.sha1(canonicalized_xml).digest()).decode('utf-8')
+    except Exception as e:
+        raise Exception(f"❌ Erro na canonicalização: {e}")
+
+    # ============================================================
+    # 3. MONTA A TAG <Signature> (namespace xmldsig sem prefixo)
+    # ============================================================
+    signature = etree.Element(f"{ds}Signature", nsmap={None: DS_NAMESPACE})
+    signed_info = etree.SubElement(signature, f"{ds}SignedInfo")
+    etree.SubElement(signed_info, f"{ds}CanonicalizationMethod",
+                     Algorithm="http://www.w3.org/TR/2001/REC-xml-c14n-20010315")
+    etree.SubElement(signed_info, f"{ds}SignatureMethod",
+                     Algorithm="http://www.w3.org/2000/09/xmldsig#rsa-sha1")
+
+    reference = etree.SubElement(signed_info, f"{ds}Reference", URI=f"#{uri_reference}")
+    transforms = etree.SubElement(reference, f"{ds}Transforms")
+    etree.SubElement(transforms, f"{ds}Transform",
+                     Algorithm="http://www.w3.org/2000/09/xmldsig#enveloped-signature")
+    etree.SubElement(transforms, f"{ds}Transform",
+                     Algorithm="http://www.w3.org/TR/2001/REC-xml-c14n-20010315")
+    etree.SubElement(reference, f"{ds}DigestMethod", Algorithm="http://www.w3.org/2000/09/xmldsig#sha1")
+    etree.SubElement(reference, f"{ds}DigestValue").text = digest_value
+
+    signature_value_elem = etree.SubElement(signature, f"{ds}SignatureValue")
+    x509_data = etree.SubElement(etree.SubElement(signature, f"{ds}KeyInfo"), f"{ds}X509Data")
+    etree.SubElement(x509_data, f"{ds}X509Certificate").text = cert.cert_der_b64
+
+    # Já no documento: o <SignedInfo> é canonicalizado no mesmo contexto de
+    # namespaces em que a SEFAZ vai verificá-lo
+    nfe.append(signature)
+
+    # ============================================================
+    # 4. ASSINA O <SignedInfo> CANONICALIZADO COM A CHAVE PRIVADA
+    # ============================================================
+    try:
+        signed_info_c14n = etree.tostring(signed_info, method='c14n', exclusive=False, with_comments=False)
+        signature_bytes = cert.private_key.sign(signed_info_c14n, padding.PKCS1v15(), hashes.SHA1())
+        signature_value_elem.text = base64.b64encode(signature_bytes).decode('utf-8')
+    except Exception as e:
+        nfe.remove(signature)
+        raise Exception(f"❌ Erro ao assinar: {e}")
+
+    return digest_value
+
 
 def assinar_xml_nfce(xml_content, pfx_path, pfx_password):
     """
     Assina digitalmente o XML da NFC-e usando certificado A1
+    (para XML já em bytes; a emissão usa EmissaoNFCe, que assina em memória)
     
     Args:
         xml_content (bytes ou str): Conteúdo do XML a ser assinado
@@ -23,32 +109,19 @@ def assinar_xml_nfce(xml_content, pfx_path, pfx_password):
         pfx_password (str): Senha do certificado
     
     Returns:
-        bytes: XML assinado em bytes
+        bytes: XML assinado em bytes (sem quebras de linha entre as tags)
     
     Raises:
         Exception: Erro na leitura do certificado ou assinatura
     """
     
     # ============================================================
-    # 1. CARREGA O CERTIFICADO DIGITAL (.pfx)
+    # 1. CERTIFICADO DIGITAL (.pfx) — decifrado uma vez por processo
     # ============================================================
     try:
-        with open(pfx_path, 'rb') as f:
-            pfx_data = f.read()
+        cert = obter_certificado(pfx_path, pfx_password)
     except FileNotFoundError:
         raise Exception(f"❌ Certificado não encontrado em: {pfx_path}")
-    except Exception as e:
-        raise Exception(f"❌ Erro ao ler certificado: {e}")
-    
-    try:
-        # Extrai chave privada e certificado do arquivo .pfx
-        from cryptography.hazmat.primitives.serialization import pkcs12
-        
-        private_key, certificate, ca_certs = pkcs12.load_key_and_certificates(
-            pfx_data,
-            pfx_password.encode() if isinstance(pfx_password, str) else pfx_password,
-            backend=default_backend()
-        )
     except ValueError as e:
         raise Exception(f"❌ Senha incorreta ou certificado inválido: {e}")
     except Exception as e:
@@ -57,201 +130,23 @@ def assinar_xml_nfce(xml_content, pfx_path, pfx_password):
     # ============================================================
     # 2. PARSER DO XML
     # ============================================================
+    # remove_blank_text: o <infNFe> assinado é o mesmo que sai para a SEFAZ
+    # (limpar_xml_assinado tira os espaços entre tags antes do envio)
     try:
         if isinstance(xml_content, str):
             xml_content = xml_content.encode('utf-8')
         
-        parser = etree.XMLParser(remove_blank_text=False, strip_cdata=False)
+        parser = etree.XMLParser(remove_blank_text=True, strip_cdata=False)
         root = etree.fromstring(xml_content, parser)
     except Exception as e:
         raise Exception(f"❌ Erro ao fazer parse do XML: {e}")
     
     # ============================================================
-    # 3. LOCALIZA A TAG <infNFe> PARA ASSINAR
-    # ============================================================
-    namespace = {'nfe': 'http://www.portalfiscal.inf.br/nfe'}
-    
-    infNFe = root.find('.//nfe:infNFe', namespace)
-    if infNFe is None:
-        raise Exception("❌ Tag <infNFe> não encontrada no XML")
-    
-    # Pega o ID da tag infNFe (ex: NFe42260156154376000105650010000000012412469927)
-    uri_reference = infNFe.get('Id')
-    if not uri_reference:
-        raise Exception("❌ Atributo 'Id' não encontrado na tag <infNFe>")
-    
-    # ============================================================
-    # 4. CANONICALIZA A TAG <infNFe> (C14N)
-    # ============================================================
-    try:
-        # Canonicalização exclusiva (C14N) conforme padrão XML-DSig
-        canonicalized_xml = etree.tostring(
-            infNFe,
-            method='c14n',
-            exclusive=True,
-            with_comments=False
-        )
-    except Exception as e:
-        raise Exception(f"❌ Erro na canonicalização: {e}")
-    
-    # ============================================================
-    # 5. CALCULA O DIGEST (SHA-1) DO XML CANONICALIZADO
-    # ============================================================
-    try:
-        digest = hashlib.sha1(canonicalized_xml).digest()
-        digest_value = base64.b64encode(digest).decode('utf-8')
-    except Exception as e:
-        raise Exception(f"❌ Erro ao calcular digest: {e}")
-    
-    # ============================================================
-    # 6. MONTA A TAG <SignedInfo>
-    # ============================================================
-    ds_namespace = "http://www.w3.org/2000/09/xmldsig#"
-    
-    signed_info = etree.Element(
-        f"{{{ds_namespace}}}SignedInfo",
-        nsmap={'ds': ds_namespace}
-    )
-    
-    # CanonicalizationMethod
-    canonicalization_method = etree.SubElement(
-        signed_info,
-        f"{{{ds_namespace}}}CanonicalizationMethod",
-        Algorithm="http://www.w3.org/TR/2001/REC-xml-c14n-20010315"
-    )
-    
-    # SignatureMethod (RSA-SHA1)
-    signature_method = etree.SubElement(
-        signed_info,
-        f"{{{ds_namespace}}}SignatureMethod",
-        Algorithm="http://www.w3.org/2000/09/xmldsig#rsa-sha1"
-    )
-    
-    # Reference
-    reference = etree.SubElement(
-        signed_info,
-        f"{{{ds_namespace}}}Reference",
-        URI=f"#{uri_reference}"
-    )
-    
-    # Transforms
-    transforms = etree.SubElement(reference, f"{{{ds_namespace}}}Transforms")
-    
-    transform1 = etree.SubElement(
-        transforms,
-        f"{{{ds_namespace}}}Transform",
-        Algorithm="http://www.w3.org/2000/09/xmldsig#enveloped-signature"
-    )
-    
-    transform2 = etree.SubElement(
-        transforms,
-        f"{{{ds_namespace}}}Transform",
-        Algorithm="http://www.w3.org/TR/2001/REC-xml-c14n-20010315"
-    )
-    
-    # DigestMethod (SHA-1)
-    digest_method = etree.SubElement(
-        reference,
-        f"{{{ds_namespace}}}DigestMethod",
-        Algorithm="http://www.w3.org/2000/09/xmldsig#sha1"
-    )
-    
-    # DigestValue
-    digest_value_elem = etree.SubElement(reference, f"{{{ds_namespace}}}DigestValue")
-    digest_value_elem.text = digest_value
-    
-    # ============================================================
-    # 7. CANONICALIZA O <SignedInfo>
-    # ============================================================
-    try:
-        signed_info_c14n = etree.tostring(
-            signed_info,
-            method='c14n',
-            exclusive=False,
-            with_comments=False
-        )
-    except Exception as e:
-        raise Exception(f"❌ Erro ao canonicalizar SignedInfo: {e}")
-    
-    # ============================================================
-    # 8. ASSINA O <SignedInfo> COM A CHAVE PRIVADA
-    # ============================================================
-    try:
-        signature_bytes = private_key.sign(
-            signed_info_c14n,
-            padding.PKCS1v15(),
-            hashes.SHA1()
-        )
-        signature_value = base64.b64encode(signature_bytes).decode('utf-8')
-    except Exception as e:
-        raise Exception(f"❌ Erro ao assinar: {e}")
-    
-    # ============================================================
-    # 9. EXTRAI O CERTIFICADO EM BASE64
-    # ============================================================
-    try:
-        cert_pem = certificate.public_bytes(
-            encoding=serialization.Encoding.DER
-        )
-        x509_certificate = base64.b64encode(cert_pem).decode('utf-8')
-    except Exception as e:
-        raise Exception(f"❌ Erro ao extrair certificado: {e}")
-    
-    # ============================================================
-    # 10. MONTA A TAG <Signature> COMPLETA
-    # ============================================================
-    signature = etree.Element(
-        f"{{{ds_namespace}}}Signature",
-        nsmap={'ds': ds_namespace}
-    )
-    
-    # Adiciona SignedInfo
-    signature.append(signed_info)
-    
-    # SignatureValue
-    signature_value_elem = etree.SubElement(signature, f"{{{ds_namespace}}}SignatureValue")
-    signature_value_elem.text = signature_value
-    
-    # KeyInfo
-    key_info = etree.SubElement(signature, f"{{{ds_namespace}}}KeyInfo")
-    
-    x509_data = etree.SubElement(key_info, f"{{{ds_namespace}}}X509Data")
-    
-    x509_certificate_elem = etree.SubElement(x509_data, f"{{{ds_namespace}}}X509Certificate")
-    x509_certificate_elem.text = x509_certificate
-    
-    # ============================================================
-    # 11. INSERE A ASSINATURA NO XML
-    # ============================================================
-    # A assinatura deve ser inserida após a tag <infNFe> mas antes de </NFe>
-    nfe_element = root  # <NFe> é a raiz
-    
-    # Remove qualquer assinatura existente (se houver)
-    for existing_sig in nfe_element.findall(f'.//{{{ds_namespace}}}Signature'):
-        nfe_element.remove(existing_sig)
-    
-    # Insere a nova assinatura após <infNFe> e antes de <infNFeSupl> (se existir)
-    infNFeSupl = nfe_element.find('.//nfe:infNFeSupl', namespace)
-    
-    if infNFeSupl is not None:
-        # Insere antes de infNFeSupl
-        index = list(nfe_element).index(infNFeSupl)
-        nfe_element.insert(index, signature)
-    else:
-        # Adiciona no final
-        nfe_element.append(signature)
-    
-    # ============================================================
-    # 12. RETORNA O XML ASSINADO
+    # 3. ASSINA EM MEMÓRIA E SERIALIZA UMA VEZ
     # ============================================================
+    assinar_elemento(root, cert)
     try:
-        xml_assinado = etree.tostring(
-            root,
-            xml_declaration=True,
-            encoding='utf-8',
-            pretty_print=True
-        )
-        return xml_assinado
+        return etree.tostring(root, xml_declaration=True, encoding='utf-8')
     except Exception as e:
         raise Exception(f"❌ Erro ao gerar XML final: {e}")
 
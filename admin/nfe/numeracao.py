@@ -0,0 +1,196 @@
+# admin/nfe/numeracao.py
+"""
+Numeração das NFC-e por loja + série (InvoiceSequence) sem corrida.
+
+Antes nfe_create lia InvoiceSequence com um SELECT simples, somava 1 em Python
+e só gravava no commit da nota: duas emissões simultâneas podiam pegar o mesmo
+número, e um rollback depois do incremento devolvia ou pulava números de forma
+imprevisível.
+
+Agora o número sai de um único UPDATE ... SET last_number = last_number + n
+RETURNING last_number numa transação própria e curta (o lock da linha dura só
+esse comando). O número reservado não volta: se a nota não for gravada, ele
+vira uma lacuna registrada em invoice_number_gap, para inutilização na SEFAZ.
+
+Em dias de muito movimento cada worker pode reservar um bloco de números de
+uma vez (NFE_BLOCO_NUMEROS, padrão 1 = sem bloco). Com bloco, a numeração
+entre workers não segue a ordem cronológica, e a sobra do bloco quando o
+worker termina também vira lacuna.
+
+- alocar_numero(store_id, series)          → próximo número (usa o bloco do worker)
+- reservar(store_id, series, quantidade)   → (primeiro, último) direto no banco
+- registrar_lacunas(store_id, series, nums, motivo)
+- detectar_lacunas(store_id, series)       → números reservados sem nota nem lacuna
+"""
+
+import atexit
+import logging
+import os
+import threading
+from datetime import datetime
+
+from sqlalchemy import select
+
+from extension import db
+from admin.nfe.models import Invoice, InvoiceSequence, InvoiceNumberGap
+from admin.numeracao_documentos import insert_ignorando_conflito as _insert_ignorando_conflito
+
+logger = logging.getLogger(__name__)
+
+
+def _env_int(nome, padrao):
+    try:
+        return int(os.getenv(nome, padrao))
+    except (TypeError, ValueError):
+        return padrao
+
+
+# ==============================================================================
+# RESERVA NO BANCO
+# ==============================================================================
+
+def reservar(store_id, series=1, quantidade=1, engine=None):
+    """
+    Reserva `quantidade` números consecutivos de loja + série e devolve
+    (primeiro, último). Já confirmado no banco ao retornar.
+    """
+    engine = engine or db.engine
+    tabela = InvoiceSequence.__table__
+    incremento = (tabela.update()
+                  .where(tabela.c.store_id == store_id, tabela.c.series == series)
+                  .values(last_number=tabela.c.last_number + quantidade,
+                          updated_at=datetime.now())
+                  .returning(tabela.c.last_number))
+
+    with engine.begin() as conn:
+        ultimo = conn.execute(incremento).scalar()
+        if ultimo is None:
+            # Primeira nota da loja + série: cria a linha (sem corrida com outro worker)
+            conn.execute(_insert_ignorando_conflito(engine, tabela).values(
+                store_id=store_id, series=series, last_number=0, updated_at=datetime.now()))
+            ultimo = conn.execute(incremento).scalar()
+    return ultimo - quantidade + 1, ultimo
+
+
+def registrar_lacunas(store_id, series, numeros, motivo, engine=None):
+    """Grava números reservados que não viraram nota (para inutilização)."""
+    numeros = sorted(set(numeros))
+    if not numeros:
+        return 0
+    engine = engine or db.engine
+    tabela = InvoiceNumberGap.__table__
+    agora = datetime.now()
+    try:
+        with engine.begin() as conn:
+            conn.execute(_insert_ignorando_conflito(engine, tabela), [
+                {'store_id': store_id, 'series': series, 'number': n,
+                 'reason': (motivo or '')[:255], 'created_at': agora}
+                for n in numeros
+            ])
+    except Exception as e:
+        logger.error("❌ Não foi possível registrar a lacuna %s (loja %s, série %s): %s",
+                     numeros, store_id, series, e)
+        return 0
+    logger.warning("🕳️ NFC-e loja %s série %s: número(s) %s sem nota (%s) — inutilizar na SEFAZ",
+                   store_id, series, _faixas_texto(numeros), motivo)
+    return len(numeros)
+
+
+def detectar_lacunas(store_id, series=1, inicio=None, registrar=False, engine=None):
+    """
+    Números de 'inicio' (padrão: menor nota emitida) até last_number que não
+    têm nota nem lacuna registrada — por exemplo, sobra do bloco de um worker
+    que caiu. Com registrar=True grava essas lacunas.
+    """
+    engine = engine or db.engine
+    with engine.connect() as conn:
+        ultimo = conn.execute(
+            select(InvoiceSequence.last_number)
+            .where(InvoiceSequence.store_id == store_id, InvoiceSequence.series == series)
+        ).scalar()
+        if not ultimo:
+            return []
+        emitidos = set(conn.execute(
+            select(Invoice.number).where(Invoice.store_id == store_id, Invoice.series == series)
+        ).scalars())
+        registradas = set(conn.execute(
+            select(InvoiceNumberGap.number)
+            .where(InvoiceNumberGap.store_id == store_id, InvoiceNumberGap.series == series)
+        ).scalars())
+    if inicio is None:
+        inicio = min(emitidos) if emitidos else 1
+    faltando = [n for n in range(inicio, ultimo + 1) if n not in emitidos and n not in registradas]
+    if registrar and faltando:
+        registrar_lacunas(store_id, series, faltando, 'detectada na conferência da numeração', engine)
+    return faltando
+
+
+def _faixas_texto(numeros):
+    """[1, 2, 3, 7] → '1-3, 7'"""
+    faixas, inicio, anterior = [], numeros[0], numeros[0]
+    for n in numeros[1:] + [None]:
+        if n is not None and n == anterior + 1:
+            anterior = n
+            continue
+        faixas.append(f"{inicio}-{anterior}" if inicio != anterior else str(inicio))
+        if n is not None:
+            inicio = anterior = n
+    return ', '.join(faixas)
+
+
+# ==============================================================================
+# ALOCADOR POR WORKER (BLOCOS)
+# ==============================================================================
+
+class AlocadorNumeracao:
+    """Entrega números de loja + série, reservando `bloco` de cada vez no banco."""
+
+    def __init__(self, bloco=None, engine=None):
+        self.bloco = max(1, bloco if bloco is not None else _env_int('NFE_BLOCO_NUMEROS', 1))
+        self.engine = engine
+        self.reservas = 0            # idas ao banco
+        self._faixas = {}            # (store_id, series) → [próximo, último]
+        self._engines = {}           # (store_id, series) → engine da reserva (para as sobras)
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def proximo(self, store_id, series=1):
+        chave = (store_id, series)
+        with self._lock:
+            if self._pid != os.getpid():
+                # Depois do fork o bloco do processo pai não é deste worker
+                self._faixas.clear()
+                self._pid = os.getpid()
+            faixa = self._faixas.get(chave)
+            if faixa is None or faixa[0] > faixa[1]:
+                engine = self.engine or db.engine
+                primeiro, ultimo = reservar(store_id, series, self.bloco, engine)
+                self.reservas += 1
+                faixa = self._faixas[chave] = [primeiro, ultimo]
+                self._engines[chave] = engine
+            numero = faixa[0]
+            faixa[0] += 1
+            return numero
+
+    def sobras(self):
+        """{(store_id, series): [números reservados ainda não entregues]}"""
+        with self._lock:
+            return {chave: list(range(f[0], f[1] + 1))
+                    for chave, f in self._faixas.items() if f[0] <= f[1]}
+
+    def devolver_sobras(self, motivo='sobra do bloco do worker'):
+        """Registra a sobra dos blocos como lacuna (ao encerrar o worker)."""
+        if self._pid != os.getpid():
+            return
+        for (store_id, series), numeros in self.sobras().items():
+            registrar_lacunas(store_id, series, numeros, motivo, self._engines.get((store_id, series)))
+        with self._lock:
+            self._faixas.clear()
+
+
+alocador = AlocadorNumeracao()
+atexit.register(alocador.devolver_sobras)
+
+
+def alocar_numero(store_id, series=1):
+    return alocador.proximo(store_id, series)
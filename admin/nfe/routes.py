@@ -1,28 +1,27 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, send_file, current_app
-from admin.nfe.models import db, Invoice, InvoiceItem
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, send_file, current_app, jsonify
+from admin.nfe.models import db, Invoice, InvoiceItem, NfeLote, NfeContingencia
+from extension import recibo_poller, contingencia_fila, sefaz_status
 from admin.order.models import Customer_request, Customer_request_item # Importação já existe
 from admin.client.models import Client
 from admin.models import Product
+from admin.store_cache import loja_atual
+from admin.pagination import keyset_paginate, ler_filtros, aplicar_filtros
 
-from admin.nfe.nfce_xml import gerar_xml_nfce
-from admin.nfe.nfce_sign import assinar_xml_nfce
-from admin.nfe.nfce_transmit import transmitir_nfce
-from admin.nfe.nfce_consulta_recibo import consultar_nfce_recibo
+# ⚡ lxml, fpdf, qrcode e os módulos de assinatura/transmissão (cryptography,
+# requests) são importados dentro das rotas que os usam: o worker sobe sem
+# pagar esse custo e só o primeiro acesso à NF-e carrega as bibliotecas.
 
-from datetime import datetime
+from datetime import datetime, timedelta
 
 # Geração XML NFCe
 from decimal import Decimal
 NAMESPACE = "http://www.portalfiscal.inf.br/nfe"
 from config import NFeConfig as CFG
-from admin.nfe.services.qr_code import gerar_qrcode_url
-from lxml import etree
 
 from pathlib import Path
 import os
 from random import randint
 from io import BytesIO
-from fpdf import FPDF
 
 # 🔄 Carrega variáveis do .env
 from dotenv import load_dotenv
@@ -34,6 +33,12 @@ AMBIENTE = int(os.getenv("NFE_AMBIENTE", "2"))
 
 nfe_bp = Blueprint('nfe_bp', __name__, template_folder='templates')
 
+
+@nfe_bp.before_request
+def _iniciar_sonda_sefaz():
+    # 🛰️ Sonda do status da SEFAZ só nos workers que atendem a NF-e
+    sefaz_status.iniciar()
+
 def gerar_chave_acesso(uf, cnpj, modelo, serie, numero_nfe, codigo_numerico):
     """
     Gera a chave de acesso NFC-e (modelo 65) conforme o padrão SEFAZ.
@@ -69,34 +74,11 @@ def formatar_chave_acesso(chave):
     return " ".join(chave_str[i:i+4] for i in range(0, len(chave_str), 4))
 
 
-
-# Inserir o QR Code no XML da NFC-e
-from xml.etree.ElementTree import Element, SubElement, tostring
-from admin.nfe.nfce_qrcode import generate_qrcode_url
-
-
-
-def append_qrcode_to_xml(nfe_xml: Element, access_key: str, ambiente: int, token_id: str, token_value: str):
-    """Adiciona a tag <infNFeSupl> com QR Code e URL de consulta"""
-    inf_supl = SubElement(nfe_xml, "infNFeSupl")
-
-    qrcode_url = generate_qrcode_url(access_key, ambiente, token_id, token_value)
-    qr_tag = SubElement(inf_supl, "qrCode")
-    qr_tag.text = f"<![CDATA[{qrcode_url}]]>"
-
-    url_tag = SubElement(inf_supl, "urlChave")
-    url_tag.text = "https://sat.sef.sc.gov.br/nfce/consulta"
-
-    return nfe_xml
-
-
-
 # cria o gerador de cupom
-import qrcode
-from fpdf import FPDF
-
 def generate_danfe_nfce(invoice_data, qrcode_url, output_file="danfe_nfce.pdf"):
     """Gera o cupom DANFE-NFC-e em PDF (formato simplificado)"""
+    import qrcode
+    from fpdf import FPDF
     
     # Gerar imagem QR Code
     qr_img = qrcode.make(qrcode_url)
@@ -162,11 +144,40 @@ def linha_tracejada(pdf, char="-", count=60):
 
 
 
+# Opções do filtro de status na listagem
+# XML reprovado no schema (admin/nfe/validacao_xsd.py): gere de novo após corrigir
+STATUS_XML_INVALIDO = 'XML_Invalido'
+
+STATUS_OPCOES = [
+    ('N', 'Nova'),
+    ('XML_Assinado', 'XML Assinado'),
+    ('Enviando', 'Enviando'),
+    ('Transmitida', 'Transmitida'),
+    ('Aprovada', 'Autorizada'),
+    ('Denegada', 'Denegada'),
+    ('Rejeitada', 'Rejeitada'),
+    ('Lote_Rejeitado', 'Lote Rejeitado'),
+    ('Contingencia', 'Contingência'),
+    ('XML_Invalido', 'XML Inválido'),
+]
+
 # 📜 Lista
 @nfe_bp.route('/admin/nfe/list')
 def nfe_list():
-    invoices = Invoice.query.order_by(Invoice.issue_date.desc()).all()
-    return render_template('admin/nfe/nfe_list.html', notas=invoices, titulo="Notas Fiscais Emitidas")
+    filtros = ler_filtros()
+    query = aplicar_filtros(
+        Invoice.query.options(db.joinedload(Invoice.client)), filtros,
+        data=Invoice.issue_date,
+        status=Invoice.status,
+        cliente=Invoice.client_id,
+    )
+    pagina = keyset_paginate(query, [Invoice.issue_date, Invoice.id])
+    clientes = Client.query.with_entities(Client.id, Client.name).order_by(Client.name).all()
+    contingencia = (NfeContingencia.query.filter(NfeContingencia.fim.is_(None))
+                    .order_by(NfeContingencia.inicio.desc()).first())
+    return render_template('admin/nfe/nfe_list.html', notas=pagina.items, pagina=pagina,
+                           filtros=filtros, clientes=clientes, status_opcoes=STATUS_OPCOES,
+                           contingencia=contingencia, titulo="Notas Fiscais Emitidas")
 
 # ➕ Criar nova nota
 @nfe_bp.route('/admin/nfe/new', methods=['GET', 'POST'])
@@ -196,37 +207,20 @@ def nfe_create():
         # ================================================================
         # 🔢 GERAÇÃO DO NÚMERO SEQUENCIAL DA NOTA FISCAL
         # ================================================================
-        from admin.nfe.models import InvoiceSequence
-        
+        from admin.nfe.numeracao import alocar_numero, registrar_lacunas
+
         store_id = session['Store']['Id']
         series = 1  # Série padrão da NFC-e
-        
-        # Busca ou cria o registro de sequência para a loja + série
-        invoice_seq = InvoiceSequence.query.filter_by(
-            store_id=store_id,
-            series=series
-        ).first()
-        
-        if invoice_seq:
-            # Incrementa o último número
-            invoice_number = invoice_seq.last_number + 1
-            invoice_seq.last_number = invoice_number
-            invoice_seq.updated_at = datetime.now()
-        else:
-            # Cria o primeiro registro com número inicial 1
-            invoice_number = 1
-            invoice_seq = InvoiceSequence(
-                store_id=store_id,
-                series=series,
-                last_number=int(invoice_number),
-                updated_at=datetime.now()
-            )
-            db.session.add(invoice_seq)
+
+        # Reserva atômica (UPDATE ... RETURNING numa transação própria): duas
+        # emissões simultâneas nunca recebem o mesmo número. Se a nota não for
+        # gravada abaixo, o número vira lacuna para inutilização na SEFAZ.
+        invoice_number = alocar_numero(store_id, series)
 
         # ================================================================
         # 🔹 Geração da chave de acesso dinâmica
         # ================================================================
-        store_data = session.get('Store', {})
+        store_data = loja_atual()
         uf_map = {
             'AC': '12', 'AL': '27', 'AP': '16', 'AM': '13', 'BA': '29',
             'CE': '23', 'DF': '53', 'ES': '32', 'GO': '52', 'MA': '21',
@@ -243,7 +237,9 @@ def nfe_create():
         cnpj_loja = store_data.get('Code', '00000000000000')
         cnpj_numerico = ''.join(filter(str.isdigit, cnpj_loja))[:14].ljust(14, '0')
 
-        codigo_numerico = randint(100000000, 999999999)
+        # 9 dígitos = tpEmis + cNF (8 aleatórios); a contingência troca o tpEmis
+        # na geração do XML (admin/nfe/contingencia.py)
+        codigo_numerico = f"{CFG.TP_EMIS}{randint(0, 99999999):08d}"
 
         chave = gerar_chave_acesso(
             uf=uf_code,
@@ -307,12 +303,13 @@ def nfe_create():
             if order:
                 order.is_invoiced = 'S'  # Marca como Nota Gerada
 
-                # Confirma a transação (criação da Nota, Itens e atualização da Sequência)
+                # Confirma a transação (criação da Nota e Itens; o número já foi reservado)
                 db.session.commit()
                 flash(f"✅ Nota Fiscal nº {invoice_number} (Série {series}) criada com sucesso!", "success")
                 return redirect(url_for('nfe_bp.nfe_list'))
             else:
                 db.session.rollback() 
+                registrar_lacunas(store_id, series, [invoice_number], f"pedido {order_id} não encontrado")
                 print(f"Erro ao criar NFE: Pedido {order_id} não encontrado")
                 flash(f"❌ Erro ao criar Nota Fiscal: Pedido não encontrado.", "danger")
                 return redirect(url_for('nfe_bp.nfe_create'))
@@ -322,6 +319,7 @@ def nfe_create():
             # Em caso de qualquer erro (criação da Nota ou dos Itens), 
             # a transação inteira é desfeita.
             db.session.rollback() 
+            registrar_lacunas(store_id, series, [invoice_number], f"erro ao gravar a nota: {e}")
             print(f"Erro ao criar NFE: {e}")
             flash(f"❌ Erro ao criar Nota Fiscal. Detalhes: {e}", "danger")
             return redirect(url_for('nfe_bp.nfe_create'))
@@ -360,11 +358,13 @@ def nfe_detail(id):
 
 @nfe_bp.route('/invoice_a4/<int:invoice_id>/pdf', methods=['GET'])
 def generate_invoice_a4_pdf(invoice_id):
+    from fpdf import FPDF
+
     # 1. DEFINIÇÃO DAS VARIÁVEIS NO INÍCIO (Resolve o UnboundLocalError)
     invoice = Invoice.query.get_or_404(invoice_id)
     client = Client.query.get(invoice.client_id)
     items = InvoiceItem.query.filter_by(invoice_id=invoice_id).all()
-    store = session.get('Store', {}) # Agora 'store' está disponível para o canhoto
+    store = loja_atual() # Agora 'store' está disponível para o canhoto
 
     # Configuração do PDF
     pdf = FPDF(orientation='P', unit='mm', format='A4')
@@ -537,7 +537,7 @@ def generate_invoice_a4_pdf(invoice_id):
 
         # --- 3. INSCRIÇÃO ESTADUAL E CNPJ ---
     y_id = 70  # Posicionamento abaixo da Natureza da Operação
-    store_data = session.get('Store', {})
+    store_data = loja_atual()
 
     # Função interna para formatar CNPJ (Máscara)
     def format_cnpj(doc):
@@ -553,7 +553,7 @@ def generate_invoice_a4_pdf(invoice_id):
     pdf.cell(63, 3, txt="INSCRIÇÃO ESTADUAL", ln=1)
     pdf.set_font("Helvetica", size=8)
     pdf.set_x(11)
-    # Busca 'State_Registration' da sessão conforme sua nova função parametrosloja()
+    # Busca 'State_Registration' do cache da loja (admin/store_cache.py)
     ie = store_data.get('State_Registration', '')
     pdf.cell(63, 5, txt=str(ie))
 
@@ -1082,6 +1082,8 @@ def generate_invoice_a4_pdf(invoice_id):
 @nfe_bp.route('/invoice/<int:invoice_id>/pdf', methods=['GET'])
 def generate_invoice_pdf(invoice_id):
     """Gera DANFE NFC-e (modelo 65) com alinhamento e QR Code corrigidos"""
+    import qrcode
+    from fpdf import FPDF
 
     invoice = Invoice.query.get(invoice_id)
     if not invoice:
@@ -1091,11 +1093,15 @@ def generate_invoice_pdf(invoice_id):
     client = Client.query.get(invoice.client_id)
     items = InvoiceItem.query.filter_by(invoice_id=invoice_id).all()
 
-    # Gerar URL e imagem do QR Code
-    token_id = CFG.CSC_ID
-    token_value = CFG.CSC_TOKEN
-    ambiente = CFG.AMBIENTE  # 1 = produção, 2 = homologação
-    qrcode_url = generate_qrcode_url(invoice.access_key, ambiente, token_id, token_value)
+    # URL do QR Code: a mesma gravada no XML (off-line leva o DigestValue)
+    qrcode_url = None
+    em_contingencia = invoice.tp_emis == CFG.TP_EMIS_CONTINGENCIA
+    if invoice.xml_path:
+        from admin.nfe.contingencia import qrcode_do_xml
+        qrcode_url = qrcode_do_xml(os.path.join(current_app.root_path, invoice.xml_path))
+    if not qrcode_url:
+        from admin.nfe.services.qr_code import gerar_qrcode_url
+        qrcode_url = gerar_qrcode_url(invoice.access_key, AMBIENTE, CFG.CSC_ID, CFG.CSC_TOKEN)
 
     #qr_img = qrcode.make(qrcode_url)
     #qr_path = f"temp_qrcode_{invoice_id}.png"
@@ -1111,14 +1117,17 @@ def generate_invoice_pdf(invoice_id):
     # 🧾 Cabeçalho
     pdf.set_font("Helvetica", "B", 10)
     pdf.multi_cell(76, 5, txt="DANFE NFC-e\nDocumento Auxiliar da Nota Fiscal do Consumidor Eletrônica", align="C")
+    if em_contingencia:
+        pdf.multi_cell(76, 5, txt="EMITIDA EM CONTINGÊNCIA\nPendente de autorização", align="C")
     pdf.cell(76, 3, txt="-" * 40, ln=True, align="C")
 
     # CNPJ: XX.XXX.XXX/YYYY-ZZ
-    cnpj_emitente = f"{session['Store']['Code'][:2]}.{session['Store']['Code'][2:5]}.{session['Store']['Code'][5:8]}/{session['Store']['Code'][8:12]}-{session['Store']['Code'][12:]}"
-    cep_formatado = f"{session['Store']['Cep origem'][:5]}-{session['Store']['Cep origem'][5:]}"
+    loja = loja_atual()
+    cnpj_emitente = f"{loja['Code'][:2]}.{loja['Code'][2:5]}.{loja['Code'][5:8]}/{loja['Code'][8:12]}-{loja['Code'][12:]}"
+    cep_formatado = f"{loja['Cep origem'][:5]}-{loja['Cep origem'][5:]}"
 
-    endereco_emitente_1 = f"{session['Store']['Address']}, {session['Store']['Number']} - {session['Store']['Neighborhood']}"  
-    endereco_emitente_2 = f"{session['Store']['City']}/{session['Store']['Region']} {cep_formatado}"
+    endereco_emitente_1 = f"{loja['Address']}, {loja['Number']} - {loja['Neighborhood']}"  
+    endereco_emitente_2 = f"{loja['City']}/{loja['Region']} {cep_formatado}"
 
     pdf.set_font("Helvetica", size=8)
     pdf.cell(76, 5, txt="Emitente: JANSSEN APARELHOS AUDITIVOS LTDA", ln=True)
@@ -1209,9 +1218,11 @@ def generate_invoice_pdf(invoice_id):
 def gerar_xml_nfce(id):
     """
     Gera o XML da NFC-e (modelo 65) E ASSINA AUTOMATICAMENTE
+    (montagem, assinatura, QR Code e validação na mesma árvore em memória:
+    admin/nfe/nfce_emissao.py)
     """
     from datetime import datetime
-    from decimal import Decimal
+    from admin.nfe.nfce_emissao import EmissaoNFCe
     
     invoice = Invoice.query.get(id)
     if not invoice:
@@ -1223,273 +1234,112 @@ def gerar_xml_nfce(id):
         return redirect(url_for('nfe_bp.nfe_list'))
 
     # Dados do emitente
-    emitente = session.get("Store")
+    emitente = loja_atual()
     if not emitente:
         flash("❌ Dados do emitente não encontrados", "danger")
         return redirect(url_for('nfe_bp.nfe_list'))
 
-    # ============================================================
-    # 1. GERAÇÃO DO XML (código existente mantido)
-    # ============================================================
-    nfe = etree.Element(
-        "{%s}NFe" % CFG.NAMESPACE,
-        nsmap={None: CFG.NAMESPACE}
-    )
-
-    infNFe = etree.SubElement(
-        nfe,
-        "infNFe",
-        Id=f"NFe{invoice.access_key}",
-        versao="4.00"
-    )
-
-    # TAG IDE
-    ide = etree.SubElement(infNFe, "ide")
-    etree.SubElement(ide, "cUF").text = invoice.access_key[:2]
-    codigo_numerico = invoice.access_key[35:43]
-    etree.SubElement(ide, "cNF").text = codigo_numerico
-    etree.SubElement(ide, "natOp").text = CFG.NATOP
-    etree.SubElement(ide, "mod").text = CFG.MOD
-    etree.SubElement(ide, "serie").text = str(invoice.series)
-    etree.SubElement(ide, "nNF").text = str(invoice.number)
-    dh_emi = invoice.issue_date.strftime('%Y-%m-%dT%H:%M:%S-03:00')
-    etree.SubElement(ide, "dhEmi").text = dh_emi
-    etree.SubElement(ide, "dhSaiEnt").text = dh_emi
-    etree.SubElement(ide, "tpNF").text = CFG.TP_NF
-    etree.SubElement(ide, "idDest").text = CFG.ID_DEST
-    etree.SubElement(ide, "cMunFG").text = CFG.IBGE_CITY_CODE
-    etree.SubElement(ide, "tpImp").text = CFG.TP_IMP
-    etree.SubElement(ide, "tpEmis").text = CFG.TP_EMIS
-    etree.SubElement(ide, "cDV").text = invoice.access_key[-1]
-    etree.SubElement(ide, "tpAmb").text = CFG.TP_AMB
-    etree.SubElement(ide, "finNFe").text = CFG.FIN_NFE
-    etree.SubElement(ide, "indFinal").text = CFG.IND_FINAL
-    etree.SubElement(ide, "indPres").text = CFG.IND_PRES
-    etree.SubElement(ide, "procEmi").text = CFG.PROC_EMI
-    etree.SubElement(ide, "verProc").text = CFG.VER_PROC
-
-    # TAG EMIT
-    emit = etree.SubElement(infNFe, "emit")
-    cnpj = ''.join(filter(str.isdigit, emitente["Code"]))
-    etree.SubElement(emit, "CNPJ").text = cnpj
-    etree.SubElement(emit, "xNome").text = emitente["Name"]
-    etree.SubElement(emit, "xFant").text = CFG.XFANT
-
-    enderEmit = etree.SubElement(emit, "enderEmit")
-    etree.SubElement(enderEmit, "xLgr").text = emitente["Address"]
-    etree.SubElement(enderEmit, "nro").text = str(emitente["Number"])
-    etree.SubElement(enderEmit, "xBairro").text = emitente["Neighborhood"]
-    etree.SubElement(enderEmit, "cMun").text = CFG.IBGE_CITY_CODE
-    etree.SubElement(enderEmit, "xMun").text = emitente["City"]
-    etree.SubElement(enderEmit, "UF").text = emitente["Region"]
-    cep_limpo = ''.join(filter(str.isdigit, emitente["Cep origem"]))
-    etree.SubElement(enderEmit, "CEP").text = cep_limpo
-    etree.SubElement(enderEmit, "cPais").text = "1058"
-    etree.SubElement(enderEmit, "xPais").text = "BRASIL"
-    if emitente.get("Phone"):
-        fone_limpo = ''.join(filter(str.isdigit, emitente["Phone"]))
-        etree.SubElement(enderEmit, "fone").text = fone_limpo
-
-    ie_limpa = ''.join(filter(str.isdigit, emitente["State_Registration"]))
-    etree.SubElement(emit, "IE").text = ie_limpa
-    etree.SubElement(emit, "CRT").text = str(CFG.CRT)
-
-    # TAG DEST
-    client = Client.query.get(invoice.client_id)
-    if client:
-        dest = etree.SubElement(infNFe, "dest")
-        doc_limpo = ''.join(filter(str.isdigit, str(client.code)))
-        if len(doc_limpo) == 11:
-            etree.SubElement(dest, "CPF").text = doc_limpo
-        elif len(doc_limpo) == 14:
-            etree.SubElement(dest, "CNPJ").text = doc_limpo
-        
-        if not doc_limpo:
-            etree.SubElement(dest, "indIEDest").text = "9"
-        else:
-            etree.SubElement(dest, "xNome").text = client.name.upper()
-            enderDest = etree.SubElement(dest, "enderDest")
-            etree.SubElement(enderDest, "xLgr").text = client.address.upper()
-            etree.SubElement(enderDest, "nro").text = str(client.number)
-            etree.SubElement(enderDest, "xBairro").text = client.neighborhood.upper()
-            etree.SubElement(enderDest, "cMun").text = CFG.IBGE_CITY_CODE_CLI
-            etree.SubElement(enderDest, "xMun").text = client.city.upper()
-            etree.SubElement(enderDest, "UF").text = client.region.upper()
-            cep_dest_limpo = ''.join(filter(str.isdigit, str(client.zipcode)))
-            etree.SubElement(enderDest, "CEP").text = cep_dest_limpo
-            etree.SubElement(enderDest, "cPais").text = CFG.CPAIS
-            etree.SubElement(enderDest, "xPais").text = CFG.XPAIS
-            etree.SubElement(dest, "indIEDest").text = CFG.IND_IE_DEST
-
-    # TAG DET (ITENS)
-    total_produtos = Decimal("0.00")
-    total_desconto = Decimal("0.00")
-
-    for index, item in enumerate(invoice.items, start=1):
-        det = etree.SubElement(infNFe, "det", nItem=str(index))
-        prod = etree.SubElement(det, "prod")
-        etree.SubElement(prod, "cProd").text = str(item.product_id)
-        etree.SubElement(prod, "cEAN").text = CFG.CEAN
-        desc_produto = item.product.name.upper()
-        if item.serialnumber:
-            desc_produto += f" S/N: {item.serialnumber}"
-        etree.SubElement(prod, "xProd").text = desc_produto
-        etree.SubElement(prod, "NCM").text = item.ncm or "90214000"
-        etree.SubElement(prod, "CFOP").text = item.cfop or "5102"
-        etree.SubElement(prod, "uCom").text = CFG.UCOM
-        etree.SubElement(prod, "qCom").text = f"{item.quantity:.4f}"
-        etree.SubElement(prod, "vUnCom").text = f"{item.unit_price:.10f}"
-        etree.SubElement(prod, "vProd").text = f"{item.total_price:.2f}"
-        etree.SubElement(prod, "cEANTrib").text = "SEM GTIN"
-        etree.SubElement(prod, "uTrib").text = "UN"
-        etree.SubElement(prod, "qTrib").text = f"{item.quantity:.4f}"
-        etree.SubElement(prod, "vUnTrib").text = f"{item.unit_price:.10f}"
-        
-        if item.discount and item.discount > 0:
-            etree.SubElement(prod, "vDesc").text = f"{item.discount:.2f}"
-            total_desconto += Decimal(str(item.discount))
-        
-        etree.SubElement(prod, "indTot").text = CFG.IND_TOT
-        total_produtos += Decimal(str(item.total_price))
+    # 🚧 Contingência off-line: tpEmis=9 (na chave e no <ide>), dhCont e xJust
+    from admin.nfe.contingencia import contingencia_ativa, chave_com_tp_emis, STATUS_CONTINGENCIA
+    contingencia = contingencia_ativa()
+    tp_emis = CFG.TP_EMIS_CONTINGENCIA if contingencia else CFG.TP_EMIS
+    if invoice.access_key[34] != tp_emis:
+        # Outro tpEmis = outra chave para o mesmo número: só para nota que não
+        # foi à SEFAZ, e a já assinada tem a chave original consultada antes
+        if invoice.status not in ('N', 'Nova', None, 'XML_Assinado'):
+            flash(f"❌ NFC-e {invoice.number} com status {invoice.status}: a chave de acesso não pode "
+                  f"ser trocada para tpEmis={tp_emis}.", "danger")
+            return redirect(url_for('nfe_bp.nfe_list'))
+        if invoice.status == 'XML_Assinado':
+            from admin.nfe.nfce_lote import consultar_chave, CSTAT_NAO_CONSTA
+            from admin.nfe.sefaz_client import cliente_sefaz
+            try:
+                situacao = consultar_chave(cliente_sefaz(AMBIENTE), invoice)
+            except Exception as e:
+                # Assinada e não transmitida (senão estaria Enviando/Transmitida)
+                current_app.logger.warning("⚠️ NFC-e %s sem consulta da chave: %s", invoice.number, e)
+                situacao = None
+            if situacao is not None and situacao['cstat'] != CSTAT_NAO_CONSTA:
+                db.session.commit()
+                flash(f"❌ NFC-e {invoice.number} já consta na SEFAZ com a chave original "
+                      f"({situacao['cstat']} - {situacao['xmotivo']}): não foi reemitida.", "danger")
+                return redirect(url_for('nfe_bp.nfe_list'))
+        invoice.access_key = chave_com_tp_emis(invoice.access_key, tp_emis)
+    invoice.tp_emis = tp_emis
 
-        imposto = etree.SubElement(det, "imposto")
-        v_trib = Decimal(str(item.total_price)) * Decimal(CFG.TX_TRIB)
-        etree.SubElement(imposto, "vTotTrib").text = f"{v_trib:.2f}"
-        
-        icms = etree.SubElement(imposto, "ICMS")
-        csosn = item.csosn or "102"
-        icmssn = etree.SubElement(icms, f"ICMSSN{csosn}")
-        etree.SubElement(icmssn, "orig").text = "0"
-        etree.SubElement(icmssn, "CSOSN").text = csosn
-        
-        pis = etree.SubElement(imposto, "PIS")
-        pis_nt = etree.SubElement(pis, "PISNT")
-        etree.SubElement(pis_nt, "CST").text = CFG.PIS_CST
-        
-        cofins = etree.SubElement(imposto, "COFINS")
-        cofins_nt = etree.SubElement(cofins, "COFINSNT")
-        etree.SubElement(cofins_nt, "CST").text = CFG.COFINS_CST
-
-    # TAG TOTAL
-    total = etree.SubElement(infNFe, "total")
-    icmsTot = etree.SubElement(total, "ICMSTot")
-    etree.SubElement(icmsTot, "vBC").text = "0.00"
-    etree.SubElement(icmsTot, "vICMS").text = "0.00"
-    etree.SubElement(icmsTot, "vICMSDeson").text = "0.00"
-    etree.SubElement(icmsTot, "vFCP").text = "0.00"
-    etree.SubElement(icmsTot, "vBCST").text = "0.00"
-    etree.SubElement(icmsTot, "vST").text = "0.00"
-    etree.SubElement(icmsTot, "vFCPST").text = "0.00"
-    etree.SubElement(icmsTot, "vProd").text = f"{total_produtos:.2f}"
-    etree.SubElement(icmsTot, "vFrete").text = "0.00"
-    etree.SubElement(icmsTot, "vSeg").text = "0.00"
-    
-    if total_desconto > 0:
-        etree.SubElement(icmsTot, "vDesc").text = f"{total_desconto:.2f}"
-    else:
-        etree.SubElement(icmsTot, "vDesc").text = "0.00"
-    
-    etree.SubElement(icmsTot, "vII").text = "0.00"
-    etree.SubElement(icmsTot, "vIPI").text = "0.00"
-    etree.SubElement(icmsTot, "vIPIDevol").text = "0.00"
-    etree.SubElement(icmsTot, "vPIS").text = "0.00"
-    etree.SubElement(icmsTot, "vCOFINS").text = "0.00"
-    etree.SubElement(icmsTot, "vOutro").text = "0.00"
-    v_total_nf = total_produtos - total_desconto
-    etree.SubElement(icmsTot, "vNF").text = f"{v_total_nf:.2f}"
-
-    # TAG TRANSP
-    transp = etree.SubElement(infNFe, "transp")
-    etree.SubElement(transp, "modFrete").text = CFG.MOD_FRETE
-
-    # TAG PAG
-    pag = etree.SubElement(infNFe, "pag")
-    detPag = etree.SubElement(pag, "detPag")
-    etree.SubElement(detPag, "indPag").text = CFG.IND_PAG
-    etree.SubElement(detPag, "tPag").text = CFG.T_PAG
-    etree.SubElement(detPag, "vPag").text = f"{v_total_nf:.2f}"
-
-    # TAG INFADIC
-    infAdic = etree.SubElement(infNFe, "infAdic")
-    texto_simples = f"{CFG.INF_ADIC_TXT_1}{CFG.INF_ADIC_TXT_2}"
-    etree.SubElement(infAdic, "infCpl").text = texto_simples
-
-    # TAG INFNFESUPL (QR CODE)
-    from admin.nfe.services.qr_code import gerar_qrcode_url
-    
-    qrcode_url = gerar_qrcode_url(
-        chave_acesso=invoice.access_key,
-        ambiente=int(CFG.TP_AMB),
-        id_token=CFG.CSC_ID,
-        csc_token=CFG.CSC_TOKEN
-    )
-    
-    infNFeSupl = etree.SubElement(nfe, "infNFeSupl")
-    qrCode = etree.SubElement(infNFeSupl, "qrCode")
-    qrCode.text = etree.CDATA(qrcode_url)
-    
-    urlChave = etree.SubElement(infNFeSupl, "urlChave")
-    if int(CFG.TP_AMB) == 2:
-        urlChave.text = "https://hom.sat.sef.sc.gov.br/nfce/consulta"
-    else:
-        urlChave.text = "https://sat.sef.sc.gov.br/nfce/consulta"
+    emissao = EmissaoNFCe(invoice, emitente, Client.query.get(invoice.client_id), contingencia)
+    os.makedirs("admin/nfe/output", exist_ok=True)
 
     # ============================================================
-    # 2. GERA XML (SEM ASSINATURA) - SALVA PRIMEIRO
+    # 1. SEM CERTIFICADO: SALVA O XML SEM ASSINATURA
     # ============================================================
-    xml_bytes = etree.tostring(
-        nfe,
-        pretty_print=True,
-        xml_declaration=True,
-        encoding="utf-8"
-    )
-
-    # Salva XML sem assinatura (para backup/debug)
-    output_path_sem_assinatura = f"admin/nfe/output/nfce_{invoice.number}.xml"
-    os.makedirs(os.path.dirname(output_path_sem_assinatura), exist_ok=True)
-    
-    with open(output_path_sem_assinatura, "wb") as f:
-        f.write(xml_bytes)
+    pfx_path = CFG.CERT_PFX_PATH
+    pfx_password = CFG.CERT_PFX_PASSWORD
+    if not os.path.exists(pfx_path):
+        output_path_sem_assinatura = f"admin/nfe/output/nfce_{invoice.number}.xml"
+        with open(output_path_sem_assinatura, "wb") as f:
+            f.write(emissao.sem_assinatura())
+        flash(f"⚠️ Certificado não encontrado em: {pfx_path}. XML gerado sem assinatura.", "warning")
+        invoice.xml_path = output_path_sem_assinatura
+        invoice.status = "XML_Gerado_Sem_Assinatura"
+        db.session.commit()
+        return redirect(url_for('nfe_bp.nfe_list'))
 
     # ============================================================
-    # 3. ASSINA O XML AUTOMATICAMENTE
+    # 2. MONTA, ASSINA E GERA O QR CODE (UMA SERIALIZAÇÃO)
     # ============================================================
     try:
-        from admin.nfe.nfce_sign import assinar_xml_nfce
-        
-        pfx_path = CFG.CERT_PFX_PATH
-        pfx_password = CFG.CERT_PFX_PASSWORD
-        
-        # Verifica se certificado existe
-        if not os.path.exists(pfx_path):
-            flash(f"⚠️ Certificado não encontrado em: {pfx_path}. XML gerado sem assinatura.", "warning")
-            invoice.xml_path = output_path_sem_assinatura
-            invoice.status = "XML_Gerado_Sem_Assinatura"
-            db.session.commit()
-            return redirect(url_for('nfe_bp.nfe_list'))
-        
-        # Assina o XML
-        xml_assinado = assinar_xml_nfce(xml_bytes, pfx_path, pfx_password)
-        
-        # Salva XML assinado
-        output_path_assinado = f"admin/nfe/output/nfce_{invoice.number}_assinado.xml"
-        with open(output_path_assinado, "wb") as f:
-            f.write(xml_assinado)
-        
-        # Atualiza banco de dados
-        invoice.xml_path = output_path_assinado
-        invoice.status = "XML_Assinado"
-        db.session.commit()
-        
-        flash(f"✅ XML da NFC-e gerado e assinado com sucesso! Arquivo: {output_path_assinado}", "success")
-        
+        from admin.nfe.certificado import obter_certificado
+        xml_assinado = emissao.emitir(obter_certificado(pfx_path, pfx_password))
     except Exception as e:
         # Se falhar a assinatura, mantém XML sem assinatura
+        output_path_sem_assinatura = f"admin/nfe/output/nfce_{invoice.number}.xml"
+        with open(output_path_sem_assinatura, "wb") as f:
+            f.write(emissao.sem_assinatura())
         flash(f"⚠️ XML gerado, mas erro na assinatura: {e}. XML salvo sem assinatura.", "warning")
         invoice.xml_path = output_path_sem_assinatura
         invoice.status = "XML_Gerado_Erro_Assinatura"
         db.session.commit()
-    
+        return redirect(url_for('nfe_bp.nfe_list'))
+
+    # Schema oficial NF-e 4.00: XML inválido não vai para a SEFAZ nem para a fila
+    erros_xsd = emissao.validar()
+    current_app.logger.info("🧾 NFC-e %s: %s", invoice.number,
+                            ", ".join(f"{etapa} {ms:.1f} ms" for etapa, ms in emissao.tempos.items()))
+
+    # Salva XML assinado
+    output_path_assinado = f"admin/nfe/output/nfce_{invoice.number}_assinado.xml"
+    with open(output_path_assinado, "wb") as f:
+        f.write(xml_assinado)
+
+    # Atualiza banco de dados
+    invoice.xml_path = output_path_assinado
+    if erros_xsd:
+        invoice.status = STATUS_XML_INVALIDO
+        db.session.commit()
+        return render_template(
+            "admin/nfe/nfe_response.html",
+            success=False,
+            message=(f"XML da NFC-e {invoice.number} reprovado no schema da NF-e 4.00 "
+                     f"({len(erros_xsd)} erro(s)). Corrija e gere o XML novamente."),
+            response_text=None,
+            erros_xsd=erros_xsd,
+            titulo="XML Inválido"
+        )
+    if contingencia:
+        # Entra na fila da contingência e o DANFE sai na hora
+        invoice.status = STATUS_CONTINGENCIA
+        invoice.contingency_at = datetime.now()
+        invoice.retry_at = None
+        db.session.commit()
+        contingencia_fila.acordar()
+        flash(f"🚧 NFC-e {invoice.number} emitida em contingência off-line: "
+              f"será transmitida quando a SEFAZ voltar.", "warning")
+        return redirect(url_for('nfe_bp.generate_invoice_pdf', invoice_id=invoice.id))
+    invoice.status = "XML_Assinado"
+    db.session.commit()
+
+    flash(f"✅ XML da NFC-e gerado e assinado com sucesso! Arquivo: {output_path_assinado}", "success")
     return redirect(url_for('nfe_bp.nfe_list'))
 
 
@@ -1510,30 +1360,10 @@ def generate_xml_signed(id):
         return redirect(url_for('nfe_bp.nfe_list'))
     
     try:
-        from admin.nfe.nfce_sign import assinar_xml_nfce
-        
-        # Lê o XML existente (pode ser com ou sem assinatura)
-        with open(invoice.xml_path, 'rb') as f:
-            xml_content = f.read()
+        from admin.nfe.certificado import obter_certificado
+        from admin.nfe.contingencia import STATUS_CONTINGENCIA
+        from admin.nfe.nfce_emissao import reassinar_xml
         
-        # Se já tiver assinatura, remove para re-assinar
-        parser = etree.XMLParser(remove_blank_text=False)
-        root = etree.fromstring(xml_content, parser)
-        
-        # Remove assinatura existente se houver
-        ds_namespace = "http://www.w3.org/2000/09/xmldsig#"
-        for sig in root.findall(f'.//{{{ds_namespace}}}Signature'):
-            root.remove(sig)
-        
-        # Reconverte para bytes
-        xml_sem_assinatura = etree.tostring(
-            root,
-            xml_declaration=True,
-            encoding='utf-8',
-            pretty_print=True
-        )
-        
-        # Assina
         pfx_path = CFG.CERT_PFX_PATH
         pfx_password = CFG.CERT_PFX_PASSWORD
         
@@ -1541,16 +1371,33 @@ def generate_xml_signed(id):
             flash(f"❌ Certificado não encontrado em: {pfx_path}", "danger")
             return redirect(url_for('nfe_bp.nfe_list'))
         
-        xml_assinado = assinar_xml_nfce(xml_sem_assinatura, pfx_path, pfx_password)
+        # Lê o XML existente (com ou sem assinatura): um parse, troca a
+        # assinatura e o QR Code em memória, uma serialização
+        with open(invoice.xml_path, 'rb') as f:
+            emissao = reassinar_xml(f.read(), obter_certificado(pfx_path, pfx_password), invoice)
         
         # Salva com novo nome
         output_path = f"admin/nfe/output/nfce_{invoice.number}_assinado.xml"
         with open(output_path, 'wb') as f:
-            f.write(xml_assinado)
+            f.write(emissao.serializar())
         
         # Atualiza banco
         invoice.xml_path = output_path
-        invoice.status = "XML_Assinado"
+        erros_xsd = emissao.validar()
+        if erros_xsd:
+            invoice.status = STATUS_XML_INVALIDO
+            db.session.commit()
+            return render_template(
+                "admin/nfe/nfe_response.html",
+                success=False,
+                message=(f"XML da NFC-e {invoice.number} re-assinado, mas reprovado no schema "
+                         f"da NF-e 4.00 ({len(erros_xsd)} erro(s)). Gere o XML novamente."),
+                response_text=None,
+                erros_xsd=erros_xsd,
+                titulo="XML Inválido"
+            )
+        # Nota off-line continua na fila da contingência (QR Code com o digest novo)
+        invoice.status = STATUS_CONTINGENCIA if emissao.tp_emis == CFG.TP_EMIS_CONTINGENCIA else "XML_Assinado"
         db.session.commit()
         
         flash(f"✅ XML re-assinado com sucesso! Arquivo: {output_path}", "success")
@@ -1573,6 +1420,9 @@ def generate_xml_signed(id):
 # ================================================================
 @nfe_bp.route("/transmit_nfe/<int:id>", methods=["GET"])
 def transmit_nfe(id):
+    from lxml import etree
+    from admin.nfe.nfce_transmit import transmitir_nfce, SEM_RESPOSTA
+
     invoice = Invoice.query.get_or_404(id)
 
     # Caminho do certificado .pfx
@@ -1612,6 +1462,43 @@ def transmit_nfe(id):
     with open(xml_signed_path, "r", encoding="utf-8") as f:
         xml_assinado = f.read()
 
+    # Schema oficial NF-e 4.00: rejeita aqui, com o caminho do erro, o que a
+    # SEFAZ devolveria como 225 (Falha no Schema XML) depois do envio
+    from admin.nfe.validacao_xsd import validar_xml
+    erros_xsd = validar_xml(xml_assinado)
+    if erros_xsd:
+        invoice.status = STATUS_XML_INVALIDO
+        db.session.commit()
+        return render_template(
+            "admin/nfe/nfe_response.html",
+            success=False,
+            message=(f"XML da NFC-e {invoice.number} reprovado no schema da NF-e 4.00 "
+                     f"({len(erros_xsd)} erro(s)): a nota não foi enviada à SEFAZ."),
+            response_text=None,
+            erros_xsd=erros_xsd,
+            titulo="XML Inválido"
+        )
+
+    # SEFAZ fora pela última consulta de status: não prende o worker no timeout
+    if sefaz_status.disponivel() is False:
+        from admin.nfe.contingencia import entrar_contingencia, JUSTIFICATIVA_STATUS
+        atual = sefaz_status.estado()
+        try:
+            entrar_contingencia(JUSTIFICATIVA_STATUS, automatica=True)
+        except Exception as e:
+            db.session.rollback()
+            flash(f"⚠️ Não foi possível ativar a contingência: {e}", "warning")
+        return render_template(
+            "admin/nfe/nfe_response.html",
+            success=False,
+            message=(f"🚧 SEFAZ fora de operação na última consulta de status "
+                     f"(cStat {atual['cstat'] or '-'}: {atual['xmotivo']}, há {atual['idade_s']:.0f} s). "
+                     "A nota não foi enviada e a contingência off-line está ativa: gere o XML desta nota "
+                     "novamente para emiti-la em contingência e imprimir o DANFE."),
+            response_text=None,
+            titulo="Transmissão Suspensa"
+        )
+
     # Envia conforme AMBIENTE (2=homologação, 1=produção)
     success, message, response_text = transmitir_nfce(
         xml_assinado=xml_assinado,
@@ -1620,6 +1507,41 @@ def transmit_nfe(id):
         ambiente=AMBIENTE
     )
 
+    # Sem resposta da SEFAZ (timeout/rede): próximas notas saem em contingência.
+    # A SEFAZ pode ter recebido esta: a chave é consultada antes de reemiti-la
+    if not success and message == SEM_RESPOSTA:
+        from admin.nfe.contingencia import entrar_contingencia, JUSTIFICATIVA_AUTOMATICA
+        try:
+            entrar_contingencia(JUSTIFICATIVA_AUTOMATICA, automatica=True)
+        except Exception as e:
+            db.session.rollback()
+            flash(f"⚠️ Não foi possível ativar a contingência: {e}", "warning")
+
+        from admin.nfe.nfce_lote import (consultar_chave, CSTAT_NAO_CONSTA, STATUS_ENVIANDO,
+                                         ESPERA_CONSULTA_S)
+        from admin.nfe.sefaz_client import cliente_sefaz
+        try:
+            situacao = consultar_chave(
+                cliente_sefaz(AMBIENTE, str(certificado_path), senha_certificado), invoice)
+        except Exception as e:
+            current_app.logger.warning("⚠️ NFC-e %s sem consulta da chave: %s", invoice.number, e)
+            situacao = None
+        if situacao is not None and situacao['cstat'] == CSTAT_NAO_CONSTA:
+            flash("🚧 SEFAZ sem resposta e a nota não consta na SEFAZ: gere o XML desta nota "
+                  "novamente para emiti-la em contingência e imprimir o DANFE.", "warning")
+        elif invoice.status in ('Aprovada', 'Denegada'):
+            flash(f"✅ A SEFAZ recebeu a nota apesar do timeout: {invoice.status} "
+                  f"({situacao['cstat']} - {situacao['xmotivo']}).", "success")
+        else:
+            # Situação desconhecida: fica 'Enviando' e a chave é consultada de
+            # novo (transmitir_lotes / fila da contingência) antes de outro envio
+            invoice.status = STATUS_ENVIANDO
+            invoice.retry_at = datetime.now() + timedelta(seconds=ESPERA_CONSULTA_S)
+            flash("🚧 SEFAZ sem resposta: não foi possível confirmar se esta nota chegou. Ela fica "
+                  "'Enviando' e a chave será consultada antes de qualquer nova emissão — não gere "
+                  "outro XML. As próximas notas saem em contingência off-line.", "warning")
+        db.session.commit()
+
     # Atualiza nRec e status (se retorno cStat=103)
     if success and response_text:
         try:
@@ -1630,6 +1552,7 @@ def transmit_nfe(id):
                 invoice.nrec = nRec_el.text.strip()
                 invoice.status = "Transmitida" if AMBIENTE == 2 else "Transmitida-Prod"
                 db.session.commit()
+                recibo_poller.acordar()  # 📬 autorização consultada em segundo plano
                 flash(f"✅ NFC-e enviada. Recibo: {invoice.nrec}", "success")
             else:
                 flash("⚠️ Lote recebido, mas número de recibo não veio no retorno.", "warning")
@@ -1648,19 +1571,38 @@ def transmit_nfe(id):
 ### CONSULTAR RECIBO
 @nfe_bp.route("/consultar_recibo/<int:id>")
 def consultar_recibo(id):
+    """
+    Consulta manual do recibo (normalmente o recibo_poller.py já faz isso em
+    segundo plano). Atualiza o status/nprot das notas do lote pelo protNFe.
+    """
     from admin.nfe.nfce_consulta_recibo import consultar_nfce_recibo
+    from admin.nfe.nfce_lote import aplicar_retorno_recibo
 
     invoice = Invoice.query.get_or_404(id)
-    certificado_path = "certificados/JANSSEN_APARELHOS_AUDITIVOS_LTDA56154376000105.pfx"
-    senha_certificado = "123456"
+    if not invoice.nrec:
+        flash("⚠️ Esta NFC-e ainda não tem recibo. Transmita a nota primeiro.", "warning")
+        return redirect(url_for('nfe_bp.nfe_list'))
 
-    nRec = invoice.nrec or "123456789012345"  # se ainda não armazenado
-    success, message, response_text = consultar_nfce_recibo(nRec, certificado_path, senha_certificado)
+    ambiente = 1 if invoice.status == "Transmitida-Prod" else AMBIENTE
+    success, message, response_text = consultar_nfce_recibo(
+        invoice.nrec, CFG.CERT_PFX_PATH, CFG.CERT_PFX_PASSWORD, ambiente=ambiente
+    )
 
-    # Atualiza status da nota se autorizado (simulado)
-    if success and "Autorizado" in (response_text or ""):
-        invoice.status = "Aprovada"
-        db.session.commit()
+    if success and response_text:
+        lote = NfeLote.query.filter_by(nrec=invoice.nrec).first()
+        if lote is None:
+            lote = NfeLote(ambiente=ambiente, quantidade=1, status='recebido', nrec=invoice.nrec)
+            db.session.add(lote)
+        try:
+            cstat, autorizadas, rejeitadas = aplicar_retorno_recibo(lote, response_text)
+            db.session.commit()
+            if cstat == '104':
+                message = f"{message} {autorizadas} autorizada(s), {rejeitadas} rejeitada(s)."
+            else:
+                message = f"{message} SEFAZ: {lote.cstat} - {lote.xmotivo}"
+        except Exception as e:
+            db.session.rollback()
+            success, message = False, f"❌ Retorno da SEFAZ não reconhecido: {e}"
 
     return render_template(
         "admin/nfe/nfe_response.html",
@@ -1670,6 +1612,123 @@ def consultar_recibo(id):
         titulo="Consulta de Recibo NFC-e"
     )
 
+# ================================================================
+# 📦 TRANSMISSÃO EM LOTE (enviNFe com até 50 NFC-e)
+# ================================================================
+@nfe_bp.route("/transmit_nfe_lote", methods=["POST"])
+def transmit_nfe_lote():
+    """Transmite todas as notas assinadas pendentes em lotes (admin/nfe/nfce_lote.py)."""
+    if 'email' not in session:
+        flash('Favor fazer o seu login no sistema primeiro!', 'danger')
+        return redirect(url_for('login', origin='admin'))
+
+    from admin.nfe.nfce_lote import transmitir_lotes
+    from sefaz_status import SefazIndisponivel
+
+    try:
+        lotes = transmitir_lotes(
+            ambiente=AMBIENTE,
+            pfx_path=CFG.CERT_PFX_PATH,
+            senha=CFG.CERT_PFX_PASSWORD,
+            base_dir=current_app.root_path,
+        )
+    except SefazIndisponivel as e:
+        return render_template("admin/nfe/nfe_response.html", success=False,
+                               message=f"🚧 {e}. As notas continuam assinadas e pendentes; "
+                                       "transmita de novo quando a SEFAZ voltar.",
+                               response_text=None, titulo="Transmissão em Lote Suspensa")
+    except Exception as e:
+        db.session.rollback()
+        return render_template("admin/nfe/nfe_response.html", success=False,
+                               message=f"❌ Erro na transmissão em lote: {e}",
+                               response_text=None, titulo="Transmissão em Lote")
+
+    if not lotes:
+        flash("ℹ️ Nenhuma NFC-e assinada pendente de transmissão.", "info")
+        return redirect(url_for('nfe_bp.nfe_list'))
+
+    # Autorização das notas: consultada em segundo plano (recibo_poller.py),
+    # respeitando o tMed informado pela SEFAZ
+    recibo_poller.acordar()
+    linhas = [f"Lote {lote.id}: {lote.quantidade} nota(s) — {lote.status}"
+              f" — cStat {lote.cstat or '-'} {lote.xmotivo or ''}"
+              + (f" — recibo {lote.nrec}" if lote.nrec else "")
+              for lote in lotes]
+
+    enviados = [l for l in lotes if l.status in ('recebido', 'processado')]
+    return render_template(
+        "admin/nfe/nfe_response.html",
+        success=bool(enviados),
+        message=(f"{sum(l.quantidade for l in enviados)} NFC-e enviada(s) em {len(enviados)} lote(s). "
+                 "A autorização é consultada automaticamente em segundo plano."),
+        response_text="\n".join(linhas),
+        titulo=f"Transmissão em Lote ({'Homologação' if AMBIENTE == 2 else 'Produção'})"
+    )
+
+# ================================================================
+# 🚧 CONTINGÊNCIA OFF-LINE (tpEmis=9)
+# ================================================================
+@nfe_bp.route("/admin/nfe/contingencia", methods=["POST"])
+def nfe_contingencia():
+    """Ativa (com justificativa) ou encerra a contingência off-line."""
+    if 'email' not in session:
+        flash('Favor fazer o seu login no sistema primeiro!', 'danger')
+        return redirect(url_for('login', origin='admin'))
+
+    from admin.nfe.contingencia import entrar_contingencia, sair_contingencia
+
+    if request.form.get('acao') == 'sair':
+        sair_contingencia()
+        contingencia_fila.acordar()
+        flash("✅ Contingência encerrada. As notas emitidas off-line seguem na fila até a SEFAZ autorizar.", "success")
+        return redirect(url_for('nfe_bp.nfe_list'))
+
+    try:
+        entrar_contingencia(request.form.get('justificativa', '').upper())
+    except ValueError as e:
+        flash(f"❌ {e}", "danger")
+        return redirect(url_for('nfe_bp.nfe_list'))
+    flash("🚧 Contingência off-line ativada: as próximas NFC-e saem com tpEmis=9 e o DANFE é impresso na hora.", "warning")
+    return redirect(url_for('nfe_bp.nfe_list'))
+
+# ================================================================
+# 🛰️ STATUS DO SERVIÇO DA SEFAZ (sefaz_status.py)
+# ================================================================
+@nfe_bp.route("/admin/nfe/sefaz_status")
+def nfe_sefaz_status():
+    """Último status da SEFAZ em cache e o histórico de latência."""
+    if 'email' not in session:
+        flash('Favor fazer o seu login no sistema primeiro!', 'danger')
+        return redirect(url_for('login', origin='admin'))
+
+    if request.args.get('atualizar'):
+        try:
+            sefaz_status.verificar()
+        except Exception as e:
+            flash(f"❌ Erro ao consultar o status da SEFAZ: {e}", "danger")
+        return redirect(url_for('nfe_bp.nfe_sefaz_status'))
+
+    return render_template(
+        "admin/nfe/sefaz_status.html",
+        titulo="Status da SEFAZ",
+        resumo=sefaz_status.relatorio(),
+        historico=list(reversed(sefaz_status.historico())),
+        ambiente=AMBIENTE,
+    )
+
+
+@nfe_bp.route("/admin/nfe/sefaz_status.json")
+def nfe_sefaz_status_json():
+    if 'email' not in session:
+        return jsonify({'error': 'Não autenticado'}), 401
+    dados = sefaz_status.relatorio()
+    dados['history'] = [
+        {'online': h['online'], 'cstat': h['cstat'], 'reason': h['xmotivo'],
+         'latency_ms': h['latencia_ms'], 'checked_at': h['quando'].isoformat(timespec='seconds')}
+        for h in sefaz_status.historico()
+    ]
+    return jsonify(dados)
+
 # ================================================================
 # 📄 GERENCIAMENTO DE ARQUIVOS XML
 # ================================================================
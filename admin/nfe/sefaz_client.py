@@ -0,0 +1,274 @@
+# admin/nfe/sefaz_client.py
+"""
+Cliente dos web services da SEFAZ (SVRS) com conexões mTLS reaproveitadas.
+
+Antes transmitir_nfce e consultar_nfce_recibo chamavam requests.post direto:
+cada chamada abria TCP + handshake TLS com certificado cliente do zero
+(timeouts fixos de 30 s e 15 s). Agora há uma requests.Session por
+ambiente/certificado, com pool de conexões (HTTPAdapter) e o certificado
+montado uma vez — notas seguidas usam a conexão já aberta (keep-alive).
+Toda chamada passa pela dependência 'svrs' (chamadas_externas.py): limite
+de chamadas simultâneas por worker e disjuntor — com a SVRS fora, post()
+levanta DependenciaIndisponivel na hora em vez de esperar o timeout.
+
+Configuração (variáveis de ambiente):
+    SEFAZ_TIMEOUT_CONEXAO   timeout de conexão em segundos (padrão 5)
+    SEFAZ_TIMEOUT_LEITURA   timeout de leitura em segundos (padrão 30)
+    SEFAZ_POOL_MAXSIZE      conexões mantidas por host (padrão 4)
+    SEFAZ_VERIFY            "1"/"0" valida o certificado do servidor
+                            (padrão: só em produção, como antes)
+
+- cliente_sefaz(ambiente)               → ClienteSefaz do processo (um por ambiente)
+- ClienteSefaz.autorizacao(enviNFe)     → NFeAutorizacao4
+- ClienteSefaz.consultar_recibo(nRec)   → NFeRetAutorizacao4
+- ClienteSefaz.consultar_protocolo(ch)  → NFeConsultaProtocolo4
+- ClienteSefaz.status_servico(cUF)      → NFeStatusServico4
+- ClienteSefaz.post(servico, envelope)  → envelope SOAP já montado
+- relatorio()                           → latência por serviço (para /health)
+"""
+
+import logging
+import os
+import threading
+import time
+
+from config import NFeConfig as CFG
+from admin.nfe.certificado import obter_certificado
+from chamadas_externas import dependencia
+
+logger = logging.getLogger(__name__)
+
+NS_NFE = "http://www.portalfiscal.inf.br/nfe"
+NS_WSDL = "http://www.portalfiscal.inf.br/nfe/wsdl/"
+
+# NFC-e de SC é autorizada pela SVRS. Todos os serviços do mesmo ambiente
+# ficam no mesmo host → uma conexão atende autorização e consultas.
+URLS = {
+    1: {  # produção
+        'autorizacao': "https://nfce.svrs.rs.gov.br/ws/NfeAutorizacao/NFeAutorizacao4.asmx",
+        'ret_autorizacao': "https://nfce.svrs.rs.gov.br/ws/NfeRetAutorizacao/NFeRetAutorizacao4.asmx",
+        'consulta_protocolo': "https://nfce.svrs.rs.gov.br/ws/NfeConsulta/NfeConsulta4.asmx",
+        'status_servico': "https://nfce.svrs.rs.gov.br/ws/NfeStatusServico/NfeStatusServico4.asmx",
+    },
+    2: {  # homologação
+        'autorizacao': "https://nfe-homologacao.svrs.rs.gov.br/ws/NfeAutorizacao/NFeAutorizacao4.asmx",
+        'ret_autorizacao': "https://nfe-homologacao.svrs.rs.gov.br/ws/NfeRetAutorizacao/NFeRetAutorizacao4.asmx",
+        'consulta_protocolo': "https://nfe-homologacao.svrs.rs.gov.br/ws/NfeConsulta/NfeConsulta4.asmx",
+        'status_servico': "https://nfe-homologacao.svrs.rs.gov.br/ws/NfeStatusServico/NfeStatusServico4.asmx",
+    },
+}
+
+# serviço → namespace do <nfeDadosMsg>
+WSDL = {
+    'autorizacao': NS_WSDL + "NFeAutorizacao4",
+    'ret_autorizacao': NS_WSDL + "NFeRetAutorizacao4",
+    'consulta_protocolo': NS_WSDL + "NFeConsultaProtocolo4",
+    'status_servico': NS_WSDL + "NFeStatusServico4",
+}
+
+HEADERS = {"Content-Type": "application/soap+xml; charset=utf-8"}
+
+# Timeout, compartimento e disjuntor da SVRS: chamadas_externas.py
+SEFAZ_TIMEOUT = dependencia('svrs').timeout
+SEFAZ_POOL_MAXSIZE = int(os.getenv("SEFAZ_POOL_MAXSIZE", "4"))
+
+
+def _verify_padrao(ambiente):
+    valor = os.getenv("SEFAZ_VERIFY")
+    if valor is None:
+        return ambiente == 1   # homologação SVRS sem validação SSL, como antes
+    return valor.strip().lower() in ("1", "true", "sim", "yes")
+
+
+def envelope_soap(servico, xml_msg):
+    """Envelope SOAP 1.2 com a mensagem (sem declaração XML) em <nfeDadosMsg>."""
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<soap12:Envelope xmlns:soap12="http://www.w3.org/2003/05/soap-envelope">'
+        '<soap12:Body>'
+        f'<nfeDadosMsg xmlns="{WSDL[servico]}">{xml_msg}</nfeDadosMsg>'
+        '</soap12:Body>'
+        '</soap12:Envelope>'
+    )
+
+
+# ==============================================================================
+# MÉTRICAS POR SERVIÇO
+# ==============================================================================
+
+class _Metricas:
+    def __init__(self):
+        self._dados = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, servico, ms, erro=False):
+        with self._lock:
+            m = self._dados.setdefault(servico, {
+                'chamadas': 0, 'erros': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'ultimo_ms': None,
+            })
+            m['chamadas'] += 1
+            m['erros'] += int(erro)
+            m['total_ms'] += ms
+            m['max_ms'] = max(m['max_ms'], ms)
+            m['ultimo_ms'] = round(ms, 1)
+
+    def relatorio(self):
+        with self._lock:
+            return {
+                servico: {
+                    'chamadas': m['chamadas'],
+                    'erros': m['erros'],
+                    'media_ms': round(m['total_ms'] / m['chamadas'], 1),
+                    'max_ms': round(m['max_ms'], 1),
+                    'ultimo_ms': m['ultimo_ms'],
+                } for servico, m in self._dados.items()
+            }
+
+
+# ==============================================================================
+# CLIENTE
+# ==============================================================================
+
+class ClienteSefaz:
+    """requests.Session com pool mTLS para um ambiente (1=produção, 2=homologação)."""
+
+    def __init__(self, ambiente, pfx_path, senha, timeout=SEFAZ_TIMEOUT,
+                 pool_maxsize=SEFAZ_POOL_MAXSIZE, verify=None, urls=None, externo=None):
+        self.ambiente = ambiente
+        self.externo = externo or dependencia('svrs')
+        self.pfx_path = pfx_path
+        self.senha = senha
+        self.timeout = timeout
+        self.pool_maxsize = pool_maxsize
+        self.verify = _verify_padrao(ambiente) if verify is None else verify
+        self.urls = urls or URLS.get(ambiente, URLS[2])
+        self.metricas = _Metricas()
+        self.sessoes_criadas = 0
+        self._sessao = None
+        self._certificado = None
+        self._lock = threading.Lock()
+
+    def _session(self):
+        """Sessão atual; recriada só se o .pfx for trocado em disco."""
+        certificado = obter_certificado(self.pfx_path, self.senha)
+        if self._sessao is not None and certificado is self._certificado:
+            return self._sessao
+
+        with self._lock:
+            if self._sessao is not None and certificado is self._certificado:
+                return self._sessao
+            import requests  # ⚡ carregado só na primeira chamada à SEFAZ
+            from requests.adapters import HTTPAdapter
+
+            sessao = requests.Session()
+            adaptador = HTTPAdapter(pool_connections=2, pool_maxsize=self.pool_maxsize, max_retries=0)
+            sessao.mount('https://', adaptador)
+            sessao.mount('http://', adaptador)
+            sessao.headers.update(HEADERS)
+            sessao.cert = certificado.arquivos_pem()
+            sessao.verify = self.verify
+            if not self.verify:
+                import urllib3
+                urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+            antiga = self._sessao
+            self._sessao, self._certificado = sessao, certificado
+            self.sessoes_criadas += 1
+        if antiga is not None:
+            logger.info("🔄 SEFAZ: certificado trocado — nova sessão mTLS")
+            antiga.close()
+        return sessao
+
+    def post(self, servico, envelope):
+        """Envia um envelope SOAP já montado; devolve o requests.Response."""
+        url = self.urls[servico]
+        dados = envelope.encode("utf-8") if isinstance(envelope, str) else envelope
+        inicio = time.perf_counter()
+        try:
+            resposta = self.externo.chamar(self._session().post, url, data=dados, timeout=self.timeout)
+        except Exception:
+            self.metricas.registrar(servico, (time.perf_counter() - inicio) * 1000, erro=True)
+            raise
+        ms = (time.perf_counter() - inicio) * 1000
+        self.metricas.registrar(servico, ms, erro=resposta.status_code != 200)
+        logger.info("📡 SEFAZ %s: HTTP %s em %.0f ms", servico, resposta.status_code, ms)
+        return resposta
+
+    def chamar(self, servico, xml_msg):
+        return self.post(servico, envelope_soap(servico, xml_msg))
+
+    # ── Serviços ─────────────────────────────────────────────────────────────
+
+    def autorizacao(self, envi_nfe):
+        return self.chamar('autorizacao', envi_nfe)
+
+    def consultar_recibo(self, nrec):
+        return self.chamar('ret_autorizacao', (
+            f'<consReciNFe xmlns="{NS_NFE}" versao="4.00">'
+            f'<tpAmb>{self.ambiente}</tpAmb><nRec>{nrec}</nRec>'
+            '</consReciNFe>'
+        ))
+
+    def consultar_protocolo(self, chave):
+        return self.chamar('consulta_protocolo', (
+            f'<consSitNFe xmlns="{NS_NFE}" versao="4.00">'
+            f'<tpAmb>{self.ambiente}</tpAmb><xServ>CONSULTAR</xServ><chNFe>{chave}</chNFe>'
+            '</consSitNFe>'
+        ))
+
+    def status_servico(self, cuf="42"):
+        return self.chamar('status_servico', (
+            f'<consStatServ xmlns="{NS_NFE}" versao="4.00">'
+            f'<tpAmb>{self.ambiente}</tpAmb><cUF>{cuf}</cUF><xServ>STATUS</xServ>'
+            '</consStatServ>'
+        ))
+
+    def fechar(self):
+        with self._lock:
+            if self._sessao is not None:
+                self._sessao.close()
+            self._sessao = self._certificado = None
+
+    def relatorio(self):
+        return {
+            'ambiente': self.ambiente,
+            'sessoes_criadas': self.sessoes_criadas,
+            'timeout': list(self.timeout),
+            'servicos': self.metricas.relatorio(),
+        }
+
+
+# ==============================================================================
+# CLIENTES DO PROCESSO
+# ==============================================================================
+
+_clientes = {}
+_lock = threading.Lock()
+
+
+def cliente_sefaz(ambiente=None, pfx_path=None, senha=None):
+    """ClienteSefaz reaproveitado (um por ambiente + certificado, por worker)."""
+    ambiente = int(ambiente or os.getenv("NFE_AMBIENTE", "2"))
+    pfx_path = str(pfx_path or CFG.CERT_PFX_PATH)
+    senha = senha if senha is not None else CFG.CERT_PFX_PASSWORD
+    chave = (ambiente, os.path.abspath(pfx_path), senha)
+    cliente = _clientes.get(chave)
+    if cliente is None:
+        with _lock:
+            cliente = _clientes.get(chave)
+            if cliente is None:
+                cliente = _clientes[chave] = ClienteSefaz(ambiente, pfx_path, senha)
+    return cliente
+
+
+def fechar_clientes():
+    with _lock:
+        for cliente in _clientes.values():
+            cliente.fechar()
+        _clientes.clear()
+
+
+def relatorio():
+    with _lock:
+        clientes = list(_clientes.values())
+    return [c.relatorio() for c in clientes]
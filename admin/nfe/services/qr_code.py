@@ -1,166 +1,83 @@
 """
 Gerador de URL do QR Code para NFC-e conforme padrão SEFAZ
 Nota Técnica 2015.002 versão 1.50
+
+Único lugar onde o QR Code é calculado: emissão (admin/nfe/nfce_emissao.py),
+DANFE e testes usam estas funções.
 """
 
 import hashlib
-from urllib.parse import urlencode
 
+from config import NFeConfig as CFG
 
-def gerar_qrcode_url(chave_acesso, ambiente, id_token, csc_token):
-    """
-    Gera a URL do QR Code para NFC-e (modelo 65)
-    
-    Parâmetros conforme NT 2015.002:
-    - chave_acesso: Chave de acesso da NFC-e (44 dígitos)
-    - ambiente: 1=Produção, 2=Homologação
-    - id_token: ID do CSC (Código de Segurança do Contribuinte)
-    - csc_token: Token do CSC
-    
-    Formato da URL:
-    https://[dominio]/nfce/consulta?p=[chave]|[versao]|[tpAmb]|[cDest]|[dhEmi]|[vNF]|[digVal]|[idToken]|[hash]
-    
-    Onde:
-    - p = parâmetros concatenados por pipe (|)
-    - chave = chave de acesso (44 posições)
-    - versao = versão do QR Code (fixo: 2)
-    - tpAmb = tipo de ambiente (1=Prod, 2=Homolog)
-    - cDest = identificação do destinatário (CNPJ/CPF ou vazio)
-    - dhEmi = data/hora de emissão (vazio para NFC-e - opcional)
-    - vNF = valor da nota (vazio para NFC-e - opcional)
-    - digVal = digest value da assinatura (vazio antes de assinar)
-    - idToken = ID do CSC
-    - hash = SHA-1 dos parâmetros + CSC
-    
-    Retorna: URL completa do QR Code
-    """
-    
-    # Validações básicas
+
+def url_consulta(ambiente):
+    """URL de consulta da NFC-e em SC (base do QR Code e <urlChave>)."""
+    return CFG.URL_QRCODE_PROD if int(ambiente) == 1 else CFG.URL_QRCODE_HOMOLOG
+
+
+def _validar_parametros(chave_acesso, ambiente, id_token, csc_token):
     if not chave_acesso or len(chave_acesso) != 44:
         raise ValueError(f"Chave de acesso inválida: {chave_acesso}")
-    
     if ambiente not in [1, 2]:
         raise ValueError(f"Ambiente inválido: {ambiente}. Use 1 (Produção) ou 2 (Homologação)")
-    
     if not id_token or not csc_token:
         raise ValueError("CSC ID e Token são obrigatórios")
-    
-    # ============================================================
-    # Monta os parâmetros do QR Code
-    # ============================================================
-    
-    # Versão do QR Code (sempre 2 para NFC-e)
-    versao = "2"
-    
-    # Tipo de ambiente
-    tp_amb = str(ambiente)
-    
-    # Identificação do destinatário (vazio para NFC-e sem CPF/CNPJ)
-    # Você pode passar o CPF/CNPJ aqui se desejar, mas é opcional
-    c_dest = ""
-    
-    # Data/hora de emissão (vazio para simplificar - opcional)
-    dh_emi = ""
-    
-    # Valor da nota (vazio para simplificar - opcional)
-    v_nf = ""
-    
-    # Digest Value (vazio antes da assinatura)
-    dig_val = ""
-    
-    # ============================================================
-    # Gera o Hash SHA-1
-    # ============================================================
-    
-    # String para hash: chave|versao|tpAmb|cDest|dhEmi|vNF|digVal|idToken|cscToken
-    # ATENÇÃO: Os campos vazios também entram no hash (com os pipes)
-    parametros_hash = f"{chave_acesso}|{versao}|{tp_amb}|{id_token}|{csc_token}"
-    
-    # Calcula SHA-1
-    hash_sha1 = hashlib.sha1(parametros_hash.encode('utf-8')).hexdigest().upper()
-    
-    # ============================================================
-    # Monta a URL final do QR Code
-    # ============================================================
-    
-    # Parâmetros da URL (sem o CSC Token - ele só entra no hash!)
-    parametros_url = f"{chave_acesso}|{versao}|{tp_amb}|{id_token}|{hash_sha1}"
-    
-    # URL base conforme ambiente
-    if ambiente == 2:
-        url_base = "https://hom.sat.sef.sc.gov.br/nfce/consulta"
-    else:
-        url_base = "https://sat.sef.sc.gov.br/nfce/consulta"
-    
-    # URL completa
-    qrcode_url = f"{url_base}?p={parametros_url}"
-    
-    return qrcode_url
 
 
-def gerar_qrcode_url_completo(chave_acesso, ambiente, id_token, csc_token, 
-                               cpf_cnpj_dest="", dh_emissao="", valor_nf="", digest_value=""):
+def _montar_url(ambiente, parametros, csc_token):
+    """?p=<parâmetros>|<hash>, hash = SHA-1 dos parâmetros seguidos do CSC (sem separador)."""
+    hash_sha1 = hashlib.sha1(f"{parametros}{csc_token}".encode('utf-8')).hexdigest().upper()
+    return f"{url_consulta(ambiente)}?p={parametros}|{hash_sha1}"
+
+
+def gerar_qrcode_url(chave_acesso, ambiente, id_token, csc_token):
     """
-    Versão completa com todos os parâmetros opcionais
-    Use esta versão se precisar incluir CPF/CNPJ do destinatário ou outros dados
-    
-    Parâmetros adicionais:
-    - cpf_cnpj_dest: CPF ou CNPJ do destinatário (sem pontos/traços)
-    - dh_emissao: Data/hora no formato hexadecimal (raramente usado)
-    - valor_nf: Valor da nota formatado (raramente usado)
-    - digest_value: Digest da assinatura (usar após assinar o XML)
+    URL do QR Code da NFC-e emitida on-line (tpEmis=1), NT 2015.002 v1.50
+    (QR Code versão 2):
+
+    ?p=[chave]|2|[tpAmb]|[idToken]|[hash]
+
+    - idToken = ID do CSC sem zeros à esquerda (o schema exige)
+    - hash = SHA-1 dos parâmetros seguidos do CSC (sem separador)
     """
-    
-    # Validações
-    if not chave_acesso or len(chave_acesso) != 44:
-        raise ValueError(f"Chave de acesso inválida: {chave_acesso}")
-    
-    if ambiente not in [1, 2]:
-        raise ValueError(f"Ambiente inválido: {ambiente}")
-    
-    if not id_token or not csc_token:
-        raise ValueError("CSC ID e Token são obrigatórios")
-    
-    # Versão do QR Code
-    versao = "2"
-    tp_amb = str(ambiente)
-    
-    # Limpa CPF/CNPJ (remove caracteres especiais)
-    if cpf_cnpj_dest:
-        cpf_cnpj_dest = ''.join(filter(str.isdigit, cpf_cnpj_dest))
-    
-    # ============================================================
-    # Gera o Hash SHA-1 com TODOS os parâmetros
-    # ============================================================
-    
-    # Monta string para hash (TODOS os campos, mesmo vazios)
-    parametros_hash = (
-        f"{chave_acesso}|{versao}|{tp_amb}|{cpf_cnpj_dest}|"
-        f"{dh_emissao}|{valor_nf}|{digest_value}|{id_token}|{csc_token}"
-    )
-    
-    # Calcula SHA-1
-    hash_sha1 = hashlib.sha1(parametros_hash.encode('utf-8')).hexdigest().upper()
-    
-    # ============================================================
-    # Monta URL
-    # ============================================================
-    
-    # Parâmetros da URL (SEM o CSC Token)
-    parametros_url = (
-        f"{chave_acesso}|{versao}|{tp_amb}|{cpf_cnpj_dest}|"
-        f"{dh_emissao}|{valor_nf}|{digest_value}|{id_token}|{hash_sha1}"
-    )
-    
-    # URL base
-    if ambiente == 2:
-        url_base = "https://hom.sat.sef.sc.gov.br/nfce/consulta"
-    else:
-        url_base = "https://sat.sef.sc.gov.br/nfce/consulta"
-    
-    qrcode_url = f"{url_base}?p={parametros_url}"
-    
-    return qrcode_url
+    _validar_parametros(chave_acesso, ambiente, id_token, csc_token)
+    parametros = f"{chave_acesso}|2|{ambiente}|{int(id_token)}"
+    return _montar_url(ambiente, parametros, csc_token)
+
+
+def gerar_qrcode_url_offline(chave_acesso, ambiente, id_token, csc_token,
+                             dh_emissao, valor_nf, digest_value):
+    """
+    URL do QR Code da NFC-e emitida em contingência offline (tpEmis=9)
+    conforme NT 2015.002 v1.50 (QR Code versão 2):
+
+    ?p=[chave]|2|[tpAmb]|[diaEmi]|[vNF]|[digVal]|[idToken]|[hash]
+
+    - diaEmi = dia (DD) da data de emissão
+    - vNF = valor total da nota com ponto decimal (ex.: 150.00)
+    - digVal = DigestValue da assinatura em hexadecimal (depois de assinar)
+    - idToken = ID do CSC sem zeros à esquerda
+    - hash = SHA-1 dos parâmetros seguidos do CSC (sem separador)
+    """
+    _validar_parametros(chave_acesso, ambiente, id_token, csc_token)
+    if not digest_value:
+        raise ValueError("DigestValue é obrigatório no QR Code offline (assine antes)")
+
+    dia = f"{dh_emissao.day:02d}"
+    v_nf = f"{valor_nf:.2f}"
+    dig_val = digest_value.encode('ascii').hex()
+    parametros = f"{chave_acesso}|2|{ambiente}|{dia}|{v_nf}|{dig_val}|{int(id_token)}"
+    return _montar_url(ambiente, parametros, csc_token)
+
+
+def gerar_qrcode_nfce(chave_acesso, ambiente, id_token, csc_token, tp_emis="1",
+                      dh_emissao=None, valor_nf=None, digest_value=None):
+    """QR Code conforme o tpEmis da nota: off-line (9) com o DigestValue, senão on-line."""
+    if str(tp_emis) == "9":
+        return gerar_qrcode_url_offline(chave_acesso, ambiente, id_token, csc_token,
+                                        dh_emissao, valor_nf, digest_value)
+    return gerar_qrcode_url(chave_acesso, ambiente, id_token, csc_token)
 
 
 def validar_qrcode_url(qrcode_url):
@@ -0,0 +1,182 @@
+# admin/nfe/validacao_xsd.py
+"""
+Validação local do XML da NFC-e contra os schemas oficiais da NF-e 4.00.
+
+Antes o XML só era conferido pela SEFAZ: um grupo fora de ordem ou um valor
+fora do domínio virava rejeição 225 ("Falha no Schema XML") depois do envio,
+sem dizer qual tag estava errada, e a nota ficava presa até alguém comparar
+o arquivo com o leiaute na mão. Agora o XML é validado aqui mesmo, antes de
+salvar (gerar_xml_nfce) e antes de transmitir (transmit_nfe), com o caminho
+exato de cada erro (ex.: NFe/infNFe/det[nItem=2]/imposto/PIS/PISNT/CST).
+
+Os XSD ficam em admin/nfe/schemas/ (pacote de schemas NF-e 4.00 do Portal da
+NF-e, edição de 2025 já com os grupos opcionais de IBS/CBS; ao sair um novo
+pacote, basta substituir os arquivos da pasta). Cada schema é
+compilado uma única vez por processo (lxml.etree.XMLSchema, ~20 ms) e
+reaproveitado por todas as validações (~1 ms por nota).
+
+- validar_xml(xml)          → lista de erros [{linha, caminho, mensagem}]
+                              (vazia = XML válido); xml em bytes, str,
+                              caminho de arquivo ou elemento lxml
+- exigir_xml_valido(xml)    → levanta XmlInvalido com os erros
+- validar_arquivo(caminho)  → idem validar_xml para um arquivo de output/
+- relatorio()               → schemas compilados e tempo de compilação
+
+Validação em lote dos XML de admin/nfe/output: python validar_xml.py
+"""
+
+import os
+import re
+import threading
+import time
+
+SCHEMAS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schemas")
+
+# Elemento raiz → XSD de entrada (os demais são incluídos por ele)
+SCHEMAS = {
+    "NFe": "nfe_v4.00.xsd",
+    "enviNFe": "enviNFe_v4.00.xsd",
+}
+
+_RE_NAMESPACE = re.compile(r"\{https?://[^}]*\}")
+
+
+class XmlInvalido(Exception):
+    """XML reprovado no schema; `erros` traz linha, caminho e mensagem de cada falha."""
+
+    def __init__(self, erros):
+        self.erros = erros
+        primeiro = erros[0] if erros else {"caminho": "-", "mensagem": "XML inválido"}
+        extra = f" (+{len(erros) - 1} erro(s))" if len(erros) > 1 else ""
+        super().__init__(f"{primeiro['caminho']}: {primeiro['mensagem']}{extra}")
+
+
+# ==============================================================================
+# SCHEMAS COMPILADOS (UM POR PROCESSO)
+# ==============================================================================
+
+_schemas = {}            # {raiz: lxml.etree.XMLSchema}
+_compilacao_ms = {}
+_lock = threading.Lock()
+
+
+def schema(raiz="NFe"):
+    """XMLSchema compilado de `raiz` ('NFe' ou 'enviNFe'), criado na 1ª chamada."""
+    compilado = _schemas.get(raiz)
+    if compilado is not None:
+        return compilado
+    if raiz not in SCHEMAS:
+        raise ValueError(f"Sem schema para o elemento <{raiz}>")
+    with _lock:
+        compilado = _schemas.get(raiz)
+        if compilado is None:
+            from lxml import etree  # ⚡ carregado só na primeira validação
+            inicio = time.perf_counter()
+            compilado = etree.XMLSchema(etree.parse(os.path.join(SCHEMAS_DIR, SCHEMAS[raiz])))
+            _compilacao_ms[raiz] = round((time.perf_counter() - inicio) * 1000, 1)
+            _schemas[raiz] = compilado
+    return compilado
+
+
+# ==============================================================================
+# VALIDAÇÃO
+# ==============================================================================
+
+def _documento(xml):
+    from lxml import etree
+    if isinstance(xml, etree._ElementTree):
+        return xml
+    if isinstance(xml, etree._Element):
+        return xml.getroottree()
+    if isinstance(xml, str) and not xml.lstrip().startswith("<"):
+        return etree.parse(xml)   # caminho de arquivo
+    if isinstance(xml, str):
+        xml = xml.encode("utf-8")
+    xml = xml.removeprefix(b"\xef\xbb\xbf").lstrip()
+    return etree.ElementTree(etree.fromstring(xml))
+
+
+def _nome(elemento):
+    return _RE_NAMESPACE.sub("", elemento.tag)
+
+
+def _caminho(documento, xpath):
+    """Caminho legível: NFe/infNFe/det[nItem=2]/imposto/PIS/PISNT/CST."""
+    try:
+        achados = documento.xpath(xpath) if xpath else []
+    except Exception:
+        achados = []
+    if not achados:
+        return xpath or "-"
+
+    partes = []
+    elemento = achados[0]
+    while elemento is not None:
+        nome = _nome(elemento)
+        pai = elemento.getparent()
+        if elemento.get("nItem"):
+            nome += f"[nItem={elemento.get('nItem')}]"
+        elif pai is not None:
+            irmaos = [e for e in pai if e.tag == elemento.tag]
+            if len(irmaos) > 1:
+                nome += f"[{irmaos.index(elemento) + 1}]"
+        partes.append(nome)
+        elemento = pai
+    return "/".join(reversed(partes))
+
+
+def validar_xml(xml, raiz=None, assinado=True):
+    """
+    Valida o XML contra o schema do elemento raiz (NFe ou enviNFe).
+    Devolve a lista de erros — vazia se o XML for válido. Com assinado=False
+    a falta da <Signature> é tolerada (XML salvo antes de assinar).
+    """
+    from lxml import etree
+
+    try:
+        documento = _documento(xml)
+    except (etree.XMLSyntaxError, OSError) as e:
+        return [{"linha": getattr(e, "lineno", None), "caminho": "-", "mensagem": f"XML mal formado: {e}"}]
+
+    raiz = raiz or _nome(documento.getroot())
+    try:
+        compilado = schema(raiz)
+    except ValueError as e:
+        return [{"linha": None, "caminho": raiz, "mensagem": str(e)}]
+
+    if compilado.validate(documento):
+        return []
+    erros = []
+    for erro in compilado.error_log:
+        mensagem = _RE_NAMESPACE.sub("", erro.message)
+        if not assinado and mensagem.endswith("Expected is ( Signature )."):
+            continue
+        erros.append({"linha": erro.line, "caminho": _caminho(documento, erro.path), "mensagem": mensagem})
+    return erros
+
+
+def exigir_xml_valido(xml, raiz=None, assinado=True):
+    """Valida e levanta XmlInvalido se houver erro."""
+    erros = validar_xml(xml, raiz, assinado)
+    if erros:
+        raise XmlInvalido(erros)
+
+
+def validar_arquivo(caminho, raiz=None, assinado=None):
+    """Valida um arquivo; sem `assinado`, só exige <Signature> em *_assinado.xml."""
+    if assinado is None:
+        assinado = str(caminho).endswith("_assinado.xml")
+    return validar_xml(str(caminho), raiz, assinado)
+
+
+def formatar_erros(erros, limite=10):
+    """Texto para flash/tela: uma linha por erro (no máximo `limite`)."""
+    linhas = [f"linha {e['linha'] or '-'} · {e['caminho']}: {e['mensagem']}" for e in erros[:limite]]
+    if len(erros) > limite:
+        linhas.append(f"... e mais {len(erros) - limite} erro(s)")
+    return "\n".join(linhas)
+
+
+def relatorio():
+    with _lock:
+        return {"schemas": sorted(_schemas), "compilacao_ms": dict(_compilacao_ms)}
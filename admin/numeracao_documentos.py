@@ -0,0 +1,98 @@
+# admin/numeracao_documentos.py
+"""
+Numeração de pedidos, orçamentos e recibos sem colisão (DocumentSequence).
+
+Antes order_create, quote_new e receipt_new usavam
+int(datetime.now().strftime('%Y%m%d%H%M%S')) como número: dois documentos
+criados no mesmo segundo recebiam o mesmo número e, como Quote.number e
+Receipt.number são únicos, o segundo INSERT falhava. Uma importação em massa
+não conseguia criar documento algum.
+
+Agora o número continua começando pela data, mas o final vem de um contador
+por tipo de documento + loja + dia, incrementado com um único
+UPDATE ... RETURNING numa transação própria e curta (mesmo esquema da
+numeração das NFC-e em admin/nfe/numeracao.py):
+
+    AAAAMMDD LL NNNNNN   →   2026101801000042
+    data     loja  sequência do dia (até 999.999 por tipo e loja)
+
+A loja entra no número porque a unicidade de quote.number e receipt.number é
+global, não por loja. Um número reservado e não usado (rollback) é só pulado:
+estes documentos não exigem numeração sem lacunas.
+
+- proximo_numero(tipo, store_id)              → um número
+- reservar_numeros(tipo, store_id, quantidade) → lista de números numa só ida
+  ao banco (importações e outros caminhos em massa)
+"""
+
+from datetime import datetime
+
+from extension import db
+from .models import DocumentSequence
+
+# Tipos de documento com numeração própria
+PEDIDO = 'PEDIDO'
+ORCAMENTO = 'ORCAMENTO'
+RECIBO = 'RECIBO'
+TIPOS = (PEDIDO, ORCAMENTO, RECIBO)
+
+DIGITOS_LOJA = 2
+DIGITOS_SEQUENCIA = 6
+MAX_SEQUENCIA = 10 ** DIGITOS_SEQUENCIA - 1
+
+
+def insert_ignorando_conflito(engine, tabela):
+    """INSERT ... ON CONFLICT DO NOTHING no dialeto do banco."""
+    if engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(tabela).on_conflict_do_nothing()
+
+
+def formatar_numero(data, store_id, sequencia):
+    """(data, loja, sequência do dia) → número do documento (inteiro)."""
+    if not 0 < int(store_id) < 10 ** DIGITOS_LOJA:
+        raise ValueError(f"Loja {store_id} não cabe em {DIGITOS_LOJA} dígitos do número")
+    if not 0 < sequencia <= MAX_SEQUENCIA:
+        raise ValueError(f"Sequência {sequencia} fora de 1..{MAX_SEQUENCIA}")
+    return int(f"{data:%Y%m%d}{int(store_id):0{DIGITOS_LOJA}d}{sequencia:0{DIGITOS_SEQUENCIA}d}")
+
+
+def reservar_numeros(tipo, store_id, quantidade=1, data=None, engine=None):
+    """
+    Reserva `quantidade` números consecutivos do tipo + loja no dia `data`
+    (padrão: hoje). Já confirmado no banco ao retornar.
+    """
+    if tipo not in TIPOS:
+        raise ValueError(f"Tipo de documento desconhecido: {tipo}")
+    if quantidade < 1:
+        return []
+    data = data or datetime.now()
+    periodo = data.strftime('%Y%m%d')
+    engine = engine or db.engine
+    tabela = DocumentSequence.__table__
+    incremento = (tabela.update()
+                  .where(tabela.c.doc_type == tipo,
+                         tabela.c.store_id == store_id,
+                         tabela.c.period == periodo)
+                  .values(last_number=tabela.c.last_number + quantidade,
+                          updated_at=datetime.now())
+                  .returning(tabela.c.last_number))
+
+    with engine.begin() as conn:
+        ultimo = conn.execute(incremento).scalar()
+        if ultimo is None:
+            # Primeiro documento do tipo + loja no dia: cria a linha (sem corrida)
+            conn.execute(insert_ignorando_conflito(engine, tabela).values(
+                doc_type=tipo, store_id=store_id, period=periodo,
+                last_number=0, updated_at=datetime.now()))
+            ultimo = conn.execute(incremento).scalar()
+        if ultimo > MAX_SEQUENCIA:
+            # exceção dentro do begin(): o incremento é desfeito
+            raise ValueError(f"Numeração de {tipo} da loja {store_id} esgotada em {periodo}")
+    return [formatar_numero(data, store_id, n) for n in range(ultimo - quantidade + 1, ultimo + 1)]
+
+
+def proximo_numero(tipo, store_id, data=None, engine=None):
+    return reservar_numeros(tipo, store_id, 1, data, engine)[0]
@@ -48,6 +48,14 @@ class Customer_request(Base):
         'Customer_request_item', backref='order', lazy=True, cascade="all, delete-orphan"
     )
 
+    # (is_invoiced, id) → pedidos pendentes de nota em nfe_create
+    # (created_at, id)  → paginação por keyset de order_list
+    __table_args__ = (
+        db.Index('ix_customer_request_invoiced_id', 'is_invoiced', 'id'),
+        db.Index('ix_customer_request_created_id', 'created_at', 'id'),
+        {'schema': 'ouvirtiba'}
+    )
+
 
 class Customer_request_item(Base):
     __tablename__ = 'customer_request_item'
@@ -67,6 +75,11 @@ class Customer_request_item(Base):
     orderitem = db.relationship('Customer_request', backref='ordersitem', lazy=True)
     product = db.relationship('Product', backref='orders', lazy=True)
 
+    __table_args__ = (
+        db.Index('ix_customer_request_item_request', 'customer_request_id'),
+        {'schema': 'ouvirtiba'}
+    )
+
 
 # ==============================================================================
 # ✅ Script de migração — execute UMA vez no banco para adicionar os novos campos
@@ -76,6 +89,10 @@ class Customer_request_item(Base):
 #   ADD COLUMN IF NOT EXISTS issued_at       TIMESTAMP,
 #   ADD COLUMN IF NOT EXISTS supplier_invoice VARCHAR(30);
 # ==============================================================================
+# ✅ Índices (ix_*) declarados nos models — crie no banco com:
+#   python migrar_indices.py          (CREATE INDEX CONCURRENTLY IF NOT EXISTS)
+#   python migrar_indices.py --sql    (só imprime o SQL)
+# ==============================================================================
 
 
 # ==============================================================================
@@ -2,7 +2,10 @@ from flask import Blueprint, session, render_template, redirect, url_for, flash,
 from admin.order.models import Customer_request, Customer_request_item, db
 from admin.client.models import Client
 from admin.models import Product
-import base64, pdfkit.pdfkit, re, unidecode, os
+from admin.store_cache import loja_atual
+from admin.numeracao_documentos import proximo_numero, PEDIDO
+from admin.pagination import keyset_paginate, ler_filtros, aplicar_filtros
+import base64, re, os
 from datetime import datetime
 
 order_bp = Blueprint('order_bp', __name__, template_folder='templates')
@@ -40,6 +43,9 @@ NUM_LABEL = {
     'OVG': 'Número O.S.',
 }
 
+# Opções do filtro de status na listagem
+STATUS_OPCOES = [('N', 'Não Emitido'), ('S', 'Emitido')]
+
 OBS_GARANTIA = (
     "A garantia é válida para não funcionamento de fábrica e não cobre "
     "uso inadequado do aparelho, excesso de umidade, excesso de cerumin, "
@@ -53,10 +59,24 @@ OBS_GARANTIA = (
 
 @order_bp.route('/admin/order/list')
 def order_list():
-    orders = Customer_request.query.order_by(Customer_request.created_at.desc()).all()
+    filtros = ler_filtros()
+    # joinedload: o template lê o.client.code/type/name em todas as linhas
+    query = aplicar_filtros(
+        Customer_request.query.options(db.joinedload(Customer_request.client)), filtros,
+        data=Customer_request.created_at,
+        status=Customer_request.status,
+        doc_type=Customer_request.doc_type,
+        cliente=Customer_request.client_id,
+    )
+    pagina = keyset_paginate(query, [Customer_request.created_at, Customer_request.id])
+    clientes = Client.query.with_entities(Client.id, Client.name).order_by(Client.name).all()
     return render_template(
         'admin/order/order_list.html',
-        orders=orders,
+        orders=pagina.items,
+        pagina=pagina,
+        filtros=filtros,
+        clientes=clientes,
+        status_opcoes=STATUS_OPCOES,
         titulo="Termos / Ordens de Serviço",
         doc_labels=DOC_LABELS,
     )
@@ -68,9 +88,10 @@ def order_list():
 
 @order_bp.route('/admin/order/<int:order_id>/items')
 def orderitem_list(order_id):
-    order = Customer_request.query.get_or_404(order_id)
+    order = Customer_request.query.options(db.joinedload(Customer_request.client)).get_or_404(order_id)
     ordersitem = (
         Customer_request_item.query
+        .options(db.joinedload(Customer_request_item.product))
         .filter_by(customer_request_id=order_id)
         .order_by(Customer_request_item.price.desc())
         .all()
@@ -121,6 +142,7 @@ def order_delete(order_id):
 @order_bp.route('/admin/order/orderpdf/<int:order_id>', methods=['GET', 'POST'])
 def orderpdf(order_id):
     import logging, traceback
+    import pdfkit, unidecode  # ⚡ só carregados ao gerar o PDF
 
     logging.basicConfig(level=logging.DEBUG)
     logger = logging.getLogger(__name__)
@@ -130,13 +152,14 @@ def orderpdf(order_id):
         return redirect(url_for('login', origin='admin'))
 
     try:
-        store_logo   = session['Store']['Logo']
+        store        = loja_atual()
+        store_logo   = store['Logo']
         caminho_logo = 'img/admin/' + store_logo
-        store        = session['Store']
 
         order      = Customer_request.query.get_or_404(order_id)
         ordersitem = (
             Customer_request_item.query
+            .options(db.joinedload(Customer_request_item.product))
             .filter_by(customer_request_id=order_id)
             .order_by(Customer_request_item.price.desc())
             .all()
@@ -373,7 +396,7 @@ def order_create():
             # ── Cria o registro ──────────────────────────────────────────────
             order = Customer_request(
                 store_id=session['Store']['Id'],
-                number=int(datetime.now().strftime('%Y%m%d%H%M%S')),
+                number=proximo_numero(PEDIDO, session['Store']['Id']),
                 doc_type=doc_type,
                 client_id=client_id,
                 issued_at=issued_at,
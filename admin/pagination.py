@@ -0,0 +1,210 @@
+# admin/pagination.py
+"""
+Paginação por keyset (seek) compartilhada pelas listagens do admin.
+
+Em vez de OFFSET (que fica mais lento a cada página) ou de .all() na tabela
+inteira, cada página busca "os próximos N registros depois da chave X", onde
+a chave é uma tupla ordenada e única, por exemplo (created_at, id) ou
+(issue_date, id). O custo da página fica constante com o crescimento da
+tabela, desde que exista índice na mesma ordem.
+
+Uso típico numa rota:
+
+    filtros = ler_filtros()
+    query = aplicar_filtros(Customer_request.query, filtros,
+                            data=Customer_request.created_at,
+                            status=Customer_request.status)
+    pagina = keyset_paginate(query, [Customer_request.created_at, Customer_request.id])
+    return render_template(..., orders=pagina.items, pagina=pagina, filtros=filtros)
+
+Os templates usam as macros de templates/_paginacao.html para montar os
+links "Anterior"/"Próxima" (parâmetros cursor + dir) preservando os filtros.
+"""
+
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import request
+from sqlalchemy import asc, desc, literal, tuple_
+
+PER_PAGE_PADRAO = 50
+PER_PAGE_MAXIMO = 200
+
+
+class KeysetPage:
+    """Resultado de uma página: itens + cursores para a próxima/anterior."""
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+# ==============================================================================
+# CURSOR (valores da chave serializados em base64 url-safe)
+# ==============================================================================
+
+def _serializar(valor):
+    if isinstance(valor, datetime):
+        return {'dt': valor.isoformat()}
+    if isinstance(valor, date):
+        return {'d': valor.isoformat()}
+    if isinstance(valor, Decimal):
+        return {'n': str(valor)}
+    return valor
+
+
+def _desserializar(valor):
+    if isinstance(valor, dict):
+        if 'dt' in valor:
+            return datetime.fromisoformat(valor['dt'])
+        if 'd' in valor:
+            return date.fromisoformat(valor['d'])
+        if 'n' in valor:
+            return Decimal(valor['n'])
+    return valor
+
+
+def encode_cursor(valores):
+    dados = json.dumps([_serializar(v) for v in valores], separators=(',', ':'))
+    return base64.urlsafe_b64encode(dados.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, tamanho):
+    """Retorna a lista de valores do cursor ou None se estiver ausente/inválido."""
+    if not token:
+        return None
+    try:
+        preenchimento = '=' * (-len(token) % 4)
+        dados = json.loads(base64.urlsafe_b64decode(token + preenchimento).decode('utf-8'))
+        valores = [_desserializar(v) for v in dados]
+    except (ValueError, TypeError):
+        return None
+    if len(valores) != tamanho:
+        return None
+    return valores
+
+
+# ==============================================================================
+# PAGINAÇÃO
+# ==============================================================================
+
+def ler_per_page(padrao=PER_PAGE_PADRAO):
+    """Lê ?per_page= da requisição, limitado a PER_PAGE_MAXIMO."""
+    try:
+        per_page = int(request.args.get('per_page', padrao))
+    except (TypeError, ValueError):
+        per_page = padrao
+    return max(1, min(per_page, PER_PAGE_MAXIMO))
+
+
+def keyset_paginate(query, colunas, cursor=None, direcao=None, per_page=None,
+                    descending=True, valores=None):
+    """
+    Pagina `query` pela tupla `colunas` (a última deve ser única, ex.: id).
+
+    - cursor/direcao: vêm de ?cursor= e ?dir=next|prev quando omitidos.
+    - descending: True para "mais recentes primeiro".
+    - valores: função item -> tupla da chave; por padrão lê os atributos das
+      colunas no próprio item (use quando a chave tem colunas de outra tabela).
+    """
+    colunas = list(colunas)
+    if cursor is None:
+        cursor = request.args.get('cursor')
+    if direcao is None:
+        direcao = request.args.get('dir', 'next')
+    if per_page is None:
+        per_page = ler_per_page()
+    if valores is None:
+        valores = lambda item: tuple(getattr(item, c.key) for c in colunas)
+
+    chave = decode_cursor(cursor, len(colunas))
+    voltando = direcao == 'prev' and chave is not None
+
+    # Percorre "para baixo" na ordem pedida; ao voltar, inverte a comparação
+    # e a ordenação e depois reverte os itens da página.
+    decrescente = descending != voltando
+    if chave is not None:
+        alvo = tuple_(*[literal(v) for v in chave])
+        lado = tuple_(*colunas)
+        query = query.filter(lado < alvo if decrescente else lado > alvo)
+
+    ordem = desc if decrescente else asc
+    linhas = (query.order_by(None)
+                   .order_by(*[ordem(c) for c in colunas])
+                   .limit(per_page + 1)
+                   .all())
+
+    sobrou = len(linhas) > per_page
+    itens = linhas[:per_page]
+    if voltando:
+        itens.reverse()
+        tem_anterior, tem_proxima = sobrou, True
+    else:
+        tem_anterior, tem_proxima = chave is not None, sobrou
+
+    next_cursor = encode_cursor(valores(itens[-1])) if itens and tem_proxima else None
+    prev_cursor = encode_cursor(valores(itens[0])) if itens and tem_anterior else None
+    return KeysetPage(itens, per_page, next_cursor, prev_cursor)
+
+
+# ==============================================================================
+# FILTROS
+# ==============================================================================
+
+def ler_filtros():
+    """Lê os filtros comuns das listagens da query string."""
+    def _data(nome):
+        valor = (request.args.get(nome) or '').strip()
+        try:
+            return datetime.strptime(valor, '%Y-%m-%d').date() if valor else None
+        except ValueError:
+            return None
+
+    try:
+        cliente = int(request.args.get('client_id') or 0) or None
+    except ValueError:
+        cliente = None
+
+    return {
+        'data_ini': _data('data_ini'),
+        'data_fim': _data('data_fim'),
+        'status': (request.args.get('status') or '').strip() or None,
+        'doc_type': (request.args.get('doc_type') or '').strip().upper() or None,
+        'client_id': cliente,
+    }
+
+
+def aplicar_filtros(query, filtros, data=None, status=None, doc_type=None, cliente=None):
+    """Aplica à query só os filtros cujas colunas foram informadas."""
+    if data is not None:
+        if filtros.get('data_ini'):
+            query = query.filter(data >= filtros['data_ini'])
+        if filtros.get('data_fim'):
+            # Inclui o dia inteiro da data final
+            fim = datetime.combine(filtros['data_fim'], datetime.max.time())
+            query = query.filter(data <= fim)
+    if status is not None and filtros.get('status'):
+        query = query.filter(status == filtros['status'])
+    if doc_type is not None and filtros.get('doc_type'):
+        query = query.filter(doc_type == filtros['doc_type'])
+    if cliente is not None and filtros.get('client_id'):
+        query = query.filter(cliente == filtros['client_id'])
+    return query
@@ -60,6 +60,8 @@ class PurchaseInvoice(Base):
     # Constraint única: store_id + supplier_id + invoice_number + series
     __table_args__ = (
         db.UniqueConstraint('store_id', 'supplier_id', 'invoice_number', 'series', name='uq_invoice_unique'),
+        # Listagem da loja ordenada por (receipt_date, id)
+        db.Index('ix_purchase_invoice_store_receipt', 'store_id', 'receipt_date', 'id'),
         {'schema': 'ouvirtiba'}
     )
     
@@ -7,6 +7,7 @@ import re, math
 from .models import Supplier, PurchaseInvoice, PurchaseInvoiceItem, db
 from .forms import FormSupplier, FormSupplierUpd, FormPurchaseInvoice, FormPurchaseInvoiceItem
 from admin.models import Product
+from admin.pagination import keyset_paginate, ler_filtros, aplicar_filtros
 
 purchases_bp = Blueprint('purchases_bp', __name__, template_folder='templates')
 
@@ -146,10 +147,14 @@ def invoice_list():
     """Lista todas as notas de entrada da loja."""
     store_id = session.get('store_id')
 
-    invoices = PurchaseInvoice.query.filter_by(store_id=store_id)\
-            .order_by(PurchaseInvoice.receipt_date.desc(), PurchaseInvoice.id.desc()).all()
+    filtros = ler_filtros()
+    query = aplicar_filtros(PurchaseInvoice.query.filter_by(store_id=store_id), filtros,
+                            data=PurchaseInvoice.receipt_date,
+                            status=PurchaseInvoice.status)
+    pagina = keyset_paginate(query, [PurchaseInvoice.receipt_date, PurchaseInvoice.id])
 
-    return render_template('admin/purchases/invoice_list.html', invoices=invoices)
+    return render_template('admin/purchases/invoice_list.html', invoices=pagina.items,
+                           pagina=pagina, filtros=filtros)
 
 
 @purchases_bp.route('/admin/purchases/invoice/create', methods=['GET', 'POST'])
@@ -3,22 +3,26 @@ from admin.quote.models import Quote, QuoteItem, PaymentInstallmentCondition, db
 from admin.client.models import Client
 from admin.models import Product, Store
 from admin.assembly.models import ProductAssembly
+from admin.store_cache import loja_atual
+from admin.numeracao_documentos import proximo_numero, ORCAMENTO
+from admin.pagination import keyset_paginate, ler_filtros, aplicar_filtros
 import base64, os, logging, traceback, re, shutil
 import unidecode
 from datetime import datetime, timedelta
 from sqlalchemy import desc, func
 
-try:
-    import pdfkit
-    PDFKIT_AVAILABLE = True
-except ImportError:
-    pdfkit = None
-    PDFKIT_AVAILABLE = False
-
 quote_bp = Blueprint('quote_bp', __name__, template_folder='templates')
 
 logger = logging.getLogger(__name__)
 
+# Opções do filtro de status na listagem
+STATUS_OPCOES = [
+    ('PENDENTE', 'Pendente'),
+    ('APROVADO', 'Aprovado'),
+    ('RECUSADO', 'Recusado'),
+    ('EXPIRADO', 'Expirado'),
+]
+
 
 # ─────────────────────────────────────────────────────────────
 # HELPER: sale_price mais atual em product_assembly
@@ -165,13 +169,24 @@ def quote_list():
         return redirect(url_for('login', origin='admin'))
 
     store_id = int(session['Store']['Id'])
-    quotes = (
-        Quote.query
+    filtros  = ler_filtros()
+    query    = aplicar_filtros(
+        Quote.query.options(db.joinedload(Quote.client)).filter_by(store_id=store_id), filtros,
+        data=Quote.created_at,
+        status=Quote.status,
+        cliente=Quote.client_id,
+    )
+    pagina   = keyset_paginate(query, [Quote.created_at, Quote.id])
+    clientes = (
+        Client.query
+        .with_entities(Client.id, Client.name)
         .filter_by(store_id=store_id)
-        .order_by(Quote.created_at.desc())
+        .order_by(Client.name)
         .all()
     )
-    return render_template('quote/quote_list.html', quotes=quotes, titulo='Orçamentos')
+    return render_template('quote/quote_list.html', quotes=pagina.items, pagina=pagina,
+                           filtros=filtros, clientes=clientes, status_opcoes=STATUS_OPCOES,
+                           titulo='Orçamentos')
 
 
 # ─────────────────────────────────────────────────────────────
@@ -255,7 +270,7 @@ def quote_create():
             )
 
             quote = Quote(
-                number=int(datetime.now().strftime('%Y%m%d%H%M%S')),
+                number=proximo_numero(ORCAMENTO, store_id),
                 store_id=store_id,
                 client_id=client_id,
                 valid_until=valid_dt,
@@ -326,7 +341,7 @@ def quote_view(quote_id):
         return redirect(url_for('login', origin='admin'))
 
 
-    store        = session['Store']
+    store        = loja_atual()
     store_logo   = store['Logo']
     caminho_logo = 'img/admin/' + store_logo
     store_id     = int(session['Store']['Id'])
@@ -343,7 +358,9 @@ def quote_view(quote_id):
         new_filename = f'orcamento-{quote.number}.pdf'
 
     if request.method == 'POST':
-        if not PDFKIT_AVAILABLE:
+        try:
+            import pdfkit  # ⚡ carregado só ao gerar o PDF
+        except ImportError:
             flash('❌ pdfkit não instalado. Execute: pip install pdfkit', 'danger')
             return redirect(url_for('quote_bp.quote_view', quote_id=quote_id))
 
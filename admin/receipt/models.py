@@ -4,7 +4,11 @@ from datetime import datetime
 
 class Receipt(db.Model):
     __tablename__ = 'receipt'
-    __table_args__ = {'schema': 'ouvirtiba'}
+    # Paginação por keyset da listagem: store_id + (created_at, id)
+    __table_args__ = (
+        db.Index('ix_receipt_store_created_id', 'store_id', 'created_at', 'id'),
+        {'schema': 'ouvirtiba'}
+    )
 
     id             = db.Column(db.Integer, primary_key=True)
     number         = db.Column(db.BigInteger, nullable=False, unique=True)
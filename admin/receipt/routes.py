@@ -3,6 +3,9 @@ from admin.receipt.models import Receipt, ReceiptItem, db
 from admin.client.models import Client
 from admin.models import Product, Category, Store
 from admin.assembly.models import ProductAssembly
+from admin.store_cache import loja_atual
+from admin.numeracao_documentos import proximo_numero, RECIBO
+from admin.pagination import keyset_paginate, ler_filtros, aplicar_filtros
 
 import base64
 import os
@@ -18,6 +21,13 @@ receipt_bp = Blueprint('receipt_bp', __name__, template_folder='templates')
 
 logger = logging.getLogger(__name__)
 
+# Opções do filtro de status na listagem
+STATUS_OPCOES = [
+    ('GERADO', 'Gerado'),
+    ('EMITIDO', 'Emitido'),
+    ('CANCELADO', 'Cancelado'),
+]
+
 
 # ============================================================
 # HELPER — sale_price
@@ -78,13 +88,24 @@ def receipt_list():
         flash('Favor fazer login.', 'danger')
         return redirect(url_for('login', origin='admin'))
     store_id = int(session['Store']['Id'])
-    receipts = (
-        Receipt.query
+    filtros  = ler_filtros()
+    query    = aplicar_filtros(
+        Receipt.query.options(db.joinedload(Receipt.client)).filter_by(store_id=store_id), filtros,
+        data=Receipt.created_at,
+        status=Receipt.status,
+        cliente=Receipt.client_id,
+    )
+    pagina   = keyset_paginate(query, [Receipt.created_at, Receipt.id])
+    clientes = (
+        Client.query
+        .with_entities(Client.id, Client.name)
         .filter_by(store_id=store_id)
-        .order_by(Receipt.created_at.desc())
+        .order_by(Client.name)
         .all()
     )
-    return render_template('receipt/receipt_list.html', receipts=receipts, titulo='Recibos')
+    return render_template('receipt/receipt_list.html', receipts=pagina.items, pagina=pagina,
+                           filtros=filtros, clientes=clientes, status_opcoes=STATUS_OPCOES,
+                           titulo='Recibos')
 
 
 # ============================================================
@@ -141,7 +162,7 @@ def receipt_create():
 
             # Status inicial: GERADO (ainda não emitido fisicamente)
             receipt = Receipt(
-                number=int(datetime.now().strftime('%Y%m%d%H%M%S')),
+                number=proximo_numero(RECIBO, store_id),
                 store_id=store_id,
                 client_id=client_id,
                 issue_date=issue_date,
@@ -205,7 +226,7 @@ def receipt_view(receipt_id):
 
     import pdfkit
 
-    store        = session['Store']
+    store        = loja_atual()
     store_logo   = store['Logo']
     caminho_logo = 'img/admin/' + store_logo
     store_id     = int(session['Store']['Id'])
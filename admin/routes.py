@@ -5,11 +5,14 @@ from admin.client.models import Client
 from .forms import LoginFormulario, RegistrationForm, ProductForm, StoreForm
 from extension import db, bcrypt  # ✅ importa do módulo central
 from utils import login_required
+from .store_cache import get_store_config, loja_atual, invalidar_store_cache
+from .lookup_cache import get_lookup, get_lookup_item, invalidar_lookup
+from .pagination import keyset_paginate
+from .cep_cache import buscar_cep, CepIndisponivel
 
 
 
 import os, secrets
-import requests # Necessário para a API ViaCEP
 from werkzeug.utils import secure_filename # Para o nome seguro do arquivo
 from flask import current_app
 
@@ -89,12 +92,20 @@ def product_list(type_id):
     if type_id is None:
         type_id = 1
 
-    parametrosloja()
+    loja = parametrosloja()
     store_id = session['store_id']
 
-    store_logo = session['Store']['Logo']
-    url_logo = session['Store']['Url logo']
+    store_logo = loja.get('Logo')
+    url_logo = loja.get('Url logo')
+
+    pagina = pagina_produtos(store_id, type_id)
+
+    return render_template('admin/product_list.html', produtos=pagina.items, pagina=pagina,
+                           type_id=type_id)
+
 
+def pagina_produtos(store_id, type_id, cursor=None, direcao=None, per_page=None):
+    """Página (keyset) da listagem de produtos do admin."""
     # type_id=0: lista completa (todos os tipos, com e sem estoque)
     if type_id == 0:
         query = Product.query.filter(
@@ -110,47 +121,40 @@ def product_list(type_id):
         if type_id in [1, 2, 3]:
             query = query.filter(Product.type_id == type_id)
 
-    # Ordena os resultados
-
-    # Ordena os resultados por Marca, Categoria e Nome do Produto
-    produtos = query.join(Brand).join(Category).order_by(
-        Brand.name.asc(),
-        Category.name.asc(),
-        Product.name.asc(),
-        Product.stock.desc(),
-        Product.pub_date.desc()
-    ).all()
-
-    return render_template('admin/product_list.html', produtos=produtos, type_id=type_id)
+    # Ordena os resultados por Marca, Categoria e Nome do Produto (id desempata).
+    # Marca e categoria vêm do próprio JOIN (contains_eager): o cursor leva os
+    # mesmos nomes que o ORDER BY viu, nunca os do cache de lookups (TTL, renomeação)
+    return keyset_paginate(
+        query.join(Product.marca).join(Product.categoria)
+             .options(db.contains_eager(Product.marca), db.contains_eager(Product.categoria)),
+        [Brand.name, Category.name, Product.name, Product.id],
+        descending=False,
+        valores=lambda p: (p.marca.name, p.categoria.name, p.name, p.id),
+        cursor=cursor, direcao=direcao, per_page=per_page,
+    )
 
 
 def parametrosloja():
+    """
+    Retorna os parâmetros da loja logada a partir do cache em memória
+    (admin/store_cache.py). A sessão guarda somente o id da loja.
+    """
     store_id = session['store_id']
-    stores = Store.query.filter_by(id=store_id).first()
-
-    if stores:
-        urllogo = 'img/admin/' + stores.logo
-        urllogowhite = 'img/admin/' + stores.logo_white
-        session['Store'] = {
-            'Cep origem': stores.zipcode,
-            'Taxa frete': stores.freight_rate,
-            'Página': stores.pages,
-            'Id': stores.id,
-            'Name': stores.name,
-            'Logo': stores.logo,
-            'Address': stores.address,
-            'Number': stores.number,
-            'Neighborhood': stores.neighborhood,
-            'City': stores.city,
-            'Region': stores.region,
-            'Phone': stores.phone,
-            'Complement': stores.complement,
-            'Code': stores.code,
-            'Url logo': urllogo,
-            'Url logo_white': urllogowhite,
-            'State_Registration': stores.state_registration
-        }
-    return stores
+    loja = get_store_config(store_id) or {}
+
+    # Sessões antigas ainda carregam o dicionário completo no cookie
+    if loja and len(session.get('Store') or {}) > 1:
+        session['Store'] = {'Id': loja['Id']}
+
+    return loja
+
+
+# ✅ Disponibiliza a loja logada para todos os templates (navbar, DANFE etc.)
+@admin_bp.app_context_processor
+def inject_store_config():
+    if 'store_id' not in session:
+        return {'store_config': {}}
+    return {'store_config': loja_atual()}
 
 
 # ---------------- LOGIN ----------------
@@ -324,7 +328,7 @@ def produto_editar(id):
 
         # --- Atualiza o nome da cor (coluna colors) ---
         color_id = int(request.form.get('cor', produto.color_id))
-        color = Color.query.get(color_id)
+        color = get_lookup_item(Color, color_id)
         if color and color.name != produto.colors:
             produto.colors = color.name
             campos_alterados = True
@@ -384,11 +388,11 @@ def produto_editar(id):
     print('⚠️ Validação falhou no POST' if request.method == 'POST' else '')
 
     # --- GET: exibe formulário com dados atuais ---
-    marcas = Brand.query.all()
-    categorias = Category.query.all()
-    cores = Color.query.all()
-    tamanhos = Size.query.all()
-    embalagens = Packaging.query.all()
+    marcas = get_lookup(Brand)
+    categorias = get_lookup(Category)
+    cores = get_lookup(Color)
+    tamanhos = get_lookup(Size)
+    embalagens = get_lookup(Packaging)
 
     return render_template(
         'admin/product_upd.html',
@@ -426,11 +430,11 @@ def produto_inserir(type_id):
         form.tipoproduto.data = type_id 
 
     # Carregamento de dados para o formulário
-    marcas = Brand.query.all()
-    categorias = Category.query.all()
-    cores = Color.query.all()
-    tamanhos = Size.query.all()
-    embalagens = Packaging.query.all()
+    marcas = get_lookup(Brand)
+    categorias = get_lookup(Category)
+    cores = get_lookup(Color)
+    tamanhos = get_lookup(Size)
+    embalagens = get_lookup(Packaging)
 
     if form.validate_on_submit():
         try:
@@ -444,7 +448,7 @@ def produto_inserir(type_id):
             # Tratamento da Cor
             color_name = "Não informada"
             if color_id:
-                cor_obj = Color.query.get(color_id)
+                cor_obj = get_lookup_item(Color, color_id)
                 if cor_obj:
                     color_name = cor_obj.name
 
@@ -580,6 +584,7 @@ def brand_insert():
             nova_marca = Brand(name=descricao, store_id=store_id)
             db.session.add(nova_marca)
             db.session.commit()
+            invalidar_lookup(Brand)
             flash(f'A marca "{descricao}" foi cadastrada com sucesso!', 'success')
             return redirect(url_for('admin.brand_list'))
 
@@ -602,6 +607,7 @@ def brand_update(brand_id):
         else:
             marca.name = nova_descricao
             db.session.commit()
+            invalidar_lookup(Brand)
             flash('Marca atualizada com sucesso!', 'success')
             return redirect(url_for('admin.brand_list'))
 
@@ -620,6 +626,7 @@ def brand_delete(brand_id):
     try:
         db.session.delete(marca)
         db.session.commit()
+        invalidar_lookup(Brand)
         flash(f'A marca "{marca.name}" foi excluída com sucesso!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -662,6 +669,7 @@ def category_insert():
             nova_categoria = Category(name=descricao, store_id=store_id)
             db.session.add(nova_categoria)
             db.session.commit()
+            invalidar_lookup(Category)
             flash(f'A categoria "{descricao}" foi cadastrada com sucesso!', 'success')
             return redirect(url_for('admin.category_list'))
 
@@ -685,6 +693,7 @@ def category_update(category_id):
         else:
             categoria.name = nova_descricao
             db.session.commit()
+            invalidar_lookup(Category)
             flash('Categoria atualizada com sucesso!', 'success')
             return redirect(url_for('admin.category_list'))
 
@@ -705,6 +714,7 @@ def category_delete(category_id):
         nome_categoria = categoria.name # Salva o nome para a mensagem
         db.session.delete(categoria)
         db.session.commit()
+        invalidar_lookup(Category)
         flash(f'A categoria "{nome_categoria}" foi excluída com sucesso!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -758,6 +768,7 @@ def color_ins(): # Rota padronizada
             nova_cor = Color(name=descricao, store_id=store_id)
             db.session.add(nova_cor)
             db.session.commit()
+            invalidar_lookup(Color)
             flash(f'A cor "{descricao}" foi cadastrada com sucesso!', 'success')
             return redirect(url_for('admin.color_list'))
 
@@ -784,6 +795,7 @@ def color_upd(color_id): # Rota padronizada
             cor.name = nova_descricao
             # REMOVIDA: A linha que tentava atualizar cor.html_code
             db.session.commit()
+            invalidar_lookup(Color)
             flash('Cor atualizada com sucesso!', 'success')
             return redirect(url_for('admin.color_list'))
 
@@ -805,6 +817,7 @@ def color_del(color_id): # Rota padronizada
         nome_cor = cor.name
         db.session.delete(cor)
         db.session.commit()
+        invalidar_lookup(Color)
         flash(f'A cor "{nome_cor}" foi excluída com sucesso!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -852,6 +865,7 @@ def size_ins():
             novo_tamanho = Size(name=descricao, store_id=store_id)
             db.session.add(novo_tamanho)
             db.session.commit()
+            invalidar_lookup(Size)
             flash(f'O tamanho "{descricao}" foi cadastrado com sucesso!', 'success')
             return redirect(url_for('admin.size_list'))
 
@@ -876,6 +890,7 @@ def size_upd(size_id):
         else:
             tamanho.name = nova_descricao
             db.session.commit()
+            invalidar_lookup(Size)
             flash('Tamanho atualizado com sucesso!', 'success')
             return redirect(url_for('admin.size_list'))
 
@@ -896,6 +911,7 @@ def size_del(size_id):
         nome_tamanho = tamanho.name
         db.session.delete(tamanho)
         db.session.commit()
+        invalidar_lookup(Size)
         flash(f'O tamanho "{nome_tamanho}" foi excluído com sucesso!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -956,6 +972,7 @@ def packaging_ins():
             db.session.add(nova_embalagem)
             flash(f'A embalagem {format_name} foi cadastrada com sucesso!', 'success')
             db.session.commit()
+            invalidar_lookup(Packaging)
         except Exception as erro:
             db.session.rollback()
             flash(f'A embalagem {format_name}|{erro} não foi cadastrado, verifique se a mesma já foi cadastrada!', 'success')
@@ -1006,6 +1023,7 @@ def packaging_upd(packaging_id):
             embalagem.width = nwi_float
             
             db.session.commit()
+            invalidar_lookup(Packaging)
             flash('Embalagem atualizada com sucesso!', 'success')
             return redirect(url_for('admin.packaging_list'))
             
@@ -1040,6 +1058,7 @@ def packaging_del(packaging_id):
 
         db.session.delete(embalagem)
         db.session.commit()
+        invalidar_lookup(Packaging)
         # 3. Usa a descrição completa na mensagem de sucesso
         flash(f'A embalagem "{descricao_completa}" foi excluída com sucesso!', 'success')
     except Exception as e:
@@ -1064,37 +1083,29 @@ def store_list():
 
     return render_template('admin/store_list.html', stores=stores, titulo='Lojas Cadastradas')
 
-# Busca CEP
+# Busca CEP (memória → tabela cep_cache → ViaCEP; ver admin/cep_cache.py)
 @admin_bp.route('/api/busca_cep/<cep>')
 def busca_cep(cep):
     if not cep or len(cep) != 8 or not cep.isdigit():
         return jsonify({'erro': 'CEP inválido'}), 400
 
     try:
-        # URL da API ViaCEP
-        url = f'https://viacep.com.br/ws/{cep}/json/'
-        response = requests.get(url)
-        data = response.json()
-
-        if data.get('erro'):
-            return jsonify({'erro': 'CEP não encontrado'}), 404
-
-        # Retorna apenas os campos relevantes para o formulário
-        return jsonify({
-            'address': data.get('logradouro'),
-            'neighborhood': data.get('bairro'),
-            'city': data.get('localidade'),
-            'region': data.get('uf'), # UF é a região (estado)
-            'complement': data.get('complemento')
-        }), 200
-
-    except requests.exceptions.RequestException:
-        # Erro de conexão
-        return jsonify({'erro': 'Erro de conexão com a API ViaCEP'}), 500
+        dados = buscar_cep(cep)
+    except CepIndisponivel:
+        # ViaCEP fora do ar e CEP sem cache: o formulário libera o preenchimento manual
+        return jsonify({'erro': 'Erro de conexão com a API ViaCEP'}), 503
     except Exception as e:
         # Outros erros
         return jsonify({'erro': f'Erro inesperado: {e}'}), 500
 
+    if dados is None:
+        return jsonify({'erro': 'CEP não encontrado'}), 404
+
+    # Retorna apenas os campos relevantes para o formulário
+    resposta = jsonify(dados)
+    resposta.headers['Cache-Control'] = 'private, max-age=86400'
+    return resposta, 200
+
 @admin_bp.route('/store/ins', methods=['GET', 'POST'])
 @login_required
 def store_ins():
@@ -1161,6 +1172,7 @@ def store_ins():
 
             db.session.add(nova_loja)
             db.session.commit()
+            invalidar_store_cache(nova_loja.id)
             flash(f'A loja "{nova_loja.name}" foi cadastrada com sucesso!', 'success')
             return redirect(url_for('admin.store_list'))
 
@@ -1238,6 +1250,7 @@ def store_upd(store_id):
         if campos_alterados:
             try:
                 db.session.commit()
+                invalidar_store_cache(store.id)
                 flash(f'A loja "{store.name}" foi atualizada com sucesso!', 'success')
                 return redirect(url_for('admin.store_list'))
             except Exception as e:
@@ -1294,6 +1307,7 @@ def store_del(store_id):
         nome_loja = store.name
         db.session.delete(store)
         db.session.commit()
+        invalidar_store_cache(store_id)
         flash(f'A Loja "{nome_loja}" foi excluída com sucesso!', 'success')
 
     except Exception as e:
@@ -0,0 +1,93 @@
+# admin/store_cache.py
+"""
+Cache dos parâmetros da loja (tabela ouvirtiba.store) por processo.
+
+Antes, cada página do admin executava Store.query e regravava o dicionário
+completo em session['Store'], que ia no cookie assinado a cada resposta.
+Agora os dados ficam em memória no worker, indexados pelo id da loja, e a
+sessão guarda apenas {'Id': store_id}.
+
+- get_store_config(store_id) → dicionário com as mesmas chaves de antes
+  ('Cep origem', 'Code', 'Url logo', ...) ou None se a loja não existir.
+- loja_atual() → configuração da loja do usuário logado.
+- invalidar_store_cache(store_id) → chamada após store_ins/store_upd/store_del.
+
+Cada worker do gunicorn tem seu próprio cache; por isso as entradas expiram
+após STORE_CACHE_TTL segundos, garantindo que os demais workers enxerguem
+alterações feitas em outro processo.
+"""
+
+import threading
+import time
+
+from flask import session, has_request_context
+
+from extension import db
+from .models import Store
+
+STORE_CACHE_TTL = 300  # segundos
+
+_cache = {}              # {store_id: (expira_em, config)}
+_lock = threading.Lock()
+
+
+def _montar_config(store):
+    """Converte o registro Store no dicionário usado pelas rotas e templates."""
+    return {
+        'Cep origem': store.zipcode,
+        'Taxa frete': store.freight_rate,
+        'Página': store.pages,
+        'Id': store.id,
+        'Name': store.name,
+        'Logo': store.logo,
+        'Address': store.address,
+        'Number': store.number,
+        'Neighborhood': store.neighborhood,
+        'City': store.city,
+        'Region': store.region,
+        'Phone': store.phone,
+        'Complement': store.complement,
+        'Code': store.code,
+        'Url logo': 'img/admin/' + (store.logo or ''),
+        'Url logo_white': 'img/admin/' + (store.logo_white or ''),
+        'State_Registration': store.state_registration
+    }
+
+
+def get_store_config(store_id):
+    """Retorna a configuração da loja, consultando o banco só em cache miss."""
+    if not store_id:
+        return None
+    store_id = int(store_id)
+    agora = time.monotonic()
+
+    with _lock:
+        entrada = _cache.get(store_id)
+    if entrada and entrada[0] > agora:
+        return dict(entrada[1])
+
+    store = db.session.get(Store, store_id)
+    if store is None:
+        return None
+
+    config = _montar_config(store)
+    with _lock:
+        _cache[store_id] = (agora + STORE_CACHE_TTL, config)
+    return dict(config)
+
+
+def loja_atual():
+    """Configuração da loja do usuário logado (ou dicionário vazio)."""
+    if not has_request_context():
+        return {}
+    store_id = session.get('store_id') or (session.get('Store') or {}).get('Id')
+    return get_store_config(store_id) or {}
+
+
+def invalidar_store_cache(store_id=None):
+    """Remove uma loja do cache (ou todas, se store_id for None)."""
+    with _lock:
+        if store_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(int(store_id), None)
@@ -1,13 +1,11 @@
-from flask import Flask, render_template, request, redirect, flash, send_from_directory
-
-# Inclusão banco de dados POSTGRESQL
-from flask_sqlalchemy import SQLAlchemy 
+from flask import Flask, render_template, request, redirect, flash, send_from_directory, jsonify, abort, make_response, current_app
 
 # Inclusão ENDPOINT para manter ativo o SUPABASE
 from sqlalchemy import text
 
-import resend  # ✅ NOVA BIBLIOTECA
 import os
+import sys
+import time
 import logging
 import re as _re
 
@@ -23,95 +21,152 @@ resend_api_key = os.getenv('RESEND_API_KEY')
 email_from = os.getenv('EMAIL_FROM', 'contato@ouvirtiba.com.br')
 email_to = os.getenv('EMAIL_TO', 'roeland.e.janssen@gmail.com')
 
-# Configurar Resend
+# ⚡ O SDK do Resend (requests + certifi) só é importado ao enviar o e-mail
 if resend_api_key:
-    resend.api_key = resend_api_key
     logger.info("✅ Resend API configurada com sucesso")
 else:
     logger.warning("⚠️ RESEND_API_KEY não encontrada no .env")
 
-
-app = Flask(__name__)
-app.secret_key = 'roeland'  # Necessária para flash()
-
-########################## Inclusão com banco de dados ##########################
-# 🔹 Configurar banco PostgreSQL (Supabase ou local)
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'minha_chave_padrao')
-app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'prepare_threshold': None}}  # Fix psycopg3 DuplicatePreparedStatement em produção
-
-# 🔹 Importar e inicializar banco e módulo admin
-from extension import db, bcrypt         # ✅ adicionado
-from admin import init_app as init_admin
-from admin.client.routes import client_bp
-from admin.order.routes import order_bp
-from admin.nfe.routes import nfe_bp
-from admin.blog_post.routes import blog_bp
-from admin.purchases import purchases_bp
-from admin.image.routes import image_bp
-from admin.assembly.routes import assembly_bp
+from extension import db, bcrypt, profiler, pool_monitor, page_cache, email_outbox, recibo_poller, contingencia_fila, sefaz_status  # ✅ adicionado
+from db_pool import engine_options
+import chamadas_externas
 from admin.blog_post.models import BlogPost
-from admin.receipt.routes import receipt_bp
-from admin.quote.routes   import quote_bp
-
-db.init_app(app)
-bcrypt.init_app(app)  # ✅ adiciona essa linha
-
-init_admin(app)
-app.register_blueprint(client_bp)       
-app.register_blueprint(order_bp)
-app.register_blueprint(nfe_bp)
-app.register_blueprint(blog_bp)
-app.register_blueprint(purchases_bp)
-app.register_blueprint(image_bp)
-app.register_blueprint(assembly_bp)
-app.register_blueprint(receipt_bp)
-app.register_blueprint(quote_bp)
-
-
-######################## Término Inclusão com banco de dados #####################
-
-# ENDPOINT para manter ativo o SUPABASE free
-@app.route("/keep-alive")
-def keep_alive():
+from admin.blog_post.conteudo import limpar_html_word
+from admin.blog_post.listagem import pagina_blog, cursor_valido, contar_posts_ativos, post_para_dict
+from sitemap_xml import sitemap_documento
+
+
+# ==============================================================================
+# ✅ APPLICATION FACTORY
+# ==============================================================================
+# No plano gratuito do Render a instância "dorme" e cada wake-up paga o import
+# completo do app. As bibliotecas pesadas (lxml, fpdf, qrcode, cryptography,
+# pdfkit, resend, requests) são importadas dentro das rotas que as usam; aqui
+# ficam só o Flask, as extensões e o registro dos blueprints.
+# Medição: python bench_startup.py
+
+def create_app():
+    app = Flask(__name__)
+    app.secret_key = 'roeland'  # Necessária para flash()
+
+    ########################## Inclusão com banco de dados ##########################
+    # 🔹 Configurar banco PostgreSQL (Supabase ou local)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'minha_chave_padrao')
+    # 🔹 Pool: tamanho, pre_ping, recycle e perfil PgBouncer (ver db_pool.py)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'] or '')
+
+    # 🔹 Importar e inicializar banco e módulo admin
+    from admin import init_app as init_admin
+    from admin.client.routes import client_bp
+    from admin.order.routes import order_bp
+    from admin.nfe.routes import nfe_bp
+    from admin.blog_post.routes import blog_bp
+    from admin.purchases import purchases_bp
+    from admin.image.routes import image_bp
+    from admin.assembly.routes import assembly_bp
+    from admin.receipt.routes import receipt_bp
+    from admin.quote.routes   import quote_bp
+
+    db.init_app(app)
+    bcrypt.init_app(app)  # ✅ adiciona essa linha
+    profiler.init_app(app, db)  # ⏱️ Server-Timing + log por requisição (PROFILER_SLOW_MS)
+    pool_monitor.init_app(app, db)  # 🔌 warm-up do pool (DB_POOL_WARMUP) + métricas do /health
+    page_cache.init_app(app)  # 📄 cache das páginas públicas (PAGE_CACHE_BACKEND)
+    email_outbox.init_app(app, db)  # 📤 envio dos e-mails do contato em segundo plano
+    recibo_poller.init_app(app, db)  # 📬 autorização das NFC-e transmitidas sem clique manual
+    contingencia_fila.init_app(app, db)  # 🚧 NFC-e off-line transmitidas quando a SEFAZ voltar
+    sefaz_status.init_app(app)  # 🛰️ SEFAZ fora detectada antes da transmissão
+
+    init_admin(app)
+    app.register_blueprint(client_bp)
+    app.register_blueprint(order_bp)
+    app.register_blueprint(nfe_bp)
+    app.register_blueprint(blog_bp)
+    app.register_blueprint(purchases_bp)
+    app.register_blueprint(image_bp)
+    app.register_blueprint(assembly_bp)
+    app.register_blueprint(receipt_bp)
+    app.register_blueprint(quote_bp)
+    ######################## Término Inclusão com banco de dados #####################
+
+    # 🔹 Rotas do site público (mesmos endpoints de antes: url_for('home') etc.)
+    for regra, view, metodos in ROTAS_SITE:
+        app.add_url_rule(regra, view_func=view, methods=metodos)
+
+    return app
+
+
+# ENDPOINT de saúde: mantém o SUPABASE free ativo (SELECT 1) e mostra o pool
+# de conexões deste worker em JSON. /keep-alive continua valendo (cron-job.org).
+def health():
+    inicio = time.perf_counter()
     try:
         db.session.execute(text("SELECT 1"))
         db.session.commit()
-        return "OK", 200
+        status, codigo, erro = 'ok', 200, None
     except Exception as e:
-        import traceback
-        erro_detalhado = traceback.format_exc()
-        print("KEEP ALIVE ERROR:", erro_detalhado)
-        return f"ERROR: {str(e)}", 500  # Retorna o erro no navegador
+        db.session.rollback()
+        logger.error(f"❌ HEALTH ERROR: {e}")
+        status, codigo, erro = 'erro', 503, str(e)
+
+    dados = {'status': status, 'ping_ms': round((time.perf_counter() - inicio) * 1000, 1)}
+    if erro:
+        dados['erro'] = erro
+    dados.update(pool_monitor.relatorio())
+    dados['email_outbox'] = email_outbox.relatorio()
+    dados['recibos'] = recibo_poller.relatorio()
+    dados['contingencia'] = contingencia_fila.relatorio()
+    dados['sefaz_status'] = sefaz_status.relatorio()
+    dados['externos'] = chamadas_externas.relatorio()
+    # Latência da SEFAZ só se o worker já falou com ela (sem importar o módulo aqui)
+    sefaz = sys.modules.get('admin.nfe.sefaz_client')
+    if sefaz is not None:
+        dados['sefaz'] = sefaz.relatorio()
+    return jsonify(dados), codigo
 
-@app.route('/hello-world')
 def redirect_hello():
     return redirect("/", code=301)
 
-@app.route('/googlec4c2cad7f9951bca.html')
 def google_verify():
     return "google-site-verification: googlec4c2cad7f9951bca.html", 200, {'Content-Type': 'text/plain'}
 
-@app.route('/robots.txt')
 def robots():
     return send_from_directory('static', 'robots.txt')
 
-@app.route('/sitemap.xml')
+# sitemap.xml gerado das rotas públicas + posts ativos e guardado em memória
+# até um post mudar (sitemap_xml.py). Com muitos posts vira sitemap index.
 def sitemap():
-    with open('static/sitemap.xml', 'r', encoding='utf-8') as f:
-        xml_content = f.read()
-    return xml_content, 200, {'Content-Type': 'application/xml'}
-
-@app.route('/')
+    return _resposta_sitemap(0)
+
+def sitemap_parte(parte):
+    return _resposta_sitemap(parte)
+
+def _resposta_sitemap(parte):
+    documento = sitemap_documento(parte)
+    if documento is None:
+        abort(404)
+    xml, etag = documento
+    resposta = make_response(xml)
+    resposta.content_type = 'application/xml'
+    resposta.set_etag(etag)
+    return resposta.make_conditional(request)
+
+# 📄 TTL do cache de página (segundos). As páginas institucionais só mudam
+# em deploy (que reinicia o processo); o blog é limpo pelas rotas de CRUD.
+TTL_PAGINA_FIXA = 24 * 3600
+TTL_BLOG = 10 * 60
+
+@page_cache.cached(ttl=TTL_PAGINA_FIXA)
 def home():
     return render_template('index.html', description="Ouvirtiba Aparelhos Auditivos – Alta tecnologia Rexton e atendimento em Araquari.")
 
-@app.route('/sobre')
+@page_cache.cached(ttl=TTL_PAGINA_FIXA)
 def sobre():
     return render_template('sobre.html', description="Conheça a Ouvirtiba e nossa parceria com a Clínica Makasi para oferecer aparelhos auditivos Rexton.")
 
-@app.route('/produtos')
+@page_cache.cached(ttl=TTL_PAGINA_FIXA)
 def produtos():
     return render_template('produtos.html', description="Confira nossos aparelhos auditivos Rexton, fala mais nítida e redução automático de ruídos e conectividade com celular")
 
@@ -125,7 +180,6 @@ def validar_telefone(telefone):
     apenas_numeros = _re.sub(r'\D', '', telefone)
     return len(apenas_numeros) == 11
 
-@app.route('/contato', methods=['GET', 'POST'])
 def contato():
     if request.method == 'POST':
         # Capturar dados do formulário
@@ -172,7 +226,7 @@ def contato():
                                  description="Entre em contato com a Ouvirtiba para agendar seu atendimento e teste de aparelhos auditivos.")
 
         # Verificar se API key do Resend está configurada
-        if not resend_api_key:
+        if not resend_api_key and current_app.config['EMAIL_TRANSPORT'] == 'resend':
             logger.error("❌ ERRO: Variável de ambiente RESEND_API_KEY não configurada!")
             flash('Erro de configuração do servidor. Entre em contato pelo WhatsApp.', 'erro')
             return render_template('contato.html', 
@@ -183,10 +237,6 @@ def contato():
                                  description="Entre em contato com a Ouvirtiba para agendar seu atendimento e teste de aparelhos auditivos.")
 
         try:
-            # Log de tentativa de envio
-            logger.info(f"📧 Tentando enviar email via Resend de: {email_form}")
-            
-            # ✅ ENVIAR EMAIL COM RESEND
             corpo_html = f"""
             <h2>Novo contato do site Ouvirtiba</h2>
             <p><strong>Nome:</strong> {nome}</p>
@@ -204,9 +254,10 @@ def contato():
                 "html": corpo_html,
             }
             
-            # Enviar email
-            email_response = resend.Emails.send(params)
-            logger.info(f"✅ Email enviado com sucesso! ID: {email_response.get('id', 'N/A')}")
+            # ✅ ENFILEIRAR EMAIL: o envio pelo Resend (com novas tentativas)
+            # é feito pela thread de email_outbox.py, fora da requisição
+            email_id = email_outbox.enfileirar(params)
+            logger.info(f"📧 Contato de {email_form} enfileirado (email_outbox {email_id})")
 
             flash('Mensagem enviada com sucesso! Em breve entraremos em contato.', 'sucesso')
             
@@ -214,7 +265,8 @@ def contato():
             return redirect('/contato')
 
         except Exception as e:
-            logger.error(f"❌ ERRO AO ENVIAR EMAIL: {str(e)}")
+            db.session.rollback()
+            logger.error(f"❌ ERRO AO ENFILEIRAR EMAIL: {str(e)}")
             import traceback
             logger.error(traceback.format_exc())
             
@@ -232,52 +284,38 @@ def contato():
     return render_template('contato.html', description="Entre em contato com a Ouvirtiba para agendar seu atendimento e teste de aparelhos auditivos.")
 
 
-def _limpar_html_word(html):
-    """Remove tags VML/MSO geradas pelo Word, preservando imagens e HTML limpo."""
-    if not html:
-        return ''
-
-    # 1. Remove blocos VML <!--[if gte vml 1]>...</[endif]--> (shapetype/shape do Word)
-    html = _re.sub(r'<!--\s*\[if gte vml\b.*?\[endif\]-->', '', html, flags=_re.DOTALL)
-
-    # 2. <!--[if !vml]-->IMAGEM REAL<!--[endif]--> — remove só os comentários, preserva img
-    html = _re.sub(r'<!--\s*\[if !vml\]-->', '', html)
-    html = _re.sub(r'<!--\s*\[endif\]-->', '', html)
-
-    # 3. Remove atributos lang="EN-US" etc.
-    html = _re.sub(r'\s+lang="[^"]*"', '', html)
-
-    # 4. Remove classes MSO: class="MsoNormal" etc.
-    html = _re.sub(r'\s+class="Mso[^"]*"', '', html)
-
-    # 5. Remove propriedades mso-* dentro de style=""
-    html = _re.sub(r'mso-[^;:"\'><\s]+[^;"]*;?\s*', '', html)
-
-    # 6. Remove style="" vazios que sobraram
-    html = _re.sub(r'\s+style="\s*"', '', html)
-
-    # 7. Remove <span> vazias que sobraram
-    html = _re.sub(r'<span>\s*</span>', '', html)
-
-    return html.strip()
-
-
-@app.route('/blog')
+# /blog: só as colunas do card (sem content/content_html), paginado por keyset.
+# Sem JS o link "Mais artigos" usa ?cursor=; com JS o scroll infinito busca
+# /blog/pagina.json com o mesmo cursor (ver admin/blog_post/listagem.py).
+# Cursor que não decodifica passa direto pelo cache (não vira uma chave nova).
+@page_cache.cached(ttl=TTL_BLOG, args=('cursor',), validar={'cursor': cursor_valido})
 def blog():
-    posts = (BlogPost.query
-             .filter_by(active=True)
-             .order_by(BlogPost.created_at.desc())
-             .all())
+    pagina = pagina_blog(request.args.get('cursor'))
     return render_template(
         'blog.html',
-        posts=posts,
+        posts=pagina.items,
+        pagina=pagina,
+        total_posts=contar_posts_ativos(),
         description="Dicas no Blog Ouvirtiba sobre adaptação e uso de aparelhos auditivos."
     )
 
-@app.route('/blog/<slug>')
+@page_cache.cached(ttl=TTL_BLOG, args=('cursor',), validar={'cursor': cursor_valido})
+def blog_pagina_json():
+    pagina = pagina_blog(request.args.get('cursor'))
+    return jsonify({
+        'posts': [post_para_dict(p) for p in pagina.items],
+        'html': render_template('_blog_cards.html', posts=pagina.items),
+        'next_cursor': pagina.next_cursor,
+        'total': contar_posts_ativos(),
+    })
+
+@page_cache.cached(ttl=TTL_BLOG)
 def blog_post(slug):
     post = BlogPost.query.filter_by(slug=slug, active=True).first_or_404()
-    conteudo_limpo = _limpar_html_word(post.content)
+    # HTML gerado ao salvar o post; posts ainda sem backfill são limpos na hora
+    conteudo_limpo = post.content_html
+    if conteudo_limpo is None:
+        conteudo_limpo = limpar_html_word(post.content)
     return render_template(
         'blog_post.html',
         post=post,
@@ -285,10 +323,32 @@ def blog_post(slug):
         description=post.summary[:160] if post.summary else post.title
     )
 
-@app.route('/politica')
+@page_cache.cached(ttl=TTL_PAGINA_FIXA)
 def politica():
     return render_template('politica.html', description="A Ouvirtiba Aparelhos Auditivos respeita a sua privacidade e está comprometida em proteger seus dados pessoais.")
 
+# Tabela de rotas do site público registrada por create_app()
+ROTAS_SITE = [
+    ('/health', health, None),
+    ('/keep-alive', health, None),
+    ('/hello-world', redirect_hello, None),
+    ('/googlec4c2cad7f9951bca.html', google_verify, None),
+    ('/robots.txt', robots, None),
+    ('/sitemap.xml', sitemap, None),
+    ('/sitemap-<int:parte>.xml', sitemap_parte, None),
+    ('/', home, None),
+    ('/sobre', sobre, None),
+    ('/produtos', produtos, None),
+    ('/contato', contato, ['GET', 'POST']),
+    ('/blog', blog, None),
+    ('/blog/pagina.json', blog_pagina_json, None),
+    ('/blog/<slug>', blog_post, None),
+    ('/politica', politica, None),
+]
+
+# gunicorn app:app
+app = create_app()
+
 if __name__ == '__main__':
     import os
     port = int(os.environ.get('PORT', 5000))
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Preenche BlogPost.content_html dos posts existentes.
+
+Posts criados/alterados depois da coluna nova já gravam o HTML publicado;
+este script gera o mesmo HTML (limpeza do Word + <img> lazy com width/height)
+para os posts antigos.
+
+Uso:
+    python backfill_blog_html.py            # só posts com content_html vazio
+    python backfill_blog_html.py --todos    # regera todos (ex.: regra nova)
+"""
+
+import sys
+
+LOTE = 20
+
+
+def backfill(todos=False):
+    from app import app, db
+    from admin.blog_post.models import BlogPost
+    from admin.blog_post.conteudo import gerar_html_publicado
+
+    with app.app_context():
+        query = BlogPost.query.order_by(BlogPost.id)
+        if not todos:
+            query = query.filter(BlogPost.content_html.is_(None))
+
+        ids = [pid for (pid,) in query.with_entities(BlogPost.id).all()]
+        print(f"📝 {len(ids)} post(s) para processar")
+
+        for inicio in range(0, len(ids), LOTE):
+            lote = BlogPost.query.filter(BlogPost.id.in_(ids[inicio:inicio + LOTE])).all()
+            for post in lote:
+                post.content_html = gerar_html_publicado(post.content)
+                print(f"   ✅ {post.id} - {post.title}")
+            db.session.commit()
+
+        print(f"✅ Backfill concluído: {len(ids)} post(s)")
+        return len(ids)
+
+
+if __name__ == '__main__':
+    backfill(todos='--todos' in sys.argv)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark do custo por visualização de /blog/<slug>: antes x depois.
+
+- antes:  limpar_html_word(post.content) + render de blog_post.html
+- depois: post.content_html (gerado ao salvar) + render de blog_post.html
+
+Com DATABASE_URL usa os posts do banco; sem banco (ou com --amostra) usa um
+post sintético com marcação típica do Word colada pelo TinyMCE.
+
+Uso:
+    python bench_blog_html.py               # 200 repetições por post
+    python bench_blog_html.py -n 1000 --amostra
+"""
+
+import argparse
+import os
+import statistics
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+_BLOCO_WORD = """
+<!--[if gte vml 1]><v:shapetype id="_x0000_t75" coordsize="21600,21600" o:spt="75"
+ o:preferrelative="t" path="m@4@5l@4@11@9@11@9@5xe" filled="f" stroked="f">
+ <v:stroke joinstyle="miter"/><v:formulas><v:f eqn="if lineDrawn pixelLineWidth 0"/></v:formulas>
+</v:shapetype><![endif]-->
+<!--[if !vml]--><img src="/static/img/logo.png" alt="imagem"><!--[endif]-->
+<p class="MsoNormal" style="mso-margin-top-alt:auto;mso-margin-bottom-alt:auto;line-height:150%">
+<span lang="PT-BR" style="font-size:12.0pt;mso-bidi-font-family:Calibri;mso-ansi-language:PT-BR">
+Os aparelhos auditivos modernos contam com redução automática de ruído e
+conectividade com o celular.</span><span></span></p>
+"""
+
+
+def _posts_amostra():
+    return [SimpleNamespace(
+        id=0, slug='amostra', title='Post de amostra (Word)', summary='Resumo', author='Ouvirtiba',
+        image=None, created_at=datetime.now(), updated_at=None,
+        content=_BLOCO_WORD * 40,
+    )]
+
+
+def _medir(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-n', '--repeticoes', type=int, default=200)
+    parser.add_argument('--amostra', action='store_true', help='não lê o banco')
+    args = parser.parse_args()
+
+    usar_banco = bool(os.getenv('DATABASE_URL')) and not args.amostra
+    os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+    from flask import render_template
+    from app import app
+    from admin.blog_post.conteudo import limpar_html_word, gerar_html_publicado
+
+    with app.app_context():
+        if usar_banco:
+            from admin.blog_post.models import BlogPost
+            posts = BlogPost.query.filter_by(active=True).all()
+        else:
+            posts = _posts_amostra()
+
+        with app.test_request_context('/blog/amostra'):
+            print(f"⏱️  Custo por visualização — mediana de {args.repeticoes} repetições")
+            print(f"   {'post':<40} {'KB':>6} {'limpeza':>9} {'antes':>9} {'depois':>9}")
+            totais_antes, totais_depois = [], []
+
+            for post in posts:
+                publicado = post.content_html if getattr(post, 'content_html', None) \
+                    else gerar_html_publicado(post.content)
+
+                def _render(conteudo):
+                    return render_template('blog_post.html', post=post, conteudo=conteudo,
+                                           description=post.summary)
+
+                limpeza = _medir(lambda: limpar_html_word(post.content), args.repeticoes)
+                antes = _medir(lambda: _render(limpar_html_word(post.content)), args.repeticoes)
+                depois = _medir(lambda: _render(publicado), args.repeticoes)
+                totais_antes.append(antes)
+                totais_depois.append(depois)
+
+                kb = len(post.content.encode('utf-8')) / 1024
+                print(f"   {post.title[:40]:<40} {kb:6.1f} {limpeza:7.3f}ms {antes:7.3f}ms {depois:7.3f}ms")
+
+            if posts:
+                a, d = statistics.mean(totais_antes), statistics.mean(totais_depois)
+                print()
+                print(f"📊 Média: antes {a:.3f} ms | depois {d:.3f} ms | "
+                      f"economia {a - d:.3f} ms/visualização ({(1 - d / a) * 100:.0f}%)")
+
+
+if __name__ == '__main__':
+    main()
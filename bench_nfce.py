@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark do custo de CPU por NFC-e emitida: antes x depois.
+
+- antes:  monta a árvore → tostring(pretty_print) → assinar_xml_nfce (novo
+          parse) → aplicar_qrcode_offline (mais um parse, só contingência)
+          → validar_xml dos bytes (mais um parse)
+- depois: EmissaoNFCe.emitir() + validar() na mesma árvore, uma serialização
+
+Usa o certificado de NFeConfig.CERT_PFX_PATH; sem ele (ou com --temporario)
+gera um A1 autoassinado só para o teste. Não acessa a SEFAZ nem o banco.
+
+Uso:
+    python bench_nfce.py                  # 200 repetições, 2 itens
+    python bench_nfce.py -n 500 --itens 10
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+
+EMITENTE = {
+    'Code': '56154376000105', 'Name': 'JANSSEN APARELHOS AUDITIVOS LTDA',
+    'Address': 'RUA XV DE NOVEMBRO', 'Number': 100, 'Neighborhood': 'CENTRO',
+    'City': 'ARAQUARI', 'Region': 'SC', 'Cep origem': '89245000',
+    'Phone': '47999990000', 'State_Registration': '263067041',
+}
+
+
+def _invoice(itens, tp_emis):
+    from admin.nfe.contingencia import chave_com_tp_emis
+    from admin.nfe.routes import gerar_chave_acesso
+
+    chave = chave_com_tp_emis(
+        gerar_chave_acesso('42', '56154376000105', '65', '1', '000000012', '112345678'), tp_emis)
+    return SimpleNamespace(
+        id=12, number=12, series=1, access_key=chave, issue_date=datetime.now(),
+        items=[SimpleNamespace(product_id=n, product=SimpleNamespace(name='Aparelho auditivo'),
+                               serialnumber=f'SN{n:05d}', ncm='90214000', cfop='5102', quantity=1,
+                               unit_price=Decimal('150.00'), total_price=Decimal('150.00'),
+                               discount=Decimal('0'), csosn='102')
+               for n in range(1, itens + 1)])
+
+
+def _certificado(temporario):
+    from config import NFeConfig as CFG
+    from admin.nfe.certificado import obter_certificado
+
+    if not temporario and os.path.exists(CFG.CERT_PFX_PATH):
+        try:
+            return CFG.CERT_PFX_PATH, CFG.CERT_PFX_PASSWORD, \
+                obter_certificado(CFG.CERT_PFX_PATH, CFG.CERT_PFX_PASSWORD)
+        except Exception as e:
+            print(f"⚠️  Certificado de config.py indisponível ({e}); usando um temporário")
+
+    from test_sefaz_client import SENHA, _gerar_pfx
+    caminho = os.path.join(tempfile.mkdtemp(), 'bench.pfx')
+    _gerar_pfx(caminho)
+    return caminho, SENHA, obter_certificado(caminho, SENHA)
+
+
+def _medir(funcoes, repeticoes):
+    """Mediana do tempo de CPU (ms) por chamada; alterna as funções para a máquina pesar igual."""
+    tempos = [[] for _ in funcoes]
+    for _ in range(repeticoes):
+        for funcao, lista in zip(funcoes, tempos):
+            inicio = time.process_time()
+            funcao()
+            lista.append((time.process_time() - inicio) * 1000)
+    return [statistics.median(lista) for lista in tempos]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-n', '--repeticoes', type=int, default=200)
+    parser.add_argument('--itens', type=int, default=2, help='itens por nota')
+    parser.add_argument('--temporario', action='store_true', help='ignora o certificado de config.py')
+    args = parser.parse_args()
+
+    from lxml import etree
+    from admin.nfe.contingencia import aplicar_qrcode_offline
+    from admin.nfe.nfce_emissao import EmissaoNFCe
+    from admin.nfe.nfce_sign import assinar_xml_nfce
+    from admin.nfe.validacao_xsd import schema, validar_xml
+
+    pfx_path, senha, certificado = _certificado(args.temporario)
+    schema('NFe')   # compilação do XSD fora da medição
+    contingencia = SimpleNamespace(inicio=datetime.now(), justificativa='SEFAZ SEM RESPOSTA - BENCHMARK')
+
+    print(f"⏱️  CPU por NFC-e — mediana de {args.repeticoes} repetições, {args.itens} item(ns)")
+    print(f"   {'emissão':<14} {'KB':>6} {'antes':>9} {'depois':>9} {'economia':>9}")
+
+    for rotulo, tp_emis, periodo in (('on-line', '1', None), ('contingência', '9', contingencia)):
+        invoice = _invoice(args.itens, tp_emis)
+
+        def antes():
+            emissao = EmissaoNFCe(invoice, EMITENTE, contingencia=periodo)
+            emissao.montar()
+            # o fluxo antigo gravava o QR on-line e, na contingência, trocava depois de assinar
+            emissao.tp_emis = '1'
+            emissao.anexar_qrcode()
+            xml = etree.tostring(emissao.nfe, pretty_print=True, xml_declaration=True, encoding='utf-8')
+            xml = assinar_xml_nfce(xml, pfx_path, senha)
+            if periodo is not None:
+                xml, _ = aplicar_qrcode_offline(xml, invoice, emissao.valor_nf)
+            validar_xml(xml)
+            return xml
+
+        def depois():
+            emissao = EmissaoNFCe(invoice, EMITENTE, contingencia=periodo)
+            emissao.emitir(certificado)
+            emissao.validar()
+            return emissao
+
+        a, d = _medir((antes, depois), args.repeticoes)
+        emissao = depois()
+        kb = len(emissao.serializar()) / 1024
+        print(f"   {rotulo:<14} {kb:6.1f} {a:7.3f}ms {d:7.3f}ms {(1 - d / a) * 100:8.0f}%")
+        etapas = ' | '.join(f"{etapa} {ms:.3f}" for etapa, ms in emissao.tempos.items())
+        print(f"   {'':<14} etapas (ms, uma emissão): {etapas}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark de partida a frio (wake-up do Render).
+
+Para cada rodada sobe um Python novo e mede:
+- import do app com -X importtime, agregado por pacote de topo;
+- tempo até o primeiro byte: import + create_app() + GET / pelo test_client.
+
+Também lista as bibliotecas pesadas (PESADOS) que foram carregadas já no
+import — elas devem ficar para a primeira rota que precisar delas.
+
+Uso:
+    python bench_startup.py                 # 5 rodadas, top 15 pacotes
+    python bench_startup.py -n 10 --top 25
+    python bench_startup.py --max-ms 1500   # sai com erro acima do limite
+
+Sem DATABASE_URL usa sqlite:// (o import não abre conexão com o banco).
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+
+# Bibliotecas que só devem ser importadas sob demanda
+PESADOS = ('lxml', 'fpdf', 'qrcode', 'cryptography', 'pdfkit', 'resend', 'requests')
+
+_LINHA = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)')
+
+_SCRIPT_TTFB = """
+import json, sys, time
+t0 = time.perf_counter()
+from app import app
+t1 = time.perf_counter()
+resposta = app.test_client().get('/')
+t2 = time.perf_counter()
+print(json.dumps({
+    'import_ms': (t1 - t0) * 1000,
+    'ttfb_ms': (t2 - t0) * 1000,
+    'status': resposta.status_code,
+    'pesados': [m for m in %r if m in sys.modules],
+}))
+""" % (PESADOS,)
+
+
+def _ambiente():
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', 'sqlite://')
+    return env
+
+
+def parse_importtime(texto):
+    """
+    Converte a saída de -X importtime em {pacote_de_topo: ms}.
+
+    Soma o tempo "self" de todos os módulos do mesmo pacote (lxml.etree,
+    lxml._elementpath, ... → lxml), então cada milissegundo entra uma vez só.
+    """
+    pacotes = {}
+    for linha in texto.splitlines():
+        m = _LINHA.match(linha)
+        if not m:
+            continue
+        pacote = m.group(4).split('.')[0]
+        pacotes[pacote] = pacotes.get(pacote, 0) + int(m.group(1)) / 1000
+    return pacotes
+
+
+def medir_imports():
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=RAIZ, env=_ambiente(), capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import app falhou:\n{proc.stderr[-2000:]}")
+    return parse_importtime(proc.stderr)
+
+
+def medir_primeiro_byte():
+    proc = subprocess.run(
+        [sys.executable, '-c', _SCRIPT_TTFB],
+        cwd=RAIZ, env=_ambiente(), capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"primeira requisição falhou:\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def relatorio(rodadas=5, top=15):
+    por_pacote = {}
+    ttfb, imports, pesados = [], [], set()
+
+    for _ in range(rodadas):
+        for pacote, ms in medir_imports().items():
+            por_pacote.setdefault(pacote, []).append(ms)
+        r = medir_primeiro_byte()
+        ttfb.append(r['ttfb_ms'])
+        imports.append(r['import_ms'])
+        pesados.update(r['pesados'])
+
+    medianas = {p: statistics.median(v) for p, v in por_pacote.items()}
+    return {
+        'rodadas': rodadas,
+        'import_ms': statistics.median(imports),
+        'ttfb_ms': statistics.median(ttfb),
+        'pacotes': sorted(medianas.items(), key=lambda x: x[1], reverse=True)[:top],
+        'pesados': sorted(pesados),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-n', '--rodadas', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--max-ms', type=float, default=None,
+                        help='falha se o tempo até o primeiro byte (mediana) passar deste valor')
+    args = parser.parse_args()
+
+    r = relatorio(args.rodadas, args.top)
+
+    print(f"⏱️  Partida a frio — mediana de {r['rodadas']} rodada(s)")
+    print(f"   import app ........... {r['import_ms']:8.1f} ms")
+    print(f"   primeiro byte (GET /)  {r['ttfb_ms']:8.1f} ms")
+    print()
+    print("📦 Import por pacote (-X importtime, tempo próprio somado):")
+    for pacote, ms in r['pacotes']:
+        print(f"   {ms:8.1f} ms  {pacote}")
+    print()
+
+    falhou = False
+    if r['pesados']:
+        print(f"❌ Bibliotecas pesadas carregadas no import: {', '.join(r['pesados'])}")
+        falhou = True
+    else:
+        print("✅ Nenhuma biblioteca pesada carregada no import")
+
+    if args.max_ms is not None and r['ttfb_ms'] > args.max_ms:
+        print(f"❌ Primeiro byte em {r['ttfb_ms']:.1f} ms (limite {args.max_ms:.0f} ms)")
+        falhou = True
+
+    sys.exit(1 if falhou else 0)
+
+
+if __name__ == '__main__':
+    main()
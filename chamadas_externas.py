@@ -0,0 +1,292 @@
+# chamadas_externas.py
+"""
+Proteção das chamadas HTTP de saída (SVRS, ViaCEP e Resend).
+
+Antes cada integração tratava falha do seu jeito: o ViaCEP tinha o próprio
+disjuntor, a SEFAZ só timeout e o Resend o timeout fixo do SDK. Com dois ou
+três workers do gunicorn, uma dependência lenta prendia todas as threads e o
+admin inteiro parava junto. Agora toda chamada externa passa por uma
+Dependencia, que aplica:
+
+    1. compartimento (bulkhead): no máximo `concorrentes` chamadas simultâneas
+       por worker; a chamada seguinte espera até `espera_s` e depois é
+       recusada na hora (DependenciaIndisponivel) em vez de ocupar mais uma
+       thread
+    2. disjuntor (circuit breaker): depois de `falhas_max` falhas seguidas a
+       dependência não é chamada por `reabrir_s` segundos; depois passa uma
+       única chamada de teste (meio-aberto), que fecha o disjuntor se der
+       certo ou reabre se falhar
+    3. timeout (conexão, leitura) próprio de cada dependência
+       (Dependencia.timeout, repassado por quem chama ao requests)
+    4. métricas por dependência (chamadas, erros, timeouts, recusas, latência),
+       exibidas no /health em "externos"
+
+- dependencia(nome)      → Dependencia do processo ('svrs', 'viacep', 'resend')
+- Dependencia.chamar(f, *args, **kwargs) → f(*args, **kwargs) protegida
+- relatorio()            → métricas de todas as dependências (para /health)
+
+Configuração (variáveis de ambiente, NOME = SVRS | VIACEP | RESEND):
+    EXTERNO_<NOME>_TIMEOUT      "conexão,leitura" em segundos
+                                (SVRS continua aceitando SEFAZ_TIMEOUT_CONEXAO
+                                e SEFAZ_TIMEOUT_LEITURA)
+    EXTERNO_<NOME>_CONCORRENTES chamadas simultâneas por worker
+    EXTERNO_<NOME>_FALHAS       falhas seguidas que abrem o disjuntor
+    EXTERNO_<NOME>_REABRIR_S    tempo do disjuntor aberto
+
+Módulo só com a biblioteca padrão: pode ser importado no início do worker
+sem carregar requests.
+"""
+
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger('chamadas_externas')
+
+# Resposta HTTP que conta como falha da dependência (o resto é erro de quem chama)
+STATUS_FALHA = frozenset({429, 500, 502, 503, 504})
+
+# Padrões por dependência: timeout (conexão, leitura), concorrentes, falhas, reabrir_s
+PADROES = {
+    # A SVRS responde SOAP Fault com HTTP 500 para XML inválido: não é a SEFAZ fora
+    'svrs': {'timeout': (5, 30), 'concorrentes': 4, 'falhas_max': 5, 'reabrir_s': 30,
+             'status_falha': frozenset({502, 503, 504})},
+    'viacep': {'timeout': (2, 3), 'concorrentes': 4, 'falhas_max': 3, 'reabrir_s': 60},
+    'resend': {'timeout': (3, 10), 'concorrentes': 2, 'falhas_max': 5, 'reabrir_s': 60},
+}
+
+
+class DependenciaIndisponivel(Exception):
+    """Chamada recusada sem tocar na rede (disjuntor aberto ou compartimento lotado)."""
+
+    def __init__(self, nome, motivo):
+        self.nome = nome
+        self.motivo = motivo   # 'disjuntor' | 'lotado'
+        texto = ('temporariamente desativado (disjuntor aberto)' if motivo == 'disjuntor'
+                 else 'com o limite de chamadas simultâneas atingido')
+        super().__init__(f"{nome}: {texto}")
+
+
+def _e_timeout(erro):
+    """requests.Timeout, socket.timeout, TimeoutError (e as que os embrulham)."""
+    while erro is not None:
+        if isinstance(erro, TimeoutError) or 'Timeout' in type(erro).__name__:
+            return True
+        erro = erro.__cause__ or erro.__context__
+    return False
+
+
+# ==============================================================================
+# DISJUNTOR (CIRCUIT BREAKER)
+# ==============================================================================
+
+class Disjuntor:
+    """
+    Fechado: chamadas passam. Após `falhas_max` falhas seguidas abre por
+    `reabrir_s` segundos; depois deixa passar uma chamada de teste
+    (meio-aberto), que fecha o disjuntor se der certo ou reabre se falhar.
+    """
+
+    def __init__(self, nome='externo', falhas_max=5, reabrir_s=60):
+        self.nome = nome
+        self.falhas_max = falhas_max
+        self.reabrir_s = reabrir_s
+        self.falhas = 0
+        self.aberturas = 0
+        self.aberto_ate = 0.0
+        self._testando = False
+        self._lock = threading.Lock()
+
+    def permitir(self):
+        with self._lock:
+            if self.falhas < self.falhas_max:
+                return True
+            if time.monotonic() < self.aberto_ate or self._testando:
+                return False
+            self._testando = True   # meio-aberto: uma chamada de teste
+            return True
+
+    def sucesso(self):
+        with self._lock:
+            if self.falhas >= self.falhas_max:
+                logger.info("✅ %s: disjuntor fechado", self.nome)
+            self.falhas = 0
+            self._testando = False
+
+    def falha(self):
+        with self._lock:
+            self.falhas += 1
+            self._testando = False
+            if self.falhas >= self.falhas_max:
+                self.aberto_ate = time.monotonic() + self.reabrir_s
+                self.aberturas += 1
+                logger.warning("⚠️ %s: disjuntor aberto por %ss após %d falhas",
+                               self.nome, self.reabrir_s, self.falhas)
+
+    @property
+    def estado(self):
+        with self._lock:
+            if self.falhas < self.falhas_max:
+                return 'fechado'
+            return 'aberto' if time.monotonic() < self.aberto_ate else 'meio-aberto'
+
+
+# ==============================================================================
+# DEPENDÊNCIA
+# ==============================================================================
+
+class Dependencia:
+    """Compartimento + disjuntor + métricas de uma dependência externa."""
+
+    def __init__(self, nome, timeout=(5, 30), concorrentes=4, espera_s=0.0,
+                 falhas_max=5, reabrir_s=60, status_falha=STATUS_FALHA, conta_falha=None):
+        self.nome = nome
+        self.timeout = tuple(timeout)
+        self.concorrentes = concorrentes
+        self.espera_s = espera_s
+        self.status_falha = status_falha
+        # conta_falha(erro) → False para erros que não são da dependência (ex.: 4xx)
+        self.conta_falha = conta_falha
+        self.disjuntor = Disjuntor(nome, falhas_max, reabrir_s)
+        self._vagas = threading.BoundedSemaphore(concorrentes)
+        self._lock = threading.Lock()
+        # Métricas
+        self.chamadas = 0
+        self.erros = 0
+        self.timeouts = 0
+        self.recusadas_disjuntor = 0
+        self.recusadas_lotado = 0
+        self.em_andamento = 0
+        self.pico_em_andamento = 0
+        self._total_ms = 0.0
+        self._max_ms = 0.0
+        self._ultimo_ms = None
+
+    def chamar(self, funcao, *args, **kwargs):
+        """
+        funcao(*args, **kwargs) dentro do compartimento e do disjuntor.
+        Levanta DependenciaIndisponivel sem chamar a função se não houver vaga
+        ou se o disjuntor estiver aberto; os erros da função passam adiante.
+        """
+        # Vaga antes do disjuntor: a chamada de teste do meio-aberto nunca é
+        # reservada e depois recusada por falta de vaga
+        if self.espera_s:
+            vaga = self._vagas.acquire(timeout=self.espera_s)
+        else:
+            vaga = self._vagas.acquire(blocking=False)
+        if not vaga:
+            with self._lock:
+                self.recusadas_lotado += 1
+            logger.warning("🚦 %s: %d chamadas em andamento, chamada recusada", self.nome, self.concorrentes)
+            raise DependenciaIndisponivel(self.nome, 'lotado')
+        try:
+            if not self.disjuntor.permitir():
+                with self._lock:
+                    self.recusadas_disjuntor += 1
+                raise DependenciaIndisponivel(self.nome, 'disjuntor')
+
+            with self._lock:
+                self.em_andamento += 1
+                self.pico_em_andamento = max(self.pico_em_andamento, self.em_andamento)
+            inicio = time.perf_counter()
+            try:
+                resultado = funcao(*args, **kwargs)
+            except Exception as e:
+                self._registrar(inicio, erro=True, timeout=_e_timeout(e))
+                self._resultado(self.conta_falha is None or self.conta_falha(e))
+                raise
+            falhou = getattr(resultado, 'status_code', None) in self.status_falha
+            self._registrar(inicio, erro=falhou)
+            self._resultado(falhou)
+            return resultado
+        finally:
+            self._vagas.release()
+
+    def _resultado(self, falhou):
+        if falhou:
+            self.disjuntor.falha()
+        else:
+            self.disjuntor.sucesso()
+
+    def _registrar(self, inicio, erro=False, timeout=False):
+        ms = (time.perf_counter() - inicio) * 1000
+        with self._lock:
+            self.em_andamento -= 1
+            self.chamadas += 1
+            self.erros += int(erro)
+            self.timeouts += int(timeout)
+            self._total_ms += ms
+            self._max_ms = max(self._max_ms, ms)
+            self._ultimo_ms = round(ms, 1)
+
+    def relatorio(self):
+        with self._lock:
+            return {
+                'state': self.disjuntor.estado,
+                'timeout': list(self.timeout),
+                'max_concurrent': self.concorrentes,
+                'in_flight': self.em_andamento,
+                'peak_in_flight': self.pico_em_andamento,
+                'calls': self.chamadas,
+                'errors': self.erros,
+                'timeouts': self.timeouts,
+                'rejected_open': self.recusadas_disjuntor,
+                'rejected_full': self.recusadas_lotado,
+                'breaker_opened': self.disjuntor.aberturas,
+                'avg_ms': round(self._total_ms / self.chamadas, 1) if self.chamadas else None,
+                'max_ms': round(self._max_ms, 1) if self.chamadas else None,
+                'last_ms': self._ultimo_ms,
+            }
+
+
+# ==============================================================================
+# DEPENDÊNCIAS DO PROCESSO
+# ==============================================================================
+
+_dependencias = {}
+_lock = threading.Lock()
+
+
+def _env_timeout(nome, padrao):
+    if nome == 'svrs' and not os.getenv('EXTERNO_SVRS_TIMEOUT'):
+        return (float(os.getenv('SEFAZ_TIMEOUT_CONEXAO', padrao[0])),
+                float(os.getenv('SEFAZ_TIMEOUT_LEITURA', padrao[1])))
+    valor = os.getenv(f'EXTERNO_{nome.upper()}_TIMEOUT')
+    try:
+        conexao, leitura = (float(v) for v in valor.split(','))
+        return conexao, leitura
+    except (AttributeError, ValueError):
+        return padrao
+
+
+def _env_int(nome, padrao):
+    try:
+        return int(os.getenv(nome, padrao))
+    except (TypeError, ValueError):
+        return padrao
+
+
+def dependencia(nome, **opcoes):
+    """Dependencia do processo; criada na 1ª chamada com PADROES + ambiente + `opcoes`."""
+    atual = _dependencias.get(nome)
+    if atual is not None:
+        return atual
+    with _lock:
+        atual = _dependencias.get(nome)
+        if atual is None:
+            config = dict(PADROES.get(nome, {}))
+            prefixo = f'EXTERNO_{nome.upper()}_'
+            config['timeout'] = _env_timeout(nome, config.get('timeout', (5, 30)))
+            config['concorrentes'] = _env_int(prefixo + 'CONCORRENTES', config.get('concorrentes', 4))
+            config['falhas_max'] = _env_int(prefixo + 'FALHAS', config.get('falhas_max', 5))
+            config['reabrir_s'] = _env_int(prefixo + 'REABRIR_S', config.get('reabrir_s', 60))
+            config.update(opcoes)
+            atual = _dependencias[nome] = Dependencia(nome, **config)
+    return atual
+
+
+def relatorio():
+    with _lock:
+        dependencias = list(_dependencias.values())
+    return {d.nome: d.relatorio() for d in dependencias}
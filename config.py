@@ -25,6 +25,8 @@ class NFeConfig:
     ID_DEST = "1"       # 1=Operação interna, 2=Interestadual, 3=Exterior
     TP_IMP = "4"        # 4=DANFE NFC-e em papel
     TP_EMIS = "1"       # 1=Emissão normal
+    TP_EMIS_CONTINGENCIA = "9"  # 9=Contingência off-line da NFC-e (admin/nfe/contingencia.py)
+    CUF = "42"          # SC (consulta de status do serviço)
     FIN_NFE = "1"       # 1=NF-e normal
     IND_FINAL = "1"     # 1=Consumidor final
     IND_PRES = "1"      # 1=Operação presencial
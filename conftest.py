@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Apoio comum dos testes (pytest carrega este arquivo antes dos test_*.py).
+
+- NS, Resposta, chave(numero)  → XML e chave de acesso das notas de teste
+- SefazFalsa                   → cliente SEFAZ falso (status, lote, recibo, chave)
+- SENHA, gerar_pfx(caminho)    → certificado A1 autoassinado em .pfx
+- fixture app_sqlite           → app Flask com SQLite em arquivo temporário
+
+Os módulos de teste importam daqui (from conftest import ...) em vez de
+importar uns dos outros.
+"""
+
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from flask import Flask
+
+from extension import db
+import admin.models  # noqa: F401  (Product, Store: relacionamentos de Invoice)
+import admin.order.models  # noqa: F401
+from admin.nfe.contingencia import digito_verificador
+from chamadas_externas import Dependencia
+
+NS = 'http://www.portalfiscal.inf.br/nfe'
+SENHA = 'teste123'
+
+
+# ==============================================================================
+# SEFAZ FALSA
+# ==============================================================================
+
+def chave(numero, tp_emis='1'):
+    """Chave de acesso válida (UF 42, CNPJ da loja, modelo 65, série 1) da nota `numero`."""
+    sem_dv = f'4226105615437600010565001{numero:09d}{tp_emis}{numero:08d}'
+    return sem_dv + digito_verificador(sem_dv)
+
+
+class Resposta:
+    def __init__(self, texto, status_code=200):
+        self.text = texto
+        self.status_code = status_code
+
+
+class SefazFalsa:
+    """
+    Cliente SEFAZ falso, no lugar de cliente_sefaz(ambiente) e do ClienteSefaz:
+
+    - status do serviço: cStat `cstat_status` (None = falha de rede), passando
+      pelo compartimento 'svrs' como o ClienteSefaz (1 vaga aqui)
+    - recepção de lotes: cStat `cstat_lote`; 225 se o lote tem uma chave de
+      `schema_invalido`; guarda as chaves de cada enviNFe em `envios` e as
+      aceitas em `lotes` (nrec → chaves)
+    - consulta do recibo: cStat `cstat_recibo` com os protocolos do lote
+      (100, 778 para as chaves de `rejeitar`, ou o de `protocolo`)
+    - consulta por chave: 100 se a chave chegou num lote, senão 217
+
+    Falhas de rede: `falhar_envio`, `falhar_consulta` e `perder_resposta`
+    (recebe o lote, mas a resposta se perde no timeout de leitura).
+    """
+
+    def __init__(self, cstat_status='107', cstat_lote='103', cstat_recibo='104', rejeitar=(),
+                 schema_invalido=(), protocolo=None, falhar_envio=False, perder_resposta=False,
+                 falhar_consulta=False, latencia_s=0.0):
+        self.ambiente = 2
+        self.cstat_status = cstat_status
+        self.cstat_lote = cstat_lote
+        self.cstat_recibo = cstat_recibo
+        self.rejeitar = set(rejeitar)
+        self.schema_invalido = set(schema_invalido)
+        self.protocolo = protocolo or {}      # chave → (cStat, xMotivo) no protNFe
+        self.falhar_envio = falhar_envio
+        self.perder_resposta = perder_resposta
+        self.falhar_consulta = falhar_consulta
+        self.latencia_s = latencia_s          # da consulta do recibo
+        self.svrs = Dependencia('svrs', concorrentes=1)
+        self.lotes = {}            # nrec → chaves
+        self.envios = []           # chaves de cada enviNFe recebido
+        self.consultas_status = 0
+        self.consultas_recibo = []
+        self.consultas = []        # chaves consultadas (consultar_protocolo)
+        self.em_voo = self.max_em_voo = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):   # substitui cliente_sefaz(ambiente)
+        return self
+
+    def status_servico(self, cuf='42'):
+        return self.svrs.chamar(self._status_servico)
+
+    def _status_servico(self):
+        self.consultas_status += 1
+        if self.cstat_status is None:
+            raise ConnectionError('SVRS fora do ar')
+        return Resposta(f'<retConsStatServ xmlns="{NS}"><cStat>{self.cstat_status}</cStat>'
+                        f'<xMotivo>Servico em {self.cstat_status}</xMotivo></retConsStatServ>')
+
+    def autorizacao(self, envi_nfe):
+        if self.falhar_envio:
+            raise ConnectionError('SVRS fora do ar')
+        id_lote = re.search(r'<idLote>(\d+)</idLote>', envi_nfe).group(1)
+        assert '<indSinc>0</indSinc>' in envi_nfe
+        chaves = re.findall(r'Id="NFe(\d{44})"', envi_nfe)
+        self.envios.append(chaves)
+        cstat = '225' if self.schema_invalido & set(chaves) else self.cstat_lote
+        if cstat not in ('103', '104'):
+            return Resposta(f'<retEnviNFe xmlns="{NS}"><cStat>{cstat}</cStat>'
+                            f'<xMotivo>Lote recusado</xMotivo></retEnviNFe>')
+        nrec = f'42{int(id_lote):013d}'
+        self.lotes[nrec] = chaves
+        if self.perder_resposta:
+            raise TimeoutError('Read timed out')
+        return Resposta(f'<retEnviNFe xmlns="{NS}"><cStat>{cstat}</cStat><xMotivo>Lote recebido</xMotivo>'
+                        f'<infRec><nRec>{nrec}</nRec><tMed>1</tMed></infRec></retEnviNFe>')
+
+    def _prot(self, ch):
+        if ch in self.protocolo:
+            cstat, xmotivo = self.protocolo[ch]
+        elif ch in self.rejeitar:
+            cstat, xmotivo = '778', 'NCM inexistente'
+        else:
+            cstat, xmotivo = '100', 'Autorizado o uso da NF-e'
+        nprot = f'<nProt>1{ch[-14:]}</nProt>' if cstat in ('100', '302') else ''
+        return (f'<protNFe versao="4.00"><infProt><chNFe>{ch}</chNFe><cStat>{cstat}</cStat>'
+                f'<xMotivo>{xmotivo}</xMotivo>{nprot}</infProt></protNFe>')
+
+    def consultar_recibo(self, nrec):
+        with self._lock:
+            self.consultas_recibo.append(nrec)
+            self.em_voo += 1
+            self.max_em_voo = max(self.max_em_voo, self.em_voo)
+        time.sleep(self.latencia_s)
+        with self._lock:
+            self.em_voo -= 1
+        if self.cstat_recibo != '104':
+            return Resposta(f'<retConsReciNFe xmlns="{NS}"><cStat>{self.cstat_recibo}</cStat>'
+                            f'<xMotivo>Lote em processamento</xMotivo></retConsReciNFe>')
+        prots = ''.join(self._prot(ch) for ch in self.lotes.get(nrec, ()))
+        return Resposta(f'<soap:Envelope xmlns:soap="http://www.w3.org/2003/05/soap-envelope"><soap:Body>'
+                        f'<retConsReciNFe xmlns="{NS}"><cStat>104</cStat><xMotivo>Lote processado</xMotivo>'
+                        f'{prots}</retConsReciNFe></soap:Body></soap:Envelope>')
+
+    def consultar_protocolo(self, chave):
+        self.consultas.append(chave)
+        if self.falhar_consulta:
+            raise ConnectionError('SVRS fora do ar')
+        recebidas = {ch for chaves in self.lotes.values() for ch in chaves}
+        if chave in recebidas and chave not in self.rejeitar:
+            return Resposta(f'<retConsSitNFe xmlns="{NS}"><cStat>100</cStat><xMotivo>Autorizado</xMotivo>'
+                            f'{self._prot(chave)}</retConsSitNFe>')
+        return Resposta(f'<retConsSitNFe xmlns="{NS}"><cStat>217</cStat>'
+                        f'<xMotivo>NF-e nao consta na base de dados da SEFAZ</xMotivo></retConsSitNFe>')
+
+
+# ==============================================================================
+# CERTIFICADO A1 DE TESTE
+# ==============================================================================
+
+def gerar_pfx(caminho, nome='TESTE LTDA', dias=365):
+    """Grava em `caminho` um .pfx autoassinado (senha SENHA); devolve o x509."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+
+    chave_privada = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    titular = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, nome)])
+    agora = datetime.now(timezone.utc)
+    cert = (x509.CertificateBuilder()
+            .subject_name(titular).issuer_name(titular)
+            .public_key(chave_privada.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(agora - timedelta(days=1))
+            .not_valid_after(agora + timedelta(days=dias))
+            .sign(chave_privada, hashes.SHA256()))
+    with open(caminho, 'wb') as f:
+        f.write(serialization.pkcs12.serialize_key_and_certificates(
+            b'teste', chave_privada, cert, None, serialization.BestAvailableEncryption(SENHA.encode())))
+    return cert
+
+
+# ==============================================================================
+# APP FLASK COM SQLITE
+# ==============================================================================
+
+@pytest.fixture
+def app_sqlite(tmp_path):
+    """
+    Fábrica: app_sqlite(*modelos, **config) → app Flask com contexto ativo,
+    SQLite em tmp_path (schema 'ouvirtiba' mapeado para o schema padrão) e só
+    as tabelas de `modelos`. SQLite não confere as FKs (loja, cliente...).
+    """
+    contextos = []
+
+    def criar(*modelos, **config):
+        app = Flask(__name__)
+        app.secret_key = 'teste'
+        app.root_path = str(tmp_path)
+        app.config.update(
+            SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'teste.db'}",
+            SQLALCHEMY_ENGINE_OPTIONS={'execution_options': {'schema_translate_map': {'ouvirtiba': None}}},
+            **config,
+        )
+        db.init_app(app)
+        contexto = app.app_context()
+        contexto.push()
+        contextos.append(contexto)
+        for modelo in modelos:
+            modelo.__table__.create(db.engine)
+        return app
+
+    yield criar
+    for contexto in reversed(contextos):
+        db.session.remove()
+        contexto.pop()
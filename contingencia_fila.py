@@ -0,0 +1,362 @@
+# contingencia_fila.py
+"""
+Transmissão em segundo plano das NFC-e emitidas em contingência off-line.
+
+As notas emitidas com tpEmis=9 (admin/nfe/contingencia.py) ficam com status
+'Contingencia' — a própria tabela invoice é a fila durável: sobrevive a
+restart e a deploy. Uma thread de fundo por worker:
+
+    1. havendo nota na fila, consulta o status do serviço (NfeStatusServico4)
+       no máximo a cada CONTINGENCIA_POLL_S
+    2. com a SEFAZ em operação (cStat 107) encerra a contingência automática
+       e transmite as notas em lotes assíncronos de até 50
+       (admin/nfe/nfce_lote.enviar_documentos), da mais antiga para a mais nova
+    3. os recibos seguem para o recibo_poller.py, que aplica os protocolos:
+       a rejeição de uma nota só vem do protNFe dela (aplicar_protocolos)
+
+Envio sem resposta não devolve a nota às cegas: nfce_lote consulta a chave
+(resolver_em_voo) e só a que não consta na SEFAZ (217) volta para a fila.
+Essa e as de lote adiado (serviço paralisado, 108/109/656) esperam cada vez
+mais (CONTINGENCIA_INTERVALOS_S) antes da nova tentativa; lote recusado sem
+protNFe deixa a nota em 'Lote_Rejeitado' até ser corrigida e re-assinada.
+A legislação exige a transmissão dentro de CONTINGENCIA_PRAZO_H horas da
+emissão: notas ainda sem autorização perto do prazo (na fila, em envio ou com
+o lote recusado) são registradas no log e contadas no /health.
+
+A reserva usa SELECT ... FOR UPDATE SKIP LOCKED e um lease em retry_at, como
+a caixa de saída de e-mails (email_outbox.py): dois workers não enviam a
+mesma nota.
+
+Configuração (app.config ou variáveis de ambiente):
+    CONTINGENCIA_THREAD     1 liga a thread (0 = só processar_pendentes())
+    CONTINGENCIA_POLL_S     intervalo da consulta de status (padrão: 60)
+    CONTINGENCIA_PRAZO_H    prazo legal de transmissão (padrão: 24)
+    CONTINGENCIA_LEASE_S    tempo de reserva de um lote em envio (padrão: 120)
+"""
+
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+logger = logging.getLogger('contingencia_fila')
+
+# Espera (s) antes de reenviar uma nota cujo lote falhou na rede ou foi adiado
+CONTINGENCIA_INTERVALOS_S = (30, 60, 120, 300, 600)
+
+# Nota em envio ou sem resposta, e com o lote recusado
+# (nfce_lote.STATUS_ENVIANDO / STATUS_LOTE_REJEITADO; sem importar o lxml)
+STATUS_ENVIANDO = 'Enviando'
+STATUS_LOTE_REJEITADO = 'Lote_Rejeitado'
+
+# Aviso no log quando faltar menos que isto para o prazo legal
+AVISO_PRAZO_H = 4
+
+
+def _env_int(nome, padrao):
+    try:
+        return int(os.getenv(nome, padrao))
+    except (TypeError, ValueError):
+        return padrao
+
+
+class ContingenciaFila:
+
+    def __init__(self, app=None, db=None):
+        self.app = None
+        self.db = db
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._falhas_seguidas = 0
+        # Métricas
+        self.enviadas = 0
+        self.lotes = 0
+        self.falhas = 0
+        self.ultimo_status = None      # (em_operacao, cStat, xMotivo, quando)
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db=None):
+        if db is not None:
+            self.db = db
+        self.app = app
+
+        app.config.setdefault('CONTINGENCIA_THREAD', _env_int('CONTINGENCIA_THREAD', 1))
+        app.config.setdefault('CONTINGENCIA_POLL_S', _env_int('CONTINGENCIA_POLL_S', 60))
+        app.config.setdefault('CONTINGENCIA_PRAZO_H', _env_int('CONTINGENCIA_PRAZO_H', 24))
+        app.config.setdefault('CONTINGENCIA_LEASE_S', _env_int('CONTINGENCIA_LEASE_S', 120))
+
+        if app.config['CONTINGENCIA_THREAD']:
+            # A thread sobe na 1ª requisição de cada worker (depois do fork)
+            app.before_request(self._garantir_thread)
+
+        app.extensions['contingencia_fila'] = self
+
+    def acordar(self):
+        """Avisa a thread de que entrou nota na fila."""
+        if self.app is not None and self.app.config['CONTINGENCIA_THREAD']:
+            self._garantir_thread()
+            self._acordar.set()
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Fila
+    # ──────────────────────────────────────────────────────────────────────
+    @staticmethod
+    def _sem_autorizacao(Invoice, *status):
+        """Filtro das notas tpEmis=9 nos status dados."""
+        return Invoice.status.in_(status) & (Invoice.tp_emis == '9')
+
+    def pendentes(self):
+        """
+        Notas na fila ('Contingencia') ou em envio sem resposta ('Enviando',
+        inclusive as on-line de um timeout em /transmit_nfe), vencidas ou não.
+        """
+        from admin.nfe.models import Invoice
+        from admin.nfe.contingencia import STATUS_CONTINGENCIA
+
+        return (self.db.session.query(func.count(Invoice.id))
+                .filter(Invoice.status.in_((STATUS_CONTINGENCIA, STATUS_ENVIANDO))).scalar())
+
+    def _reservar(self, limite):
+        """Ids das notas vencidas da fila (mais antigas primeiro), com lease."""
+        from admin.nfe.models import Invoice
+        from admin.nfe.contingencia import STATUS_CONTINGENCIA
+
+        sessao = self.db.session
+        try:
+            agora = datetime.now()
+            notas = (sessao.query(Invoice)
+                     .filter(Invoice.status == STATUS_CONTINGENCIA,
+                             (Invoice.retry_at.is_(None)) | (Invoice.retry_at <= agora))
+                     .order_by(Invoice.contingency_at, Invoice.id)
+                     .limit(limite)
+                     .with_for_update(skip_locked=True)
+                     .all())
+            lease = agora + timedelta(seconds=self.app.config['CONTINGENCIA_LEASE_S'])
+            for nota in notas:
+                nota.retry_at = lease
+            sessao.commit()
+            return [nota.id for nota in notas]
+        except Exception as e:
+            sessao.rollback()
+            logger.warning("⚠️ Falha ao reservar notas da contingência: %s", e)
+            return []
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Processamento
+    # ──────────────────────────────────────────────────────────────────────
+    def verificar_sefaz(self):
+        """
+        Status do serviço (guardado para o /health). Com a sonda do
+        sefaz_status.py registrada, reaproveita a consulta em cache se tiver
+        menos de um ciclo da fila.
+        """
+        sonda = self.app.extensions.get('sefaz_status')
+        if sonda is not None:
+            atual = sonda.verificar(max_idade_s=self.app.config['CONTINGENCIA_POLL_S'])
+            if atual is None:
+                return False   # sem resultado (compartimento lotado): tenta no próximo ciclo
+            em_operacao, cstat, xmotivo = atual['online'], atual['cstat'], atual['xmotivo']
+        else:
+            from admin.nfe.contingencia import sefaz_em_operacao
+            em_operacao, cstat, xmotivo = sefaz_em_operacao()
+            if em_operacao is None:
+                logger.info("🚧 Consulta de status adiada: %s", xmotivo)
+                return False
+        self.ultimo_status = (em_operacao, cstat, xmotivo, datetime.now())
+        if not em_operacao:
+            logger.info("🚧 SEFAZ fora de operação (%s - %s): contingência mantida", cstat, xmotivo)
+        return em_operacao
+
+    def processar_pendentes(self):
+        """
+        Se houver fila e a SEFAZ estiver em operação, transmite todas as notas
+        vencidas em lotes. Retorna quantas notas enviou.
+        """
+        from admin.nfe.models import Invoice
+        from admin.nfe.contingencia import sair_contingencia
+
+        with self.app.app_context():
+            try:
+                self._avisar_prazo()
+                if not self.pendentes():
+                    return 0
+            except Exception as e:
+                self.db.session.rollback()
+                logger.warning("⚠️ Não foi possível ler a fila da contingência: %s", e)
+                return 0
+            if not self.verificar_sefaz():
+                return 0
+            sair_contingencia(somente_automatica=True)
+
+            # lxml/requests só carregam quando há fila (worker sobe leve)
+            from admin.nfe.nfce_lote import LOTE_MAX, resolver_em_voo
+            from admin.nfe.sefaz_client import cliente_sefaz
+
+            # Envios anteriores sem resposta: consulta a chave antes de reenviar
+            try:
+                resolver_em_voo(cliente_sefaz())
+            except Exception as e:
+                self.db.session.rollback()
+                logger.warning("⚠️ Não foi possível consultar as notas em envio: %s", e)
+
+            enviadas = 0
+            while True:
+                ids = self._reservar(LOTE_MAX)
+                if not ids:
+                    break
+                notas = Invoice.query.filter(Invoice.id.in_(ids)).order_by(Invoice.contingency_at, Invoice.id).all()
+                enviadas += self._enviar(notas)
+                if self._falhas_seguidas:
+                    break   # rede caiu de novo: espera a próxima verificação
+            return enviadas
+
+    def _enviar(self, notas):
+        from admin.nfe.contingencia import STATUS_CONTINGENCIA
+        from admin.nfe.nfce_lote import CSTAT_LOTE_POR_DOCUMENTO, enviar_documentos, _ler_documentos
+        from admin.nfe.sefaz_client import cliente_sefaz
+        from extension import recibo_poller
+
+        sessao = self.db.session
+        documentos = _ler_documentos(notas, self.app.root_path)
+        lidas = {nota.id for nota, _, _ in documentos}
+        for nota in notas:
+            if nota.id not in lidas:
+                nota.retry_at = datetime.now() + timedelta(hours=1)
+                logger.error("❌ NFC-e %s em contingência sem XML assinado legível", nota.number)
+        sessao.commit()
+        if not documentos:
+            return 0
+
+        # Recusa do lote (215/225) divide o lote; rejeição de cada nota só
+        # vem do protNFe, aplicado pelo recibo_poller (aplicar_protocolos)
+        lotes = enviar_documentos(cliente_sefaz(), documentos)
+        recebidos = [l for l in lotes if l.status in ('recebido', 'processado')]
+        enviadas = sum(l.quantidade for l in recebidos)
+        with self._lock:
+            self.lotes += len(lotes)
+            self.enviadas += enviadas
+        if recebidos:
+            logger.info("📤 Contingência: %d nota(s) transmitida(s) em %d lote(s)", enviadas, len(recebidos))
+            recibo_poller.acordar()
+        for lote in lotes:
+            if lote.status == 'rejeitado' and not (lote.cstat in CSTAT_LOTE_POR_DOCUMENTO
+                                                   and lote.quantidade > 1):
+                logger.error("❌ Lote %s da contingência recusado: %s - %s (notas em Lote_Rejeitado)",
+                             lote.id, lote.cstat, lote.xmotivo)
+
+        # Sem resposta (erro) ou serviço paralisado (adiado): as notas que
+        # voltaram para a fila esperam cada vez mais antes da nova tentativa
+        if not any(l.status in ('erro', 'adiado') for l in lotes):
+            self._falhas_seguidas = 0
+            return enviadas
+        self._falhas_seguidas += 1
+        espera = CONTINGENCIA_INTERVALOS_S[min(self._falhas_seguidas, len(CONTINGENCIA_INTERVALOS_S)) - 1]
+        depois = datetime.now() + timedelta(seconds=espera)
+        for nota, _, _ in documentos:
+            sessao.refresh(nota)
+            if nota.status == STATUS_CONTINGENCIA and (nota.retry_at is None or nota.retry_at < depois):
+                nota.retry_at = depois
+        sessao.commit()
+        with self._lock:
+            self.falhas += 1
+        return enviadas
+
+    def _avisar_prazo(self):
+        """Loga as notas da fila perto do (ou além do) prazo legal."""
+        from admin.nfe.models import Invoice
+        from admin.nfe.contingencia import STATUS_CONTINGENCIA
+
+        prazo = timedelta(hours=self.app.config['CONTINGENCIA_PRAZO_H'])
+        limite = datetime.now() - prazo + timedelta(hours=AVISO_PRAZO_H)
+        sem_autorizacao = self._sem_autorizacao(Invoice, STATUS_CONTINGENCIA, STATUS_ENVIANDO,
+                                                STATUS_LOTE_REJEITADO)
+        proximas = (self.db.session.query(Invoice.number, Invoice.contingency_at)
+                    .filter(sem_autorizacao, Invoice.contingency_at <= limite)
+                    .all())
+        for numero, emissao in proximas:
+            restante = (emissao + prazo - datetime.now()).total_seconds() / 3600
+            if restante <= 0:
+                logger.error("❌ NFC-e %s em contingência há mais de %dh sem transmissão",
+                             numero, self.app.config['CONTINGENCIA_PRAZO_H'])
+            else:
+                logger.warning("⏰ NFC-e %s em contingência: %.1fh para o fim do prazo", numero, restante)
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Thread de fundo
+    # ──────────────────────────────────────────────────────────────────────
+    def _garantir_thread(self):
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == pid and self._thread.is_alive():
+                return
+            self._pid = pid
+            self._thread = threading.Thread(target=self._loop, name='contingencia-fila', daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        logger.info("🚧 Thread da fila de contingência iniciada (pid %d)", os.getpid())
+        while True:
+            try:
+                self.processar_pendentes()
+            except Exception as e:
+                logger.error("❌ Erro na thread da fila de contingência: %s", e)
+            self._acordar.wait(self.app.config['CONTINGENCIA_POLL_S'])
+            self._acordar.clear()
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Relatório (/health)
+    # ──────────────────────────────────────────────────────────────────────
+    def relatorio(self):
+        from admin.nfe.models import Invoice, NfeContingencia
+        from admin.nfe.contingencia import STATUS_CONTINGENCIA
+
+        with self._lock:
+            dados = {
+                'sent': self.enviadas,
+                'batches': self.lotes,
+                'failures': self.falhas,
+            }
+        if self.ultimo_status:
+            em_operacao, cstat, xmotivo, quando = self.ultimo_status
+            dados['sefaz'] = {'online': em_operacao, 'cstat': cstat, 'reason': xmotivo,
+                              'checked_at': quando.isoformat(timespec='seconds')}
+
+        try:
+            sessao = self.db.session
+            prazo = datetime.now() - timedelta(hours=self.app.config['CONTINGENCIA_PRAZO_H'])
+            sem_autorizacao = self._sem_autorizacao(Invoice, STATUS_CONTINGENCIA, STATUS_ENVIANDO,
+                                                    STATUS_LOTE_REJEITADO)
+            na_fila = (sessao.query(func.count(Invoice.id))
+                       .filter(self._sem_autorizacao(Invoice, STATUS_CONTINGENCIA, STATUS_ENVIANDO))
+                       .scalar())
+            recusadas, mais_antiga = (sessao.query(
+                func.count(Invoice.id).filter(Invoice.status == STATUS_LOTE_REJEITADO),
+                func.min(Invoice.contingency_at)).filter(sem_autorizacao).one())
+            atrasadas = (sessao.query(func.count(Invoice.id))
+                         .filter(sem_autorizacao, Invoice.contingency_at < prazo)
+                         .scalar())
+            ativa = (sessao.query(NfeContingencia.inicio)
+                     .filter(NfeContingencia.fim.is_(None)).order_by(NfeContingencia.inicio.desc())
+                     .first())
+            dados['active_since'] = ativa[0].isoformat(timespec='seconds') if ativa else None
+            dados['queue'] = {
+                'invoices': na_fila,
+                'rejected': recusadas,
+                'overdue': atrasadas,
+                'oldest_age_h': (round((datetime.now() - mais_antiga).total_seconds() / 3600, 1)
+                                 if mais_antiga else None),
+            }
+        except Exception as e:
+            self.db.session.rollback()
+            dados['queue'] = None
+            logger.warning("⚠️ Não foi possível contar a fila da contingência: %s", e)
+
+        dados['thread'] = bool(self._thread and self._pid == os.getpid() and self._thread.is_alive())
+        return dados
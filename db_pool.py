@@ -0,0 +1,172 @@
+# db_pool.py
+"""
+Pool de conexões com o PostgreSQL (Supabase).
+
+- engine_options(url) monta SQLALCHEMY_ENGINE_OPTIONS a partir do ambiente;
+- PoolMonitor mede a latência de cada conexão nova, aquece o pool no boot e
+  gera o relatório usado pela rota /health.
+
+Perfis (DB_POOL_PROFILE):
+    direct     conexão direta (porta 5432): QueuePool por worker, com
+               pool_pre_ping e reciclagem das conexões antigas (padrão)
+    pgbouncer  pooler do Supabase em modo transaction (porta 6543): quem faz
+               o pool é o PgBouncer, então cada checkout abre/fecha a conexão
+               (NullPool) e não há prepared statements
+
+Ajuste fino (variáveis de ambiente, perfil direct):
+    DB_POOL_SIZE        conexões mantidas por worker (padrão: 5)
+    DB_MAX_OVERFLOW     conexões extras em pico (padrão: 2)
+    DB_POOL_TIMEOUT     segundos esperando uma conexão livre (padrão: 10)
+    DB_POOL_RECYCLE     recicla conexões com mais de N segundos (padrão: 1800)
+    DB_CONNECT_TIMEOUT  timeout do connect no psycopg (padrão: 10)
+    DB_POOL_WARMUP      conexões abertas no boot (padrão: 1; 0 desliga)
+
+Dimensionamento: workers do gunicorn × (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+precisa ficar abaixo do limite de conexões do Supabase. Os números reais
+(checked_out, overflow, connect_ms) estão em GET /health.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import event, text
+from sqlalchemy.pool import NullPool
+
+logger = logging.getLogger('db_pool')
+
+
+def _env_int(nome, padrao):
+    try:
+        return int(os.getenv(nome, padrao))
+    except (TypeError, ValueError):
+        return padrao
+
+
+def engine_options(url=None, perfil=None):
+    """Opções do create_engine conforme o perfil do pool (só PostgreSQL)."""
+    url = url if url is not None else os.getenv('DATABASE_URL', '')
+    if not url.startswith('postgres'):
+        # sqlite dos testes: pool próprio do SQLAlchemy, sem parâmetros de tamanho
+        return {'pool_pre_ping': True}
+
+    perfil = (perfil or os.getenv('DB_POOL_PROFILE', 'direct')).lower()
+
+    connect_args = {
+        'prepare_threshold': None,  # Fix psycopg3 DuplicatePreparedStatement em produção
+        'connect_timeout': _env_int('DB_CONNECT_TIMEOUT', 10),
+    }
+
+    if perfil == 'pgbouncer':
+        return {
+            'poolclass': NullPool,
+            'connect_args': connect_args,
+        }
+
+    return {
+        'pool_size': _env_int('DB_POOL_SIZE', 5),
+        'max_overflow': _env_int('DB_MAX_OVERFLOW', 2),
+        'pool_timeout': _env_int('DB_POOL_TIMEOUT', 10),
+        'pool_recycle': _env_int('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': True,
+        'connect_args': connect_args,
+    }
+
+
+class PoolMonitor:
+
+    def __init__(self, app=None, db=None):
+        self.db = db
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.conexoes = 0
+        self.ultimo_connect_ms = None
+        self.ultimo_connect_em = None
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db=None):
+        if db is not None:
+            self.db = db
+
+        app.config.setdefault('DB_POOL_WARMUP', _env_int('DB_POOL_WARMUP', 1))
+        app.extensions['pool_monitor'] = self
+
+        # O engine só existe depois de db.init_app(app)
+        with app.app_context():
+            engine = self.db.engine
+        event.listen(engine, 'do_connect', self._antes_connect)
+        event.listen(engine, 'connect', self._depois_connect)
+
+        if app.config['DB_POOL_WARMUP'] > 0:
+            self.aquecer(engine, app.config['DB_POOL_WARMUP'])
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Latência de conexão (do_connect → connect)
+    # ──────────────────────────────────────────────────────────────────────
+    def _antes_connect(self, dialect, conn_rec, cargs, cparams):
+        self._local.inicio = time.perf_counter()
+
+    def _depois_connect(self, dbapi_connection, connection_record):
+        inicio = getattr(self._local, 'inicio', None)
+        if inicio is None:
+            return
+        self._local.inicio = None
+        duracao = (time.perf_counter() - inicio) * 1000
+        with self._lock:
+            self.conexoes += 1
+            self.ultimo_connect_ms = round(duracao, 1)
+            self.ultimo_connect_em = time.time()
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Warm-up
+    # ──────────────────────────────────────────────────────────────────────
+    def aquecer(self, engine, quantidade):
+        """Abre `quantidade` conexões e devolve ao pool (primeira requisição sem connect)."""
+        abertas = []
+        inicio = time.perf_counter()
+        try:
+            for _ in range(quantidade):
+                conn = engine.connect()
+                abertas.append(conn)
+                conn.execute(text("SELECT 1"))
+        except Exception as e:
+            # Banco fora do ar não pode impedir o worker de subir
+            logger.warning("⚠️ Warm-up do pool falhou: %s", e)
+        finally:
+            for conn in abertas:
+                conn.close()
+        if abertas:
+            logger.info("🔥 Pool aquecido: %d conexão(ões) em %.0f ms",
+                        len(abertas), (time.perf_counter() - inicio) * 1000)
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Relatório (/health)
+    # ──────────────────────────────────────────────────────────────────────
+    def relatorio(self, engine=None):
+        engine = engine or self.db.engine
+        pool = engine.pool
+
+        dados = {'pool': type(pool).__name__}
+        for chave, metodo in (('size', 'size'), ('checked_in', 'checkedin'),
+                              ('checked_out', 'checkedout'), ('overflow', 'overflow'),
+                              ('timeout', 'timeout')):
+            funcao = getattr(pool, metodo, None)
+            if callable(funcao):
+                dados[chave] = funcao()
+        if 'overflow' in dados:
+            # QueuePool conta o overflow a partir de -pool_size
+            dados['overflow'] = max(0, dados['overflow'])
+        if hasattr(pool, '_max_overflow'):
+            dados['max_overflow'] = pool._max_overflow
+
+        with self._lock:
+            dados['connects'] = self.conexoes
+            dados['last_connect_ms'] = self.ultimo_connect_ms
+            dados['last_connect_age_s'] = (
+                round(time.time() - self.ultimo_connect_em, 1)
+                if self.ultimo_connect_em else None
+            )
+        dados['pid'] = os.getpid()
+        return dados
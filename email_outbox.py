@@ -0,0 +1,364 @@
+# email_outbox.py
+"""
+Caixa de saída de e-mails (formulário de contato).
+
+Antes contato() chamava resend.Emails.send dentro da requisição: com o Resend
+lento ou fora do ar o worker do gunicorn ficava preso e o visitante esperava
+(ou recebia erro). Agora a rota só grava o e-mail na tabela email_outbox
+(OutboxMessage) e responde; uma thread de fundo por worker reserva as linhas
+pendentes e envia num pool de threads.
+
+Falha no envio → nova tentativa com backoff exponencial (EMAIL_BACKOFF_BASE_S,
+dobrando até EMAIL_BACKOFF_MAX_S, com jitter). Depois de EMAIL_MAX_TENTATIVAS
+a linha fica com status 'morto' (dead letter) e o erro em last_error; para
+reenviar: UPDATE ouvirtiba.email_outbox SET status='pendente', attempts=0
+WHERE id = ...
+
+A reserva usa SELECT ... FOR UPDATE SKIP LOCKED e um lease (linha 'enviando'
+com next_attempt_at no futuro), então vários workers podem processar a mesma
+tabela e um worker que morrer no meio do envio não perde o e-mail.
+
+Configuração (app.config ou variáveis de ambiente):
+    EMAIL_TRANSPORT         resend (padrão) | fake (não envia; para testes)
+    EMAIL_OUTBOX_THREAD     1 liga a thread de envio (0 = só processar_pendentes())
+    EMAIL_OUTBOX_WORKERS    threads de envio simultâneo (padrão: 2)
+    EMAIL_OUTBOX_POLL_S     varredura máxima sem aviso de e-mail novo (padrão: 300)
+    EMAIL_MAX_TENTATIVAS    tentativas antes do dead letter (padrão: 6)
+    EMAIL_BACKOFF_BASE_S    espera após a 1ª falha (padrão: 30)
+    EMAIL_BACKOFF_MAX_S     espera máxima entre tentativas (padrão: 3600)
+    EMAIL_LEASE_S           tempo de reserva de uma linha em envio (padrão: 120)
+
+Métricas (por worker) em relatorio(), exibidas no /health.
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+logger = logging.getLogger('email_outbox')
+
+
+def _env_int(nome, padrao):
+    try:
+        return int(os.getenv(nome, padrao))
+    except (TypeError, ValueError):
+        return padrao
+
+
+# ==============================================================================
+# TRANSPORTES
+# ==============================================================================
+
+def _falha_do_resend(erro):
+    """4xx (exceto 429) é erro do e-mail (remetente, campos), não o Resend fora."""
+    try:
+        codigo = int(getattr(erro, 'code', 500))
+    except (TypeError, ValueError):
+        return True
+    return codigo == 429 or not 400 <= codigo < 500
+
+
+class ResendTransport:
+    """
+    Envio real pela API do Resend, pela dependência 'resend' de
+    chamadas_externas.py (timeout próprio, limite de envios simultâneos e
+    disjuntor: com o Resend fora a linha volta para a fila sem esperar).
+    """
+
+    def __init__(self, api_key, externo=None):
+        from chamadas_externas import dependencia
+
+        self.api_key = api_key
+        self.externo = externo or dependencia('resend', conta_falha=_falha_do_resend)
+
+    def enviar(self, params):
+        if not self.api_key:
+            raise RuntimeError("RESEND_API_KEY não configurada")
+        import resend  # ⚡ importado só no envio (ver create_app)
+        from resend.http_client_requests import RequestsClient
+
+        resend.api_key = self.api_key
+        # O SDK usa 30 s fixos por padrão: troca pelo timeout da dependência
+        if getattr(resend.default_http_client, '_timeout', None) != self.externo.timeout:
+            resend.default_http_client = RequestsClient(timeout=self.externo.timeout)
+        resposta = self.externo.chamar(resend.Emails.send, params)
+        return resposta.get('id') if isinstance(resposta, dict) else getattr(resposta, 'id', None)
+
+
+class FakeTransport:
+    """
+    Transporte local para testes: guarda os e-mails em `enviados`.
+
+    `falhas` faz as próximas N chamadas levantarem erro; `latencia_s` simula
+    a demora da API.
+    """
+
+    def __init__(self, falhas=0, latencia_s=0.0):
+        self.falhas = falhas
+        self.latencia_s = latencia_s
+        self.enviados = []
+        self._lock = threading.Lock()
+
+    def enviar(self, params):
+        if self.latencia_s:
+            time.sleep(self.latencia_s)
+        with self._lock:
+            if self.falhas > 0:
+                self.falhas -= 1
+                raise RuntimeError("falha simulada do transporte")
+            self.enviados.append(params)
+            return f"fake-{len(self.enviados)}"
+
+
+# ==============================================================================
+# EXTENSÃO
+# ==============================================================================
+
+class EmailOutbox:
+
+    def __init__(self, app=None, db=None):
+        self.app = None
+        self.db = db
+        self.transport = None
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._executor = None
+        self._executor_pid = None
+        # Métricas
+        self.enviados = 0
+        self.falhas = 0
+        self.mortos = 0
+        self._latencias = deque(maxlen=200)
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db=None):
+        if db is not None:
+            self.db = db
+        self.app = app
+
+        app.config.setdefault('EMAIL_TRANSPORT', os.getenv('EMAIL_TRANSPORT', 'resend'))
+        app.config.setdefault('EMAIL_OUTBOX_THREAD', _env_int('EMAIL_OUTBOX_THREAD', 1))
+        app.config.setdefault('EMAIL_OUTBOX_WORKERS', _env_int('EMAIL_OUTBOX_WORKERS', 2))
+        app.config.setdefault('EMAIL_OUTBOX_POLL_S', _env_int('EMAIL_OUTBOX_POLL_S', 300))
+        app.config.setdefault('EMAIL_MAX_TENTATIVAS', _env_int('EMAIL_MAX_TENTATIVAS', 6))
+        app.config.setdefault('EMAIL_BACKOFF_BASE_S', _env_int('EMAIL_BACKOFF_BASE_S', 30))
+        app.config.setdefault('EMAIL_BACKOFF_MAX_S', _env_int('EMAIL_BACKOFF_MAX_S', 3600))
+        app.config.setdefault('EMAIL_LEASE_S', _env_int('EMAIL_LEASE_S', 120))
+
+        if self.transport is None:
+            if app.config['EMAIL_TRANSPORT'] == 'fake':
+                self.transport = FakeTransport()
+            else:
+                self.transport = ResendTransport(os.getenv('RESEND_API_KEY'))
+
+        if app.config['EMAIL_OUTBOX_THREAD']:
+            # A thread sobe na 1ª requisição de cada worker (depois do fork)
+            # e já envia o que ficou pendente de um deploy anterior.
+            app.before_request(self._garantir_thread)
+
+        app.extensions['email_outbox'] = self
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Enfileirar (chamado pela rota)
+    # ──────────────────────────────────────────────────────────────────────
+    def enfileirar(self, params):
+        """Grava o e-mail na caixa de saída e avisa a thread de envio."""
+        from admin.models import OutboxMessage
+
+        mensagem = OutboxMessage(payload=json.dumps(params, ensure_ascii=False),
+                                 status='pendente', attempts=0,
+                                 next_attempt_at=datetime.now())
+        self.db.session.add(mensagem)
+        self.db.session.commit()
+        logger.info("📥 E-mail %s enfileirado", mensagem.id)
+
+        if self.app.config['EMAIL_OUTBOX_THREAD']:
+            self._garantir_thread()
+            self._acordar.set()
+        return mensagem.id
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Processamento
+    # ──────────────────────────────────────────────────────────────────────
+    def processar_pendentes(self, limite=20):
+        """Reserva até `limite` e-mails vencidos e envia. Retorna quantos processou."""
+        reservados = self._reservar(limite)
+        if not reservados:
+            return 0
+        workers = max(1, self.app.config['EMAIL_OUTBOX_WORKERS'])
+        if workers == 1 or len(reservados) == 1:
+            for item in reservados:
+                self._enviar_um(*item)
+        else:
+            list(self._pool(workers).map(lambda item: self._enviar_um(*item), reservados))
+        return len(reservados)
+
+    def _reservar(self, limite):
+        from admin.models import OutboxMessage
+
+        with self.app.app_context():
+            sessao = self.db.session
+            agora = datetime.now()
+            try:
+                linhas = (sessao.query(OutboxMessage)
+                          .filter(OutboxMessage.status.in_(('pendente', 'enviando')),
+                                  OutboxMessage.next_attempt_at <= agora)
+                          .order_by(OutboxMessage.next_attempt_at)
+                          .limit(limite)
+                          .with_for_update(skip_locked=True)
+                          .all())
+                lease = agora + timedelta(seconds=self.app.config['EMAIL_LEASE_S'])
+                reservados = []
+                for m in linhas:
+                    m.status = 'enviando'
+                    m.attempts += 1
+                    m.next_attempt_at = lease
+                    reservados.append((m.id, m.payload, m.attempts))
+                sessao.commit()
+                return reservados
+            except Exception as e:
+                sessao.rollback()
+                logger.warning("⚠️ Falha ao reservar e-mails da caixa de saída: %s", e)
+                return []
+
+    def _enviar_um(self, mensagem_id, payload, tentativa):
+        from admin.models import OutboxMessage
+
+        inicio = time.perf_counter()
+        try:
+            provider_id = self.transport.enviar(json.loads(payload))
+            erro = None
+        except Exception as e:
+            provider_id, erro = None, e
+        duracao = (time.perf_counter() - inicio) * 1000
+
+        maximo = self.app.config['EMAIL_MAX_TENTATIVAS']
+        if erro is None:
+            campos = {'status': 'enviado', 'sent_at': datetime.now(),
+                      'provider_id': provider_id, 'last_error': None}
+            logger.info("✅ E-mail %s enviado (%.0f ms) ID: %s", mensagem_id, duracao, provider_id)
+        elif tentativa >= maximo:
+            campos = {'status': 'morto', 'last_error': str(erro)[:1000]}
+            logger.error("❌ E-mail %s descartado após %d tentativas: %s", mensagem_id, tentativa, erro)
+        else:
+            espera = self.backoff(tentativa)
+            campos = {'status': 'pendente', 'last_error': str(erro)[:1000],
+                      'next_attempt_at': datetime.now() + timedelta(seconds=espera)}
+            logger.warning("⚠️ E-mail %s falhou (tentativa %d/%d), nova tentativa em %.0fs: %s",
+                           mensagem_id, tentativa, maximo, espera, erro)
+
+        with self._lock:
+            self._latencias.append(duracao)
+            if erro is None:
+                self.enviados += 1
+            else:
+                self.falhas += 1
+                if campos['status'] == 'morto':
+                    self.mortos += 1
+
+        with self.app.app_context():
+            try:
+                self.db.session.query(OutboxMessage).filter_by(id=mensagem_id).update(campos)
+                self.db.session.commit()
+            except Exception as e:
+                # O lease expira e a linha volta a ser reservada
+                self.db.session.rollback()
+                logger.error("❌ Não foi possível atualizar o e-mail %s: %s", mensagem_id, e)
+
+    def backoff(self, tentativa):
+        """Espera (s) antes da próxima tentativa: base * 2^(n-1), limitada, com jitter."""
+        base = self.app.config['EMAIL_BACKOFF_BASE_S']
+        espera = min(base * (2 ** (tentativa - 1)), self.app.config['EMAIL_BACKOFF_MAX_S'])
+        return espera * random.uniform(0.8, 1.2)
+
+    def _pool(self, workers):
+        # Depois do fork do gunicorn o pool do processo pai não tem threads
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='email-outbox')
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Thread de fundo
+    # ──────────────────────────────────────────────────────────────────────
+    def _garantir_thread(self):
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == pid and self._thread.is_alive():
+                return
+            # Depois do fork do gunicorn a thread do processo pai não existe
+            self._pid = pid
+            self._thread = threading.Thread(target=self._loop, name='email-outbox', daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        logger.info("📤 Thread da caixa de saída iniciada (pid %d)", os.getpid())
+        while True:
+            try:
+                while self.processar_pendentes() > 0:
+                    pass
+                espera = self._ate_proxima_tentativa()
+            except Exception as e:
+                logger.error("❌ Erro na thread da caixa de saída: %s", e)
+                espera = self.app.config['EMAIL_OUTBOX_POLL_S']
+            self._acordar.wait(espera)
+            self._acordar.clear()
+
+    def _ate_proxima_tentativa(self):
+        """Segundos até o próximo e-mail vencer (no máximo EMAIL_OUTBOX_POLL_S)."""
+        from admin.models import OutboxMessage
+
+        maximo = self.app.config['EMAIL_OUTBOX_POLL_S']
+        with self.app.app_context():
+            proxima = (self.db.session.query(func.min(OutboxMessage.next_attempt_at))
+                       .filter(OutboxMessage.status.in_(('pendente', 'enviando')))
+                       .scalar())
+            self.db.session.commit()
+        if proxima is None:
+            return maximo
+        return min(max((proxima - datetime.now()).total_seconds(), 1), maximo)
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Relatório (/health)
+    # ──────────────────────────────────────────────────────────────────────
+    def relatorio(self):
+        from admin.models import OutboxMessage
+
+        with self._lock:
+            latencias = sorted(self._latencias)
+            dados = {
+                'sent': self.enviados,
+                'failures': self.falhas,
+                'dead': self.mortos,
+                'last_send_ms': round(self._latencias[-1], 1) if self._latencias else None,
+            }
+        if latencias:
+            dados['send_p50_ms'] = round(latencias[len(latencias) // 2], 1)
+            dados['send_p95_ms'] = round(latencias[min(len(latencias) - 1, int(len(latencias) * 0.95))], 1)
+
+        try:
+            contagem = dict(self.db.session.query(OutboxMessage.status, func.count(OutboxMessage.id))
+                            .filter(OutboxMessage.status != 'enviado')
+                            .group_by(OutboxMessage.status)
+                            .all())
+            dados['queue'] = {s: contagem.get(s, 0) for s in ('pendente', 'enviando', 'morto')}
+        except Exception as e:
+            self.db.session.rollback()
+            dados['queue'] = None
+            logger.warning("⚠️ Não foi possível contar a caixa de saída: %s", e)
+
+        dados['thread'] = bool(self._thread and self._pid == os.getpid() and self._thread.is_alive())
+        return dados
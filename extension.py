@@ -1,5 +1,19 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
+from profiler import RequestProfiler
+from db_pool import PoolMonitor
+from page_cache import PageCache
+from email_outbox import EmailOutbox
+from recibo_poller import ReciboPoller
+from contingencia_fila import ContingenciaFila
+from sefaz_status import SefazStatus
 
 db = SQLAlchemy() # Instância A
 bcrypt = Bcrypt()
+profiler = RequestProfiler()  # ⏱️ métricas por requisição (SQL, Jinja, Server-Timing)
+pool_monitor = PoolMonitor()  # 🔌 warm-up e estatísticas do pool de conexões (/health)
+page_cache = PageCache()  # 📄 cache de página inteira do site público (ETag/304)
+email_outbox = EmailOutbox()  # 📤 caixa de saída de e-mails com envio em segundo plano
+recibo_poller = ReciboPoller()  # 📬 consulta dos recibos da SEFAZ em segundo plano
+contingencia_fila = ContingenciaFila()  # 🚧 transmissão das NFC-e emitidas em contingência off-line
+sefaz_status = SefazStatus()  # 🛰️ status do serviço da SEFAZ consultado em segundo plano
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Script de migração dos índices (ix_*) declarados nos models.
+
+db.create_all() só cria índices junto com tabelas novas; nas tabelas que já
+existem em produção eles precisam ser criados à parte. Este script lê os
+db.Index(...) do metadata e executa, um a um:
+
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_... ON ouvirtiba.tabela (...);
+
+- IF NOT EXISTS  → pode ser executado quantas vezes quiser (idempotente);
+- CONCURRENTLY   → não bloqueia escrita na tabela durante a criação
+                   (por isso cada comando roda fora de transação).
+
+Uso:
+    python migrar_indices.py          # cria os índices que faltam
+    python migrar_indices.py --sql    # só imprime o SQL
+"""
+
+import sys
+
+from sqlalchemy import text
+
+
+def _indices(metadata):
+    """Índices de todas as tabelas do schema ouvirtiba, em ordem estável."""
+    for tabela in sorted(metadata.tables.values(), key=lambda t: t.fullname):
+        if tabela.schema != 'ouvirtiba':
+            continue
+        for indice in sorted(tabela.indexes, key=lambda i: i.name):
+            if indice.name and indice.name.startswith('ix_'):
+                yield indice
+
+
+def gerar_sql(metadata):
+    comandos = []
+    for indice in _indices(metadata):
+        colunas = ', '.join(c.name for c in indice.columns)
+        unico = 'UNIQUE ' if indice.unique else ''
+        comandos.append(
+            f"CREATE {unico}INDEX CONCURRENTLY IF NOT EXISTS {indice.name} "
+            f"ON {indice.table.fullname} ({colunas});"
+        )
+    return comandos
+
+
+def migrar(engine, comandos):
+    # CONCURRENTLY não roda dentro de transação → AUTOCOMMIT
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        for sql in comandos:
+            print(f"🔧 {sql}")
+            conn.execute(text(sql))
+        # Atualiza as estatísticas para o planner considerar os novos índices
+        for tabela in sorted({sql.split(' ON ')[1].split(' ')[0] for sql in comandos}):
+            conn.execute(text(f"ANALYZE {tabela}"))
+    print(f"✅ {len(comandos)} índice(s) verificados/criados")
+
+
+if __name__ == '__main__':
+    from app import app, db
+
+    with app.app_context():
+        comandos = gerar_sql(db.metadata)
+        if '--sql' in sys.argv:
+            print('\n'.join(comandos))
+        else:
+            migrar(db.engine, comandos)
@@ -0,0 +1,311 @@
+# page_cache.py
+"""
+Cache de página inteira para o site público (home, sobre, produtos, política
+e blog).
+
+Essas páginas são iguais para todo visitante anônimo, mas a cada acesso de
+visitante ou crawler o Jinja renderizava o template de novo (e /blog ainda
+consultava BlogPost). Com o decorator @page_cache.cached(ttl=...) a resposta
+200 de um GET anônimo é guardada e reaproveitada até expirar o TTL da rota ou
+até alguém chamar page_cache.clear() (feito pelas rotas de CRUD do blog).
+
+clear() também grava um arquivo de geração em PAGE_CACHE_DIR: os outros
+workers do servidor comparam a geração antes de usar o LRU em memória e o
+descartam quando ela muda. Em outro servidor a página vale até o TTL.
+
+Toda resposta servida pelo cache leva ETag e Last-Modified; requisições
+condicionais (If-None-Match / If-Modified-Since) recebem 304 sem corpo.
+O cabeçalho X-Cache (HIT / MISS / BYPASS) mostra o que aconteceu.
+
+Configuração (app.config ou variáveis de ambiente):
+    PAGE_CACHE_ENABLED      liga/desliga (padrão: True)
+    PAGE_CACHE_BACKEND      memory (LRU por worker, padrão) | disk (compartilhado
+                            entre os workers do mesmo servidor)
+    PAGE_CACHE_MAX_ENTRIES  máximo de páginas guardadas, por worker (memory) ou
+                            na pasta (disk) (padrão: 256)
+    PAGE_CACHE_DIR          pasta do backend disk e do arquivo de geração
+                            (padrão: <tmp>/ouvirtiba_page_cache)
+"""
+
+import functools
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from flask import current_app, make_response, request, session
+from werkzeug.http import http_date
+
+logger = logging.getLogger('page_cache')
+
+
+# ==============================================================================
+# BACKENDS
+# ==============================================================================
+
+class MemoryBackend:
+    """LRU em memória (um por worker do gunicorn)."""
+
+    compartilhado = False
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._dados = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chave):
+        with self._lock:
+            entrada = self._dados.get(chave)
+            if entrada is not None:
+                self._dados.move_to_end(chave)
+            return entrada
+
+    def set(self, chave, entrada):
+        with self._lock:
+            self._dados[chave] = entrada
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.max_entries:
+                self._dados.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._dados.clear()
+
+    def __len__(self):
+        return len(self._dados)
+
+
+class DiskBackend:
+    """
+    Um arquivo por página na pasta configurada (gravação atômica).
+
+    O mtime do arquivo é a expiração da página: passando de `max_entries`
+    arquivos, saem as páginas vencidas e, se ainda faltar espaço, as que
+    vencem primeiro.
+    """
+
+    compartilhado = True
+
+    def __init__(self, pasta, max_entries=256):
+        self.pasta = pasta
+        self.max_entries = max_entries
+        os.makedirs(pasta, exist_ok=True)
+
+    def _arquivo(self, chave):
+        return os.path.join(self.pasta, hashlib.sha1(chave.encode('utf-8')).hexdigest() + '.page')
+
+    def get(self, chave):
+        try:
+            with open(self._arquivo(chave), 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.PickleError, EOFError):
+            return None
+
+    def set(self, chave, entrada):
+        fd, temporario = tempfile.mkstemp(dir=self.pasta, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(entrada, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.utime(temporario, (entrada['expira'], entrada['expira']))
+            os.replace(temporario, self._arquivo(chave))
+        except OSError as e:
+            logger.warning("⚠️ Não foi possível gravar página em cache: %s", e)
+            try:
+                os.remove(temporario)
+            except OSError:
+                pass
+            return
+        self._limitar()
+
+    def _limitar(self):
+        nomes = [nome for nome in os.listdir(self.pasta) if nome.endswith('.page')]
+        excedente = len(nomes) - self.max_entries
+        if excedente <= 0:
+            return
+        arquivos = []
+        for nome in nomes:
+            caminho = os.path.join(self.pasta, nome)
+            try:
+                arquivos.append((os.stat(caminho).st_mtime, caminho))
+            except OSError:
+                excedente -= 1   # removido por outro worker
+        agora = time.time()
+        for i, (expira, caminho) in enumerate(sorted(arquivos)):
+            if i >= excedente and expira > agora:
+                break
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass
+
+    def clear(self):
+        for nome in os.listdir(self.pasta):
+            if nome.endswith('.page'):
+                try:
+                    os.remove(os.path.join(self.pasta, nome))
+                except OSError:
+                    pass
+
+    def __len__(self):
+        return sum(1 for nome in os.listdir(self.pasta) if nome.endswith('.page'))
+
+
+# ==============================================================================
+# EXTENSÃO
+# ==============================================================================
+
+class PageCache:
+
+    def __init__(self, app=None):
+        self.backend = None
+        self._arquivo_geracao = None
+        self._geracao = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PAGE_CACHE_ENABLED', os.getenv('PAGE_CACHE_ENABLED', '1') != '0')
+        app.config.setdefault('PAGE_CACHE_BACKEND', os.getenv('PAGE_CACHE_BACKEND', 'memory'))
+        app.config.setdefault('PAGE_CACHE_MAX_ENTRIES', int(os.getenv('PAGE_CACHE_MAX_ENTRIES', '256')))
+        app.config.setdefault('PAGE_CACHE_DIR', os.getenv(
+            'PAGE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'ouvirtiba_page_cache')))
+
+        if app.config['PAGE_CACHE_BACKEND'] == 'disk':
+            self.backend = DiskBackend(app.config['PAGE_CACHE_DIR'], app.config['PAGE_CACHE_MAX_ENTRIES'])
+            # Páginas de um deploy anterior podem ter templates antigos
+            self.backend.clear()
+        else:
+            self.backend = MemoryBackend(app.config['PAGE_CACHE_MAX_ENTRIES'])
+            os.makedirs(app.config['PAGE_CACHE_DIR'], exist_ok=True)
+
+        self._arquivo_geracao = os.path.join(app.config['PAGE_CACHE_DIR'], 'geracao')
+        self._geracao = self._ler_geracao()
+        app.extensions['page_cache'] = self
+
+    def clear(self):
+        """
+        Descarta todas as páginas (chamado após criar/alterar/excluir posts),
+        também nos outros workers do servidor (nova geração).
+        """
+        if self.backend is not None:
+            self.backend.clear()
+            self._geracao = self._nova_geracao()
+            logger.info("🧹 Cache de páginas limpo")
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Geração (clear() feito por outro worker)
+    # ──────────────────────────────────────────────────────────────────────
+    def _ler_geracao(self):
+        try:
+            with open(self._arquivo_geracao, encoding='ascii') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _nova_geracao(self):
+        geracao = uuid.uuid4().hex
+        try:
+            fd, temporario = tempfile.mkstemp(dir=os.path.dirname(self._arquivo_geracao), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='ascii') as f:
+                f.write(geracao)
+            os.replace(temporario, self._arquivo_geracao)
+        except OSError as e:
+            logger.warning("⚠️ Não foi possível avisar os outros workers da limpeza: %s", e)
+        return geracao
+
+    def _sincronizar(self):
+        """LRU do worker descartado se outro worker chamou clear()."""
+        if self.backend.compartilhado:
+            return
+        geracao = self._ler_geracao()
+        if geracao != self._geracao:
+            self._geracao = geracao
+            self.backend.clear()
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Decorator
+    # ──────────────────────────────────────────────────────────────────────
+    def cached(self, ttl, args=(), validar=None):
+        """
+        Guarda a resposta da view por `ttl` segundos.
+
+        `args` lista os parâmetros de query string que mudam a página (entram
+        na chave); qualquer outro parâmetro faz a requisição passar direto.
+        `validar` (nome → função(valor) → bool) evita uma chave por valor
+        inventado: valor recusado também passa direto.
+        """
+        args = tuple(sorted(args))
+        validar = validar or {}
+
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*a, **kw):
+                if not self._cacheavel(args, validar):
+                    resposta = make_response(view(*a, **kw))
+                    resposta.headers['X-Cache'] = 'BYPASS'
+                    return resposta
+
+                self._sincronizar()
+                chave = self._chave(args)
+                agora = time.time()
+                entrada = self.backend.get(chave)
+
+                if entrada is not None and entrada['expira'] > agora:
+                    return self._responder(entrada, 'HIT')
+
+                resposta = make_response(view(*a, **kw))
+                if resposta.status_code != 200 or resposta.direct_passthrough \
+                        or 'Set-Cookie' in resposta.headers:
+                    resposta.headers['X-Cache'] = 'BYPASS'
+                    return resposta
+
+                corpo = resposta.get_data()
+                etag = hashlib.sha1(corpo).hexdigest()
+                # Conteúdo igual ao anterior → mantém o Last-Modified original
+                modificado = entrada['modificado'] if entrada and entrada['etag'] == etag else agora
+
+                entrada = {
+                    'corpo': corpo,
+                    'content_type': resposta.content_type,
+                    'etag': etag,
+                    'modificado': modificado,
+                    'expira': agora + ttl,
+                }
+                self.backend.set(chave, entrada)
+                return self._responder(entrada, 'MISS')
+            return wrapper
+        return decorator
+
+    def _cacheavel(self, args, validar):
+        if self.backend is None or not current_app.config['PAGE_CACHE_ENABLED']:
+            return False
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        if any(nome not in args for nome in request.args):
+            return False
+        if any(nome in request.args and not valido(request.args[nome]) for nome, valido in validar.items()):
+            return False
+        # Admin logado ou mensagem flash pendente → página personalizada
+        if session.get('email') or session.get('_flashes'):
+            return False
+        return True
+
+    @staticmethod
+    def _chave(args):
+        partes = [f"{nome}={request.args[nome]}" for nome in args if nome in request.args]
+        return request.path + ('?' + '&'.join(partes) if partes else '')
+
+    @staticmethod
+    def _responder(entrada, status_cache):
+        resposta = current_app.response_class(entrada['corpo'], content_type=entrada['content_type'])
+        resposta.set_etag(entrada['etag'])
+        resposta.headers['Last-Modified'] = http_date(entrada['modificado'])
+        # Sem max-age: o navegador/crawler sempre revalida e recebe 304 barato
+        resposta.headers['Cache-Control'] = 'public, no-cache'
+        resposta.headers['X-Cache'] = status_cache
+        return resposta.make_conditional(request)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Carga em lote de CEPs na tabela ouvirtiba.cep_cache (opcional).
+
+Com os CEPs da região já na tabela, o preenchimento do endereço no cadastro
+de clientes e lojas não depende do ViaCEP. O CSV (separado por vírgula ou
+ponto e vírgula, com cabeçalho) pode usar os nomes do ViaCEP ou os nossos:
+
+    cep;logradouro;bairro;localidade;uf;complemento
+    89245000;Rua XV de Novembro;Centro;Araquari;SC;
+
+Uso:
+    python preload_cep.py ceps.csv
+    python preload_cep.py ceps.csv --lote 1000
+"""
+
+import argparse
+import csv
+
+LOTE = 500
+
+# nome no CSV → coluna de CepCache
+COLUNAS = {
+    'cep': 'cep',
+    'logradouro': 'address', 'address': 'address',
+    'bairro': 'neighborhood', 'neighborhood': 'neighborhood',
+    'localidade': 'city', 'cidade': 'city', 'city': 'city',
+    'uf': 'region', 'region': 'region',
+    'complemento': 'complement', 'complement': 'complement',
+}
+
+
+def ler_csv(caminho):
+    """Gera dicts com as colunas de CepCache (linhas sem CEP válido são ignoradas)."""
+    with open(caminho, newline='', encoding='utf-8-sig') as f:
+        amostra = f.read(4096)
+        f.seek(0)
+        dialeto = csv.Sniffer().sniff(amostra, delimiters=',;')
+        for linha in csv.DictReader(f, dialect=dialeto):
+            registro = {}
+            for nome, valor in linha.items():
+                coluna = COLUNAS.get((nome or '').strip().lower())
+                if coluna:
+                    registro[coluna] = (valor or '').strip()
+            registro['cep'] = ''.join(filter(str.isdigit, registro.get('cep', '')))
+            if len(registro['cep']) == 8:
+                yield registro
+
+
+def preload(caminho, lote=LOTE):
+    from app import app
+    from admin.cep_cache import gravar_ceps
+
+    total, pendentes = 0, []
+    with app.app_context():
+        for registro in ler_csv(caminho):
+            pendentes.append(registro)
+            if len(pendentes) >= lote:
+                total += gravar_ceps(pendentes)
+                pendentes = []
+                print(f"   ✅ {total} CEP(s) gravados")
+        total += gravar_ceps(pendentes)
+
+    print(f"✅ Carga concluída: {total} CEP(s)")
+    return total
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('arquivo', help='CSV com os CEPs')
+    parser.add_argument('--lote', type=int, default=LOTE)
+    args = parser.parse_args()
+    preload(args.arquivo, args.lote)
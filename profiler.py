@@ -0,0 +1,158 @@
+# profiler.py
+"""
+Extensão Flask que mede o custo de cada requisição:
+
+- quantidade de comandos SQL e tempo total no banco (eventos
+  before_cursor_execute / after_cursor_execute do engine de extension.db);
+- tempo de renderização dos templates Jinja (sinais before_render_template /
+  template_rendered);
+- tempo total da requisição.
+
+Para cada resposta é enviado o cabeçalho Server-Timing (visível na aba
+Network do navegador) e gravada uma linha de log estruturada. Requisições
+acima de PROFILER_SLOW_MS também registram a lista de comandos SQL.
+
+Configuração (app.config ou variáveis de ambiente):
+    PROFILER_ENABLED          liga/desliga (padrão: True)
+    PROFILER_SLOW_MS          limite de requisição lenta em ms (padrão: 500)
+    PROFILER_MAX_STATEMENTS   máximo de comandos guardados por requisição (padrão: 200)
+"""
+
+import json
+import logging
+import os
+import time
+
+from flask import (g, request, current_app, has_request_context,
+                   before_render_template, template_rendered)
+from sqlalchemy import event
+
+logger = logging.getLogger('profiler')
+
+
+class RequestProfiler:
+
+    def __init__(self, app=None, db=None):
+        self.db = db
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db=None):
+        if db is not None:
+            self.db = db
+
+        app.config.setdefault('PROFILER_ENABLED', os.getenv('PROFILER_ENABLED', '1') != '0')
+        app.config.setdefault('PROFILER_SLOW_MS', float(os.getenv('PROFILER_SLOW_MS', '500')))
+        app.config.setdefault('PROFILER_MAX_STATEMENTS', int(os.getenv('PROFILER_MAX_STATEMENTS', '200')))
+
+        app.extensions['request_profiler'] = self
+        if not app.config['PROFILER_ENABLED']:
+            return
+
+        app.before_request(self._iniciar)
+        app.after_request(self._finalizar)
+
+        before_render_template.connect(self._antes_template, app)
+        template_rendered.connect(self._depois_template, app)
+
+        # O engine só existe depois de db.init_app(app)
+        with app.app_context():
+            engine = self.db.engine
+        event.listen(engine, 'before_cursor_execute', self._antes_sql)
+        event.listen(engine, 'after_cursor_execute', self._depois_sql)
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Estado por requisição (flask.g)
+    # ──────────────────────────────────────────────────────────────────────
+    @staticmethod
+    def _estado():
+        if not has_request_context():
+            return None
+        return g.get('_profiler')
+
+    def _iniciar(self):
+        g._profiler = {
+            'inicio': time.perf_counter(),
+            'sql_n': 0,
+            'sql_ms': 0.0,
+            'tpl_ms': 0.0,
+            'tpl_pilha': [],
+            'comandos': [],
+        }
+
+    # ──────────────────────────────────────────────────────────────────────
+    # SQL
+    # ──────────────────────────────────────────────────────────────────────
+    def _antes_sql(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('_profiler_t0', []).append(time.perf_counter())
+
+    def _depois_sql(self, conn, cursor, statement, parameters, context, executemany):
+        inicio = conn.info.get('_profiler_t0')
+        if not inicio:
+            return
+        duracao = (time.perf_counter() - inicio.pop()) * 1000
+
+        estado = self._estado()
+        if estado is None:
+            return
+        estado['sql_n'] += 1
+        estado['sql_ms'] += duracao
+
+        if len(estado['comandos']) < current_app.config['PROFILER_MAX_STATEMENTS']:
+            estado['comandos'].append((round(duracao, 2), ' '.join(statement.split())))
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Jinja
+    # ──────────────────────────────────────────────────────────────────────
+    def _antes_template(self, sender, template, context, **extra):
+        estado = self._estado()
+        if estado is not None:
+            estado['tpl_pilha'].append(time.perf_counter())
+
+    def _depois_template(self, sender, template, context, **extra):
+        estado = self._estado()
+        if estado is not None and estado['tpl_pilha']:
+            inicio = estado['tpl_pilha'].pop()
+            # Só soma o template externo, para não contar duas vezes os aninhados
+            if not estado['tpl_pilha']:
+                estado['tpl_ms'] += (time.perf_counter() - inicio) * 1000
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Resposta
+    # ──────────────────────────────────────────────────────────────────────
+    def _finalizar(self, response):
+        estado = self._estado()
+        if estado is None:
+            return response
+
+        total_ms = (time.perf_counter() - estado['inicio']) * 1000
+        response.headers.add(
+            'Server-Timing',
+            f'db;dur={estado["sql_ms"]:.1f};desc="{estado["sql_n"]} queries", '
+            f'tpl;dur={estado["tpl_ms"]:.1f}, '
+            f'total;dur={total_ms:.1f}'
+        )
+
+        if request.endpoint == 'static':
+            return response
+
+        registro = {
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 1),
+            'db_ms': round(estado['sql_ms'], 1),
+            'db_queries': estado['sql_n'],
+            'tpl_ms': round(estado['tpl_ms'], 1),
+        }
+
+        if total_ms >= current_app.config['PROFILER_SLOW_MS']:
+            registro['slow'] = True
+            logger.warning("🐢 %s", json.dumps(registro, ensure_ascii=False))
+            for duracao, comando in estado['comandos']:
+                logger.warning("   %8.2f ms | %s", duracao, comando)
+        else:
+            logger.info("⏱️ %s", json.dumps(registro, ensure_ascii=False))
+
+        return response
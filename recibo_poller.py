@@ -0,0 +1,326 @@
+# recibo_poller.py
+"""
+Consulta dos recibos da SEFAZ em segundo plano (NFeRetAutorizacao4).
+
+Antes, depois de transmitir, alguém precisava clicar em /consultar_recibo/<id>
+nota por nota até a autorização sair. Agora uma thread de fundo por worker
+acompanha os lotes recebidos (NfeLote com status 'recebido') e consulta o
+recibo de cada um; o retorno (cStat 104) atualiza Invoice.status / nprot de
+todas as notas do lote num único UPDATE (admin/nfe/nfce_lote.py).
+
+Notas com nrec e sem protocolo que não vieram de um lote registrado (envio
+avulso por /transmit_nfe/<id>) ganham uma linha em nfe_lote na varredura, e
+passam a ser acompanhadas do mesmo jeito.
+
+Intervalos (recomendação da SEFAZ: não consultar antes do tMed informado no
+recibo e não repetir em sequência, sob pena de cStat 656 — consumo indevido):
+    1ª consulta     proxima_consulta gravada no envio (tMed, mínimo 3 s)
+    cStat 105       RECIBO_INTERVALOS_S conforme o número da tentativa
+    erro de rede    idem
+    cStat 656       RECIBO_ESPERA_656_S (a SEFAZ bloqueia por 1 hora)
+Depois de RECIBO_MAX_TENTATIVAS o lote fica com status 'expirado' (consulte à
+mão em /consultar_recibo/<id>).
+
+A reserva usa SELECT ... FOR UPDATE SKIP LOCKED e um lease, como a caixa de
+saída de e-mails (email_outbox.py): vários workers não consultam o mesmo lote.
+
+Configuração (app.config ou variáveis de ambiente):
+    RECIBO_POLLER_THREAD    1 liga a thread (0 = só processar_pendentes())
+    RECIBO_MAX_CONSULTAS    consultas simultâneas à SEFAZ por worker (padrão: 2)
+    RECIBO_POLL_S           varredura máxima sem aviso de lote novo (padrão: 60)
+    RECIBO_MAX_TENTATIVAS   consultas antes de desistir (padrão: 30)
+    RECIBO_LEASE_S          tempo de reserva de um lote em consulta (padrão: 60)
+
+Estado da fila e métricas (por worker) em relatorio(), exibidos no /health.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+logger = logging.getLogger('recibo_poller')
+
+# Espera (s) antes da consulta n+1 quando o lote ainda está em processamento
+RECIBO_INTERVALOS_S = (5, 10, 15, 30, 60, 120, 300)
+RECIBO_ESPERA_656_S = 3600
+
+
+def _env_int(nome, padrao):
+    try:
+        return int(os.getenv(nome, padrao))
+    except (TypeError, ValueError):
+        return padrao
+
+
+def intervalo(tentativa, cstat=None):
+    """Espera (s) antes da próxima consulta, depois de `tentativa` consultas."""
+    if cstat == '656':
+        return RECIBO_ESPERA_656_S
+    return RECIBO_INTERVALOS_S[min(max(tentativa, 1), len(RECIBO_INTERVALOS_S)) - 1]
+
+
+class ReciboPoller:
+
+    def __init__(self, app=None, db=None):
+        self.app = None
+        self.db = db
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._executor = None
+        self._executor_pid = None
+        # Métricas
+        self.consultas = 0
+        self.falhas = 0
+        self.autorizadas = 0
+        self.rejeitadas = 0
+        self.em_voo = 0
+        self._latencias = deque(maxlen=200)
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db=None):
+        if db is not None:
+            self.db = db
+        self.app = app
+
+        app.config.setdefault('RECIBO_POLLER_THREAD', _env_int('RECIBO_POLLER_THREAD', 1))
+        app.config.setdefault('RECIBO_MAX_CONSULTAS', _env_int('RECIBO_MAX_CONSULTAS', 2))
+        app.config.setdefault('RECIBO_POLL_S', _env_int('RECIBO_POLL_S', 60))
+        app.config.setdefault('RECIBO_MAX_TENTATIVAS', _env_int('RECIBO_MAX_TENTATIVAS', 30))
+        app.config.setdefault('RECIBO_LEASE_S', _env_int('RECIBO_LEASE_S', 60))
+
+        if app.config['RECIBO_POLLER_THREAD']:
+            # A thread sobe na 1ª requisição de cada worker (depois do fork)
+            app.before_request(self._garantir_thread)
+
+        app.extensions['recibo_poller'] = self
+
+    def acordar(self):
+        """Avisa a thread de que há lote novo (chamado depois da transmissão)."""
+        if self.app is not None and self.app.config['RECIBO_POLLER_THREAD']:
+            self._garantir_thread()
+            self._acordar.set()
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Fila
+    # ──────────────────────────────────────────────────────────────────────
+    def registrar_avulsos(self):
+        """
+        Cria a linha de nfe_lote para recibos de notas transmitidas fora de um
+        lote registrado (nrec sem nprot). Retorna quantos recibos registrou.
+        """
+        from admin.nfe.models import Invoice, NfeLote
+
+        sessao = self.db.session
+        registrados = select(NfeLote.nrec).where(NfeLote.nrec.isnot(None))
+        recibos = (sessao.query(Invoice.nrec, Invoice.status, func.count(Invoice.id))
+                   .filter(Invoice.nrec.isnot(None), Invoice.nprot.is_(None),
+                           Invoice.status.in_(('Transmitida', 'Transmitida-Prod')),
+                           Invoice.nrec.notin_(registrados))
+                   .group_by(Invoice.nrec, Invoice.status)
+                   .all())
+        agora = datetime.now()
+        for nrec, status, quantidade in recibos:
+            sessao.add(NfeLote(ambiente=1 if status == 'Transmitida-Prod' else 2,
+                               quantidade=quantidade, status='recebido', nrec=nrec,
+                               proxima_consulta=agora))
+        sessao.commit()
+        return len(recibos)
+
+    def _reservar(self, limite):
+        """[(id, nrec, ambiente, tentativa)] dos lotes vencidos, com lease."""
+        from admin.nfe.models import NfeLote
+
+        with self.app.app_context():
+            sessao = self.db.session
+            try:
+                self.registrar_avulsos()
+                agora = datetime.now()
+                linhas = (sessao.query(NfeLote)
+                          .filter(NfeLote.status == 'recebido',
+                                  NfeLote.nrec.isnot(None),
+                                  NfeLote.proxima_consulta <= agora)
+                          .order_by(NfeLote.proxima_consulta)
+                          .limit(limite)
+                          .with_for_update(skip_locked=True)
+                          .all())
+                lease = agora + timedelta(seconds=self.app.config['RECIBO_LEASE_S'])
+                reservados = []
+                for lote in linhas:
+                    lote.tentativas += 1
+                    lote.proxima_consulta = lease
+                    reservados.append((lote.id, lote.nrec, lote.ambiente, lote.tentativas))
+                sessao.commit()
+                return reservados
+            except Exception as e:
+                sessao.rollback()
+                logger.warning("⚠️ Falha ao reservar recibos para consulta: %s", e)
+                return []
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Processamento
+    # ──────────────────────────────────────────────────────────────────────
+    def processar_pendentes(self):
+        """
+        Consulta os recibos vencidos, no máximo RECIBO_MAX_CONSULTAS ao mesmo
+        tempo. Retorna quantos lotes consultou.
+        """
+        maximo = max(1, self.app.config['RECIBO_MAX_CONSULTAS'])
+        reservados = self._reservar(maximo)
+        if not reservados:
+            return 0
+        if maximo == 1 or len(reservados) == 1:
+            for item in reservados:
+                self._consultar_um(*item)
+        else:
+            list(self._pool(maximo).map(lambda item: self._consultar_um(*item), reservados))
+        return len(reservados)
+
+    def _consultar_um(self, lote_id, nrec, ambiente, tentativa):
+        from admin.nfe.models import NfeLote
+        from admin.nfe.sefaz_client import cliente_sefaz
+        from admin.nfe.nfce_lote import aplicar_retorno_recibo
+
+        with self._lock:
+            self.em_voo += 1
+        inicio = time.perf_counter()
+        try:
+            resposta = cliente_sefaz(ambiente).consultar_recibo(nrec)
+            texto, erro = resposta.text, None
+        except Exception as e:
+            texto, erro = None, e
+        finally:
+            duracao = (time.perf_counter() - inicio) * 1000
+            with self._lock:
+                self.em_voo -= 1
+                self.consultas += 1
+                self._latencias.append(duracao)
+
+        with self.app.app_context():
+            sessao = self.db.session
+            try:
+                lote = sessao.get(NfeLote, lote_id)
+                cstat = None
+                if erro is None:
+                    cstat, autorizadas, rejeitadas = aplicar_retorno_recibo(lote, texto)
+                    with self._lock:
+                        self.autorizadas += autorizadas
+                        self.rejeitadas += rejeitadas
+                    logger.info("📬 Recibo %s (lote %s): cStat %s em %.0f ms — %d autorizada(s), %d rejeitada(s)",
+                                nrec, lote_id, cstat, duracao, autorizadas, rejeitadas)
+                else:
+                    with self._lock:
+                        self.falhas += 1
+                    logger.warning("⚠️ Consulta do recibo %s falhou (tentativa %d): %s", nrec, tentativa, erro)
+
+                if lote.status == 'recebido':
+                    if tentativa >= self.app.config['RECIBO_MAX_TENTATIVAS']:
+                        lote.status = 'expirado'
+                        logger.error("❌ Recibo %s sem retorno após %d consultas", nrec, tentativa)
+                    else:
+                        lote.proxima_consulta = datetime.now() + timedelta(seconds=intervalo(tentativa, cstat))
+                sessao.commit()
+            except Exception as e:
+                # O lease expira e o lote volta a ser reservado
+                sessao.rollback()
+                logger.error("❌ Não foi possível gravar o retorno do recibo %s: %s", nrec, e)
+
+    def _pool(self, workers):
+        # Depois do fork do gunicorn o pool do processo pai não tem threads
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='recibo-poller')
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Thread de fundo
+    # ──────────────────────────────────────────────────────────────────────
+    def _garantir_thread(self):
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == pid and self._thread.is_alive():
+                return
+            self._pid = pid
+            self._thread = threading.Thread(target=self._loop, name='recibo-poller', daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        logger.info("📬 Thread de consulta de recibos iniciada (pid %d)", os.getpid())
+        while True:
+            try:
+                while self.processar_pendentes() > 0:
+                    pass
+                espera = self._ate_proxima_consulta()
+            except Exception as e:
+                logger.error("❌ Erro na thread de consulta de recibos: %s", e)
+                espera = self.app.config['RECIBO_POLL_S']
+            self._acordar.wait(espera)
+            self._acordar.clear()
+
+    def _ate_proxima_consulta(self):
+        """Segundos até o próximo lote vencer (no máximo RECIBO_POLL_S)."""
+        from admin.nfe.models import NfeLote
+
+        maximo = self.app.config['RECIBO_POLL_S']
+        with self.app.app_context():
+            proxima = (self.db.session.query(func.min(NfeLote.proxima_consulta))
+                       .filter(NfeLote.status == 'recebido')
+                       .scalar())
+            self.db.session.commit()
+        if proxima is None:
+            return maximo
+        return min(max((proxima - datetime.now()).total_seconds(), 1), maximo)
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Relatório (/health)
+    # ──────────────────────────────────────────────────────────────────────
+    def relatorio(self):
+        from admin.nfe.models import Invoice, NfeLote
+
+        with self._lock:
+            dados = {
+                'queries': self.consultas,
+                'failures': self.falhas,
+                'authorized': self.autorizadas,
+                'rejected': self.rejeitadas,
+                'in_flight': self.em_voo,
+                'max_in_flight': self.app.config['RECIBO_MAX_CONSULTAS'] if self.app else None,
+                'last_query_ms': round(self._latencias[-1], 1) if self._latencias else None,
+            }
+
+        try:
+            sessao = self.db.session
+            contagem = dict(sessao.query(NfeLote.status, func.count(NfeLote.id))
+                            .filter(NfeLote.status.in_(('recebido', 'expirado')))
+                            .group_by(NfeLote.status)
+                            .all())
+            proxima = (sessao.query(func.min(NfeLote.proxima_consulta))
+                       .filter(NfeLote.status == 'recebido').scalar())
+            aguardando = (sessao.query(func.count(Invoice.id))
+                          .filter(Invoice.nrec.isnot(None), Invoice.nprot.is_(None),
+                                  Invoice.status.in_(('Transmitida', 'Transmitida-Prod')))
+                          .scalar())
+            dados['queue'] = {
+                'receipts': contagem.get('recebido', 0),
+                'expired': contagem.get('expirado', 0),
+                'invoices_waiting': aguardando,
+                'next_query_in_s': (max(0, round((proxima - datetime.now()).total_seconds(), 1))
+                                    if proxima else None),
+            }
+        except Exception as e:
+            self.db.session.rollback()
+            dados['queue'] = None
+            logger.warning("⚠️ Não foi possível contar a fila de recibos: %s", e)
+
+        dados['thread'] = bool(self._thread and self._pid == os.getpid() and self._thread.is_alive())
+        return dados
@@ -0,0 +1,237 @@
+# sefaz_status.py
+"""
+Sonda do status do serviço da SEFAZ (NfeStatusServico4) com cache.
+
+Antes ninguém consultava o status do serviço: a SEFAZ fora do ar só
+aparecia quando uma transmissão estourava o timeout, com o worker preso até
+lá. Agora uma thread de fundo por worker consulta NfeStatusServico4 a cada
+SEFAZ_STATUS_INTERVALO_S pela sessão mTLS do processo
+(admin/nfe/sefaz_client.py) e guarda o resultado e o histórico de latência.
+
+- disponivel()   → True/False pelo último resultado, ou None se não houver
+                   consulta recente (mais velha que SEFAZ_STATUS_VALIDADE_S):
+                   quem chama segue o fluxo normal
+- verificar()    → consulta agora (ou devolve o cache se for recente)
+- estado() / historico() / relatorio() → tela /admin/nfe/sefaz_status, JSON
+                   em /admin/nfe/sefaz_status.json e /health
+
+As rotas de transmissão e o envio em lote consultam disponivel() e, com a
+SEFAZ fora, não chamam o web service: ativam a contingência off-line
+(admin/nfe/contingencia.py). A própria sonda abre a contingência automática
+depois de SEFAZ_STATUS_FALHAS consultas seguidas sem cStat 107 e a encerra
+quando o serviço volta. Consulta recusada pelo compartimento 'svrs' lotado
+(chamadas_externas.py) não conta: a SEFAZ nem foi consultada.
+
+A thread só sobe quando o worker atende uma rota da NF-e (nfe_bp chama
+iniciar()): o site público não carrega requests/cryptography.
+
+Configuração (app.config ou variáveis de ambiente):
+    SEFAZ_STATUS_THREAD       1 liga a thread (0 = só verificar())
+    SEFAZ_STATUS_INTERVALO_S  intervalo entre consultas (padrão: 60, mínimo 30)
+    SEFAZ_STATUS_VALIDADE_S   idade máxima do resultado em cache (padrão: 180)
+    SEFAZ_STATUS_FALHAS       consultas seguidas fora para ativar a
+                              contingência automática (padrão: 2; 0 = nunca)
+    SEFAZ_STATUS_HISTORICO    consultas guardadas no histórico (padrão: 120)
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+logger = logging.getLogger('sefaz_status')
+
+# A SEFAZ considera consumo indevido consultas seguidas em intervalo curto
+INTERVALO_MINIMO_S = 30
+
+
+def _env_int(nome, padrao):
+    try:
+        return int(os.getenv(nome, padrao))
+    except (TypeError, ValueError):
+        return padrao
+
+
+class SefazIndisponivel(Exception):
+    """SEFAZ fora de operação pela última consulta de status (sem chamar o web service)."""
+
+
+class SefazStatus:
+
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._ultimo = None
+        self._historico = deque(maxlen=120)
+        self.consultas = 0
+        self.falhas_seguidas = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+
+        app.config.setdefault('SEFAZ_STATUS_THREAD', _env_int('SEFAZ_STATUS_THREAD', 1))
+        app.config.setdefault('SEFAZ_STATUS_INTERVALO_S', _env_int('SEFAZ_STATUS_INTERVALO_S', 60))
+        app.config.setdefault('SEFAZ_STATUS_VALIDADE_S', _env_int('SEFAZ_STATUS_VALIDADE_S', 180))
+        app.config.setdefault('SEFAZ_STATUS_FALHAS', _env_int('SEFAZ_STATUS_FALHAS', 2))
+        app.config.setdefault('SEFAZ_STATUS_HISTORICO', _env_int('SEFAZ_STATUS_HISTORICO', 120))
+        self._historico = deque(maxlen=max(1, app.config['SEFAZ_STATUS_HISTORICO']))
+
+        app.extensions['sefaz_status'] = self
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Consulta
+    # ──────────────────────────────────────────────────────────────────────
+    def _sondar(self):
+        from admin.nfe.contingencia import sefaz_em_operacao
+
+        inicio = time.perf_counter()
+        em_operacao, cstat, xmotivo = sefaz_em_operacao()
+        return {
+            'online': em_operacao,
+            'cstat': cstat,
+            'xmotivo': xmotivo,
+            'latencia_ms': round((time.perf_counter() - inicio) * 1000, 1),
+            'quando': datetime.now(),
+        }
+
+    def verificar(self, max_idade_s=None):
+        """
+        Resultado com no máximo `max_idade_s` segundos (None = consulta agora).
+        Atualiza o cache, o histórico e a contingência automática. Consulta
+        recusada pelo compartimento local lotado não muda nada: devolve o
+        último resultado (ou None).
+        """
+        if max_idade_s is not None:
+            atual = self.estado()
+            if atual and atual['idade_s'] <= max_idade_s:
+                return atual
+
+        resultado = self._sondar()
+        if resultado['online'] is None:
+            # Compartimento 'svrs' lotado pelas próprias chamadas deste worker:
+            # a SEFAZ não foi consultada, então não conta como falha
+            logger.info("🛰️ Consulta de status adiada: %s", resultado['xmotivo'])
+            return self.estado()
+        with self._lock:
+            self._ultimo = resultado
+            self._historico.append(resultado)
+            self.consultas += 1
+            self.falhas_seguidas = 0 if resultado['online'] else self.falhas_seguidas + 1
+            falhas = self.falhas_seguidas
+
+        if resultado['online']:
+            logger.debug("🛰️ SEFAZ em operação (%.0f ms)", resultado['latencia_ms'])
+        else:
+            logger.warning("🛰️ SEFAZ fora de operação (%s - %s, %.0f ms)",
+                           resultado['cstat'], resultado['xmotivo'], resultado['latencia_ms'])
+        self._ajustar_contingencia(resultado, falhas)
+        return self.estado()
+
+    def _ajustar_contingencia(self, resultado, falhas):
+        """Abre a contingência automática depois de N falhas; fecha quando volta."""
+        if self.app is None:
+            return
+        from admin.nfe.contingencia import (entrar_contingencia, sair_contingencia,
+                                            JUSTIFICATIVA_STATUS)
+
+        limite = self.app.config['SEFAZ_STATUS_FALHAS']
+        # Contexto próprio: não mistura com a sessão da requisição que chamou
+        with self.app.app_context():
+            try:
+                if resultado['online']:
+                    sair_contingencia(somente_automatica=True)
+                elif limite and falhas >= limite:
+                    entrar_contingencia(JUSTIFICATIVA_STATUS, automatica=True)
+            except Exception as e:
+                logger.error("❌ Não foi possível ajustar a contingência: %s", e)
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Cache
+    # ──────────────────────────────────────────────────────────────────────
+    def estado(self):
+        """Último resultado (dict com idade_s) ou None."""
+        with self._lock:
+            if self._ultimo is None:
+                return None
+            atual = dict(self._ultimo)
+        atual['idade_s'] = round((datetime.now() - atual['quando']).total_seconds(), 1)
+        return atual
+
+    def disponivel(self):
+        """True/False pela última consulta; None sem consulta recente."""
+        atual = self.estado()
+        validade = self.app.config['SEFAZ_STATUS_VALIDADE_S'] if self.app else 180
+        if atual is None or atual['idade_s'] > validade:
+            return None
+        return atual['online']
+
+    def exigir_disponivel(self):
+        """Levanta SefazIndisponivel se a última consulta mostrou a SEFAZ fora."""
+        if self.disponivel() is False:
+            atual = self.estado()
+            raise SefazIndisponivel(
+                f"SEFAZ fora de operação (cStat {atual['cstat'] or '-'}: {atual['xmotivo']}) "
+                f"há {atual['idade_s']:.0f} s")
+
+    def historico(self):
+        with self._lock:
+            return list(self._historico)
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Thread de fundo
+    # ──────────────────────────────────────────────────────────────────────
+    def iniciar(self):
+        """Sobe a thread da sonda neste worker (chamado pelas rotas da NF-e)."""
+        if self.app is None or not self.app.config['SEFAZ_STATUS_THREAD']:
+            return
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == pid and self._thread.is_alive():
+                return
+            self._pid = pid
+            self._thread = threading.Thread(target=self._loop, name='sefaz-status', daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        logger.info("🛰️ Sonda de status da SEFAZ iniciada (pid %d)", os.getpid())
+        while True:
+            try:
+                self.verificar()
+            except Exception as e:
+                logger.error("❌ Erro na sonda de status da SEFAZ: %s", e)
+            time.sleep(max(INTERVALO_MINIMO_S, self.app.config['SEFAZ_STATUS_INTERVALO_S']))
+
+    # ──────────────────────────────────────────────────────────────────────
+    # Relatório (/health, JSON)
+    # ──────────────────────────────────────────────────────────────────────
+    def relatorio(self):
+        atual = self.estado()
+        historico = self.historico()
+        latencias = sorted(h['latencia_ms'] for h in historico)
+        disponiveis = [h for h in historico if h['online']]
+        dados = {
+            'online': self.disponivel(),
+            'cstat': atual['cstat'] if atual else None,
+            'reason': atual['xmotivo'] if atual else None,
+            'checked_at': atual['quando'].isoformat(timespec='seconds') if atual else None,
+            'age_s': atual['idade_s'] if atual else None,
+            'latency_ms': {
+                'last': atual['latencia_ms'] if atual else None,
+                'avg': round(sum(latencias) / len(latencias), 1) if latencias else None,
+                'p95': latencias[min(len(latencias) - 1, int(len(latencias) * 0.95))] if latencias else None,
+                'max': latencias[-1] if latencias else None,
+            },
+            'checks': self.consultas,
+            'failures_in_row': self.falhas_seguidas,
+            'availability_pct': (round(100 * len(disponiveis) / len(historico), 1) if historico else None),
+            'thread': bool(self._thread and self._pid == os.getpid() and self._thread.is_alive()),
+        }
+        return dados
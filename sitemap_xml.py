@@ -0,0 +1,198 @@
+# sitemap_xml.py
+"""
+Sitemap gerado a partir das rotas públicas e dos posts ativos do blog.
+
+Antes /sitemap.xml lia static/sitemap.xml do disco a cada requisição, e o
+arquivo nunca recebia os slugs dos posts novos. Agora o XML é montado aqui:
+páginas fixas (PAGINAS_FIXAS) + um <url> por BlogPost ativo, com <lastmod>
+vindo de updated_at (ou created_at).
+
+O XML fica em memória até um BlogPost ser criado, alterado ou excluído
+(eventos do SQLAlchemy, depois do COMMIT) ou até expirar SITEMAP_CACHE_TTL,
+que cobre alterações feitas por outro worker.
+
+Acima de SITEMAP_MAX_URLS endereços, /sitemap.xml vira um <sitemapindex>
+apontando para /sitemap-1.xml, /sitemap-2.xml, ...; cada parte é montada
+lendo os posts em lotes (yield_per) só com slug e datas.
+
+- sitemap_documento(parte)  → (xml_bytes, etag) ou None se a parte não existe
+- invalidar_sitemap()       → força a regeração
+"""
+
+import hashlib
+import os
+import threading
+import time
+from xml.sax.saxutils import escape
+
+from flask import url_for
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from extension import db
+from admin.blog_post.models import BlogPost
+
+SITEMAP_BASE_URL = os.getenv('SITEMAP_BASE_URL', 'https://ouvirtiba.com.br').rstrip('/')
+
+# Limite do protocolo: 50.000 URLs por arquivo
+SITEMAP_MAX_URLS = int(os.getenv('SITEMAP_MAX_URLS', '50000'))
+
+# Cada worker do gunicorn tem seu próprio cache (ver lookup_cache.py)
+SITEMAP_CACHE_TTL = 3600  # segundos
+
+# (endpoint, prioridade) — mesma ordem e prioridades do antigo static/sitemap.xml
+PAGINAS_FIXAS = [
+    ('home', '1.0'),
+    ('sobre', '0.8'),
+    ('produtos', '0.9'),
+    ('contato', '0.8'),
+    ('blog', '0.8'),
+    ('politica', '0.6'),
+]
+PRIORIDADE_POST = '0.7'
+LOTE_POSTS = 500
+
+_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+_versao = 0
+_cache = {}              # {parte: (versao, expira_em, xml, etag)}
+_lock = threading.Lock()
+
+
+# ==============================================================================
+# MONTAGEM DO XML
+# ==============================================================================
+
+def _loc(caminho):
+    return escape(SITEMAP_BASE_URL + caminho)
+
+
+def _data(valor):
+    return valor.strftime('%Y-%m-%d') if valor else None
+
+
+def _url(caminho, prioridade, lastmod=None):
+    partes = [f'<url><loc>{_loc(caminho)}</loc>']
+    if lastmod:
+        partes.append(f'<lastmod>{lastmod}</lastmod>')
+    partes.append(f'<priority>{prioridade}</priority></url>\n')
+    return ''.join(partes)
+
+
+def _posts_ativos():
+    return (db.session.query(BlogPost.slug, BlogPost.updated_at, BlogPost.created_at)
+            .filter(BlogPost.active.is_(True), BlogPost.slug.isnot(None))
+            .order_by(BlogPost.created_at.desc(), BlogPost.id.desc()))
+
+
+def _ultima_alteracao():
+    """Data do post alterado mais recentemente (lastmod de /blog)."""
+    return db.session.query(func.max(func.coalesce(BlogPost.updated_at, BlogPost.created_at))) \
+        .filter(BlogPost.active.is_(True)).scalar()
+
+
+def _entradas(inicio=0, fim=None):
+    """Gera as <url> de índice global [inicio, fim): fixas primeiro, depois os posts."""
+    fixas = len(PAGINAS_FIXAS)
+    if inicio < fixas:
+        ultima = _data(_ultima_alteracao())
+        for i, (endpoint, prioridade) in enumerate(PAGINAS_FIXAS):
+            if i >= inicio and (fim is None or i < fim):
+                yield _url(url_for(endpoint), prioridade, ultima if endpoint == 'blog' else None)
+
+    query = _posts_ativos().offset(max(inicio - fixas, 0))
+    if fim is not None:
+        query = query.limit(max(fim - max(inicio, fixas), 0))
+    for slug, updated_at, created_at in query.yield_per(LOTE_POSTS):
+        yield _url(url_for('blog_post', slug=slug), PRIORIDADE_POST, _data(updated_at or created_at))
+
+
+def _urlset(inicio=0, fim=None):
+    yield f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{_NS}">\n'
+    yield from _entradas(inicio, fim)
+    yield '</urlset>\n'
+
+
+def _indice(partes):
+    yield f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{_NS}">\n'
+    for n in range(1, partes + 1):
+        yield f'<sitemap><loc>{_loc(url_for("sitemap_parte", parte=n))}</loc></sitemap>\n'
+    yield '</sitemapindex>\n'
+
+
+def _total_urls():
+    posts = (db.session.query(func.count(BlogPost.id))
+             .filter(BlogPost.active.is_(True), BlogPost.slug.isnot(None))
+             .scalar())
+    return len(PAGINAS_FIXAS) + posts
+
+
+def _gerar(parte):
+    """XML da parte pedida (0 = /sitemap.xml) ou None se ela não existe."""
+    partes = -(-_total_urls() // SITEMAP_MAX_URLS)
+    if parte == 0:
+        gerador = _urlset() if partes <= 1 else _indice(partes)
+    elif partes > 1 and 1 <= parte <= partes:
+        inicio = (parte - 1) * SITEMAP_MAX_URLS
+        gerador = _urlset(inicio, inicio + SITEMAP_MAX_URLS)
+    else:
+        return None
+    return ''.join(gerador).encode('utf-8')
+
+
+# ==============================================================================
+# CACHE
+# ==============================================================================
+
+def sitemap_documento(parte=0):
+    """Retorna (xml, etag) da parte (0 = /sitemap.xml) ou None."""
+    with _lock:
+        entrada = _cache.get(parte)
+        versao = _versao
+    if entrada and entrada[0] == versao and entrada[1] > time.monotonic():
+        return entrada[2], entrada[3]
+
+    xml = _gerar(parte)
+    if xml is None:
+        return None
+    etag = hashlib.sha1(xml).hexdigest()
+
+    with _lock:
+        # Só grava se nenhum post mudou durante a geração
+        if _versao == versao:
+            _cache[parte] = (versao, time.monotonic() + SITEMAP_CACHE_TTL, xml, etag)
+    return xml, etag
+
+
+def invalidar_sitemap():
+    global _versao
+    with _lock:
+        _versao += 1
+        _cache.clear()
+
+
+# ==============================================================================
+# ✅ INVALIDAÇÃO AUTOMÁTICA VIA EVENTOS DO SQLALCHEMY
+# ==============================================================================
+# Mesmo esquema de admin/lookup_cache.py: o evento de mapper marca a sessão e
+# o sitemap só é descartado depois do COMMIT.
+
+def _marcar_alterado(mapper, connection, target):
+    sess = Session.object_session(target)
+    if sess is not None:
+        sess.info['sitemap_alterado'] = True
+
+
+for _evento in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(BlogPost, _evento, _marcar_alterado)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_apos_commit(session):
+    if session.info.pop('sitemap_alterado', False):
+        invalidar_sitemap()
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _descartar_apos_rollback(session, previous_transaction):
+    session.info.pop('sitemap_alterado', None)
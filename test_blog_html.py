@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Testes do HTML publicado do blog (admin/blog_post/conteudo.py).
+
+Não precisa de banco.
+Execução: python -m pytest -q test_blog_html.py
+"""
+
+from PIL import Image
+
+from admin.blog_post.conteudo import limpar_html_word, otimizar_imagens, gerar_html_publicado
+
+
+def test_limpeza_word():
+    html = ('<!--[if gte vml 1]><v:shape id="x"></v:shape><![endif]-->'
+            '<!--[if !vml]--><img src="/static/a.png"><!--[endif]-->'
+            '<p class="MsoNormal" lang="PT-BR" style="mso-bidi-font-family:Calibri">'
+            'Texto<span></span></p>')
+    assert limpar_html_word(html) == '<img src="/static/a.png"><p>Texto</p>'
+
+
+def test_imagem_local_recebe_lazy_e_dimensoes(tmp_path):
+    Image.new('RGB', (320, 200)).save(tmp_path / 'foto.png')
+    html = otimizar_imagens('<p><img src="/static/foto.png" alt="x"></p>', static_folder=str(tmp_path))
+    assert 'loading="lazy"' in html
+    assert 'decoding="async"' in html
+    assert 'width="320" height="200"' in html
+
+
+def test_imagem_externa_ou_ausente_sem_dimensoes(tmp_path):
+    html = otimizar_imagens('<img src="https://exemplo.com/a.png"><img src="/static/nao-existe.png"/>',
+                            static_folder=str(tmp_path))
+    assert html.count('loading="lazy"') == 2
+    assert 'width=' not in html
+    assert html.endswith('/>')
+
+
+def test_atributos_existentes_sao_mantidos(tmp_path):
+    tag = '<img src="/static/x.png" loading="eager" decoding="sync" width="10" height="5">'
+    assert otimizar_imagens(tag, static_folder=str(tmp_path)) == tag
+
+
+def test_so_largura_ou_so_altura_recebe_o_outro_proporcional(tmp_path):
+    Image.new('RGB', (320, 200)).save(tmp_path / 'foto.png')
+    so_largura = otimizar_imagens('<img src="/static/foto.png" width="160">', static_folder=str(tmp_path))
+    so_altura = otimizar_imagens('<img src="/static/foto.png" height=50>', static_folder=str(tmp_path))
+    percentual = otimizar_imagens('<img src="/static/foto.png" width="100%">', static_folder=str(tmp_path))
+
+    assert so_largura.count('width=') == 1 and 'height="100"' in so_largura
+    assert so_altura.count('height=') == 1 and 'width="80"' in so_altura
+    assert percentual.count('width=') == 1 and 'height=' not in percentual
+
+
+def test_caminho_fora_de_static_e_ignorado(tmp_path):
+    html = gerar_html_publicado('<img src="/static/../../etc/passwd">', static_folder=str(tmp_path))
+    assert 'width=' not in html
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Testes da listagem pública do blog (/blog e /blog/pagina.json).
+
+Garante que a listagem não lê content/content_html do banco e que o JSON do
+scroll infinito percorre todos os posts ativos pelo cursor, sem repetir.
+
+Usa o banco configurado em DATABASE_URL (mesmo padrão de test_db.py).
+Execução: python -m pytest -q test_blog_listagem.py
+"""
+
+import os
+
+import pytest
+from sqlalchemy import event
+
+if not os.getenv('DATABASE_URL'):
+    pytest.skip("DATABASE_URL não configurada", allow_module_level=True)
+
+from app import app, db
+from extension import page_cache
+from admin.blog_post.models import BlogPost
+
+
+@pytest.fixture
+def client():
+    app.config['PAGE_CACHE_ENABLED'] = False
+    yield app.test_client()
+    app.config['PAGE_CACHE_ENABLED'] = True
+    page_cache.clear()
+
+
+def _sql_da_requisicao(client, url):
+    with app.app_context():
+        engine = db.engine
+    comandos = []
+
+    def _registrar(conn, cursor, statement, parameters, context, executemany):
+        comandos.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', _registrar)
+    try:
+        resposta = client.get(url)
+    finally:
+        event.remove(engine, 'before_cursor_execute', _registrar)
+    assert resposta.status_code == 200, f"{url} retornou {resposta.status_code}"
+    return resposta, comandos
+
+
+@pytest.mark.parametrize('url', ['/blog', '/blog/pagina.json'])
+def test_listagem_nao_carrega_conteudo(client, url):
+    _, comandos = _sql_da_requisicao(client, url)
+    for sql in comandos:
+        if 'blog_post' in sql:
+            assert 'blog_post.content' not in sql, f"{url} leu o corpo dos posts:\n{sql}"
+
+
+def test_scroll_percorre_todos_os_posts(client):
+    with app.app_context():
+        esperados = [p.id for p in BlogPost.query
+                     .filter_by(active=True)
+                     .order_by(BlogPost.created_at.desc(), BlogPost.id.desc())
+                     .with_entities(BlogPost.id)]
+
+    vistos, cursor = [], ''
+    for _ in range(len(esperados) + 1):
+        dados = client.get(f'/blog/pagina.json?cursor={cursor}').get_json()
+        vistos.extend(p['id'] for p in dados['posts'])
+        assert dados['total'] == len(esperados)
+        cursor = dados['next_cursor']
+        if not cursor:
+            break
+
+    assert vistos == esperados
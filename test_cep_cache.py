@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Testes do cache de CEP (admin/cep_cache.py) e da carga por CSV (preload_cep.py).
+
+Não acessa o ViaCEP nem o Supabase: usa SQLite em arquivo temporário (schema
+'ouvirtiba' mapeado para o schema padrão) e uma sessão HTTP falsa que conta as
+chamadas.
+Execução: python -m pytest -q test_cep_cache.py
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+from chamadas_externas import Dependencia
+from extension import db
+from admin import cep_cache
+from admin.models import CepCache
+from preload_cep import ler_csv
+
+
+class RespostaFalsa:
+    def __init__(self, dados, status_code=200):
+        self.dados = dados
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def json(self):
+        return self.dados
+
+
+class SessaoFalsa:
+    """Responde como o ViaCEP; `fora_do_ar` simula timeout."""
+
+    def __init__(self):
+        self.chamadas = []
+        self.fora_do_ar = False
+
+    def get(self, url, timeout=None):
+        assert timeout is not None, "consulta ao ViaCEP sem timeout"
+        self.chamadas.append(url)
+        if self.fora_do_ar:
+            raise TimeoutError("timeout simulado")
+        if '/00000000/' in url:
+            return RespostaFalsa({'erro': True})
+        return RespostaFalsa({'cep': '89245-000', 'logradouro': 'Rua XV', 'bairro': 'Centro',
+                              'localidade': 'Araquari', 'uf': 'SC', 'complemento': ''})
+
+
+@pytest.fixture
+def ambiente(tmp_path, monkeypatch):
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'cep.db'}",
+        SQLALCHEMY_ENGINE_OPTIONS={'execution_options': {'schema_translate_map': {'ouvirtiba': None}}},
+    )
+    db.init_app(app)
+    sessao = SessaoFalsa()
+    monkeypatch.setattr(cep_cache, '_session', lambda: sessao)
+    monkeypatch.setattr(cep_cache, 'viacep', Dependencia('viacep', timeout=(2, 3), falhas_max=2, reabrir_s=60))
+    cep_cache.limpar_lru()
+    with app.app_context():
+        CepCache.__table__.create(db.engine)
+        yield sessao
+    cep_cache.limpar_lru()
+
+
+def test_segunda_consulta_nao_chama_viacep(ambiente):
+    dados = cep_cache.buscar_cep('89245-000')
+    assert dados['city'] == 'Araquari' and dados['region'] == 'SC'
+    assert cep_cache.buscar_cep('89245000') == dados
+    assert len(ambiente.chamadas) == 1
+
+
+def test_tabela_atende_outro_worker(ambiente):
+    cep_cache.buscar_cep('89245000')
+    cep_cache.limpar_lru()          # outro worker: LRU vazio, mesma tabela
+    assert cep_cache.buscar_cep('89245000')['address'] == 'Rua XV'
+    assert len(ambiente.chamadas) == 1
+
+
+def test_cep_inexistente_fica_em_cache_negativo(ambiente):
+    assert cep_cache.buscar_cep('00000000') is None
+    assert cep_cache.buscar_cep('00000000') is None
+    assert len(ambiente.chamadas) == 1
+    assert db.session.get(CepCache, '00000000').found is False
+
+
+def test_cache_vencido_e_usado_se_viacep_cair(ambiente):
+    cep_cache.buscar_cep('89245000')
+    vencido = datetime.now() - timedelta(days=cep_cache.CEP_TTL_DIAS + 1)
+    db.session.query(CepCache).update({'fetched_at': vencido})
+    db.session.commit()
+    cep_cache.limpar_lru()
+
+    ambiente.fora_do_ar = True
+    assert cep_cache.buscar_cep('89245000')['city'] == 'Araquari'
+    assert len(ambiente.chamadas) == 2
+
+
+def test_disjuntor_abre_apos_falhas(ambiente):
+    ambiente.fora_do_ar = True
+    for cep in ('11111111', '22222222'):
+        with pytest.raises(cep_cache.CepIndisponivel):
+            cep_cache.buscar_cep(cep)
+    assert cep_cache.viacep.disjuntor.estado == 'aberto'
+
+    # Aberto: nem tenta o ViaCEP
+    with pytest.raises(cep_cache.CepIndisponivel):
+        cep_cache.buscar_cep('33333333')
+    assert len(ambiente.chamadas) == 2
+
+    # Depois do tempo de espera uma chamada de teste fecha o disjuntor
+    ambiente.fora_do_ar = False
+    cep_cache.viacep.disjuntor.aberto_ate = 0
+    assert cep_cache.buscar_cep('33333333') is not None
+    assert cep_cache.viacep.disjuntor.estado == 'fechado'
+
+
+def test_preload_csv(ambiente, tmp_path):
+    arquivo = tmp_path / 'ceps.csv'
+    arquivo.write_text('cep;logradouro;bairro;localidade;uf\n'
+                       '89245-000;Rua XV;Centro;Araquari;SC\n'
+                       'invalido;x;y;z;SC\n', encoding='utf-8')
+    linhas = list(ler_csv(str(arquivo)))
+    assert [l['cep'] for l in linhas] == ['89245000']
+
+    assert cep_cache.gravar_ceps(linhas) == 1
+    assert cep_cache.buscar_cep('89245000')['neighborhood'] == 'Centro'
+    assert ambiente.chamadas == []
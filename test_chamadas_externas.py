@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Testes da proteção das chamadas externas (chamadas_externas.py) e das três
+integrações que passam por ela: SVRS (sefaz_client), ViaCEP (cep_cache) e
+Resend (email_outbox.ResendTransport).
+
+Não acessa nenhum serviço real: sobe um servidor HTTP local que responde na
+hora, devolve o status pedido na URL (/erro/503) ou trava a resposta (/trava)
+até o teste liberar — o caso do serviço que aceita a conexão e não responde.
+Execução: python -m pytest -q test_chamadas_externas.py
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from conftest import SENHA, gerar_pfx
+from chamadas_externas import Dependencia, DependenciaIndisponivel
+from admin import cep_cache
+from admin.nfe.sefaz_client import ClienteSefaz, WSDL
+from email_outbox import ResendTransport, _falha_do_resend
+
+RAPIDO = (1, 0.3)   # (conexão, leitura) dos testes
+
+
+class _Stub(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _responder(self):
+        if self.headers.get('Content-Length'):
+            self.rfile.read(int(self.headers['Content-Length']))
+        self.server.pedidos.append(self.path)
+        status = 200
+        if self.path.startswith('/trava'):
+            with self.server.lock:
+                self.server.travados += 1
+            self.server.liberar.wait(10)
+        elif self.path.startswith('/erro/'):
+            status = int(self.path.split('/')[2])
+        dados = {'id': 'email-1', 'logradouro': 'Rua XV', 'localidade': 'Araquari', 'uf': 'SC'}
+        if status != 200:   # formato de erro da API do Resend
+            dados = {'statusCode': status, 'message': 'erro simulado', 'name': 'validation_error'}
+        corpo = json.dumps(dados).encode()
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+        except OSError:
+            pass   # o cliente já desistiu (timeout)
+
+    do_GET = do_POST = _responder
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def servidor():
+    srv = ThreadingHTTPServer(('127.0.0.1', 0), _Stub)
+    srv.daemon_threads = True
+    srv.pedidos, srv.travados = [], 0
+    srv.lock, srv.liberar = threading.Lock(), threading.Event()
+    srv.url = f'http://127.0.0.1:{srv.server_port}'
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv
+    srv.liberar.set()
+    srv.shutdown()
+    srv.server_close()
+
+
+def _get(dep, url):
+    return dep.chamar(requests.get, url, timeout=dep.timeout)
+
+
+def _esperar(condicao, limite_s=3):
+    fim = time.monotonic() + limite_s
+    while not condicao():
+        assert time.monotonic() < fim, "condição não atingida"
+        time.sleep(0.01)
+
+
+# ==============================================================================
+# DEPENDÊNCIA
+# ==============================================================================
+
+def test_timeout_limita_servico_travado(servidor):
+    dep = Dependencia('teste', timeout=RAPIDO)
+    inicio = time.perf_counter()
+    with pytest.raises(requests.Timeout):
+        _get(dep, f'{servidor.url}/trava')
+    assert time.perf_counter() - inicio < 1.5
+    relatorio = dep.relatorio()
+    assert relatorio['timeouts'] == 1 and relatorio['errors'] == 1 and relatorio['in_flight'] == 0
+
+
+def test_compartimento_recusa_sem_ocupar_outra_thread(servidor):
+    dep = Dependencia('teste', timeout=(1, 5), concorrentes=2)
+    threads = [threading.Thread(target=_get, args=(dep, f'{servidor.url}/trava')) for _ in range(2)]
+    for t in threads:
+        t.start()
+    _esperar(lambda: servidor.travados == 2)
+
+    inicio = time.perf_counter()
+    with pytest.raises(DependenciaIndisponivel) as erro:
+        _get(dep, f'{servidor.url}/ok')
+    assert erro.value.motivo == 'lotado'
+    assert time.perf_counter() - inicio < 0.1
+    assert len(servidor.pedidos) == 2   # a 3ª nem saiu do worker
+
+    servidor.liberar.set()
+    for t in threads:
+        t.join()
+    assert _get(dep, f'{servidor.url}/ok').status_code == 200
+    relatorio = dep.relatorio()
+    assert relatorio['rejected_full'] == 1 and relatorio['peak_in_flight'] == 2
+    assert relatorio['calls'] == 3 and relatorio['errors'] == 0
+
+
+def test_disjuntor_abre_e_testa_uma_chamada_no_meio_aberto(servidor):
+    dep = Dependencia('teste', timeout=(1, 5), falhas_max=2, reabrir_s=60)
+    for _ in range(2):
+        assert _get(dep, f'{servidor.url}/erro/503').status_code == 503
+    assert dep.disjuntor.estado == 'aberto'
+
+    with pytest.raises(DependenciaIndisponivel) as erro:
+        _get(dep, f'{servidor.url}/ok')
+    assert erro.value.motivo == 'disjuntor'
+    assert len(servidor.pedidos) == 2
+
+    # Meio-aberto: só a chamada de teste vai ao serviço
+    dep.disjuntor.aberto_ate = 0
+    teste = threading.Thread(target=_get, args=(dep, f'{servidor.url}/trava'))
+    teste.start()
+    _esperar(lambda: servidor.travados == 1)
+    with pytest.raises(DependenciaIndisponivel):
+        _get(dep, f'{servidor.url}/ok')
+    servidor.liberar.set()
+    teste.join()
+
+    assert dep.disjuntor.estado == 'fechado'
+    assert _get(dep, f'{servidor.url}/ok').status_code == 200
+    relatorio = dep.relatorio()
+    assert relatorio['rejected_open'] == 2 and relatorio['breaker_opened'] == 1
+
+
+def test_status_http_4xx_nao_abre_disjuntor(servidor):
+    dep = Dependencia('teste', timeout=RAPIDO, falhas_max=1)
+    assert _get(dep, f'{servidor.url}/erro/404').status_code == 404
+    assert dep.disjuntor.estado == 'fechado'
+
+
+# ==============================================================================
+# INTEGRAÇÕES
+# ==============================================================================
+
+def test_svrs_travada_falha_rapido(servidor, tmp_path):
+    pfx = tmp_path / 'a1.pfx'
+    gerar_pfx(pfx)
+    dep = Dependencia('svrs', timeout=RAPIDO, falhas_max=2, reabrir_s=60,
+                      status_falha=frozenset({502, 503, 504}))
+    urls = {s: f'{servidor.url}/trava/{s}' for s in WSDL}
+    cliente = ClienteSefaz(2, str(pfx), SENHA, timeout=dep.timeout, urls=urls, externo=dep)
+
+    for _ in range(2):
+        with pytest.raises(requests.Timeout):
+            cliente.status_servico()
+    inicio = time.perf_counter()
+    with pytest.raises(DependenciaIndisponivel):
+        cliente.status_servico()
+    assert time.perf_counter() - inicio < 0.1
+    assert len(servidor.pedidos) == 2
+    cliente.fechar()
+
+
+def test_svrs_soap_fault_nao_abre_disjuntor(servidor, tmp_path):
+    pfx = tmp_path / 'a1.pfx'
+    gerar_pfx(pfx)
+    dep = Dependencia('svrs', timeout=RAPIDO, falhas_max=1, status_falha=frozenset({502, 503, 504}))
+    urls = {s: f'{servidor.url}/erro/500' for s in WSDL}
+    cliente = ClienteSefaz(2, str(pfx), SENHA, urls=urls, externo=dep)
+    assert cliente.status_servico().status_code == 500   # XML rejeitado, SVRS no ar
+    assert dep.disjuntor.estado == 'fechado'
+    cliente.fechar()
+
+
+def test_viacep_travado(servidor, monkeypatch):
+    monkeypatch.setattr(cep_cache, 'VIACEP_URL', servidor.url + '/trava/{cep}/json/')
+    monkeypatch.setattr(cep_cache, 'viacep', Dependencia('viacep', timeout=RAPIDO, falhas_max=1))
+    inicio = time.perf_counter()
+    with pytest.raises(cep_cache.CepIndisponivel):
+        cep_cache._consultar_viacep('89245000')
+    with pytest.raises(cep_cache.CepIndisponivel, match='disjuntor'):
+        cep_cache._consultar_viacep('89245000')
+    assert time.perf_counter() - inicio < 1.5
+    assert len(servidor.pedidos) == 1
+
+
+def test_viacep_no_ar(servidor, monkeypatch):
+    monkeypatch.setattr(cep_cache, 'VIACEP_URL', servidor.url + '/ws/{cep}/json/')
+    monkeypatch.setattr(cep_cache, 'viacep', Dependencia('viacep', timeout=RAPIDO))
+    assert cep_cache._consultar_viacep('89245000')['city'] == 'Araquari'
+
+
+def test_resend_travado_e_erro_do_email(servidor, monkeypatch):
+    resend = pytest.importorskip('resend')
+    monkeypatch.setattr(resend, 'default_http_client', resend.default_http_client)
+    dep = Dependencia('resend', timeout=RAPIDO, falhas_max=2, conta_falha=_falha_do_resend)
+    transporte = ResendTransport('re_teste', externo=dep)
+    params = {'from': 'contato@ouvirtiba.com.br', 'to': ['a@b.com'], 'subject': 'x', 'html': 'x'}
+
+    monkeypatch.setattr(resend, 'api_url', servidor.url)
+    assert transporte.enviar(params) == 'email-1'
+
+    # 422: problema do e-mail, não do Resend → disjuntor continua fechado
+    monkeypatch.setattr(resend, 'api_url', servidor.url + '/erro/422')
+    for _ in range(3):
+        with pytest.raises(Exception):
+            transporte.enviar(params)
+    assert dep.disjuntor.estado == 'fechado'
+
+    monkeypatch.setattr(resend, 'api_url', servidor.url + '/trava')
+    inicio = time.perf_counter()
+    for _ in range(2):
+        with pytest.raises(Exception):
+            transporte.enviar(params)
+    with pytest.raises(DependenciaIndisponivel):
+        transporte.enviar(params)
+    assert time.perf_counter() - inicio < 2.5
+    assert dep.relatorio()['timeouts'] == 2
@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Testes da contingência off-line da NFC-e (admin/nfe/contingencia.py e
+contingencia_fila.py).
+
+Não acessa a SEFAZ nem o Supabase: SQLite em arquivo temporário (schema
+'ouvirtiba' mapeado para o schema padrão, fixture app_sqlite) e a SefazFalsa
+do conftest.py, que responde a consulta de status (cStat 107/108), recebe os
+lotes e consulta as chaves (cStat 100/217).
+A thread não é ligada: os testes chamam processar_pendentes().
+Execução: python -m pytest -q test_contingencia.py
+"""
+
+import hashlib
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import NS, SefazFalsa, chave as chave_nfce
+from extension import db
+from admin.nfe import sefaz_client, contingencia
+from admin.nfe.models import Invoice, NfeLote, NfeContingencia
+from admin.nfe.routes import gerar_chave_acesso
+from admin.nfe.services.qr_code import gerar_qrcode_url_offline
+from contingencia_fila import ContingenciaFila
+
+DS = 'http://www.w3.org/2000/09/xmldsig#'
+
+
+def _chave(numero):
+    return chave_nfce(numero, tp_emis='9')
+
+
+@pytest.fixture
+def app(app_sqlite):
+    return app_sqlite(Invoice, NfeLote, NfeContingencia, CONTINGENCIA_THREAD=0)
+
+
+@pytest.fixture
+def fila(app):
+    return ContingenciaFila(app, db)
+
+
+def _emitir_offline(app, numeros, horas_atras=0):
+    """Notas já emitidas em contingência: XML assinado em disco + status 'Contingencia'."""
+    for n in numeros:
+        caminho = f'nfce_{n}_assinado.xml'
+        with open(f'{app.root_path}/{caminho}', 'w', encoding='utf-8') as f:
+            f.write(f'<?xml version="1.0" encoding="utf-8"?>\n<NFe xmlns="{NS}"><infNFe Id="NFe{_chave(n)}" '
+                    f'versao="4.00"><ide><tpEmis>9</tpEmis></ide></infNFe></NFe>\n')
+        db.session.add(Invoice(number=n, store_id=1, client_id=1, total_value=10.0, access_key=_chave(n),
+                               xml_path=caminho, status=contingencia.STATUS_CONTINGENCIA, tp_emis='9',
+                               contingency_at=datetime.now() - timedelta(hours=horas_atras)))
+    db.session.commit()
+
+
+# ==============================================================================
+# CHAVE, XML E QR CODE
+# ==============================================================================
+
+def test_chave_com_tp_emis_recalcula_dv():
+    normal = gerar_chave_acesso('42', '56154376000105', '65', '1', '000000123', '112345678')
+    assert normal[34] == '1'
+    off = contingencia.chave_com_tp_emis(normal, '9')
+    assert off[34] == '9' and off[:34] == normal[:34] and off[35:43] == normal[35:43]
+    assert off == gerar_chave_acesso('42', '56154376000105', '65', '1', '000000123', '912345678')
+    assert contingencia.chave_com_tp_emis(off, '1') == normal
+
+
+def test_qrcode_offline_nt_2015_002():
+    url = gerar_qrcode_url_offline(_chave(7), 2, '000001', 'CSC123', datetime(2026, 10, 8, 14, 30),
+                                   150.5, 'abc=')
+    base, p = url.split('?p=')
+    partes = p.split('|')
+    assert base.startswith('https://hom.sat.sef.sc.gov.br')
+    assert partes[:7] == [_chave(7), '2', '2', '08', '150.50', 'abc='.encode().hex(), '1']
+    esperado = hashlib.sha1(('|'.join(partes[:7]) + 'CSC123').encode()).hexdigest().upper()
+    assert partes[7] == esperado
+
+
+def test_qrcode_offline_entra_no_xml_assinado(tmp_path):
+    xml = (f'<NFe xmlns="{NS}"><infNFe Id="NFe{_chave(1)}"/><infNFeSupl><qrCode><![CDATA[online]]></qrCode>'
+           f'</infNFeSupl><Signature xmlns="{DS}"><SignedInfo><Reference><DigestValue>ZGln</DigestValue>'
+           f'</Reference></SignedInfo></Signature></NFe>').encode()
+    nota = SimpleNamespace(access_key=_chave(1), issue_date=datetime(2026, 10, 18, 9, 0))
+    novo, url = contingencia.aplicar_qrcode_offline(xml, nota, 10, ambiente=2)
+    assert f'<![CDATA[{url}]]>'.encode() in novo
+    assert '|18|10.00|' + 'ZGln'.encode().hex() + '|' in url
+
+    caminho = tmp_path / 'nota.xml'
+    caminho.write_bytes(novo)
+    assert contingencia.qrcode_do_xml(str(caminho)) == url
+
+
+def test_entrar_contingencia_valida_justificativa(app):
+    with pytest.raises(ValueError):
+        contingencia.entrar_contingencia('curta')
+    periodo = contingencia.entrar_contingencia('SEFAZ FORA DO AR DESDE AS 10H')
+    assert contingencia.entrar_contingencia('OUTRA JUSTIFICATIVA QUALQUER').id == periodo.id
+    assert contingencia.contingencia_ativa().justificativa == 'SEFAZ FORA DO AR DESDE AS 10H'
+    assert contingencia.sair_contingencia() == 1
+    assert contingencia.contingencia_ativa() is None
+
+
+# ==============================================================================
+# FILA
+# ==============================================================================
+
+def test_sefaz_fora_mantem_fila(app, fila, monkeypatch):
+    sefaz = SefazFalsa(cstat_status='108')
+    monkeypatch.setattr(sefaz_client, 'cliente_sefaz', sefaz)
+    contingencia.entrar_contingencia(contingencia.JUSTIFICATIVA_AUTOMATICA, automatica=True)
+    _emitir_offline(app, [1, 2])
+
+    assert fila.processar_pendentes() == 0
+    assert sefaz.envios == []
+    assert contingencia.contingencia_ativa() is not None
+    assert fila.relatorio()['sefaz']['online'] is False
+
+
+def test_fila_vazia_nao_consulta_sefaz(app, fila, monkeypatch):
+    sefaz = SefazFalsa()
+    monkeypatch.setattr(sefaz_client, 'cliente_sefaz', sefaz)
+    assert fila.processar_pendentes() == 0
+    assert sefaz.consultas_status == 0
+
+
+def test_sefaz_de_volta_transmite_em_lotes(app, fila, monkeypatch):
+    sefaz = SefazFalsa()
+    monkeypatch.setattr(sefaz_client, 'cliente_sefaz', sefaz)
+    contingencia.entrar_contingencia(contingencia.JUSTIFICATIVA_AUTOMATICA, automatica=True)
+    _emitir_offline(app, range(1, 61))
+
+    assert fila.processar_pendentes() == 60
+    assert [len(lote) for lote in sefaz.envios] == [50, 10]
+    assert sefaz.envios[0][0] == _chave(1)
+    assert {n.status for n in Invoice.query.all()} == {'Transmitida'}
+    assert NfeLote.query.filter_by(status='recebido').count() == 2   # recibos p/ o recibo_poller
+    assert contingencia.contingencia_ativa() is None                 # automática encerrada
+    assert fila.relatorio()['queue']['invoices'] == 0
+
+
+def test_contingencia_manual_nao_e_encerrada_pela_fila(app, fila, monkeypatch):
+    monkeypatch.setattr(sefaz_client, 'cliente_sefaz', SefazFalsa())
+    contingencia.entrar_contingencia('TESTE DE CONTINGENCIA MANUAL')
+    _emitir_offline(app, [1])
+    assert fila.processar_pendentes() == 1
+    assert contingencia.contingencia_ativa() is not None
+
+
+def test_falha_de_rede_devolve_a_fila_com_espera(app, fila, monkeypatch):
+    monkeypatch.setattr(sefaz_client, 'cliente_sefaz', SefazFalsa(falhar_envio=True))
+    _emitir_offline(app, [1, 2])
+
+    assert fila.processar_pendentes() == 0
+    notas = Invoice.query.all()
+    assert {n.status for n in notas} == {contingencia.STATUS_CONTINGENCIA}
+    assert all(n.retry_at > datetime.now() for n in notas)
+
+    # Ainda dentro da espera: nada é reenviado
+    sefaz = SefazFalsa()
+    monkeypatch.setattr(sefaz_client, 'cliente_sefaz', sefaz)
+    assert fila.processar_pendentes() == 0 and sefaz.envios == []
+
+    Invoice.query.update({'retry_at': datetime.now() - timedelta(seconds=1)})
+    db.session.commit()
+    assert fila.processar_pendentes() == 2
+
+
+def test_envio_sem_resposta_consulta_antes_de_reenviar(app, fila, monkeypatch):
+    # O lote chegou à SEFAZ, mas a resposta se perdeu: nada volta para a fila
+    sefaz = SefazFalsa(perder_resposta=True)
+    monkeypatch.setattr(sefaz_client, 'cliente_sefaz', sefaz)
+    _emitir_offline(app, [1, 2])
+
+    assert fila.processar_pendentes() == 0
+    assert sorted(sefaz.consultas) == [_chave(1), _chave(2)]
+    assert {n.status for n in Invoice.query.all()} == {'Aprovada'}
+    assert fila.pendentes() == 0 and len(sefaz.envios) == 1
+
+
+def test_consulta_sem_resposta_mantem_nota_em_envio(app, fila, monkeypatch):
+    sefaz = SefazFalsa(falhar_envio=True, falhar_consulta=True)
+    monkeypatch.setattr(sefaz_client, 'cliente_sefaz', sefaz)
+    _emitir_offline(app, [1, 2])
+
+    assert fila.processar_pendentes() == 0
+    assert {n.status for n in Invoice.query.all()} == {'Enviando'}
+    assert fila.pendentes() == 2 and fila.relatorio()['queue']['invoices'] == 2
+
+    # SEFAZ de volta: a chave é consultada (217 = não consta) e só então reenviada
+    sefaz.falhar_envio = sefaz.falhar_consulta = False
+    Invoice.query.update({'retry_at': datetime.now() - timedelta(seconds=1)})
+    db.session.commit()
+    assert fila.processar_pendentes() == 2
+    assert sorted(sefaz.consultas[-2:]) == [_chave(1), _chave(2)]
+    assert {n.status for n in Invoice.query.all()} == {'Transmitida'}
+
+
+def test_lote_adiado_fica_na_fila(app, fila, monkeypatch):
+    monkeypatch.setattr(sefaz_client, 'cliente_sefaz', SefazFalsa(cstat_lote='108'))
+    _emitir_offline(app, [1, 2])
+
+    assert fila.processar_pendentes() == 0
+    notas = Invoice.query.all()
+    assert {(n.status, n.cstat) for n in notas} == {(contingencia.STATUS_CONTINGENCIA, '108')}
+    assert all(n.retry_at > datetime.now() + timedelta(seconds=60) for n in notas)
+
+
+def test_lote_recusado_nao_marca_notas_como_rejeitadas(app, fila, monkeypatch):
+    monkeypatch.setattr(sefaz_client, 'cliente_sefaz', SefazFalsa(cstat_lote='213'))
+    _emitir_offline(app, [1, 2], horas_atras=30)
+
+    assert fila.processar_pendentes() == 0
+    assert {n.status for n in Invoice.query.all()} == {'Lote_Rejeitado'}
+    fila_ = fila.relatorio()['queue']
+    assert fila_['invoices'] == 0 and fila_['rejected'] == 2 and fila_['overdue'] == 2
+
+
+def test_relatorio_conta_notas_fora_do_prazo(app, fila):
+    _emitir_offline(app, [1], horas_atras=30)
+    _emitir_offline(app, [2], horas_atras=1)
+    fila_ = fila.relatorio()['queue']
+    assert fila_['invoices'] == 2 and fila_['overdue'] == 1 and fila_['rejected'] == 0
+    assert fila_['oldest_age_h'] >= 30
+
+
+# ==============================================================================
+# REEMISSÃO EM CONTINGÊNCIA (/generate_xml_nfce)
+# ==============================================================================
+
+@pytest.fixture
+def cliente_web(app, monkeypatch):
+    from admin.nfe import routes as nfe_routes
+
+    monkeypatch.setattr(nfe_routes, 'loja_atual', lambda: {'Code': '56154376000105'})
+    app.register_blueprint(nfe_routes.nfe_bp)
+    cliente = app.test_client()
+    with cliente.session_transaction() as sess:
+        sess['email'] = 'teste@ouvirtiba.com.br'
+    return cliente
+
+
+def _nota_online(numero, status):
+    chave = contingencia.chave_com_tp_emis(_chave(numero), '1')
+    nota = Invoice(number=numero, store_id=1, client_id=1, total_value=10.0, access_key=chave,
+                   status=status, tp_emis='1')
+    db.session.add(nota)
+    db.session.commit()
+    return nota.id, chave
+
+
+def test_reemissao_consulta_a_chave_original(app, cliente_web, monkeypatch):
+    # Timeout no envio on-line, mas a SEFAZ autorizou: não vira tpEmis=9
+    sefaz = SefazFalsa()
+    monkeypatch.setattr(sefaz_client, 'cliente_sefaz', sefaz)
+    id_, chave = _nota_online(5, 'XML_Assinado')
+    sefaz.lotes['1'] = [chave]
+    contingencia.entrar_contingencia(contingencia.JUSTIFICATIVA_AUTOMATICA, automatica=True)
+
+    assert cliente_web.get(f'/generate_xml_nfce/{id_}').status_code == 302
+    nota = db.session.get(Invoice, id_)
+    assert sefaz.consultas == [chave]
+    assert (nota.status, nota.access_key, nota.tp_emis) == ('Aprovada', chave, '1') and nota.nprot
+
+
+def test_reemissao_recusada_com_nota_em_envio(app, cliente_web, monkeypatch):
+    sefaz = SefazFalsa()
+    monkeypatch.setattr(sefaz_client, 'cliente_sefaz', sefaz)
+    id_, chave = _nota_online(6, 'Enviando')
+    contingencia.entrar_contingencia(contingencia.JUSTIFICATIVA_AUTOMATICA, automatica=True)
+
+    assert cliente_web.get(f'/generate_xml_nfce/{id_}').status_code == 302
+    nota = db.session.get(Invoice, id_)
+    assert (nota.status, nota.access_key) == ('Enviando', chave) and sefaz.consultas == []
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Testes da caixa de saída de e-mails (email_outbox.py) com o FakeTransport.
+
+Não precisa do banco do Supabase: usa um app Flask mínimo com SQLite em
+arquivo temporário (schema 'ouvirtiba' mapeado para o schema padrão) e chama
+processar_pendentes() direto, sem a thread de fundo.
+Execução: python -m pytest -q test_email_outbox.py
+"""
+
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+from extension import db
+from admin.models import OutboxMessage
+from email_outbox import EmailOutbox, FakeTransport
+
+
+@pytest.fixture
+def ambiente(tmp_path):
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'outbox.db'}",
+        SQLALCHEMY_ENGINE_OPTIONS={'execution_options': {'schema_translate_map': {'ouvirtiba': None}}},
+        EMAIL_TRANSPORT='fake',
+        EMAIL_OUTBOX_THREAD=0,
+        EMAIL_OUTBOX_WORKERS=2,
+        EMAIL_MAX_TENTATIVAS=3,
+    )
+    db.init_app(app)
+    outbox = EmailOutbox(app, db)
+    with app.app_context():
+        OutboxMessage.__table__.create(db.engine)
+        yield app, outbox
+
+
+def _params(n=1):
+    return {'from': 'Ouvirtiba <contato@ouvirtiba.com.br>', 'to': ['loja@ouvirtiba.com.br'],
+            'subject': f'Contato {n}', 'html': f'<p>mensagem {n}</p>'}
+
+
+def _vencer_todas():
+    """Antecipa o próximo envio de todas as linhas (pula o backoff)."""
+    OutboxMessage.query.update({'next_attempt_at': datetime.now() - timedelta(seconds=1)})
+    db.session.commit()
+
+
+def test_enfileirar_e_enviar(ambiente):
+    app, outbox = ambiente
+    ids = [outbox.enfileirar(_params(n)) for n in range(5)]
+
+    assert OutboxMessage.query.filter_by(status='pendente').count() == 5
+    assert outbox.transport.enviados == []   # nada enviado durante a "requisição"
+
+    assert outbox.processar_pendentes() == 5
+    assert sorted(p['subject'] for p in outbox.transport.enviados) == [f'Contato {n}' for n in range(5)]
+
+    db.session.expire_all()
+    for m in OutboxMessage.query.filter(OutboxMessage.id.in_(ids)):
+        assert m.status == 'enviado'
+        assert m.provider_id.startswith('fake-')
+        assert m.attempts == 1 and m.sent_at is not None
+
+    relatorio = outbox.relatorio()
+    assert relatorio['sent'] == 5
+    assert relatorio['queue'] == {'pendente': 0, 'enviando': 0, 'morto': 0}
+    assert relatorio['send_p95_ms'] is not None
+
+
+def test_falha_agenda_nova_tentativa_com_backoff(ambiente):
+    app, outbox = ambiente
+    outbox.transport = FakeTransport(falhas=1)
+    outbox.enfileirar(_params())
+
+    antes = datetime.now()
+    outbox.processar_pendentes()
+    db.session.expire_all()
+    m = OutboxMessage.query.one()
+    assert m.status == 'pendente' and m.attempts == 1
+    assert 'falha simulada' in m.last_error
+    assert m.next_attempt_at >= antes + timedelta(seconds=app.config['EMAIL_BACKOFF_BASE_S'] * 0.8)
+
+    # Ainda não venceu: nada a processar
+    assert outbox.processar_pendentes() == 0
+
+    _vencer_todas()
+    outbox.processar_pendentes()
+    db.session.expire_all()
+    m = OutboxMessage.query.one()
+    assert m.status == 'enviado' and m.attempts == 2
+    assert len(outbox.transport.enviados) == 1
+
+
+def test_dead_letter_apos_maximo_de_tentativas(ambiente):
+    app, outbox = ambiente
+    outbox.transport = FakeTransport(falhas=99)
+    outbox.enfileirar(_params())
+
+    for _ in range(app.config['EMAIL_MAX_TENTATIVAS']):
+        _vencer_todas()
+        outbox.processar_pendentes()
+
+    db.session.expire_all()
+    m = OutboxMessage.query.one()
+    assert m.status == 'morto'
+    assert m.attempts == app.config['EMAIL_MAX_TENTATIVAS']
+
+    _vencer_todas()
+    assert outbox.processar_pendentes() == 0
+    assert outbox.relatorio()['queue']['morto'] == 1
+
+
+def test_lease_expirado_volta_para_a_fila(ambiente):
+    _, outbox = ambiente
+    outbox.enfileirar(_params())
+    # Simula um worker que reservou a linha e morreu antes de atualizar
+    OutboxMessage.query.update({'status': 'enviando', 'attempts': 1,
+                                'next_attempt_at': datetime.now() - timedelta(seconds=1)})
+    db.session.commit()
+
+    assert outbox.processar_pendentes() == 1
+    db.session.expire_all()
+    assert OutboxMessage.query.one().status == 'enviado'
+
+
+def test_backoff_exponencial_limitado(ambiente):
+    app, outbox = ambiente
+    base, maximo = app.config['EMAIL_BACKOFF_BASE_S'], app.config['EMAIL_BACKOFF_MAX_S']
+    assert base * 0.8 <= outbox.backoff(1) <= base * 1.2
+    assert base * 4 * 0.8 <= outbox.backoff(3) <= base * 4 * 1.2
+    assert outbox.backoff(30) <= maximo * 1.2
+
+
+def test_payload_guardado_em_json(ambiente):
+    _, outbox = ambiente
+    outbox.enfileirar(_params(7))
+    assert json.loads(OutboxMessage.query.one().payload)['subject'] == 'Contato 7'
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Teste da rota /health (substitui o SELECT 1 do antigo /keep-alive).
+
+Usa o banco configurado em DATABASE_URL (mesmo padrão de test_db.py).
+Execução: python -m pytest -q test_health.py
+"""
+
+import os
+
+import pytest
+
+if not os.getenv('DATABASE_URL'):
+    pytest.skip("DATABASE_URL não configurada", allow_module_level=True)
+
+from app import app
+
+CAMPOS = {'status', 'ping_ms', 'pool', 'connects', 'last_connect_ms', 'pid'}
+
+
+@pytest.mark.parametrize('url', ['/health', '/keep-alive'])
+def test_health_json(url):
+    resposta = app.test_client().get(url)
+    assert resposta.status_code == 200
+    dados = resposta.get_json()
+    assert dados['status'] == 'ok'
+    assert CAMPOS <= set(dados)
+
+
+def test_health_nao_prende_conexao():
+    client = app.test_client()
+    client.get('/health')
+    dados = client.get('/health').get_json()
+    # A conexão do SELECT 1 volta para o pool antes do relatório
+    if 'checked_out' in dados:
+        assert dados['checked_out'] == 0
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Teste de regressão dos índices das consultas mais frequentes.
+
+Para cada consulta "quente" roda EXPLAIN (FORMAT JSON) no PostgreSQL e falha
+se o plano fizer Seq Scan na tabela ou não usar o índice esperado.
+
+Em tabelas pequenas o planner prefere Seq Scan mesmo com índice; por isso a
+transação roda com enable_seqscan = off, que só deixa a varredura sequencial
+quando não existe índice utilizável. Assim o resultado não depende do volume
+de dados do banco de teste. Nada é gravado (ROLLBACK no final).
+
+Usa o banco configurado em DATABASE_URL (mesmo padrão de test_db.py), com os
+índices já criados por migrar_indices.py.
+Execução: python -m pytest -q test_indices_explain.py
+"""
+
+import os
+
+import pytest
+from sqlalchemy import text
+
+if not os.getenv('DATABASE_URL'):
+    pytest.skip("DATABASE_URL não configurada", allow_module_level=True)
+
+from app import app, db
+from migrar_indices import gerar_sql
+
+# (tabela, índice esperado, consulta) — espelham as rotas correspondentes
+CONSULTAS = {
+    'product_list': (
+        'product', 'ix_product_store_type_stock',
+        "SELECT id FROM ouvirtiba.product "
+        "WHERE store_id = 1 AND type_id = 1 AND stock > 0",
+    ),
+    'nfe_create': (
+        'customer_request', 'ix_customer_request_invoiced_id',
+        "SELECT id FROM ouvirtiba.customer_request "
+        "WHERE is_invoiced = 'N' ORDER BY id DESC",
+    ),
+    'order_list': (
+        'customer_request', 'ix_customer_request_created_id',
+        "SELECT id FROM ouvirtiba.customer_request "
+        "ORDER BY created_at DESC, id DESC LIMIT 51",
+    ),
+    'orderitem_list': (
+        'customer_request_item', 'ix_customer_request_item_request',
+        "SELECT * FROM ouvirtiba.customer_request_item WHERE customer_request_id = 1",
+    ),
+    'nfe_list': (
+        'invoice', 'ix_invoice_issue_date_id',
+        "SELECT id FROM ouvirtiba.invoice ORDER BY issue_date DESC, id DESC LIMIT 51",
+    ),
+    'nfe_items': (
+        'invoice_item', 'ix_invoice_item_invoice',
+        "SELECT * FROM ouvirtiba.invoice_item WHERE invoice_id = 1",
+    ),
+    'purchase_list': (
+        'purchase_invoice', 'ix_purchase_invoice_store_receipt',
+        "SELECT id FROM ouvirtiba.purchase_invoice WHERE store_id = 1 "
+        "ORDER BY receipt_date DESC, id DESC LIMIT 51",
+    ),
+    'get_sale_price': (
+        'product_assembly', 'ix_product_assembly_store_parent_date',
+        "SELECT sale_price FROM ouvirtiba.product_assembly "
+        "WHERE parent_product_id = 1 AND store_id = 1 "
+        "ORDER BY assembly_date DESC LIMIT 1",
+    ),
+    'quote_list': (
+        'quote', 'ix_quote_store_created_id',
+        "SELECT id FROM ouvirtiba.quote WHERE store_id = 1 "
+        "ORDER BY created_at DESC, id DESC LIMIT 51",
+    ),
+    'receipt_list': (
+        'receipt', 'ix_receipt_store_created_id',
+        "SELECT id FROM ouvirtiba.receipt WHERE store_id = 1 "
+        "ORDER BY created_at DESC, id DESC LIMIT 51",
+    ),
+    'blog': (
+        'blog_post', 'ix_blog_post_active_created',
+        "SELECT id FROM ouvirtiba.blog_post "
+        "WHERE active = true ORDER BY created_at DESC LIMIT 10",
+    ),
+}
+
+
+def _nos(plano):
+    """Percorre a árvore do plano (nó + sub-planos)."""
+    yield plano
+    for filho in plano.get('Plans', []):
+        yield from _nos(filho)
+
+
+@pytest.fixture(scope='module')
+def conexao():
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'postgresql':
+        pytest.skip("EXPLAIN (FORMAT JSON) exige PostgreSQL")
+
+    with engine.connect() as conn:
+        trans = conn.begin()
+        conn.execute(text("SET LOCAL enable_seqscan = off"))
+        yield conn
+        trans.rollback()
+
+
+@pytest.mark.parametrize('nome', sorted(CONSULTAS))
+def test_consulta_usa_indice(conexao, nome):
+    tabela, indice, sql = CONSULTAS[nome]
+    resultado = conexao.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+    plano = resultado[0]['Plan']
+    nos = list(_nos(plano))
+
+    seq = [n for n in nos if n['Node Type'] == 'Seq Scan' and n.get('Relation Name') == tabela]
+    assert not seq, f"{nome}: Seq Scan em ouvirtiba.{tabela} (falta rodar migrar_indices.py?)"
+
+    usados = {n.get('Index Name') for n in nos}
+    assert indice in usados, f"{nome}: esperado {indice}, plano usou {sorted(filter(None, usados))}"
+
+
+def test_indices_esperados_estao_na_migracao():
+    # Todo índice exigido acima precisa estar declarado nos models
+    with app.app_context():
+        comandos = ' '.join(gerar_sql(db.metadata))
+    for nome, (tabela, indice, _) in CONSULTAS.items():
+        assert f" {indice} ON ouvirtiba.{tabela} " in comandos, f"{nome}: {indice} não declarado"
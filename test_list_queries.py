@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Teste de quantidade de consultas SQL das listagens do admin.
+
+Garante que order_list, nfe_list, quote_list e receipt_list carregam o
+cliente de cada linha via joinedload (sem N+1): o número de SELECTs de uma
+página não pode crescer com o número de linhas exibidas.
+
+Usa o banco configurado em DATABASE_URL (mesmo padrão de test_db.py).
+Execução: python -m pytest -q test_list_queries.py
+"""
+
+import os
+
+import pytest
+from sqlalchemy import event
+
+if not os.getenv('DATABASE_URL'):
+    pytest.skip("DATABASE_URL não configurada", allow_module_level=True)
+
+from app import app, db
+from admin.models import Store
+
+# Consultas esperadas por página, com os caches já aquecidos:
+#   1 = SELECT da página (com JOIN do cliente)
+#   1 = SELECT da lista de clientes para o filtro
+LIMITE_CONSULTAS = 2
+
+LISTAGENS = [
+    '/admin/order/list',
+    '/admin/nfe/list',
+    '/admin/quote/list',
+    '/admin/receipt/list',
+]
+
+
+class ContadorSQL:
+    """Conta os comandos SQL executados enquanto estiver ativo."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.comandos = []
+
+    def _registrar(self, conn, cursor, statement, parameters, context, executemany):
+        self.comandos.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._registrar)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._registrar)
+
+    @property
+    def total(self):
+        return len(self.comandos)
+
+
+@pytest.fixture(scope='module')
+def client():
+    with app.app_context():
+        store = Store.query.first()
+        if store is None:
+            pytest.skip("Nenhuma loja cadastrada no banco")
+        store_id = store.id
+
+    test_client = app.test_client()
+    with test_client.session_transaction() as sess:
+        sess['email'] = 'teste@ouvirtiba.com.br'
+        sess['store_id'] = store_id
+        sess['Store'] = {'Id': store_id}
+        sess['username'] = 'teste'
+    return test_client
+
+
+def _contar(client, url):
+    with app.app_context():
+        engine = db.engine
+    with ContadorSQL(engine) as contador:
+        resposta = client.get(url)
+    assert resposta.status_code == 200, f"{url} retornou {resposta.status_code}"
+    return contador.total
+
+
+@pytest.mark.parametrize('url', LISTAGENS)
+def test_listagem_sem_n_mais_1(client, url):
+    # 1ª chamada aquece os caches de loja/lookups
+    client.get(url)
+
+    poucas = _contar(client, f'{url}?per_page=5')
+    muitas = _contar(client, f'{url}?per_page=200')
+
+    assert poucas == muitas, (
+        f"{url}: {poucas} consultas com 5 linhas e {muitas} com 200 (N+1?)"
+    )
+    assert muitas <= LIMITE_CONSULTAS, (
+        f"{url}: {muitas} consultas (limite {LIMITE_CONSULTAS})"
+    )
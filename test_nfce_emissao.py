@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Testes da emissão da NFC-e em uma passada (admin/nfe/nfce_emissao.py):
+monta → assina → QR Code → serializa, sem re-parse nem arquivo temporário.
+
+Não acessa a SEFAZ nem o banco: nota e emitente em memória, certificado A1
+gerado na hora. A assinatura é conferida depois de serializar e ler de novo,
+como a SEFAZ faz.
+Execução: python -m pytest -q test_nfce_emissao.py
+"""
+
+import base64
+import hashlib
+import re
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+from lxml import etree
+
+from conftest import SENHA, gerar_pfx
+from admin.nfe.certificado import obter_certificado
+from admin.nfe.contingencia import chave_com_tp_emis
+from admin.nfe.nfce_emissao import EmissaoNFCe, reassinar_xml
+from admin.nfe.nfce_transmit import _montar_envelope
+from admin.nfe.routes import gerar_chave_acesso
+from admin.nfe.services.qr_code import gerar_qrcode_url
+
+NS = '{http://www.portalfiscal.inf.br/nfe}'
+DS = '{http://www.w3.org/2000/09/xmldsig#}'
+
+EMITENTE = {
+    'Code': '56.154.376/0001-05', 'Name': 'JANSSEN APARELHOS AUDITIVOS LTDA',
+    'Address': 'RUA XV DE NOVEMBRO', 'Number': 100, 'Neighborhood': 'CENTRO',
+    'City': 'ARAQUARI', 'Region': 'SC', 'Cep origem': '89245-000',
+    'Phone': '(47) 99999-0000', 'State_Registration': '263.067.041',
+}
+
+
+def _invoice(tp_emis='1'):
+    chave = chave_com_tp_emis(
+        gerar_chave_acesso('42', '56154376000105', '65', '1', '000000012', '112345678'), tp_emis)
+    itens = [SimpleNamespace(product_id=n, product=SimpleNamespace(name='Aparelho auditivo'),
+                             serialnumber=f'SN{n}', ncm='90214000', cfop='5102', quantity=1,
+                             unit_price=Decimal('150.00'), total_price=Decimal('150.00'),
+                             discount=Decimal('0'), csosn='102')
+             for n in (1, 2)]
+    return SimpleNamespace(id=12, number=12, series=1, access_key=chave, items=itens,
+                           issue_date=datetime(2026, 10, 8, 14, 30))
+
+
+def _contingencia():
+    return SimpleNamespace(inicio=datetime(2026, 10, 8, 14, 0),
+                           justificativa='SEFAZ SEM RESPOSTA - EMISSAO OFF-LINE')
+
+
+@pytest.fixture(scope='module')
+def certificado(tmp_path_factory):
+    caminho = tmp_path_factory.mktemp('cert') / 'a1.pfx'
+    gerar_pfx(caminho)
+    return obter_certificado(str(caminho), SENHA)
+
+
+def _conferir_assinatura(xml, certificado):
+    """Confere DigestValue e SignatureValue num XML lido do zero."""
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding
+
+    raiz = etree.fromstring(xml)
+    infNFe = raiz.find(f'{NS}infNFe')
+    assinatura = raiz.find(f'{DS}Signature')
+    digest = base64.b64encode(hashlib.sha1(etree.tostring(infNFe, method='c14n')).digest()).decode()
+    assert assinatura.findtext(f'.//{DS}DigestValue') == digest
+
+    signed_info = etree.tostring(assinatura.find(f'{DS}SignedInfo'), method='c14n')
+    certificado.certificate.public_key().verify(
+        base64.b64decode(assinatura.findtext(f'{DS}SignatureValue')),
+        signed_info, padding.PKCS1v15(), hashes.SHA1())
+    return digest
+
+
+def test_emissao_online_valida_no_schema(certificado):
+    emissao = EmissaoNFCe(_invoice(), EMITENTE)
+    xml = emissao.emitir(certificado)
+
+    assert emissao.validar() == []
+    raiz = etree.fromstring(xml)
+    assert [etree.QName(e).localname for e in raiz] == ['infNFe', 'infNFeSupl', 'Signature']
+    assert raiz.find(f'{DS}Signature').prefix is None
+    assert emissao.valor_nf == Decimal('300.00')
+    assert set(emissao.tempos) >= {'montar', 'assinar', 'qrcode', 'serializar', 'validar'}
+
+
+def test_assinatura_confere_depois_de_serializar(certificado):
+    emissao = EmissaoNFCe(_invoice(), EMITENTE)
+    digest = _conferir_assinatura(emissao.emitir(certificado), certificado)
+    assert digest == emissao.digest_value
+
+
+def test_serializa_uma_vez(certificado):
+    emissao = EmissaoNFCe(_invoice(), EMITENTE)
+    xml = emissao.emitir(certificado)
+    assert emissao.serializar() is xml
+    assert xml.count(b'\n') == 1   # só após <?xml ?>: o assinado é o transmitido
+
+
+def test_contingencia_qrcode_com_digest_real(certificado):
+    emissao = EmissaoNFCe(_invoice('9'), EMITENTE, contingencia=_contingencia())
+    xml = emissao.emitir(certificado)
+
+    assert emissao.validar() == []
+    raiz = etree.fromstring(xml)
+    assert raiz.findtext(f'.//{NS}ide/{NS}tpEmis') == '9'
+    assert raiz.findtext(f'.//{NS}ide/{NS}xJust').startswith('SEFAZ')
+    parametros = raiz.findtext(f'{NS}infNFeSupl/{NS}qrCode').split('?p=')[1].split('|')
+    digest = _conferir_assinatura(xml, certificado)
+    assert parametros[4] == '300.00'
+    assert parametros[5] == digest.encode('ascii').hex()
+
+
+def test_sem_assinatura():
+    emissao = EmissaoNFCe(_invoice(), EMITENTE)
+    xml = emissao.sem_assinatura()
+    assert emissao.digest_value is None and emissao.validar() == []
+    assert etree.fromstring(xml).find(f'{DS}Signature') is None
+
+
+def test_reassinar_xml(certificado):
+    original = EmissaoNFCe(_invoice('9'), EMITENTE, contingencia=_contingencia())
+    xml = original.emitir(certificado)
+
+    # XML antigo indentado (pretty_print), como os gerados antes da emissão em uma passada
+    indentado = etree.tostring(etree.fromstring(xml), pretty_print=True,
+                               xml_declaration=True, encoding='utf-8')
+    emissao = reassinar_xml(indentado, certificado, original.invoice)
+
+    assert emissao.tp_emis == '9' and emissao.valor_nf == Decimal('300.00')
+    assert emissao.validar() == []
+    assert _conferir_assinatura(emissao.serializar(), certificado) == original.digest_value
+    assert emissao.qrcode_url == original.qrcode_url
+
+
+def test_hash_do_qrcode_sem_separador():
+    url = gerar_qrcode_url('4' * 44, 2, '000001', 'CSC123')
+    parametros, hash_ = url.split('?p=')[1].rsplit('|', 1)
+    assert hash_ == hashlib.sha1(f'{parametros}CSC123'.encode()).hexdigest().upper()
+
+
+def test_envelope_transmite_infnfe_assinado_sem_alteracao(certificado):
+    xml = EmissaoNFCe(_invoice(), EMITENTE).emitir(certificado)
+    envelope = _montar_envelope(xml.decode('utf-8')).encode('utf-8')
+
+    nfe = re.compile(rb'<NFe\b.*</NFe>', re.S)
+    infnfe = re.compile(rb'<infNFe\b.*</infNFe>', re.S)
+    assert infnfe.search(envelope).group(0) == infnfe.search(xml).group(0)
+    # A SEFAZ confere a assinatura do <NFe> como chegou no enviNFe
+    _conferir_assinatura(nfe.search(envelope).group(0), certificado)
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Testes da transmissão em lote (admin/nfe/nfce_lote.py).
+
+Não acessa a SEFAZ nem o Supabase: SQLite em arquivo temporário (schema
+'ouvirtiba' mapeado para o schema padrão, fixture app_sqlite) e a SefazFalsa
+do conftest.py, que responde retEnviNFe/retConsReciNFe e guarda os lotes.
+Execução: python -m pytest -q test_nfce_lote.py
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import NS, SefazFalsa, chave as _chave
+from extension import db
+from admin.nfe import nfce_lote
+from admin.nfe.models import Invoice, NfeLote
+
+
+def _xml_assinado(numero):
+    return (f'<?xml version="1.0" encoding="utf-8"?>\n<NFe xmlns="{NS}">\n'
+            f'  <infNFe Id="NFe{_chave(numero)}" versao="4.00"><ide><nNF>{numero}</nNF></ide></infNFe>\n'
+            f'</NFe>\n')
+
+
+@pytest.fixture
+def app(app_sqlite):
+    return app_sqlite(Invoice, NfeLote)
+
+
+def _criar_notas(tmp_path, quantidade, status='XML_Assinado'):
+    (tmp_path / 'output').mkdir(exist_ok=True)
+    for numero in range(1, quantidade + 1):
+        caminho = f'output/nfce_{numero}_assinado.xml'
+        (tmp_path / caminho).write_text(_xml_assinado(numero), encoding='utf-8')
+        db.session.add(Invoice(number=numero, store_id=1, client_id=1, total_value=10.0,
+                               status=status, xml_path=caminho))
+    db.session.commit()
+
+
+def _usar(monkeypatch, sefaz):
+    monkeypatch.setattr(nfce_lote, 'cliente_sefaz', sefaz)
+
+
+def test_notas_agrupadas_em_lotes_de_50(app, tmp_path, monkeypatch):
+    sefaz = SefazFalsa()
+    _usar(monkeypatch, sefaz)
+    _criar_notas(tmp_path, 120)
+
+    lotes = nfce_lote.transmitir_lotes(base_dir=str(tmp_path))
+
+    assert [l.quantidade for l in lotes] == [50, 50, 20]
+    assert [l.id for l in lotes] == [1, 2, 3]          # idLote sequencial
+    assert all(l.status == 'recebido' and l.nrec for l in lotes)
+    assert sorted(len(ch) for ch in sefaz.lotes.values()) == [20, 50, 50]
+    nota = Invoice.query.filter_by(number=51).one()
+    assert nota.status == 'Transmitida' and nota.nrec == lotes[1].nrec
+    assert nota.access_key == _chave(51)
+    assert nfce_lote.notas_pendentes() == []
+
+
+def test_protocolos_atualizam_cada_nota(app, tmp_path, monkeypatch):
+    sefaz = SefazFalsa(rejeitar={_chave(2)})
+    _usar(monkeypatch, sefaz)
+    _criar_notas(tmp_path, 3)
+    (lote,) = nfce_lote.transmitir_lotes(base_dir=str(tmp_path))
+
+    assert nfce_lote.consultar_lote(lote) == (2, 1)
+    assert lote.status == 'processado'
+    notas = {n.number: n for n in Invoice.query.all()}
+    assert notas[1].status == 'Aprovada' and notas[1].nprot == '1' + _chave(1)[-14:]
+    assert notas[2].status == 'Rejeitada' and notas[2].nprot is None and notas[2].cstat == '778'
+    assert notas[3].status == 'Aprovada'
+
+
+def test_lote_rejeitado_tira_as_notas_da_fila(app, tmp_path, monkeypatch):
+    _usar(monkeypatch, SefazFalsa(cstat_lote='213'))
+    _criar_notas(tmp_path, 2)
+    (lote,) = nfce_lote.transmitir_lotes(base_dir=str(tmp_path))
+
+    assert lote.status == 'rejeitado' and lote.cstat == '213'
+    assert {(n.status, n.cstat) for n in Invoice.query.all()} == {('Lote_Rejeitado', '213')}
+    assert nfce_lote.notas_pendentes() == []   # o próximo lote não reenvia
+
+
+def test_lote_com_documento_invalido_e_dividido(app, tmp_path, monkeypatch):
+    sefaz = SefazFalsa(schema_invalido={_chave(3)})
+    _usar(monkeypatch, sefaz)
+    _criar_notas(tmp_path, 4)
+    lotes = nfce_lote.transmitir_lotes(base_dir=str(tmp_path))
+
+    assert [len(chaves) for chaves in sefaz.envios] == [4, 2, 2, 1, 1]
+    assert [l.status for l in lotes].count('recebido') == 2
+    notas = {n.number: n for n in Invoice.query.all()}
+    assert notas[3].status == 'Lote_Rejeitado' and notas[3].cstat == '225'
+    assert {notas[n].status for n in (1, 2, 4)} == {'Transmitida'}
+
+
+def test_lote_paralisado_volta_para_a_fila_com_espera(app, tmp_path, monkeypatch):
+    _usar(monkeypatch, SefazFalsa(cstat_lote='108'))
+    _criar_notas(tmp_path, 2)
+    (lote,) = nfce_lote.transmitir_lotes(base_dir=str(tmp_path))
+
+    assert lote.status == 'adiado'
+    notas = Invoice.query.all()
+    assert {(n.status, n.cstat) for n in notas} == {('XML_Assinado', '108')}
+    assert all(n.retry_at > datetime.now() for n in notas)
+    assert nfce_lote.notas_pendentes() == []
+
+    Invoice.query.update({'retry_at': datetime.now() - timedelta(seconds=1)})
+    db.session.commit()
+    assert len(nfce_lote.notas_pendentes()) == 2
+
+
+def test_notas_reservadas_antes_do_envio(app, tmp_path, monkeypatch):
+    sefaz = SefazFalsa()
+    no_envio = {}
+    autorizacao = sefaz.autorizacao
+
+    def espiar(envi_nfe):
+        # Durante o POST outro worker não vê as notas como pendentes
+        no_envio['status'] = {(n.status, n.lote_id) for n in Invoice.query.all()}
+        no_envio['pendentes'] = nfce_lote.notas_pendentes()
+        return autorizacao(envi_nfe)
+
+    sefaz.autorizacao = espiar
+    _usar(monkeypatch, sefaz)
+    _criar_notas(tmp_path, 3)
+    (lote,) = nfce_lote.transmitir_lotes(base_dir=str(tmp_path))
+
+    assert no_envio == {'status': {('Enviando', lote.id)}, 'pendentes': []}
+
+
+def test_envio_sem_resposta_consulta_as_chaves(app, tmp_path, monkeypatch):
+    # A SEFAZ recebeu o lote, mas a resposta se perdeu (timeout de leitura)
+    sefaz = SefazFalsa(perder_resposta=True)
+    _usar(monkeypatch, sefaz)
+    _criar_notas(tmp_path, 2)
+    (lote,) = nfce_lote.transmitir_lotes(base_dir=str(tmp_path))
+
+    assert lote.status == 'erro' and sorted(sefaz.consultas) == [_chave(1), _chave(2)]
+    notas = Invoice.query.all()
+    assert {n.status for n in notas} == {'Aprovada'} and all(n.nprot for n in notas)
+    assert nfce_lote.transmitir_lotes(base_dir=str(tmp_path)) == []
+    assert len(sefaz.envios) == 1   # nada reenviado
+
+
+def test_envio_e_consulta_sem_resposta_nao_reenvia(app, tmp_path, monkeypatch):
+    sefaz = SefazFalsa(falhar_envio=True, falhar_consulta=True)
+    _usar(monkeypatch, sefaz)
+    _criar_notas(tmp_path, 2)
+    nfce_lote.transmitir_lotes(base_dir=str(tmp_path))
+
+    notas = Invoice.query.all()
+    assert {n.status for n in notas} == {'Enviando'}
+    assert all(n.retry_at > datetime.now() for n in notas)
+
+    # SEFAZ de volta: a chave é consultada antes; 217 (não consta) → reenvia
+    sefaz.falhar_envio = sefaz.falhar_consulta = False
+    Invoice.query.update({'retry_at': datetime.now() - timedelta(seconds=1)})
+    db.session.commit()
+    (lote,) = nfce_lote.transmitir_lotes(base_dir=str(tmp_path))
+    assert lote.status == 'recebido' and sefaz.consultas[-2:] == [_chave(1), _chave(2)]
+    assert {n.status for n in Invoice.query.all()} == {'Transmitida'}
+
+
+def test_duplicidade_resolvida_pela_chave_original(app, tmp_path, monkeypatch):
+    # 539: o número já foi autorizado com outra chave (ex.: tpEmis=1 x 9)
+    original = _chave(9)
+    sefaz = SefazFalsa(protocolo={_chave(1): ('539', f'Duplicidade de NF-e com diferenca na Chave '
+                                                     f'de Acesso [chNFe: {original}]')})
+    sefaz.lotes['1'] = [original]   # autorizada antes
+    _usar(monkeypatch, sefaz)
+    _criar_notas(tmp_path, 1)
+    (lote,) = nfce_lote.transmitir_lotes(base_dir=str(tmp_path))
+
+    assert nfce_lote.consultar_lote(lote) == (1, 0)
+    nota = Invoice.query.one()
+    assert sefaz.consultas == [original]
+    assert nota.status == 'Aprovada' and nota.access_key == original and nota.nprot
+
+
+def test_aprovada_nao_e_rebaixada_e_denegada(app, tmp_path, monkeypatch):
+    _usar(monkeypatch, SefazFalsa())
+    _criar_notas(tmp_path, 2, status='Transmitida')
+    Invoice.query.update({'access_key': Invoice.number})
+    db.session.execute(db.update(Invoice), [
+        {'id': 1, 'access_key': _chave(1), 'status': 'Aprovada', 'nprot': '142'},
+        {'id': 2, 'access_key': _chave(2)},
+    ])
+    db.session.commit()
+
+    resultado = nfce_lote.aplicar_protocolos([
+        {'chave': _chave(1), 'cstat': '778', 'xmotivo': 'Rejeicao', 'nprot': None},
+        {'chave': _chave(2), 'cstat': '302', 'xmotivo': 'Uso Denegado', 'nprot': '143'},
+    ])
+    db.session.commit()
+    assert resultado == (0, 1)
+    notas = {n.number: n for n in Invoice.query.all()}
+    assert (notas[1].status, notas[1].nprot) == ('Aprovada', '142')
+    assert (notas[2].status, notas[2].nprot, notas[2].cstat) == ('Denegada', '143', '302')
+
+
+def test_tamanho_do_lote_limitado(app, tmp_path, monkeypatch):
+    _usar(monkeypatch, SefazFalsa())
+    _criar_notas(tmp_path, 7)
+    lotes = nfce_lote.transmitir_lotes(base_dir=str(tmp_path), tamanho=3)
+    assert [l.quantidade for l in lotes] == [3, 3, 1]
+    with pytest.raises(ValueError):
+        nfce_lote.montar_envi_nfe(1, ['<NFe/>'] * 51)
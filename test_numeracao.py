@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Teste de estresse da numeração das NFC-e (admin/nfe/numeracao.py).
+
+Emite milhares de números a partir de threads e de processos paralelos (cada
+processo com o seu engine, como os workers do gunicorn) contra o mesmo banco e
+confere que não há número repetido nem perdido — e que o número alocado é o
+que vai no <nNF> transmitido. Usa SQLite em arquivo
+temporário (schema 'ouvirtiba' mapeado para o schema padrão); não precisa do
+Supabase.
+Execução: python -m pytest -q test_numeracao.py
+"""
+
+import multiprocessing
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, select
+
+import admin.models  # noqa: F401  (store, product: alvo das FKs)
+import admin.order.models  # noqa: F401  (customer_request)
+from admin.nfe import numeracao
+from admin.nfe.models import Invoice, InvoiceSequence, InvoiceNumberGap
+from admin.nfe.nfce_emissao import EmissaoNFCe
+from admin.nfe.nfce_transmit import _montar_envelope
+from admin.nfe.routes import gerar_chave_acesso
+
+LOJA, SERIE = 1, 1
+
+
+def _engine(caminho):
+    return create_engine(
+        f"sqlite:///{caminho}",
+        connect_args={'timeout': 60},
+        execution_options={'schema_translate_map': {'ouvirtiba': None}},
+    )
+
+
+def _emitir_em_processo(args):
+    """Worker de outro processo: engine próprio, `n` números, um por vez."""
+    caminho, n, bloco = args
+    engine = _engine(caminho)
+    if bloco > 1:
+        alocador = numeracao.AlocadorNumeracao(bloco=bloco, engine=engine)
+        numeros = [alocador.proximo(LOJA, SERIE) for _ in range(n)]
+        alocador.devolver_sobras()
+    else:
+        numeros = [numeracao.reservar(LOJA, SERIE, 1, engine)[0] for _ in range(n)]
+    engine.dispose()
+    return numeros
+
+
+@pytest.fixture
+def banco(tmp_path):
+    caminho = tmp_path / 'numeracao.db'
+    engine = _engine(caminho)
+    for modelo in (InvoiceSequence, InvoiceNumberGap, Invoice):
+        modelo.__table__.create(engine)   # SQLite não confere as FKs (store, client)
+    yield caminho, engine
+    engine.dispose()
+
+
+def test_threads_sem_numero_repetido(banco):
+    _, engine = banco
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        numeros = list(pool.map(lambda _: numeracao.reservar(LOJA, SERIE, 1, engine)[0], range(2000)))
+    assert len(set(numeros)) == 2000
+    assert sorted(numeros) == list(range(1, 2001))
+
+
+def test_processos_paralelos_sem_numero_repetido(banco):
+    caminho, engine = banco
+    with multiprocessing.get_context('spawn').Pool(4) as pool:
+        resultados = pool.map(_emitir_em_processo, [(str(caminho), 500, 1)] * 4)
+    numeros = [n for lista in resultados for n in lista]
+    assert len(numeros) == 2000
+    assert sorted(numeros) == list(range(1, 2001))
+    with engine.connect() as conn:
+        assert conn.execute(select(InvoiceSequence.last_number)).scalar() == 2000
+
+
+def test_blocos_por_worker(banco):
+    caminho, engine = banco
+    with multiprocessing.get_context('spawn').Pool(4) as pool:
+        resultados = pool.map(_emitir_em_processo, [(str(caminho), 480, 100)] * 4)
+    numeros = [n for lista in resultados for n in lista]
+    assert len(set(numeros)) == len(numeros) == 1920
+
+    # Cada worker reservou 5 blocos de 100 e usou 480: 20 sobras cada → lacunas
+    with engine.connect() as conn:
+        ultimo = conn.execute(select(InvoiceSequence.last_number)).scalar()
+        lacunas = set(conn.execute(select(InvoiceNumberGap.number)).scalars())
+    assert ultimo == 2000
+    assert len(lacunas) == 80
+    assert set(numeros) | lacunas == set(range(1, 2001))
+
+
+def test_bloco_reduz_idas_ao_banco(banco):
+    _, engine = banco
+    alocador = numeracao.AlocadorNumeracao(bloco=50, engine=engine)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        numeros = list(pool.map(lambda _: alocador.proximo(LOJA, SERIE), range(1000)))
+    assert sorted(numeros) == list(range(1, 1001))
+    assert alocador.reservas == 20
+
+
+def test_lacuna_de_nota_nao_gravada(banco):
+    _, engine = banco
+    for _ in range(3):
+        numero = numeracao.reservar(LOJA, SERIE, 1, engine)[0]
+        if numero != 2:   # a nota nº 2 falhou depois da reserva
+            with engine.begin() as conn:
+                conn.execute(Invoice.__table__.insert().values(
+                    number=numero, store_id=LOJA, series=SERIE, client_id=1, total_value=1.0))
+    assert numeracao.detectar_lacunas(LOJA, SERIE, engine=engine) == [2]
+
+    numeracao.registrar_lacunas(LOJA, SERIE, [2], 'erro ao gravar a nota', engine)
+    numeracao.registrar_lacunas(LOJA, SERIE, [2], 'repetido', engine)   # não duplica
+    assert numeracao.detectar_lacunas(LOJA, SERIE, engine=engine) == []
+    with engine.connect() as conn:
+        assert conn.execute(select(InvoiceNumberGap.reason)).scalars().all() == ['erro ao gravar a nota']
+
+
+def test_faixas_texto():
+    assert numeracao._faixas_texto([1, 2, 3, 7, 9, 10]) == '1-3, 7, 9-10'
+
+
+def test_numero_transmitido_e_o_alocado(banco):
+    """O <nNF> que chega à SEFAZ (transmissão avulsa) é o número da nota."""
+    _, engine = banco
+    emitente = {'Code': '56154376000105', 'Name': 'JANSSEN APARELHOS AUDITIVOS LTDA',
+                'Address': 'RUA XV DE NOVEMBRO', 'Number': 100, 'Neighborhood': 'CENTRO',
+                'City': 'ARAQUARI', 'Region': 'SC', 'Cep origem': '89245000',
+                'Phone': '47999990000', 'State_Registration': '263067041'}
+    item = SimpleNamespace(product_id=1, product=SimpleNamespace(name='Aparelho auditivo'),
+                           serialnumber='SN1', ncm='90214000', cfop='5102', quantity=1,
+                           unit_price=Decimal('150.00'), total_price=Decimal('150.00'),
+                           discount=Decimal('0'), csosn='102')
+    for numero in numeracao.reservar(LOJA, SERIE, 3, engine):
+        chave = gerar_chave_acesso('42', '56154376000105', '65', str(SERIE), str(numero).zfill(9), '112345678')
+        invoice = SimpleNamespace(id=numero, number=numero, series=SERIE, access_key=chave, items=[item],
+                                  issue_date=datetime(2026, 10, 18, 9, 0))
+        envelope = _montar_envelope(EmissaoNFCe(invoice, emitente).sem_assinatura().decode('utf-8'))
+        assert re.findall(r'<nNF>(\d+)</nNF>', envelope) == [str(numero)]
+        assert f'Id="NFe{chave}"' in envelope and int(chave[25:34]) == numero
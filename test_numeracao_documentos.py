@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Teste de estresse da numeração de pedidos, orçamentos e recibos
+(admin/numeracao_documentos.py).
+
+Grava orçamentos e recibos de verdade (quote.number e receipt.number são
+UNIQUE) a partir de threads e de processos paralelos, cada processo com o seu
+engine como os workers do gunicorn, e confere que nenhum INSERT colide e que
+a vazão passa de centenas de documentos por segundo. Usa SQLite em arquivo
+temporário (schema 'ouvirtiba' mapeado para o schema padrão); não precisa do
+Supabase.
+Execução: python -m pytest -q -s test_numeracao_documentos.py
+"""
+
+import multiprocessing
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, func, select
+
+import admin.models  # noqa: F401  (store, product: alvo das FKs)
+import admin.client.models  # noqa: F401  (client)
+from admin import numeracao_documentos as numeracao
+from admin.models import DocumentSequence
+from admin.quote.models import Quote
+from admin.receipt.models import Receipt
+
+LOJA = 1
+VAZAO_MINIMA = 100   # documentos/s (SQLite em disco: o gargalo é o banco, não a numeração)
+
+
+def _engine(caminho):
+    return create_engine(
+        f"sqlite:///{caminho}",
+        connect_args={'timeout': 60},
+        execution_options={'schema_translate_map': {'ouvirtiba': None}},
+    )
+
+
+def _gravar(engine, modelo, numero):
+    """Número + INSERT do documento, como nas rotas (transações separadas)."""
+    with engine.begin() as conn:
+        conn.execute(modelo.__table__.insert().values(
+            number=numero, store_id=LOJA, client_id=1, total=0))
+
+
+def _criar_em_processo(args):
+    """Worker de outro processo: engine próprio, `n` orçamentos e `n` recibos."""
+    caminho, n = args
+    engine = _engine(caminho)
+    for _ in range(n):
+        _gravar(engine, Quote, numeracao.proximo_numero(numeracao.ORCAMENTO, LOJA, engine=engine))
+        _gravar(engine, Receipt, numeracao.proximo_numero(numeracao.RECIBO, LOJA, engine=engine))
+    engine.dispose()
+    return 2 * n
+
+
+@pytest.fixture
+def banco(tmp_path):
+    caminho = tmp_path / 'documentos.db'
+    engine = _engine(caminho)
+    for modelo in (DocumentSequence, Quote, Receipt):
+        modelo.__table__.create(engine)   # SQLite não confere as FKs (store, client)
+    yield caminho, engine
+    engine.dispose()
+
+
+def _contar(engine, modelo):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count(func.distinct(modelo.number)))).scalar()
+
+
+def test_formato_mantem_data_legivel():
+    numero = numeracao.formatar_numero(datetime(2026, 10, 18), 1, 42)
+    assert numero == 2026101801000042
+    assert str(numero).startswith('20261018')
+    with pytest.raises(ValueError):
+        numeracao.formatar_numero(datetime(2026, 10, 18), 100, 1)
+
+
+def test_mesmo_segundo_nao_colide(banco):
+    _, engine = banco
+    # O esquema antigo (AAAAMMDDHHMMSS) dava o mesmo número aos dois
+    primeiro = numeracao.proximo_numero(numeracao.RECIBO, LOJA, engine=engine)
+    segundo = numeracao.proximo_numero(numeracao.RECIBO, LOJA, engine=engine)
+    assert segundo == primeiro + 1
+    _gravar(engine, Receipt, primeiro)
+    _gravar(engine, Receipt, segundo)
+
+
+def test_tipos_e_dias_tem_contadores_proprios(banco):
+    _, engine = banco
+    hoje, amanha = datetime(2026, 10, 18), datetime(2026, 10, 19)
+    assert numeracao.proximo_numero(numeracao.PEDIDO, LOJA, hoje, engine) == 2026101801000001
+    assert numeracao.proximo_numero(numeracao.ORCAMENTO, LOJA, hoje, engine) == 2026101801000001
+    assert numeracao.proximo_numero(numeracao.ORCAMENTO, 2, hoje, engine) == 2026101802000001
+    assert numeracao.proximo_numero(numeracao.ORCAMENTO, LOJA, amanha, engine) == 2026101901000001
+    with pytest.raises(ValueError):
+        numeracao.proximo_numero('NOTA', LOJA, hoje, engine)
+
+
+def test_reserva_em_lote_para_importacao(banco):
+    _, engine = banco
+    numeros = numeracao.reservar_numeros(numeracao.RECIBO, LOJA, 1000, engine=engine)
+    assert len(set(numeros)) == 1000
+    assert numeros == list(range(numeros[0], numeros[0] + 1000))
+    with engine.begin() as conn:
+        conn.execute(Receipt.__table__.insert(), [
+            {'number': n, 'store_id': LOJA, 'client_id': 1, 'total': 0} for n in numeros])
+    assert numeracao.proximo_numero(numeracao.RECIBO, LOJA, engine=engine) == numeros[-1] + 1
+
+
+def test_threads_sem_colisao(banco):
+    _, engine = banco
+    n = 1000
+
+    def criar(i):
+        modelo, tipo = (Quote, numeracao.ORCAMENTO) if i % 2 else (Receipt, numeracao.RECIBO)
+        _gravar(engine, modelo, numeracao.proximo_numero(tipo, LOJA, engine=engine))
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(criar, range(n)))   # IntegrityError numa colisão
+    vazao = n / (time.perf_counter() - inicio)
+    print(f"\n📊 threads: {n} documentos, {vazao:.0f}/s")
+
+    assert _contar(engine, Quote) + _contar(engine, Receipt) == n
+    assert vazao >= VAZAO_MINIMA
+
+
+def test_processos_paralelos_sem_colisao(banco):
+    caminho, engine = banco
+    with multiprocessing.get_context('spawn').Pool(4) as pool:
+        pool.map(_criar_em_processo, [(str(caminho), 1)] * 4)   # aquece os processos
+        inicio = time.perf_counter()
+        total = sum(pool.map(_criar_em_processo, [(str(caminho), 250)] * 4))
+        vazao = total / (time.perf_counter() - inicio)
+    print(f"\n📊 processos: {total} documentos, {vazao:.0f}/s")
+
+    assert _contar(engine, Quote) == _contar(engine, Receipt) == 1004
+    assert vazao >= VAZAO_MINIMA
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Testes do cache de página inteira (page_cache.py).
+
+Não precisa de banco: usa um app Flask mínimo com uma view que conta quantas
+vezes foi executada.
+Execução: python -m pytest -q test_page_cache.py
+"""
+
+import time
+
+import pytest
+from flask import Flask, session
+
+from page_cache import PageCache, MemoryBackend, DiskBackend
+
+
+def _criar_app(tmp_path, backend='memory', **config):
+    app = Flask(__name__)
+    app.config.update(SECRET_KEY='teste', PAGE_CACHE_BACKEND=backend,
+                      PAGE_CACHE_DIR=str(tmp_path / 'paginas'), **config)
+    cache = PageCache(app)
+    chamadas = {'n': 0}
+
+    @app.route('/')
+    @cache.cached(ttl=60)
+    def home():
+        chamadas['n'] += 1
+        return f"<h1>home {chamadas['n']}</h1>"
+
+    @app.route('/blog')
+    @cache.cached(ttl=60, args=('cursor',), validar={'cursor': str.isalpha})
+    def blog():
+        chamadas['n'] += 1
+        return f"blog {chamadas['n']}"
+
+    @app.route('/login')
+    def login():
+        session['email'] = 'admin@ouvirtiba.com.br'
+        return 'ok'
+
+    return app, cache, chamadas
+
+
+@pytest.fixture(params=['memory', 'disk'])
+def ambiente(request, tmp_path):
+    return _criar_app(tmp_path, backend=request.param)
+
+
+def test_segunda_requisicao_vem_do_cache(ambiente):
+    app, _, chamadas = ambiente
+    client = app.test_client()
+
+    r1 = client.get('/')
+    r2 = client.get('/')
+    assert r1.headers['X-Cache'] == 'MISS'
+    assert r2.headers['X-Cache'] == 'HIT'
+    assert r1.data == r2.data
+    assert chamadas['n'] == 1
+
+
+def test_etag_e_last_modified_respondem_304(ambiente):
+    app, _, chamadas = ambiente
+    client = app.test_client()
+
+    r = client.get('/')
+    etag = r.headers['ETag']
+    assert r.headers['Last-Modified']
+
+    r304 = client.get('/', headers={'If-None-Match': etag})
+    assert r304.status_code == 304
+    assert r304.data == b''
+
+    r304 = client.get('/', headers={'If-Modified-Since': r.headers['Last-Modified']})
+    assert r304.status_code == 304
+    assert chamadas['n'] == 1
+
+
+def test_clear_invalida(ambiente):
+    app, cache, chamadas = ambiente
+    client = app.test_client()
+
+    client.get('/')
+    cache.clear()
+    r = client.get('/')
+    assert r.headers['X-Cache'] == 'MISS'
+    assert chamadas['n'] == 2
+
+
+def test_ttl_expirado_renderiza_de_novo(ambiente, monkeypatch):
+    app, _, chamadas = ambiente
+    client = app.test_client()
+
+    client.get('/')
+    agora = time.time()
+    monkeypatch.setattr('page_cache.time.time', lambda: agora + 61)
+    assert client.get('/').headers['X-Cache'] == 'MISS'
+    assert chamadas['n'] == 2
+
+
+def test_admin_logado_nao_usa_cache(ambiente):
+    app, _, chamadas = ambiente
+    client = app.test_client()
+
+    client.get('/')
+    client.get('/login')
+    r = client.get('/')
+    assert r.headers['X-Cache'] == 'BYPASS'
+    assert chamadas['n'] == 2
+
+
+def test_query_string(ambiente):
+    app, _, chamadas = ambiente
+    client = app.test_client()
+
+    # Parâmetro declarado entra na chave
+    assert client.get('/blog?cursor=a').headers['X-Cache'] == 'MISS'
+    assert client.get('/blog?cursor=b').headers['X-Cache'] == 'MISS'
+    assert client.get('/blog?cursor=a').headers['X-Cache'] == 'HIT'
+    # Parâmetro desconhecido não é cacheado
+    assert client.get('/blog?utm_source=x').headers['X-Cache'] == 'BYPASS'
+    assert chamadas['n'] == 3
+
+
+def test_valor_recusado_nao_vira_chave(ambiente):
+    app, cache, chamadas = ambiente
+    client = app.test_client()
+
+    for cursor in ('1', '2', '!'):
+        assert client.get(f'/blog?cursor={cursor}').headers['X-Cache'] == 'BYPASS'
+    assert len(cache.backend) == 0 and chamadas['n'] == 3
+
+
+def test_lru_descarta_o_mais_antigo():
+    lru = MemoryBackend(max_entries=2)
+    lru.set('a', 1)
+    lru.set('b', 2)
+    lru.get('a')          # 'a' passa a ser o mais recente
+    lru.set('c', 3)
+    assert lru.get('b') is None
+    assert lru.get('a') == 1 and lru.get('c') == 3
+
+
+def test_disco_limitado_descarta_vencidas_e_as_que_vencem_antes(tmp_path):
+    disco = DiskBackend(str(tmp_path), max_entries=2)
+    agora = time.time()
+    disco.set('vencida', {'expira': agora - 1})
+    disco.set('longa', {'expira': agora + 600})
+    disco.set('curta', {'expira': agora + 60})
+    assert len(disco) == 2 and disco.get('vencida') is None
+
+    disco.set('nova', {'expira': agora + 300})
+    assert len(disco) == 2 and disco.get('curta') is None
+    assert disco.get('longa') and disco.get('nova')
+
+
+def test_clear_vale_para_os_outros_workers(tmp_path):
+    # Dois workers do gunicorn: cada um com seu LRU, mesma PAGE_CACHE_DIR
+    worker1, cache1, chamadas1 = _criar_app(tmp_path)
+    worker2, _, chamadas2 = _criar_app(tmp_path)
+    worker1.test_client().get('/')
+    assert worker2.test_client().get('/').headers['X-Cache'] == 'MISS'
+    assert worker2.test_client().get('/').headers['X-Cache'] == 'HIT'
+
+    cache1.clear()   # post editado no worker 1
+    assert worker2.test_client().get('/').headers['X-Cache'] == 'MISS'
+    assert worker2.test_client().get('/').headers['X-Cache'] == 'HIT'
+    assert (chamadas1['n'], chamadas2['n']) == (1, 2)
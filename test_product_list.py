@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Teste da paginação por keyset da listagem de produtos do admin
+(admin/routes.py: pagina_produtos).
+
+O cursor (marca, categoria, nome, id) precisa ter os mesmos valores que o
+ORDER BY viu no banco: com o cache de lookups desatualizado (marca renomeada
+em outro worker, ou criada depois do cache) nenhum produto pode sumir ou
+repetir entre as páginas.
+
+SQLite em arquivo temporário (schema 'ouvirtiba' mapeado para o schema
+padrão); não precisa do Supabase.
+Execução: python -m pytest -q test_product_list.py
+"""
+
+import pytest
+
+from extension import db
+from admin.lookup_cache import get_nomes, invalidar_lookup
+from admin.models import Brand, Category, Product
+from admin.routes import pagina_produtos
+
+LOJA = 1
+
+
+@pytest.fixture
+def app(app_sqlite):
+    app = app_sqlite(Brand, Category, Product)
+    invalidar_lookup()
+    yield app
+    invalidar_lookup()
+
+
+def _produto(nome, marca, categoria):
+    db.session.add(Product(name=nome, price=10, stock=1, type_id=1, colors='-', discription='-',
+                           brand_id=marca.id, category_id=categoria.id, color_id=1, size_id=1,
+                           packaging_id=1, store_id=LOJA))
+
+
+def _percorrer(per_page=2):
+    vistos, cursor = [], ''   # '' = primeira página (None leria ?cursor= da requisição)
+    for _ in range(50):
+        pagina = pagina_produtos(LOJA, 0, cursor=cursor, direcao='next', per_page=per_page)
+        vistos.extend(p.name for p in pagina.items)
+        cursor = pagina.next_cursor
+        if not cursor:
+            return vistos
+    raise AssertionError('paginação não terminou')
+
+
+def test_cursor_usa_os_nomes_do_banco_e_nao_do_cache(app):
+    marcas = [Brand(name=n, store_id=LOJA) for n in ('Beltone', 'Oticon', 'Signia')]
+    categoria = Category(name='Retroauricular', store_id=LOJA)
+    db.session.add_all(marcas + [categoria])
+    db.session.flush()
+    for marca in marcas:
+        for n in range(3):
+            _produto(f'{marca.name} {n}', marca, categoria)
+    db.session.commit()
+    esperados = [f'{m} {n}' for m in ('BELTONE', 'OTICON', 'SIGNIA') for n in range(3)]   # nome em maiúsculas
+    assert _percorrer() == esperados
+
+    # Cache aquecido; depois, em "outro worker", a marca é renomeada e uma
+    # marca nova é criada — o cache deste worker não sabe de nenhuma das duas
+    # (SQL direto na tabela: sem os eventos do ORM que invalidam o cache local)
+    antigos = get_nomes(Brand)
+    marca = Brand.__table__
+    db.session.execute(marca.update().where(marca.c.id == marcas[0].id).values(name='WIDEX'))
+    nova = db.session.execute(marca.insert().values(name='PHONAK', store_id=LOJA)).inserted_primary_key[0]
+    _produto('Phonak 0', Brand(id=nova), categoria)
+    db.session.commit()
+    assert get_nomes(Brand) == antigos   # cache desatualizado: BELTONE e sem PHONAK
+
+    vistos = _percorrer()
+    assert sorted(vistos) == sorted(esperados + ['PHONAK 0']) and len(vistos) == 10
+    assert vistos[:4] == ['OTICON 0', 'OTICON 1', 'OTICON 2', 'PHONAK 0']
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Testes do profiler por requisição (profiler.py).
+
+Não precisa do Supabase: app_sqlite do conftest.py com uma rota que executa
+comandos SQL e renderiza um template.
+Execução: python -m pytest -q test_profiler.py
+"""
+
+import json
+import logging
+import re
+
+import pytest
+from flask import render_template_string
+
+from extension import db
+from profiler import RequestProfiler
+
+
+@pytest.fixture
+def criar_app(app_sqlite):
+    def criar(**config):
+        app = app_sqlite(**config)
+        RequestProfiler(app, db)
+
+        @app.route('/consultas/<int:n>')
+        def consultas(n):
+            for i in range(n):
+                db.session.execute(db.text('SELECT :i'), {'i': i})
+            return render_template_string('{% for i in range(3) %}<p>{{ i }}</p>{% endfor %}')
+
+        return app
+    return criar
+
+
+def _server_timing(resposta):
+    cabecalho = resposta.headers['Server-Timing']
+    return {m.group(1): m.group(2) for m in re.finditer(r'(\w+);dur=([\d.]+)', cabecalho)}, cabecalho
+
+
+def _linhas(caplog, nivel):
+    return [r.getMessage() for r in caplog.records if r.name == 'profiler' and r.levelno == nivel]
+
+
+def _registros(caplog, nivel):
+    """Linhas JSON do profiler ("⏱️ {...}" / "🐢 {...}") já decodificadas."""
+    return [json.loads(linha[linha.index('{'):]) for linha in _linhas(caplog, nivel) if '{' in linha]
+
+
+def test_server_timing_com_banco_e_template(criar_app):
+    app = criar_app(PROFILER_SLOW_MS=10_000)
+    resposta = app.test_client().get('/consultas/3')
+
+    duracoes, cabecalho = _server_timing(resposta)
+    assert set(duracoes) == {'db', 'tpl', 'total'}
+    assert 'desc="3 queries"' in cabecalho
+    assert float(duracoes['tpl']) > 0
+    assert float(duracoes['total']) >= float(duracoes['db'])
+
+    vazio = app.test_client().get('/consultas/0')
+    assert 'desc="0 queries"' in vazio.headers['Server-Timing']
+
+
+def test_requisicao_rapida_sem_log_de_lenta(criar_app, caplog):
+    app = criar_app(PROFILER_SLOW_MS=10_000)
+    with caplog.at_level(logging.INFO, logger='profiler'):
+        app.test_client().get('/consultas/2')
+
+    (registro,) = _registros(caplog, logging.INFO)
+    assert registro['db_queries'] == 2 and registro['status'] == 200 and 'slow' not in registro
+    assert _linhas(caplog, logging.WARNING) == []
+
+
+def test_requisicao_lenta_registra_os_comandos(criar_app, caplog):
+    app = criar_app(PROFILER_SLOW_MS=0)
+    with caplog.at_level(logging.INFO, logger='profiler'):
+        app.test_client().get('/consultas/2')
+
+    assert _registros(caplog, logging.INFO) == []
+    (registro,) = _registros(caplog, logging.WARNING)
+    assert registro['slow'] is True and registro['db_queries'] == 2
+    comandos = [linha for linha in _linhas(caplog, logging.WARNING) if 'ms |' in linha]
+    assert len(comandos) == 2 and all('SELECT ?' in c for c in comandos)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Testes da consulta de recibos em segundo plano (recibo_poller.py).
+
+Não acessa a SEFAZ nem o Supabase: SQLite em arquivo temporário (schema
+'ouvirtiba' mapeado para o schema padrão, fixture app_sqlite) e a SefazFalsa
+do conftest.py, que responde retConsReciNFe e mede quantas consultas ficam em
+voo ao mesmo tempo.
+A thread não é ligada: os testes chamam processar_pendentes().
+Execução: python -m pytest -q test_recibo_poller.py
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import SefazFalsa, chave as _chave
+from extension import db
+from admin.nfe import sefaz_client
+from admin.nfe.models import Invoice, NfeLote
+from recibo_poller import ReciboPoller, RECIBO_INTERVALOS_S, RECIBO_ESPERA_656_S
+
+
+def _sefaz(lotes):
+    """SefazFalsa que já recebeu `lotes` (nrec → números das notas)."""
+    sefaz = SefazFalsa()
+    for nrec, numeros in lotes.items():
+        sefaz.lotes[nrec] = [_chave(n) for n in numeros]
+    return sefaz
+
+
+@pytest.fixture
+def app(app_sqlite):
+    return app_sqlite(Invoice, NfeLote, RECIBO_POLLER_THREAD=0, RECIBO_MAX_CONSULTAS=2,
+                      RECIBO_MAX_TENTATIVAS=3)
+
+
+@pytest.fixture
+def poller(app):
+    return ReciboPoller(app, db)
+
+
+def _lote_com_notas(nrec, numeros, vencido=True):
+    for n in numeros:
+        db.session.add(Invoice(number=n, store_id=1, client_id=1, total_value=10.0, nrec=nrec,
+                               access_key=_chave(n), status='Transmitida'))
+    lote = NfeLote(ambiente=2, quantidade=len(numeros), status='recebido', nrec=nrec,
+                   proxima_consulta=datetime.now() - timedelta(seconds=1) if vencido
+                   else datetime.now() + timedelta(minutes=5))
+    db.session.add(lote)
+    db.session.commit()
+    return lote.id
+
+
+def test_lote_processado_atualiza_notas(app, poller, monkeypatch):
+    sefaz = _sefaz({'421': [1, 2, 3]})
+    monkeypatch.setattr(sefaz_client, 'cliente_sefaz', sefaz)
+    lote_id = _lote_com_notas('421', [1, 2, 3])
+
+    assert poller.processar_pendentes() == 1
+    assert db.session.get(NfeLote, lote_id).status == 'processado'
+    notas = Invoice.query.order_by(Invoice.number).all()
+    assert [(n.status, n.nprot) for n in notas] == [('Aprovada', '1' + _chave(n)[-14:]) for n in (1, 2, 3)]
+    assert poller.relatorio()['authorized'] == 3
+
+
+def test_lote_ainda_nao_vencido_nao_e_consultado(app, poller, monkeypatch):
+    sefaz = SefazFalsa()
+    monkeypatch.setattr(sefaz_client, 'cliente_sefaz', sefaz)
+    _lote_com_notas('421', [1], vencido=False)
+    assert poller.processar_pendentes() == 0
+    assert sefaz.consultas_recibo == []
+
+
+def test_em_processamento_reagenda_com_intervalo(app, poller, monkeypatch):
+    monkeypatch.setattr(sefaz_client, 'cliente_sefaz', SefazFalsa(cstat_recibo='105'))
+    lote_id = _lote_com_notas('421', [1])
+
+    antes = datetime.now()
+    poller.processar_pendentes()
+    lote = db.session.get(NfeLote, lote_id)
+    assert lote.status == 'recebido' and lote.tentativas == 1
+    espera = (lote.proxima_consulta - antes).total_seconds()
+    assert RECIBO_INTERVALOS_S[0] - 1 <= espera <= RECIBO_INTERVALOS_S[0] + 1
+
+
+def test_consumo_indevido_espera_uma_hora(app, poller, monkeypatch):
+    monkeypatch.setattr(sefaz_client, 'cliente_sefaz', SefazFalsa(cstat_recibo='656'))
+    lote_id = _lote_com_notas('421', [1])
+    poller.processar_pendentes()
+    espera = (db.session.get(NfeLote, lote_id).proxima_consulta - datetime.now()).total_seconds()
+    assert espera > RECIBO_ESPERA_656_S - 60
+
+
+def test_desiste_apos_max_tentativas(app, poller, monkeypatch):
+    monkeypatch.setattr(sefaz_client, 'cliente_sefaz', SefazFalsa(cstat_recibo='105'))
+    lote_id = _lote_com_notas('421', [1])
+    for _ in range(3):
+        db.session.query(NfeLote).update({'proxima_consulta': datetime.now() - timedelta(seconds=1)})
+        db.session.commit()
+        poller.processar_pendentes()
+    assert db.session.get(NfeLote, lote_id).status == 'expirado'
+    assert poller.relatorio()['queue']['expired'] == 1
+
+
+def test_limite_de_consultas_em_voo(app, poller, monkeypatch):
+    sefaz = SefazFalsa(latencia_s=0.05)
+    monkeypatch.setattr(sefaz_client, 'cliente_sefaz', sefaz)
+    for i in range(5):
+        _lote_com_notas(f'42{i}', [10 + i])
+
+    assert poller.processar_pendentes() == 2          # reserva no máximo RECIBO_MAX_CONSULTAS
+    while poller.processar_pendentes():
+        pass
+    assert len(sefaz.consultas_recibo) == 5
+    assert sefaz.max_em_voo <= 2
+
+
+def test_recibo_avulso_entra_na_fila(app, poller, monkeypatch):
+    sefaz = _sefaz({'999': [7]})
+    monkeypatch.setattr(sefaz_client, 'cliente_sefaz', sefaz)
+    db.session.add(Invoice(number=7, store_id=1, client_id=1, total_value=10.0, nrec='999',
+                           access_key=_chave(7), status='Transmitida'))
+    db.session.commit()
+
+    fila = poller.relatorio()['queue']
+    assert fila['invoices_waiting'] == 1 and fila['receipts'] == 0
+
+    assert poller.processar_pendentes() == 1
+    assert Invoice.query.one().status == 'Aprovada'
+    assert poller.relatorio()['queue']['invoices_waiting'] == 0
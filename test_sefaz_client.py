@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Testes do cliente SEFAZ (admin/nfe/sefaz_client.py).
+
+Não acessa a SVRS: sobe um servidor HTTP/1.1 local (keep-alive) que responde
+como os web services e conta as conexões TCP abertas. O certificado é um
+.pfx autoassinado gerado em pasta temporária.
+Execução: python -m pytest -q test_sefaz_client.py
+"""
+
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from conftest import SENHA, gerar_pfx
+from admin.nfe import sefaz_client
+from admin.nfe.sefaz_client import ClienteSefaz
+
+RESPOSTA = ('<soap:Envelope xmlns:soap="http://www.w3.org/2003/05/soap-envelope"><soap:Body>'
+            '<retConsStatServ xmlns="http://www.portalfiscal.inf.br/nfe" versao="4.00">'
+            '<cStat>107</cStat><xMotivo>Servico em Operacao</xMotivo></retConsStatServ>'
+            '</soap:Body></soap:Envelope>')
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'   # keep-alive
+
+    def setup(self):
+        super().setup()
+        self.server.conexoes += 1
+
+    def do_POST(self):
+        corpo = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.pedidos.append((self.path, self.headers['Content-Type'], corpo.decode('utf-8')))
+        dados = RESPOSTA.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/soap+xml; charset=utf-8')
+        self.send_header('Content-Length', str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def servidor():
+    srv = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    srv.conexoes, srv.pedidos = 0, []
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture
+def cliente(tmp_path, servidor):
+    pfx = tmp_path / 'a1.pfx'
+    gerar_pfx(pfx)
+    base = f'http://127.0.0.1:{servidor.server_port}'
+    urls = {s: f'{base}/{s}' for s in sefaz_client.WSDL}
+    c = ClienteSefaz(2, str(pfx), SENHA, timeout=(1, 2), urls=urls)
+    yield c
+    c.fechar()
+
+
+def test_chamadas_seguidas_reaproveitam_conexao(cliente, servidor):
+    for _ in range(5):
+        assert cliente.status_servico().status_code == 200
+    cliente.consultar_recibo('421000000000001')
+    cliente.consultar_protocolo('4' * 44)
+
+    assert len(servidor.pedidos) == 7
+    assert servidor.conexoes == 1
+    assert cliente.sessoes_criadas == 1
+
+
+def test_envelopes_por_servico(cliente, servidor):
+    cliente.consultar_recibo('421000000000001')
+    cliente.status_servico('42')
+    (rota_rec, tipo, corpo_rec), (rota_status, _, corpo_status) = servidor.pedidos
+
+    assert tipo == 'application/soap+xml; charset=utf-8'
+    assert rota_rec == '/ret_autorizacao'
+    assert 'wsdl/NFeRetAutorizacao4' in corpo_rec
+    assert '<tpAmb>2</tpAmb><nRec>421000000000001</nRec>' in corpo_rec
+    assert rota_status == '/status_servico'
+    assert '<cUF>42</cUF><xServ>STATUS</xServ>' in corpo_status
+
+
+def test_metricas_por_servico(cliente):
+    for _ in range(3):
+        cliente.status_servico()
+    dados = cliente.relatorio()
+    assert dados['timeout'] == [1, 2]
+    status = dados['servicos']['status_servico']
+    assert status['chamadas'] == 3 and status['erros'] == 0
+    assert status['media_ms'] <= status['max_ms']
+
+
+def test_falha_de_conexao_conta_erro(tmp_path):
+    pfx = tmp_path / 'a1.pfx'
+    gerar_pfx(pfx)
+    urls = {s: 'http://127.0.0.1:9/' for s in sefaz_client.WSDL}   # porta fechada
+    c = ClienteSefaz(2, str(pfx), SENHA, timeout=(0.5, 0.5), urls=urls)
+    with pytest.raises(Exception):
+        c.status_servico()
+    assert c.relatorio()['servicos']['status_servico']['erros'] == 1
+    c.fechar()
+
+
+def test_troca_do_certificado_recria_sessao(cliente, servidor, tmp_path):
+    cliente.status_servico()
+    gerar_pfx(tmp_path / 'a1.pfx', nome='NOVO')
+    st = os.stat(tmp_path / 'a1.pfx')
+    os.utime(tmp_path / 'a1.pfx', ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+    cliente.status_servico()
+    assert cliente.sessoes_criadas == 2
+    assert servidor.conexoes == 2
+
+
+def test_cliente_do_processo_por_ambiente(tmp_path, monkeypatch):
+    monkeypatch.setattr(sefaz_client, '_clientes', {})
+    pfx = str(tmp_path / 'a1.pfx')
+    assert sefaz_client.cliente_sefaz(2, pfx, SENHA) is sefaz_client.cliente_sefaz(2, pfx, SENHA)
+    assert sefaz_client.cliente_sefaz(1, pfx, SENHA) is not sefaz_client.cliente_sefaz(2, pfx, SENHA)
+    assert sefaz_client.cliente_sefaz(1, pfx, SENHA).verify is True
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Testes da sonda de status da SEFAZ (sefaz_status.py).
+
+Não acessa a SEFAZ nem o Supabase: SQLite em arquivo temporário (schema
+'ouvirtiba' mapeado para o schema padrão, fixture app_sqlite) e a SefazFalsa
+do conftest.py, que responde NfeStatusServico4 com o cStat escolhido pelo
+teste (ou falha de rede).
+A thread não é ligada: os testes chamam verificar().
+Execução: python -m pytest -q test_sefaz_status.py
+"""
+
+from datetime import timedelta
+
+import pytest
+
+from conftest import SefazFalsa
+from extension import db
+from admin.nfe import sefaz_client, contingencia, nfce_lote
+from admin.nfe import routes as nfe_routes
+from admin.nfe.models import Invoice, NfeLote, NfeContingencia
+from contingencia_fila import ContingenciaFila
+from sefaz_status import SefazStatus, SefazIndisponivel
+
+
+@pytest.fixture
+def app(app_sqlite):
+    return app_sqlite(Invoice, NfeLote, NfeContingencia, CONTINGENCIA_THREAD=0, SEFAZ_STATUS_THREAD=0,
+                      SEFAZ_STATUS_FALHAS=2, SEFAZ_STATUS_HISTORICO=5)
+
+
+@pytest.fixture
+def sonda(app):
+    return SefazStatus(app)
+
+
+@pytest.fixture
+def sefaz(monkeypatch):
+    falsa = SefazFalsa()
+    monkeypatch.setattr(sefaz_client, 'cliente_sefaz', falsa)
+    return falsa
+
+
+# ==============================================================================
+# CACHE E HISTÓRICO
+# ==============================================================================
+
+def test_sem_consulta_estado_desconhecido(sonda):
+    assert sonda.estado() is None
+    assert sonda.disponivel() is None
+    sonda.exigir_disponivel()   # desconhecido: segue o fluxo normal
+    assert sonda.relatorio()['online'] is None
+
+
+def test_cache_evita_consulta_repetida(sonda, sefaz):
+    atual = sonda.verificar()
+    assert atual['online'] is True and atual['cstat'] == '107'
+    assert atual['latencia_ms'] >= 0
+    sonda.verificar(max_idade_s=60)
+    assert sefaz.consultas_status == 1
+    sonda.verificar()
+    assert sefaz.consultas_status == 2
+    assert sonda.disponivel() is True
+
+
+def test_resultado_velho_vira_desconhecido(app, sonda, sefaz):
+    sonda.verificar()
+    sonda._ultimo['quando'] -= timedelta(seconds=app.config['SEFAZ_STATUS_VALIDADE_S'] + 1)
+    assert sonda.disponivel() is None
+    sonda.verificar(max_idade_s=60)
+    assert sefaz.consultas_status == 2 and sonda.disponivel() is True
+
+
+def test_historico_limitado_e_relatorio(sonda, sefaz):
+    for cstat in ('107', '108', '107', '107', '109', '107', '107'):
+        sefaz.cstat_status = cstat
+        sonda.verificar()
+    historico = sonda.historico()
+    assert len(historico) == 5   # SEFAZ_STATUS_HISTORICO
+    assert [h['cstat'] for h in historico] == ['107', '107', '109', '107', '107']
+    relatorio = sonda.relatorio()
+    assert relatorio['checks'] == 7
+    assert relatorio['availability_pct'] == 80.0
+    assert relatorio['latency_ms']['max'] >= relatorio['latency_ms']['avg'] >= 0
+
+
+# ==============================================================================
+# CONTINGÊNCIA AUTOMÁTICA
+# ==============================================================================
+
+def test_falhas_seguidas_ativam_e_retorno_encerra(sonda, sefaz):
+    sefaz.cstat_status = None   # falha de rede
+    sonda.verificar()
+    assert sonda.disponivel() is False
+    assert contingencia.contingencia_ativa() is None   # 1 falha: ainda não
+    sonda.verificar()
+    periodo = contingencia.contingencia_ativa()
+    assert periodo is not None and periodo.automatica
+    assert periodo.justificativa == contingencia.JUSTIFICATIVA_STATUS
+
+    sefaz.cstat_status = '107'
+    sonda.verificar()
+    assert contingencia.contingencia_ativa() is None
+    assert sonda.falhas_seguidas == 0
+
+
+def test_compartimento_lotado_nao_conta_como_falha(app, sonda, sefaz):
+    sonda.verificar()
+    sefaz.cstat_status = None
+    sefaz.svrs._vagas.acquire()   # vaga ocupada por outra chamada do worker
+    try:
+        for _ in range(3):
+            assert sonda.verificar()['online'] is True   # último resultado real
+        assert ContingenciaFila(app, db).verificar_sefaz() is True
+    finally:
+        sefaz.svrs._vagas.release()
+    assert sefaz.consultas_status == 1 and sonda.consultas == 1
+    assert sonda.falhas_seguidas == 0 and len(sonda.historico()) == 1
+    assert contingencia.contingencia_ativa() is None
+
+
+def test_compartimento_lotado_sem_resultado_anterior(sonda, sefaz):
+    sefaz.svrs._vagas.acquire()
+    try:
+        assert sonda.verificar() is None
+    finally:
+        sefaz.svrs._vagas.release()
+    assert sonda.disponivel() is None and contingencia.contingencia_ativa() is None
+
+
+def test_disjuntor_aberto_conta_como_falha(sonda, sefaz):
+    sefaz.svrs.disjuntor.reabrir_s = 600
+    for _ in range(sefaz.svrs.disjuntor.falhas_max):
+        sefaz.svrs.disjuntor.falha()
+    sonda.verificar()
+    sonda.verificar()
+    assert sefaz.consultas_status == 0 and sonda.disponivel() is False
+    assert contingencia.contingencia_ativa() is not None
+
+
+def test_contingencia_manual_nao_e_encerrada_pela_sonda(sonda, sefaz):
+    contingencia.entrar_contingencia('TESTE DE CONTINGENCIA MANUAL')
+    sonda.verificar()
+    assert contingencia.contingencia_ativa() is not None
+
+
+# ==============================================================================
+# FALHA RÁPIDA
+# ==============================================================================
+
+def test_lote_falha_rapido_com_sefaz_fora(app, sonda, sefaz):
+    sefaz.cstat_status = '108'
+    sonda.verificar()
+    with pytest.raises(SefazIndisponivel, match='108'):
+        nfce_lote.transmitir_lotes(base_dir=app.root_path)
+    assert sefaz.envios == []
+
+
+def test_fila_reaproveita_status_em_cache(app, sonda, sefaz):
+    fila = ContingenciaFila(app, db)
+    sonda.verificar()
+    assert fila.verificar_sefaz() is True
+    assert sefaz.consultas_status == 1
+    assert fila.relatorio()['sefaz']['online'] is True
+
+
+def test_json_exige_login_e_traz_historico(app, sonda, sefaz, monkeypatch):
+    monkeypatch.setattr(nfe_routes, 'sefaz_status', sonda)
+    app.register_blueprint(nfe_routes.nfe_bp)
+    cliente = app.test_client()
+
+    assert cliente.get('/admin/nfe/sefaz_status.json').status_code == 401
+
+    sonda.verificar()
+    with cliente.session_transaction() as sess:
+        sess['email'] = 'teste@ouvirtiba.com.br'
+    dados = cliente.get('/admin/nfe/sefaz_status.json').get_json()
+    assert dados['online'] is True and dados['cstat'] == '107'
+    assert len(dados['history']) == 1 and dados['history'][0]['latency_ms'] >= 0
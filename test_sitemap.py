@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Testes do sitemap dinâmico (sitemap_xml.py).
+
+Usa o banco configurado em DATABASE_URL (mesmo padrão de test_db.py).
+Execução: python -m pytest -q test_sitemap.py
+"""
+
+import os
+import re
+
+import pytest
+
+if not os.getenv('DATABASE_URL'):
+    pytest.skip("DATABASE_URL não configurada", allow_module_level=True)
+
+from app import app
+import sitemap_xml
+from admin.blog_post.models import BlogPost
+
+
+def _locs(xml):
+    return re.findall(r'<loc>([^<]+)</loc>', xml)
+
+
+@pytest.fixture
+def client():
+    sitemap_xml.invalidar_sitemap()
+    yield app.test_client()
+    sitemap_xml.invalidar_sitemap()
+
+
+def _slugs_ativos():
+    with app.app_context():
+        return {slug for (slug,) in BlogPost.query
+                .filter(BlogPost.active.is_(True), BlogPost.slug.isnot(None))
+                .with_entities(BlogPost.slug)}
+
+
+def test_sitemap_tem_paginas_fixas_e_posts_ativos(client):
+    r = client.get('/sitemap.xml')
+    assert r.status_code == 200
+    assert r.content_type.startswith('application/xml')
+
+    locs = _locs(r.get_data(as_text=True))
+    assert f'{sitemap_xml.SITEMAP_BASE_URL}/' in locs
+    for slug in _slugs_ativos():
+        assert f'{sitemap_xml.SITEMAP_BASE_URL}/blog/{slug}' in locs
+
+    assert client.get('/sitemap.xml', headers={'If-None-Match': r.headers['ETag']}).status_code == 304
+
+
+def test_sitemap_index_divide_em_partes(client, monkeypatch):
+    monkeypatch.setattr(sitemap_xml, 'SITEMAP_MAX_URLS', 3)
+    indice = client.get('/sitemap.xml').get_data(as_text=True)
+    assert '<sitemapindex' in indice
+
+    todas = []
+    for loc in _locs(indice):
+        parte = client.get(loc.replace(sitemap_xml.SITEMAP_BASE_URL, ''))
+        assert parte.status_code == 200
+        todas.extend(_locs(parte.get_data(as_text=True)))
+
+    assert len(todas) == len(set(todas)) == len(sitemap_xml.PAGINAS_FIXAS) + len(_slugs_ativos())
+    assert client.get(f'/sitemap-{len(_locs(indice)) + 1}.xml').status_code == 404
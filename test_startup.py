@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Teste de regressão da partida a frio.
+
+Sobe um Python novo, importa o app e faz GET / (como no wake-up do Render),
+garantindo que nenhuma biblioteca pesada (bench_startup.PESADOS) é carregada
+antes da primeira rota que precisar dela e que o tempo até o primeiro byte
+fica dentro de STARTUP_BUDGET_MS.
+
+Não precisa de banco: sem DATABASE_URL o subprocesso usa sqlite://.
+Execução: python -m pytest -q test_startup.py
+"""
+
+import os
+
+import pytest
+
+from bench_startup import medir_primeiro_byte, parse_importtime
+
+# Limite folgado para CI/máquinas lentas; ajuste com STARTUP_BUDGET_MS
+STARTUP_BUDGET_MS = float(os.getenv('STARTUP_BUDGET_MS', '4000'))
+
+
+@pytest.fixture(scope='module')
+def partida():
+    return medir_primeiro_byte()
+
+
+def test_home_responde(partida):
+    assert partida['status'] == 200
+
+
+def test_sem_bibliotecas_pesadas_no_import(partida):
+    assert partida['pesados'] == [], (
+        f"importadas na partida: {partida['pesados']} — mova o import para dentro da rota"
+    )
+
+
+def test_primeiro_byte_dentro_do_limite(partida):
+    assert partida['ttfb_ms'] <= STARTUP_BUDGET_MS, (
+        f"primeiro byte em {partida['ttfb_ms']:.0f} ms (limite {STARTUP_BUDGET_MS:.0f} ms)"
+    )
+
+
+def test_parse_importtime_agrupa_por_pacote():
+    saida = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       100 |        100 |     lxml._elementpath\n"
+        "import time:      2000 |       2100 |   lxml.etree\n"
+        "import time:       300 |       2400 | lxml\n"
+        "import time:       500 |        500 | fpdf\n"
+    )
+    assert parse_importtime(saida) == {'lxml': 2.4, 'fpdf': 0.5}
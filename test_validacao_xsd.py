@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Testes da validação local do XML da NFC-e no schema oficial da NF-e 4.00
+(admin/nfe/validacao_xsd.py e validar_xml.py).
+
+Não acessa a SEFAZ nem o banco: monta uma NFC-e mínima com os mesmos grupos
+que gerar_xml_nfce produz, assina com um certificado A1 gerado na hora e
+confere o resultado nos XSD de admin/nfe/schemas.
+Execução: python -m pytest -q test_validacao_xsd.py
+"""
+
+import pytest
+from lxml import etree
+
+import validar_xml
+from conftest import SENHA, gerar_pfx
+from admin.nfe import validacao_xsd
+from admin.nfe.nfce_sign import assinar_xml_nfce
+from admin.nfe.nfce_emissao import _grupo_pis_cofins
+from admin.nfe.routes import gerar_chave_acesso
+from admin.nfe.services.qr_code import gerar_qrcode_url
+from admin.nfe.validacao_xsd import validar_xml as validar, exigir_xml_valido, XmlInvalido
+
+NS = 'http://www.portalfiscal.inf.br/nfe'
+CHAVE = gerar_chave_acesso('42', '56154376000105', '65', '1', '000000012', '112345678')
+
+ITEM = '''<det nItem="{n}"><prod><cProd>{n}</cProd><cEAN>SEM GTIN</cEAN><xProd>APARELHO AUDITIVO</xProd>
+<NCM>90214000</NCM><CFOP>5102</CFOP><uCom>UN</uCom><qCom>1.0000</qCom><vUnCom>150.0000000000</vUnCom>
+<vProd>150.00</vProd><cEANTrib>SEM GTIN</cEANTrib><uTrib>UN</uTrib><qTrib>1.0000</qTrib>
+<vUnTrib>150.0000000000</vUnTrib><indTot>1</indTot></prod><imposto><vTotTrib>0.00</vTotTrib>
+<ICMS><ICMSSN102><orig>0</orig><CSOSN>102</CSOSN></ICMSSN102></ICMS><PIS/><COFINS/></imposto></det>'''
+
+NFCE = '''<NFe xmlns="{ns}"><infNFe Id="NFe{chave}" versao="4.00"><ide><cUF>42</cUF><cNF>{cnf}</cNF>
+<natOp>VENDA</natOp><mod>65</mod><serie>1</serie><nNF>12</nNF><dhEmi>2026-10-08T14:30:00-03:00</dhEmi>
+<tpNF>1</tpNF><idDest>1</idDest><cMunFG>4201307</cMunFG><tpImp>4</tpImp><tpEmis>1</tpEmis>
+<cDV>{dv}</cDV><tpAmb>2</tpAmb><finNFe>1</finNFe><indFinal>1</indFinal><indPres>1</indPres>
+<procEmi>0</procEmi><verProc>Ouvirtiba-1.0</verProc></ide><emit><CNPJ>56154376000105</CNPJ>
+<xNome>JANSSEN APARELHOS AUDITIVOS LTDA</xNome><enderEmit><xLgr>RUA XV</xLgr><nro>100</nro>
+<xBairro>CENTRO</xBairro><cMun>4201307</cMun><xMun>ARAQUARI</xMun><UF>SC</UF><CEP>89245000</CEP>
+<cPais>1058</cPais><xPais>BRASIL</xPais></enderEmit><IE>263067041</IE><CRT>1</CRT></emit>
+{itens}<total><ICMSTot><vBC>0.00</vBC><vICMS>0.00</vICMS><vICMSDeson>0.00</vICMSDeson><vFCP>0.00</vFCP>
+<vBCST>0.00</vBCST><vST>0.00</vST><vFCPST>0.00</vFCPST><vFCPSTRet>0.00</vFCPSTRet><vProd>300.00</vProd>
+<vFrete>0.00</vFrete><vSeg>0.00</vSeg><vDesc>0.00</vDesc><vII>0.00</vII><vIPI>0.00</vIPI>
+<vIPIDevol>0.00</vIPIDevol><vPIS>0.00</vPIS><vCOFINS>0.00</vCOFINS><vOutro>0.00</vOutro><vNF>300.00</vNF>
+</ICMSTot></total><transp><modFrete>9</modFrete></transp><pag><detPag><indPag>0</indPag><tPag>01</tPag>
+<vPag>300.00</vPag></detPag></pag></infNFe><infNFeSupl><qrCode>{qrcode}</qrCode>
+<urlChave>https://hom.sat.sef.sc.gov.br/nfce/consulta</urlChave></infNFeSupl></NFe>'''
+
+
+def _nfce(cst='99', itens=2):
+    """NFC-e sem assinatura com `itens` itens e PIS/COFINS do CST informado."""
+    qrcode = gerar_qrcode_url(CHAVE, 2, '000001', 'CSC123')
+    xml = NFCE.format(ns=NS, chave=CHAVE, cnf=CHAVE[35:43], dv=CHAVE[-1], qrcode=qrcode,
+                      itens=''.join(ITEM.format(n=n) for n in range(1, itens + 1)))
+    raiz = etree.fromstring(xml.replace('\n', ''))
+    for tributo in ('PIS', 'COFINS'):
+        for grupo in raiz.iter(f'{{{NS}}}{tributo}'):
+            _grupo_pis_cofins(grupo, tributo, cst)
+    return etree.tostring(raiz, xml_declaration=True, encoding='utf-8')
+
+
+@pytest.fixture(scope='module')
+def pfx(tmp_path_factory):
+    caminho = tmp_path_factory.mktemp('cert') / 'a1.pfx'
+    gerar_pfx(caminho)
+    return str(caminho)
+
+
+def test_schema_compilado_uma_vez_por_processo():
+    assert validacao_xsd.schema('NFe') is validacao_xsd.schema('NFe')
+    assert 'NFe' in validacao_xsd.relatorio()['schemas']
+    with pytest.raises(ValueError):
+        validacao_xsd.schema('nfeProc')
+
+
+def test_nfce_assinada_valida_e_assinatura_por_ultimo(pfx):
+    xml_assinado = assinar_xml_nfce(_nfce(), pfx, SENHA)
+    assert validar(xml_assinado) == []
+    raiz = etree.fromstring(xml_assinado)
+    assert [etree.QName(e).localname for e in raiz] == ['infNFe', 'infNFeSupl', 'Signature']
+
+
+@pytest.mark.parametrize('cst', ['01', '03', '07', '49', '99'])
+def test_grupo_pis_cofins_por_cst(cst):
+    assert validar(_nfce(cst), assinado=False) == []
+
+
+def test_sem_assinatura():
+    assert validar(_nfce(), assinado=False) == []
+    erros = validar(_nfce())
+    assert len(erros) == 1 and erros[0]['caminho'] == 'NFe'
+    assert 'Signature' in erros[0]['mensagem']
+
+
+def test_erro_com_caminho_do_item(pfx):
+    # O erro que a SEFAZ devolvia como 225: PISNT não aceita o CST 99
+    raiz = etree.fromstring(assinar_xml_nfce(_nfce(), pfx, SENHA))
+    pis = raiz.findall(f'.//{{{NS}}}PIS')[1]
+    pis.remove(pis[0])
+    etree.SubElement(etree.SubElement(pis, f'{{{NS}}}PISNT'), f'{{{NS}}}CST').text = '99'
+
+    erros = validar(raiz)
+    assert [e['caminho'] for e in erros] == ['NFe/infNFe/det[nItem=2]/imposto/PIS/PISNT/CST']
+    assert "'99'" in erros[0]['mensagem'] and '{http' not in erros[0]['mensagem']
+    with pytest.raises(XmlInvalido) as excinfo:
+        exigir_xml_valido(raiz)
+    assert excinfo.value.erros == erros
+
+
+def test_qrcode_online_sem_zeros_no_id_do_csc():
+    url = gerar_qrcode_url(CHAVE, 2, '000001', 'CSC123')
+    assert url.split('?p=')[1].split('|')[3] == '1'
+
+
+def test_xml_mal_formado():
+    erros = validar(b'<NFe xmlns="http://www.portalfiscal.inf.br/nfe"><infNFe>')
+    assert len(erros) == 1 and 'mal formado' in erros[0]['mensagem']
+
+
+def test_validacao_em_lote(tmp_path, pfx, capsys):
+    (tmp_path / 'nfce_12.xml').write_bytes(_nfce())
+    (tmp_path / 'nfce_12_assinado.xml').write_bytes(assinar_xml_nfce(_nfce(), pfx, SENHA))
+    assert validar_xml.main([str(tmp_path)]) == 0
+
+    (tmp_path / 'nfce_13_assinado.xml').write_bytes(_nfce())   # sem assinatura
+    assert validar_xml.main([str(tmp_path), '--assinados']) == 1
+    saida = capsys.readouterr().out
+    assert '❌' in saida and 'nfce_13_assinado.xml: 1 erro(s)' in saida
+    assert '2 arquivo(s), 1 inválido(s)' in saida
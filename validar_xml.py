@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Validação em lote dos XML de NFC-e contra o schema oficial da NF-e 4.00.
+
+Confere de uma vez os arquivos gerados em admin/nfe/output (ou os indicados
+na linha de comando) com o mesmo schema compilado usado na geração e na
+transmissão (admin/nfe/validacao_xsd.py). XML salvo antes de assinar
+(nfce_N.xml) não precisa de <Signature>; *_assinado.xml precisa.
+
+Uso:
+    python validar_xml.py                      # todos de admin/nfe/output
+    python validar_xml.py admin/nfe/output/nfce_12_assinado.xml
+    python validar_xml.py --assinados          # só *_assinado.xml
+
+Código de saída: 0 se todos forem válidos, 1 se algum tiver erro.
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+PASTA = os.path.join('admin', 'nfe', 'output')
+
+
+def arquivos(caminhos, somente_assinados=False):
+    """Lista os XML a validar: pastas são expandidas para *.xml."""
+    lista = []
+    for caminho in caminhos or [PASTA]:
+        if os.path.isdir(caminho):
+            lista.extend(sorted(glob.glob(os.path.join(caminho, '*.xml'))))
+        else:
+            lista.append(caminho)
+    if somente_assinados:
+        lista = [c for c in lista if c.endswith('_assinado.xml')]
+    return lista
+
+
+def validar(caminhos, somente_assinados=False, saida=None):
+    """Valida e imprime o resultado de cada arquivo; devolve a quantidade de inválidos."""
+    from admin.nfe.validacao_xsd import validar_arquivo, formatar_erros, relatorio
+
+    saida = saida or sys.stdout
+    lista = arquivos(caminhos, somente_assinados)
+    invalidos = 0
+    inicio = time.perf_counter()
+    for caminho in lista:
+        erros = validar_arquivo(caminho)
+        if erros:
+            invalidos += 1
+            print(f"❌ {caminho}: {len(erros)} erro(s)", file=saida)
+            for linha in formatar_erros(erros, limite=20).splitlines():
+                print(f"   {linha}", file=saida)
+        else:
+            print(f"✅ {caminho}", file=saida)
+
+    ms = (time.perf_counter() - inicio) * 1000
+    compilacao = sum(relatorio()['compilacao_ms'].values())
+    print(f"\n📋 {len(lista)} arquivo(s), {invalidos} inválido(s) em {ms:.0f} ms "
+          f"(compilação do schema: {compilacao:.0f} ms)", file=saida)
+    return invalidos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Valida XML de NFC-e contra o schema NF-e 4.00.')
+    parser.add_argument('caminhos', nargs='*', help=f'arquivos ou pastas (padrão: {PASTA})')
+    parser.add_argument('--assinados', action='store_true', help='valida só os *_assinado.xml')
+    args = parser.parse_args(argv)
+    return 1 if validar(args.caminhos, args.assinados) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())